@@ -43,10 +43,18 @@ class RedisInitKeyConfig(Enum):
     def remark(self) -> Union[str, None]:
         return self.value.get('remark')
 
+    @property
+    def is_hash(self) -> bool:
+        """
+        是否以单个Hash存储整个缓存族（field为缓存键名），整族失效只需删除一个键
+        """
+        return self.value.get('storage') == 'hash'
+
     ACCESS_TOKEN = {'key': 'access_token', 'remark': '登录令牌信息'}
-    SYS_DICT = {'key': 'sys_dict', 'remark': '数据字典'}
-    SYS_CONFIG = {'key': 'sys_config', 'remark': '配置信息'}
+    SYS_DICT = {'key': 'sys_dict', 'remark': '数据字典', 'storage': 'hash'}
+    SYS_CONFIG = {'key': 'sys_config', 'remark': '配置信息', 'storage': 'hash'}
     CAPTCHA_CODES = {'key': 'captcha_codes', 'remark': '图片验证码'}
     ACCOUNT_LOCK = {'key': 'account_lock', 'remark': '用户锁定'}
     PASSWORD_ERROR_COUNT = {'key': 'password_error_count', 'remark': '密码错误次数'}
     SMS_CODE = {'key': 'sms_code', 'remark': '短信验证码'}
+    STATISTICS = {'key': 'statistics', 'remark': '统计结果'}
@@ -76,6 +76,34 @@ class RedisSettings(BaseSettings):
     redis_database: int = 2
 
 
+class SchedulerSettings(BaseSettings):
+    """
+    定时任务配置
+    """
+
+    # 需要记录调度日志的事件，可选 submitted、executed、error、missed、max_instances、added、modified、removed，逗号分隔
+    scheduler_log_events: str = 'executed,error,missed,max_instances'
+    # 调度日志批量写入的最大条数
+    scheduler_log_batch_size: int = 100
+    # 调度日志批量写入的最长间隔（秒）
+    scheduler_log_flush_interval: float = 2.0
+    # 调度日志待写入队列容量，队列满时丢弃新日志
+    scheduler_log_queue_size: int = 10000
+    # 是否启用分布式调度：多个worker通过Redis选举主节点，只有主节点触发任务，到期任务经Redis队列分发给有空闲容量的worker执行
+    # 默认关闭，多worker部署时开启（需要Redis 6.2+）
+    scheduler_distributed: bool = False
+    # 主节点租约时长（秒），主节点失联后最多经过该时长由其他worker接管
+    scheduler_lease_ttl: int = 15
+    # 每个worker同时执行的任务数上限
+    scheduler_worker_capacity: int = 10
+    # 任务认领记录保留时长（秒），用于主节点切换时对同一次触发去重
+    scheduler_claim_ttl: int = 86400
+
+    @property
+    def log_event_names(self) -> set[str]:
+        return {name.strip() for name in self.scheduler_log_events.split(',') if name.strip()}
+
+
 class GenSettings:
     """
     代码生成配置
@@ -185,6 +213,13 @@ class GetConfig:
         # 实例化Redis配置模型
         return RedisSettings()
 
+    def get_scheduler_config(self) -> SchedulerSettings:
+        """
+        获取定时任务配置
+        """
+        # 实例化定时任务配置模型
+        return SchedulerSettings()
+
     def get_gen_config(self) -> GenSettings:
         """
         获取代码生成配置
@@ -246,6 +281,8 @@ JwtConfig = get_config.get_jwt_config()
 DataBaseConfig = get_config.get_database_config()
 # Redis配置
 RedisConfig = get_config.get_redis_config()
+# 定时任务配置
+SchedulerConfig = get_config.get_scheduler_config()
 # 代码生成配置
 GenConfig = get_config.get_gen_config()
 # 上传配置
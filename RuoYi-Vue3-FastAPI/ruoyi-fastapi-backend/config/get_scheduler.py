@@ -1,11 +1,32 @@
+import asyncio
+import functools
 import importlib
 import json
+import os
+import sys
+import threading
+import time
+import uuid
 from asyncio import iscoroutinefunction
+from concurrent.futures import ProcessPoolExecutor as ProcessPool
 from datetime import datetime, timedelta
 from typing import Any, Callable, Optional, Union
 
-from apscheduler.events import EVENT_ALL, SchedulerEvent
+from apscheduler.events import (
+    EVENT_JOB_ADDED,
+    EVENT_JOB_ERROR,
+    EVENT_JOB_EXECUTED,
+    EVENT_JOB_MAX_INSTANCES,
+    EVENT_JOB_MISSED,
+    EVENT_JOB_MODIFIED,
+    EVENT_JOB_REMOVED,
+    EVENT_JOB_SUBMITTED,
+    JobExecutionEvent,
+    JobSubmissionEvent,
+    SchedulerEvent,
+)
 from apscheduler.executors.asyncio import AsyncIOExecutor
+from apscheduler.executors.base import BaseExecutor
 from apscheduler.executors.pool import ProcessPoolExecutor
 from apscheduler.job import Job
 from apscheduler.jobstores.memory import MemoryJobStore
@@ -15,15 +36,18 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.combining import OrTrigger
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.date import DateTrigger
+from apscheduler.util import obj_to_ref, ref_to_obj
+from redis import asyncio as aioredis
 from sqlalchemy.engine import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession
 
 import module_task  # noqa: F401
 from config.database import AsyncSessionLocal, quote_plus
-from config.env import DataBaseConfig, RedisConfig
+from config.env import DataBaseConfig, RedisConfig, SchedulerConfig
 from module_admin.dao.job_dao import JobDao
 from module_admin.entity.vo.job_vo import JobLogModel, JobModel
 from module_admin.service.job_log_service import JobLogService
+from utils.leader_lock_util import LeaderLock
 from utils.log_util import logger
 
 
@@ -85,6 +109,38 @@ class MyCronTrigger(CronTrigger):
             diff += 1
 
 
+class JobDispatchExecutor(BaseExecutor):
+    """
+    分布式模式下使用的执行器
+
+    任务到期时不在当前进程执行，而是交给调度协调器写入Redis队列，由有空闲容量的worker认领执行
+    """
+
+    def start(self, scheduler: AsyncIOScheduler, alias: str) -> None:
+        super().start(scheduler, alias)
+        self._eventloop = scheduler._eventloop
+        self._pending_futures: set[asyncio.Task] = set()
+
+    def shutdown(self, wait: bool = True) -> None:
+        for future in self._pending_futures:
+            future.cancel()
+        self._pending_futures.clear()
+
+    def _do_submit_job(self, job: Job, run_times: list[datetime]) -> None:
+        def callback(future: asyncio.Task) -> None:
+            self._pending_futures.discard(future)
+            try:
+                events = future.result()
+            except BaseException:
+                self._run_job_error(job.id, *sys.exc_info()[1:])
+            else:
+                self._run_job_success(job.id, events)
+
+        future = self._eventloop.create_task(scheduler_coordinator.dispatch(job, run_times))
+        future.add_done_callback(callback)
+        self._pending_futures.add(future)
+
+
 SQLALCHEMY_DATABASE_URL = (
     f'mysql+pymysql://{DataBaseConfig.db_username}:{quote_plus(DataBaseConfig.db_password)}@'
     f'{DataBaseConfig.db_host}:{DataBaseConfig.db_port}/{DataBaseConfig.db_database}'
@@ -102,7 +158,6 @@ engine = create_engine(
     pool_recycle=DataBaseConfig.db_pool_recycle,
     pool_timeout=DataBaseConfig.db_pool_timeout,
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 redis_config = {
     'host': RedisConfig.redis_host,
     'port': RedisConfig.redis_port,
@@ -115,32 +170,176 @@ job_stores = {
     'sqlalchemy': SQLAlchemyJobStore(url=SQLALCHEMY_DATABASE_URL, engine=engine),
     'redis': RedisJobStore(**redis_config),
 }
-executors = {'default': AsyncIOExecutor(), 'processpool': ProcessPoolExecutor(5)}
+if SchedulerConfig.scheduler_distributed:
+    # 分布式模式下到期任务统一交给协调器写入队列，由各worker按任务原有的执行器类型执行
+    executors = {'default': JobDispatchExecutor(), 'processpool': JobDispatchExecutor()}
+else:
+    executors = {'default': AsyncIOExecutor(), 'processpool': ProcessPoolExecutor(5)}
 job_defaults = {'coalesce': False, 'max_instance': 1}
 scheduler = AsyncIOScheduler()
 scheduler.configure(jobstores=job_stores, executors=executors, job_defaults=job_defaults)
 
 
+# 可配置记录日志的调度事件
+SCHEDULER_LOG_EVENT_MAP = {
+    'submitted': EVENT_JOB_SUBMITTED,
+    'executed': EVENT_JOB_EXECUTED,
+    'error': EVENT_JOB_ERROR,
+    'missed': EVENT_JOB_MISSED,
+    'max_instances': EVENT_JOB_MAX_INSTANCES,
+    'added': EVENT_JOB_ADDED,
+    'modified': EVENT_JOB_MODIFIED,
+    'removed': EVENT_JOB_REMOVED,
+}
+
+
+class JobLogWriter:
+    """
+    定时任务调度日志异步批量写入器
+
+    事件监听器只负责把日志放入队列，由事件循环中的后台任务按条数或时间间隔批量写入数据库，
+    不在调度线程或事件循环中执行同步数据库操作。
+    """
+
+    # 停止信号，写入任务收到后写入已收集的日志并退出
+    _stop_signal = object()
+
+    def __init__(self, batch_size: int, flush_interval: float, queue_size: int) -> None:
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.dropped = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """
+        在当前事件循环中启动写入任务
+
+        :return:
+        """
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    def put(self, job_log: JobLogModel) -> None:
+        """
+        提交一条日志（线程安全，进程池执行器的回调可能来自其他线程）
+
+        :param job_log: 定时任务日志对象
+        :return:
+        """
+        if self._loop is None or self._loop.is_closed():
+            return
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            self._enqueue(job_log)
+        else:
+            self._loop.call_soon_threadsafe(self._enqueue, job_log)
+
+    def _enqueue(self, job_log: JobLogModel) -> None:
+        try:
+            self._queue.put_nowait(job_log)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f'定时任务日志队列已满，已丢弃{self.dropped}条日志')
+
+    async def _run(self) -> None:
+        while True:
+            job_log = await self._queue.get()
+            if job_log is self._stop_signal:
+                return
+            batch = [job_log]
+            stopping = False
+            deadline = self._loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    job_log = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if job_log is self._stop_signal:
+                    stopping = True
+                    break
+                batch.append(job_log)
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch: list[JobLogModel]) -> None:
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await JobLogService.add_job_log_batch_services(session, batch)
+            if not result.is_success:
+                logger.error(f'定时任务日志批量写入失败：{result.message}')
+        except Exception as e:
+            logger.error(f'定时任务日志批量写入失败：{e}')
+
+    async def stop(self) -> None:
+        """
+        停止写入任务并写入队列中剩余的日志
+
+        :return:
+        """
+        if self._task is None:
+            return
+        # 用停止信号代替取消任务，写入任务会先写入已收集但尚未写入的一批日志
+        if not self._task.done():
+            await self._queue.put(self._stop_signal)
+            await self._task
+        self._task = None
+        # 停止信号之后（如其他线程回调）进入队列的日志
+        remaining = []
+        while not self._queue.empty():
+            remaining.append(self._queue.get_nowait())
+        for start in range(0, len(remaining), self.batch_size):
+            await self._flush(remaining[start : start + self.batch_size])
+
+
+job_log_writer = JobLogWriter(
+    batch_size=SchedulerConfig.scheduler_log_batch_size,
+    flush_interval=SchedulerConfig.scheduler_log_flush_interval,
+    queue_size=SchedulerConfig.scheduler_log_queue_size,
+)
+
+
 class SchedulerUtil:
     """
     定时任务相关方法
     """
 
+    # 任务信息快照（任务ID -> 日志所需字段），避免在事件监听中查询持久化任务存储
+    _job_snapshots: dict[str, dict[str, Any]] = {}
+    # 任务提交时间（(任务ID, 计划执行时间) -> 提交时的单调时钟），用于计算排队延迟和执行耗时
+    _submitted_at: dict[tuple[str, datetime], float] = {}
+    _submitted_lock = threading.Lock()
+    _max_pending_submissions = 10000
+    # 配置的需要记录日志的事件掩码
+    _log_mask = 0
+
     @classmethod
-    async def init_system_scheduler(cls) -> None:
+    async def init_system_scheduler(cls, redis: aioredis.Redis) -> None:
         """
         应用启动时初始化定时任务
 
+        :param redis: redis对象
         :return:
         """
         logger.info('🔎 开始启动定时任务...')
-        scheduler.start()
-        async with AsyncSessionLocal() as session:
-            job_list = await JobDao.get_job_list_for_scheduler(session)
-            for item in job_list:
-                cls.remove_scheduler_job(job_id=str(item.job_id))
-                cls.add_scheduler_job(item)
-        scheduler.add_listener(cls.scheduler_event_listener, EVENT_ALL)
+        # 分布式模式下各worker的调度器先以暂停状态启动，只有选举成为主节点的worker才会恢复并触发任务
+        scheduler.start(paused=SchedulerConfig.scheduler_distributed)
+        await cls.load_scheduler_jobs()
+        job_log_writer.start()
+        scheduler.add_listener(cls.scheduler_event_listener, cls._get_listener_mask())
+        if SchedulerConfig.scheduler_distributed:
+            await scheduler_coordinator.start(redis)
         logger.info('✅️ 系统初始定时任务加载成功')
 
     @classmethod
@@ -150,9 +349,36 @@ class SchedulerUtil:
 
         :return:
         """
+        if SchedulerConfig.scheduler_distributed:
+            await scheduler_coordinator.stop()
         scheduler.shutdown()
+        await job_log_writer.stop()
         logger.info('✅️ 关闭定时任务成功')
 
+    @classmethod
+    async def load_scheduler_jobs(cls) -> None:
+        """
+        从数据库加载全部启用的定时任务
+
+        :return:
+        """
+        async with AsyncSessionLocal() as session:
+            job_list = await JobDao.get_job_list_for_scheduler(session)
+            for item in job_list:
+                cls.remove_scheduler_job(job_id=str(item.job_id))
+                cls.add_scheduler_job(item)
+
+    @classmethod
+    async def notify_job_changed(cls, job_ids: list[Union[str, int]]) -> None:
+        """
+        定时任务新增、修改、删除并提交事务后通知其他worker重新加载（非分布式模式下无需通知）
+
+        :param job_ids: 任务id列表
+        :return:
+        """
+        if SchedulerConfig.scheduler_distributed:
+            await scheduler_coordinator.publish_job_sync(job_ids)
+
     @classmethod
     def _import_function(cls, func_path: str) -> Callable[..., Any]:
         """
@@ -189,7 +415,7 @@ class SchedulerUtil:
         job_executor = job_info.job_executor
         if iscoroutinefunction(job_func):
             job_executor = 'default'
-        scheduler.add_job(
+        job = scheduler.add_job(
             func=job_func,
             trigger=MyCronTrigger.from_crontab(job_info.cron_expression),
             args=job_info.job_args.split(',') if job_info.job_args else None,
@@ -201,16 +427,23 @@ class SchedulerUtil:
             max_instances=3 if job_info.concurrent == '0' else 1,
             jobstore=job_info.job_group,
             executor=job_executor,
+            replace_existing=True,
         )
+        cls._job_snapshots[job.id] = cls._snapshot_job(job, job_info.job_group)
 
     @classmethod
-    def execute_scheduler_job_once(cls, job_info: JobModel) -> None:
+    async def execute_scheduler_job_once(cls, job_info: JobModel) -> None:
         """
         根据输入的任务对象执行一次任务
 
         :param job_info: 任务对象信息
         :return:
         """
+        if SchedulerConfig.scheduler_distributed:
+            # 直接写入执行队列，不影响主节点上该任务的周期触发
+            await scheduler_coordinator.enqueue_once(job_info)
+            return
+        cls.remove_scheduler_job(job_id=job_info.job_id)
         job_func = cls._import_function(job_info.invoke_target)
         job_executor = job_info.job_executor
         if iscoroutinefunction(job_func):
@@ -218,7 +451,7 @@ class SchedulerUtil:
         job_trigger = DateTrigger()
         if job_info.status == '0':
             job_trigger = OrTrigger(triggers=[DateTrigger(), MyCronTrigger.from_crontab(job_info.cron_expression)])
-        scheduler.add_job(
+        job = scheduler.add_job(
             func=job_func,
             trigger=job_trigger,
             args=job_info.job_args.split(',') if job_info.job_args else None,
@@ -231,6 +464,7 @@ class SchedulerUtil:
             jobstore=job_info.job_group,
             executor=job_executor,
         )
+        cls._job_snapshots[job.id] = cls._snapshot_job(job, job_info.job_group)
 
     @classmethod
     def remove_scheduler_job(cls, job_id: Union[str, int]) -> None:
@@ -244,50 +478,687 @@ class SchedulerUtil:
         if query_job:
             scheduler.remove_job(job_id=str(job_id))
 
+    @classmethod
+    def _get_listener_mask(cls) -> int:
+        """
+        根据配置计算需要监听的事件掩码
+
+        :return: 事件掩码
+        """
+        mask = 0
+        for name in SchedulerConfig.log_event_names:
+            if name in SCHEDULER_LOG_EVENT_MAP:
+                mask |= SCHEDULER_LOG_EVENT_MAP[name]
+            else:
+                logger.warning(f'未知的定时任务日志事件：{name}')
+        cls._log_mask = mask
+        if SchedulerConfig.scheduler_distributed:
+            # 执行日志由认领任务的worker写入，主节点只记录分发异常、错过执行等调度事件
+            return mask & ~(EVENT_JOB_EXECUTED | EVENT_JOB_SUBMITTED)
+        # 计算排队延迟与执行耗时需要提交事件
+        if mask & (EVENT_JOB_EXECUTED | EVENT_JOB_ERROR):
+            mask |= EVENT_JOB_SUBMITTED
+        return mask
+
+    @classmethod
+    def _snapshot_job(cls, job: Job, job_group: Optional[str] = None) -> dict[str, Any]:
+        """
+        提取日志所需的任务信息
+
+        :param job: 任务对象
+        :param job_group: 任务组名
+        :return: 任务信息
+        """
+        job_state = job.__getstate__()
+        return {
+            'job_name': job_state.get('name'),
+            'job_group': job_group or getattr(job, '_jobstore_alias', None),
+            'job_executor': job_state.get('executor'),
+            'invoke_target': job_state.get('func'),
+            'job_args': ','.join(str(arg) for arg in job_state.get('args') or ()),
+            'job_kwargs': json.dumps(job_state.get('kwargs')),
+            'job_trigger': str(job_state.get('trigger')),
+        }
+
+    @classmethod
+    def _record_submission(cls, event: JobSubmissionEvent) -> None:
+        """
+        记录任务提交时间
+
+        :param event: 任务提交事件
+        :return:
+        """
+        now = time.monotonic()
+        with cls._submitted_lock:
+            # 执行结果事件丢失（如进程池崩溃）时防止无限增长
+            if len(cls._submitted_at) >= cls._max_pending_submissions:
+                cls._submitted_at.clear()
+            for run_time in event.scheduled_run_times:
+                cls._submitted_at[(event.job_id, run_time)] = now
+
+    @classmethod
+    def _get_job_timing(cls, event: SchedulerEvent) -> str:
+        """
+        计算任务的排队延迟、执行耗时
+
+        :param event: 调度事件
+        :return: 耗时描述
+        """
+        if isinstance(event, JobSubmissionEvent):
+            run_time = min(event.scheduled_run_times)
+            delay = (datetime.now(run_time.tzinfo) - run_time).total_seconds()
+            return f', 排队延迟: {delay * 1000:.0f}ms'
+        if not isinstance(event, JobExecutionEvent):
+            return ''
+        now = datetime.now(event.scheduled_run_time.tzinfo)
+        if event.code in (EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES):
+            delay = (now - event.scheduled_run_time).total_seconds()
+            return f', 计划执行时间: {event.scheduled_run_time.strftime("%Y-%m-%d %H:%M:%S")}, 已延迟: {delay:.3f}s'
+        with cls._submitted_lock:
+            submitted_at = cls._submitted_at.pop((event.job_id, event.scheduled_run_time), None)
+        if submitted_at is None:
+            return ''
+        duration = time.monotonic() - submitted_at
+        queue_delay = (now - event.scheduled_run_time).total_seconds() - duration
+        return f', 排队延迟: {max(queue_delay, 0) * 1000:.0f}ms, 执行耗时: {duration:.3f}s'
+
     @classmethod
     def scheduler_event_listener(cls, event: SchedulerEvent) -> None:
+        """
+        调度事件监听：构造日志并交给异步批量写入器，不在此处访问数据库
+
+        :param event: 调度事件
+        :return:
+        """
+        if isinstance(event, JobSubmissionEvent):
+            cls._record_submission(event)
+            if not cls._log_mask & EVENT_JOB_SUBMITTED:
+                return
+        if not hasattr(event, 'job_id'):
+            return
         # 获取事件类型和任务ID
         event_type = event.__class__.__name__
+        job_id = event.job_id
         # 获取任务执行异常信息
         status = '0'
         exception_info = ''
-        if event_type == 'JobExecutionEvent' and event.exception:
+        if isinstance(event, JobExecutionEvent) and event.exception:
             exception_info = str(event.exception)
             status = '1'
-        if hasattr(event, 'job_id'):
-            job_id = event.job_id
+        elif event.code == EVENT_JOB_MISSED:
+            exception_info = '任务错过执行时间（misfire）'
+            status = '1'
+        elif event.code == EVENT_JOB_MAX_INSTANCES:
+            exception_info = '任务运行实例数已达上限，本次执行被跳过'
+            status = '1'
+        job_snapshot = cls._job_snapshots.get(job_id)
+        if job_snapshot is None:
             query_job = cls.get_scheduler_job(job_id=job_id)
-            if query_job:
-                query_job_info = query_job.__getstate__()
-                # 获取任务名称
-                job_name = query_job_info.get('name')
-                # 获取任务组名
-                job_group = query_job._jobstore_alias
-                # 获取任务执行器
-                job_executor = query_job_info.get('executor')
-                # 获取调用目标字符串
-                invoke_target = query_job_info.get('func')
-                # 获取调用函数位置参数
-                job_args = ','.join(query_job_info.get('args'))
-                # 获取调用函数关键字参数
-                job_kwargs = json.dumps(query_job_info.get('kwargs'))
-                # 获取任务触发器
-                job_trigger = str(query_job_info.get('trigger'))
-                # 构造日志消息
-                job_message = f'事件类型: {event_type}, 任务ID: {job_id}, 任务名称: {job_name}, 执行于{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}'
-                job_log = JobLogModel(
-                    jobName=job_name,
-                    jobGroup=job_group,
-                    jobExecutor=job_executor,
-                    invokeTarget=invoke_target,
-                    jobArgs=job_args,
-                    jobKwargs=job_kwargs,
-                    jobTrigger=job_trigger,
-                    jobMessage=job_message,
-                    status=status,
-                    exceptionInfo=exception_info,
-                    createTime=datetime.now(),
-                )
-                session = SessionLocal()
-                JobLogService.add_job_log_services(session, job_log)
-                session.close()
+            if not query_job:
+                return
+            job_snapshot = cls._job_snapshots[job_id] = cls._snapshot_job(query_job)
+        job_log_writer.put(
+            cls.build_job_log(job_snapshot, event_type, job_id, status, exception_info, cls._get_job_timing(event))
+        )
+
+    @classmethod
+    def build_job_log(
+        cls,
+        job_snapshot: dict[str, Any],
+        event_type: str,
+        job_id: str,
+        status: str,
+        exception_info: str = '',
+        timing: str = '',
+    ) -> JobLogModel:
+        """
+        构造定时任务日志
+
+        :param job_snapshot: 任务信息快照
+        :param event_type: 事件类型
+        :param job_id: 任务ID
+        :param status: 执行状态（0正常 1失败）
+        :param exception_info: 异常信息
+        :param timing: 耗时描述
+        :return: 定时任务日志对象
+        """
+        job_message = (
+            f'事件类型: {event_type}, 任务ID: {job_id}, 任务名称: {job_snapshot.get("job_name")}, '
+            f'执行于{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}{timing}'
+        )
+        return JobLogModel(
+            jobName=job_snapshot.get('job_name'),
+            jobGroup=job_snapshot.get('job_group'),
+            jobExecutor=job_snapshot.get('job_executor'),
+            invokeTarget=job_snapshot.get('invoke_target'),
+            jobArgs=job_snapshot.get('job_args'),
+            jobKwargs=job_snapshot.get('job_kwargs'),
+            jobTrigger=job_snapshot.get('job_trigger'),
+            jobMessage=job_message[:500],
+            status=status,
+            exceptionInfo=exception_info[:2000],
+            createTime=datetime.now(),
+        )
+
+
+class SchedulerCoordinator:
+    """
+    分布式调度协调器
+
+    - 主节点选举：各worker竞争Redis租约锁，只有主节点恢复调度器并触发任务，其他worker的调度器保持暂停，
+      作为任务定义的副本，主节点失联后可在一个租约周期内接管；
+    - 任务分发：主节点以隔离令牌为条件把到期任务写入Redis队列，失去租约的旧主节点写入会被拒绝；
+    - 任务认领：worker按空闲容量从队列获取任务，以(任务ID, 计划执行时间)认领去重，
+      并按任务的并发设置限制整个集群同时运行的实例数；
+    - 故障恢复：worker用BLMOVE把任务从队列移入自己的处理中列表，执行完成后才移除；
+      worker定期刷新心跳，主节点把心跳过期的worker处理中列表里未完成的任务放回队列；
+    - 任务同步：任务新增、修改、删除后通过pub/sub通知其他worker从数据库重新加载。
+    """
+
+    queue_key = 'scheduler:queue'
+    processing_key = 'scheduler:processing'
+    claim_key = 'scheduler:claim'
+    running_key = 'scheduler:running'
+    worker_key = 'scheduler:worker'
+    workers_key = 'scheduler:workers'
+    # 认领记录在任务执行完成后标记为该值，未完成的认领记录保存认领的worker
+    claim_done = 'done'
+    sync_channel = 'scheduler:job_sync'
+    # 运行实例集合的兜底过期时间（秒），防止运行实例无法归还
+    running_ttl = 3600
+
+    def __init__(self, lease_ttl: int, capacity: int, claim_ttl: int) -> None:
+        self.lease_ttl = lease_ttl
+        self.capacity = capacity
+        self.claim_ttl = claim_ttl
+        self._origin = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self._redis: Optional[aioredis.Redis] = None
+        self._lock: Optional[LeaderLock] = None
+        self._leader = False
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks: list[asyncio.Task] = []
+        self._running_jobs: set[asyncio.Task] = set()
+        self._process_pool: Optional[ProcessPool] = None
+
+    async def start(self, redis: aioredis.Redis) -> None:
+        """
+        开始参与主节点选举并消费任务队列
+
+        :param redis: redis对象
+        :return:
+        """
+        self._redis = redis
+        self._lock = LeaderLock(redis, 'scheduler', self.lease_ttl)
+        self._slots = asyncio.Semaphore(self.capacity)
+        await self._heartbeat()
+        await redis.sadd(self.workers_key, self._origin)
+        self._tasks = [
+            asyncio.create_task(self._election_loop()),
+            asyncio.create_task(self._consume_loop()),
+            asyncio.create_task(self._sync_loop()),
+        ]
+        logger.info(f'✅️ 分布式定时任务已启动，worker容量：{self.capacity}')
+
+    async def stop(self) -> None:
+        """
+        停止选举与消费，释放主节点租约
+
+        :return:
+        """
+        for task in self._tasks + list(self._running_jobs):
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._running_jobs, return_exceptions=True)
+        self._tasks = []
+        self._step_down('应用关闭')
+        if self._lock is not None:
+            try:
+                await self._lock.release()
+            except Exception as e:
+                logger.warning(f'释放定时任务主节点租约失败：{e}')
+            try:
+                # 被中断的任务放回队列，由其他worker执行
+                await self._requeue_processing(self._origin)
+                await self._redis.delete(f'{self.worker_key}:{self._origin}')
+                await self._redis.srem(self.workers_key, self._origin)
+            except Exception as e:
+                logger.warning(f'归还未完成的定时任务失败：{e}')
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False)
+            self._process_pool = None
+
+    async def _election_loop(self) -> None:
+        """
+        定期竞争或续期主节点租约
+
+        :return:
+        """
+        interval = max(self.lease_ttl / 3, 1)
+        while True:
+            try:
+                await self._heartbeat()
+                if self._lock.token is not None:
+                    if not await self._lock.renew():
+                        self._step_down('租约已被其他worker接管')
+                elif await self._lock.acquire():
+                    self._become_leader()
+                if self._leader:
+                    await self._reap_dead_workers()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f'定时任务主节点选举异常：{e}')
+                # 无法访问Redis时，本地租约到期前保持主节点身份
+                if self._leader and not self._lock.is_leader:
+                    self._step_down('租约续期失败且已到期')
+            await asyncio.sleep(interval)
+
+    @property
+    def _processing_key(self) -> str:
+        return f'{self.processing_key}:{self._origin}'
+
+    async def _heartbeat(self) -> None:
+        """
+        刷新本worker的心跳，心跳过期后其处理中的任务会被主节点放回队列
+
+        :return:
+        """
+        await self._redis.set(f'{self.worker_key}:{self._origin}', int(time.time()), ex=self.lease_ttl)
+
+    async def _reap_dead_workers(self) -> None:
+        """
+        主节点把心跳已过期的worker处理中列表里未完成的任务放回队列
+
+        :return:
+        """
+        for origin in await self._redis.smembers(self.workers_key):
+            if origin == self._origin or await self._redis.exists(f'{self.worker_key}:{origin}'):
+                continue
+            requeued = await self._requeue_processing(origin)
+            await self._redis.srem(self.workers_key, origin)
+            if requeued:
+                logger.warning(f'worker {origin} 已失联，{requeued}个未完成的定时任务已放回队列')
+
+    async def _requeue_processing(self, origin: str) -> int:
+        """
+        把指定worker处理中列表里未完成的任务放回队列
+
+        已执行完成或已被其他worker认领的任务直接移除；由该worker认领但未完成的任务释放认领记录和运行实例后放回
+
+        :param origin: worker标识
+        :return: 放回队列的任务数
+        """
+        processing_key = f'{self.processing_key}:{origin}'
+        for raw in await self._redis.lrange(processing_key, 0, -1):
+            try:
+                payload = json.loads(raw)
+            except ValueError:
+                await self._redis.lrem(processing_key, 1, raw)
+                continue
+            claim_key = f'{self.claim_key}:{payload["run_id"]}'
+            claimed_by = await self._redis.get(claim_key)
+            if claimed_by is None:
+                continue
+            if claimed_by != origin:
+                await self._redis.lrem(processing_key, 1, raw)
+                continue
+            pipe = self._redis.pipeline(transaction=True)
+            pipe.delete(claim_key)
+            pipe.srem(f'{self.running_key}:{payload["job_id"]}', payload['run_id'])
+            await pipe.execute()
+        requeued = 0
+        # 放回队列的出队端，优先于新任务执行
+        while await self._redis.lmove(processing_key, self.queue_key, 'RIGHT', 'RIGHT'):
+            requeued += 1
+        return requeued
+
+    def _become_leader(self) -> None:
+        """
+        成为主节点：跳过副本中早已由前任主节点处理过的触发，然后恢复调度器
+
+        :return:
+        """
+        now = datetime.now(scheduler.timezone)
+        since = now - timedelta(seconds=self.lease_ttl * 2)
+        # 内存存储中的任务在暂停期间没有推进下次执行时间，持久化存储中的任务已由前任主节点推进
+        for job in scheduler.get_jobs(jobstore='default'):
+            if job.next_run_time and job.next_run_time < since:
+                next_run_time = job.trigger.get_next_fire_time(None, since)
+                if next_run_time:
+                    job.modify(next_run_time=next_run_time)
+                else:
+                    job.remove()
+        self._leader = True
+        scheduler.resume()
+        logger.info(f'✅️ 当前worker成为定时任务主节点，隔离令牌：{self._lock.token}')
+
+    def _step_down(self, reason: str) -> None:
+        """
+        放弃主节点身份并暂停调度器
+
+        :param reason: 原因
+        :return:
+        """
+        if self._leader:
+            self._leader = False
+            scheduler.pause()
+            logger.warning(f'当前worker不再是定时任务主节点：{reason}')
+
+    @classmethod
+    def _build_payload(
+        cls,
+        run_id: str,
+        job_id: str,
+        func_ref: str,
+        args: list[Any],
+        kwargs: dict[str, Any],
+        executor: str,
+        max_instances: int,
+        scheduled_time: datetime,
+        job_snapshot: dict[str, Any],
+        fencing_token: Optional[int] = None,
+    ) -> str:
+        return json.dumps(
+            {
+                'run_id': run_id,
+                'job_id': job_id,
+                'func': func_ref,
+                'args': args,
+                'kwargs': kwargs,
+                'executor': executor,
+                'max_instances': max_instances,
+                'scheduled_time': scheduled_time.isoformat(),
+                'fencing_token': fencing_token,
+                'snapshot': job_snapshot,
+            },
+            ensure_ascii=False,
+        )
+
+    async def dispatch(self, job: Job, run_times: list[datetime]) -> list[JobExecutionEvent]:
+        """
+        主节点把到期任务写入队列（由JobDispatchExecutor调用）
+
+        :param job: 任务对象
+        :param run_times: 本次到期的计划执行时间
+        :return: 调度事件列表
+        """
+        events = []
+        job_snapshot = SchedulerUtil._job_snapshots.get(job.id) or SchedulerUtil._snapshot_job(job)
+        for run_time in run_times:
+            now = datetime.now(run_time.tzinfo)
+            if job.misfire_grace_time is not None and (now - run_time).total_seconds() > job.misfire_grace_time:
+                events.append(JobExecutionEvent(EVENT_JOB_MISSED, job.id, job._jobstore_alias, run_time))
+                continue
+            payload = self._build_payload(
+                run_id=f'{job.id}:{run_time.timestamp()}',
+                job_id=job.id,
+                func_ref=job.func_ref,
+                args=list(job.args),
+                kwargs=dict(job.kwargs),
+                executor=job.executor,
+                max_instances=job.max_instances,
+                scheduled_time=run_time,
+                job_snapshot=job_snapshot,
+                fencing_token=self._lock.token,
+            )
+            if not await self._lock.fenced_lpush(self.queue_key, payload):
+                # 已被新的主节点取代，剩余的触发由新主节点负责
+                self._step_down('隔离令牌已失效')
+                break
+            events.append(JobExecutionEvent(EVENT_JOB_EXECUTED, job.id, job._jobstore_alias, run_time))
+        return events
+
+    async def enqueue_once(self, job_info: JobModel) -> None:
+        """
+        手动执行一次任务：任意worker均可直接写入队列
+
+        :param job_info: 任务对象信息
+        :return:
+        """
+        job_func = SchedulerUtil._import_function(job_info.invoke_target)
+        job_executor = 'default' if iscoroutinefunction(job_func) else job_info.job_executor
+        now = datetime.now(scheduler.timezone)
+        payload = self._build_payload(
+            run_id=f'{job_info.job_id}:once:{uuid.uuid4().hex}',
+            job_id=str(job_info.job_id),
+            func_ref=obj_to_ref(job_func),
+            args=job_info.job_args.split(',') if job_info.job_args else [],
+            kwargs=json.loads(job_info.job_kwargs) if job_info.job_kwargs else {},
+            executor=job_executor,
+            max_instances=3 if job_info.concurrent == '0' else 1,
+            scheduled_time=now,
+            job_snapshot={
+                'job_name': job_info.job_name,
+                'job_group': job_info.job_group,
+                'job_executor': job_executor,
+                'invoke_target': job_info.invoke_target,
+                'job_args': job_info.job_args or '',
+                'job_kwargs': job_info.job_kwargs,
+                'job_trigger': str(DateTrigger(run_date=now)),
+            },
+        )
+        await self._redis.lpush(self.queue_key, payload)
+
+    async def _consume_loop(self) -> None:
+        """
+        有空闲容量时才从队列获取任务，容量已满的worker不会抢占任务；
+        任务原子地移入本worker的处理中列表，worker在执行完成前退出时不会丢失
+
+        :return:
+        """
+        while True:
+            await self._slots.acquire()
+            try:
+                item = await self._redis.blmove(self.queue_key, self._processing_key, 5, 'RIGHT', 'LEFT')
+            except asyncio.CancelledError:
+                self._slots.release()
+                raise
+            except Exception as e:
+                self._slots.release()
+                logger.warning(f'定时任务队列读取失败，稍后重试：{e}')
+                await asyncio.sleep(1)
+                continue
+            if not item:
+                self._slots.release()
+                continue
+            task = asyncio.create_task(self._run(item))
+            self._running_jobs.add(task)
+            task.add_done_callback(self._on_run_done)
+
+    def _on_run_done(self, task: asyncio.Task) -> None:
+        self._running_jobs.discard(task)
+        self._slots.release()
+
+    async def _run(self, raw: str) -> None:
+        """
+        执行一个队列任务，处理完成后从本worker的处理中列表移除
+
+        :param raw: 队列中的任务内容
+        :return:
+        """
+        try:
+            await self._execute(raw)
+        except asyncio.CancelledError:
+            # 应用关闭时被中断的任务留在处理中列表，由stop放回队列
+            raise
+        except Exception as e:
+            logger.error(f'定时任务队列消息处理失败：{e}')
+        try:
+            await self._redis.lrem(self._processing_key, 1, raw)
+        except Exception as e:
+            logger.warning(f'移除已完成的定时任务队列消息失败：{e}')
+
+    async def _execute(self, raw: str) -> None:
+        """
+        认领并执行一个队列任务
+
+        :param raw: 队列中的任务内容
+        :return:
+        """
+        try:
+            payload = json.loads(raw)
+        except ValueError:
+            logger.warning(f'丢弃无法解析的定时任务队列消息：{raw[:200]}')
+            return
+        job_id = payload['job_id']
+        run_id = payload['run_id']
+        claim_key = f'{self.claim_key}:{run_id}'
+        if not await self._redis.set(claim_key, self._origin, nx=True, ex=self.claim_ttl):
+            logger.info(f'定时任务{job_id}的本次触发已被认领，跳过：{payload["scheduled_time"]}')
+            return
+
+        job_snapshot = payload.get('snapshot') or {}
+        # 运行实例按触发记录，worker失联后主节点可以归还其占用的实例
+        running_key = f'{self.running_key}:{job_id}'
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.sadd(running_key, run_id)
+        pipe.expire(running_key, self.running_ttl)
+        pipe.scard(running_key)
+        _, _, instances = await pipe.execute()
+        if instances > payload.get('max_instances', 1):
+            await self._finish(claim_key, running_key, run_id)
+            self._write_log('max_instances', job_snapshot, job_id, '1', '任务运行实例数已达上限，本次执行被跳过')
+            return
+
+        scheduled_time = datetime.fromisoformat(payload['scheduled_time'])
+        queue_delay = (datetime.now(scheduled_time.tzinfo) - scheduled_time).total_seconds()
+        started = time.monotonic()
+        event_name, status, exception_info = 'executed', '0', ''
+        try:
+            await self._invoke(payload)
+        except Exception as e:
+            event_name, status, exception_info = 'error', '1', str(e)
+            logger.error(f'定时任务{job_id}执行失败：{e}')
+        await self._finish(claim_key, running_key, run_id)
+        timing = f', 排队延迟: {max(queue_delay, 0) * 1000:.0f}ms, 执行耗时: {time.monotonic() - started:.3f}s'
+        self._write_log(event_name, job_snapshot, job_id, status, exception_info, timing)
+
+    async def _finish(self, claim_key: str, running_key: str, run_id: str) -> None:
+        """
+        标记本次触发已处理完成并归还运行实例
+
+        :param claim_key: 认领记录键
+        :param running_key: 运行实例集合键
+        :param run_id: 触发ID
+        :return:
+        """
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.srem(running_key, run_id)
+        pipe.set(claim_key, self.claim_done, ex=self.claim_ttl)
+        await pipe.execute()
+
+    async def _invoke(self, payload: dict[str, Any]) -> None:
+        """
+        按任务的执行器类型执行任务函数
+
+        :param payload: 队列任务内容
+        :return:
+        """
+        func = ref_to_obj(payload['func'])
+        call = functools.partial(func, *(payload.get('args') or []), **(payload.get('kwargs') or {}))
+        if iscoroutinefunction(func):
+            await call()
+            return
+        pool = None
+        if payload.get('executor') == 'processpool':
+            if self._process_pool is None:
+                self._process_pool = ProcessPool(5)
+            pool = self._process_pool
+        await asyncio.get_running_loop().run_in_executor(pool, call)
+
+    @classmethod
+    def _write_log(
+        cls,
+        event_name: str,
+        job_snapshot: dict[str, Any],
+        job_id: str,
+        status: str,
+        exception_info: str = '',
+        timing: str = '',
+    ) -> None:
+        if event_name not in SchedulerConfig.log_event_names:
+            return
+        job_log_writer.put(
+            SchedulerUtil.build_job_log(
+                job_snapshot, JobExecutionEvent.__name__, job_id, status, exception_info, timing
+            )
+        )
+
+    async def publish_job_sync(self, job_ids: list[Union[str, int]]) -> None:
+        """
+        通知其他worker重新加载指定任务
+
+        :param job_ids: 任务id列表
+        :return:
+        """
+        message = {'origin': self._origin, 'job_ids': [str(job_id) for job_id in job_ids]}
+        await self._redis.publish(self.sync_channel, json.dumps(message))
+
+    async def _sync_loop(self) -> None:
+        """
+        订阅任务变更通知，连接中断重连后全量重新加载一次
+
+        :return:
+        """
+        reconnect = False
+        while True:
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.sync_channel)
+                if reconnect:
+                    # 断线期间可能错过变更通知
+                    await SchedulerUtil.load_scheduler_jobs()
+                async for message in pubsub.listen():
+                    if message.get('type') == 'message':
+                        await self._handle_sync(message.get('data'))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f'定时任务变更订阅中断，稍后重连：{e}')
+                reconnect = True
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.aclose() if hasattr(pubsub, 'aclose') else await pubsub.close()
+                except Exception:
+                    pass
+
+    async def _handle_sync(self, data: str) -> None:
+        """
+        从数据库重新加载变更的任务
+
+        :param data: 消息内容
+        :return:
+        """
+        try:
+            message = json.loads(data)
+        except (TypeError, ValueError):
+            return
+        if message.get('origin') == self._origin:
+            return
+        async with AsyncSessionLocal() as session:
+            for job_id in message.get('job_ids') or []:
+                await self._reload_job(session, job_id)
+
+    @classmethod
+    async def _reload_job(cls, session: AsyncSession, job_id: str) -> None:
+        """
+        从数据库重新加载单个任务，任务已删除或停用时移除
+
+        :param session: orm对象
+        :param job_id: 任务id
+        :return:
+        """
+        try:
+            job_info = await JobDao.get_job_detail_by_id(session, int(job_id))
+            SchedulerUtil.remove_scheduler_job(job_id=job_id)
+            if job_info and job_info.status == '0':
+                SchedulerUtil.add_scheduler_job(job_info)
+        except Exception as e:
+            logger.error(f'同步定时任务{job_id}失败：{e}')
+
+
+scheduler_coordinator = SchedulerCoordinator(
+    lease_ttl=SchedulerConfig.scheduler_lease_ttl,
+    capacity=SchedulerConfig.scheduler_worker_capacity,
+    claim_ttl=SchedulerConfig.scheduler_claim_ttl,
+)
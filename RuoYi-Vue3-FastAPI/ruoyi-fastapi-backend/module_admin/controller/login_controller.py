@@ -15,6 +15,7 @@ from common.vo import CrudResponseModel, DataResponseModel, DynamicResponseModel
 from config.env import AppConfig, JwtConfig
 from module_admin.entity.vo.login_vo import RouterModel, Token, UserLogin, UserRegister
 from module_admin.entity.vo.user_vo import CurrentUserModel, EditUserModel
+from module_admin.service.config_service import ConfigService
 from module_admin.service.login_service import CustomOAuth2PasswordRequestForm, LoginService, oauth2_scheme
 from module_admin.service.user_service import UserService
 from utils.log_util import logger
@@ -36,7 +37,8 @@ async def login(
     query_db: Annotated[AsyncSession, DBSessionDependency()],
 ) -> Response:
     captcha_enabled = (
-        await request.app.state.redis.get(f'{RedisInitKeyConfig.SYS_CONFIG.key}:sys.account.captchaEnabled') == 'true'
+        await ConfigService.query_config_list_from_cache_services(request.app.state.redis, 'sys.account.captchaEnabled')
+        == 'true'
     )
     user = UserLogin(
         userName=form_data.username,
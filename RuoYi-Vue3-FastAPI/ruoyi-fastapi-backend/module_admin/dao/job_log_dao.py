@@ -65,6 +65,18 @@ class JobLogDao:
 
         return db_job_log
 
+    @classmethod
+    async def add_job_log_batch_dao(cls, db: AsyncSession, job_log_list: list[JobLogModel]) -> None:
+        """
+        批量新增定时任务日志数据库操作
+
+        :param db: orm对象
+        :param job_log_list: 定时任务日志对象列表
+        :return:
+        """
+        db.add_all([SysJobLog(**job_log.model_dump()) for job_log in job_log_list])
+        await db.flush()
+
     @classmethod
     async def delete_job_log_dao(cls, db: AsyncSession, job_log: JobLogModel) -> None:
         """
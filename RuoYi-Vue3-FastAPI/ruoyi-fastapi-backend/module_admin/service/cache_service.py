@@ -1,9 +1,13 @@
+from typing import Union
+
 from fastapi import Request
 
 from common.enums import RedisInitKeyConfig
 from common.vo import CrudResponseModel
 from config.get_redis import RedisUtil
 from module_admin.entity.vo.cache_vo import CacheInfoModel, CacheMonitorModel
+from utils.cache_util import CacheUtil
+from utils.near_cache_util import NearCacheUtil
 
 
 class CacheService:
@@ -11,6 +15,16 @@ class CacheService:
     缓存监控模块服务层
     """
 
+    @classmethod
+    def _get_key_config(cls, cache_name: str) -> Union[RedisInitKeyConfig, None]:
+        """
+        根据缓存名称获取系统内置缓存配置
+
+        :param cache_name: 缓存名称
+        :return: 缓存配置，非内置缓存返回None
+        """
+        return next((key_config for key_config in RedisInitKeyConfig if key_config.key == cache_name), None)
+
     @classmethod
     async def get_cache_monitor_statistical_info_services(cls, request: Request) -> CacheMonitorModel:
         """
@@ -57,8 +71,11 @@ class CacheService:
         :param cache_name: 缓存名称
         :return: 缓存键名列表信息
         """
-        cache_keys: list[str] = await request.app.state.redis.keys(f'{cache_name}*')
-        cache_key_list = [key.split(':', 1)[1] for key in cache_keys if key.startswith(f'{cache_name}:')]
+        key_config = cls._get_key_config(cache_name)
+        if key_config and key_config.is_hash:
+            return await CacheUtil.hash_fields(request.app.state.redis, cache_name)
+        cache_keys = await CacheUtil.scan_keys(request.app.state.redis, f'{cache_name}:*')
+        cache_key_list = [key.split(':', 1)[1] for key in cache_keys]
 
         return cache_key_list
 
@@ -74,7 +91,11 @@ class CacheService:
         :param cache_key: 缓存键名
         :return: 缓存内容信息
         """
-        cache_value = await request.app.state.redis.get(f'{cache_name}:{cache_key}')
+        key_config = cls._get_key_config(cache_name)
+        if key_config and key_config.is_hash:
+            cache_value = await request.app.state.redis.hget(cache_name, cache_key)
+        else:
+            cache_value = await request.app.state.redis.get(f'{cache_name}:{cache_key}')
 
         return CacheInfoModel(cacheKey=cache_key, cacheName=cache_name, cacheValue=cache_value, remark='')
 
@@ -87,9 +108,13 @@ class CacheService:
         :param cache_name: 缓存名称
         :return: 操作缓存响应信息
         """
-        cache_keys = await request.app.state.redis.keys(f'{cache_name}*')
-        if cache_keys:
-            await request.app.state.redis.delete(*cache_keys)
+        key_config = cls._get_key_config(cache_name)
+        if key_config and key_config.is_hash:
+            # 整族存放在一个Hash中，删除一个键即可，UNLINK在后台释放内存
+            await request.app.state.redis.unlink(cache_name)
+            await NearCacheUtil.publish_invalidation(request.app.state.redis, cache_name)
+        else:
+            await CacheUtil.unlink_by_pattern(request.app.state.redis, f'{cache_name}:*')
 
         return CrudResponseModel(is_success=True, message=f'{cache_name}对应键值清除成功')
 
@@ -102,9 +127,13 @@ class CacheService:
         :param cache_key: 缓存键名
         :return: 操作缓存响应信息
         """
-        cache_keys = await request.app.state.redis.keys(f'*{cache_key}')
-        if cache_keys:
-            await request.app.state.redis.delete(*cache_keys)
+        await CacheUtil.unlink_keys(
+            request.app.state.redis,
+            [f'{key_config.key}:{cache_key}' for key_config in RedisInitKeyConfig if not key_config.is_hash],
+        )
+        for key_config in RedisInitKeyConfig:
+            if key_config.is_hash and await request.app.state.redis.hdel(key_config.key, cache_key):
+                await NearCacheUtil.publish_invalidation(request.app.state.redis, key_config.key, cache_key)
 
         return CrudResponseModel(is_success=True, message=f'{cache_key}清除成功')
 
@@ -116,9 +145,12 @@ class CacheService:
         :param request: Request对象
         :return: 操作缓存响应信息
         """
-        cache_keys = await request.app.state.redis.keys()
-        if cache_keys:
-            await request.app.state.redis.delete(*cache_keys)
+        # 只清除系统内置缓存族，限流等其他共享同一Redis实例的数据不受影响
+        for key_config in RedisInitKeyConfig:
+            if key_config.is_hash:
+                await request.app.state.redis.unlink(key_config.key)
+            else:
+                await CacheUtil.unlink_by_pattern(request.app.state.redis, f'{key_config.key}:*')
 
         await RedisUtil.init_sys_dict(request.app.state.redis)
         await RedisUtil.init_sys_config(request.app.state.redis)
@@ -10,8 +10,10 @@ from common.vo import CrudResponseModel, PageModel
 from exceptions.exception import ServiceException
 from module_admin.dao.config_dao import ConfigDao
 from module_admin.entity.vo.config_vo import ConfigModel, ConfigPageQueryModel, DeleteConfigModel
+from utils.cache_util import CacheUtil
 from utils.common_util import CamelCaseUtil
 from utils.excel_util import ExcelUtil
+from utils.near_cache_util import NearCacheUtil
 
 
 class ConfigService:
@@ -44,17 +46,17 @@ class ConfigService:
         :param redis: redis对象
         :return:
         """
-        # 获取以sys_config:开头的键列表
-        keys = await redis.keys(f'{RedisInitKeyConfig.SYS_CONFIG.key}:*')
-        # 删除匹配的键
-        if keys:
-            await redis.delete(*keys)
         config_all = await ConfigDao.get_config_list(query_db, ConfigPageQueryModel(), is_page=False)
-        for config_obj in config_all:
-            await redis.set(
-                f'{RedisInitKeyConfig.SYS_CONFIG.key}:{config_obj.get("configKey")}',
-                config_obj.get('configValue'),
-            )
+        config_cache = {
+            config_obj.get('configKey'): config_obj.get('configValue')
+            for config_obj in config_all
+            if config_obj.get('configValue') is not None
+        }
+        # 全部参数配置存放在一个Hash中，重建时原子替换
+        await CacheUtil.replace_hash(redis, RedisInitKeyConfig.SYS_CONFIG.key, config_cache)
+        # 清理旧版本按 sys_config:<参数键名> 逐键存储的缓存
+        await CacheUtil.unlink_by_pattern(redis, f'{RedisInitKeyConfig.SYS_CONFIG.key}:*')
+        await NearCacheUtil.publish_invalidation(redis, RedisInitKeyConfig.SYS_CONFIG.key)
 
     @classmethod
     async def query_config_list_from_cache_services(cls, redis: aioredis.Redis, config_key: str) -> Any:
@@ -65,9 +67,11 @@ class ConfigService:
         :param config_key: 参数键名
         :return: 参数键名对应值
         """
-        result = await redis.get(f'{RedisInitKeyConfig.SYS_CONFIG.key}:{config_key}')
 
-        return result
+        async def load_from_redis() -> Any:
+            return await redis.hget(RedisInitKeyConfig.SYS_CONFIG.key, config_key)
+
+        return await NearCacheUtil.get_or_load(RedisInitKeyConfig.SYS_CONFIG.key, config_key, load_from_redis)
 
     @classmethod
     async def check_config_key_unique_services(cls, query_db: AsyncSession, page_object: ConfigModel) -> bool:
@@ -101,8 +105,11 @@ class ConfigService:
         try:
             await ConfigDao.add_config_dao(query_db, page_object)
             await query_db.commit()
-            await request.app.state.redis.set(
-                f'{RedisInitKeyConfig.SYS_CONFIG.key}:{page_object.config_key}', page_object.config_value
+            await request.app.state.redis.hset(
+                RedisInitKeyConfig.SYS_CONFIG.key, page_object.config_key, page_object.config_value
+            )
+            await NearCacheUtil.publish_invalidation(
+                request.app.state.redis, RedisInitKeyConfig.SYS_CONFIG.key, page_object.config_key
             )
             return CrudResponseModel(is_success=True, message='新增成功')
         except Exception as e:
@@ -130,11 +137,14 @@ class ConfigService:
                 await ConfigDao.edit_config_dao(query_db, edit_config)
                 await query_db.commit()
                 if config_info.config_key != page_object.config_key:
-                    await request.app.state.redis.delete(
-                        f'{RedisInitKeyConfig.SYS_CONFIG.key}:{config_info.config_key}'
-                    )
-                await request.app.state.redis.set(
-                    f'{RedisInitKeyConfig.SYS_CONFIG.key}:{page_object.config_key}', page_object.config_value
+                    await request.app.state.redis.hdel(RedisInitKeyConfig.SYS_CONFIG.key, config_info.config_key)
+                await request.app.state.redis.hset(
+                    RedisInitKeyConfig.SYS_CONFIG.key, page_object.config_key, page_object.config_value
+                )
+                await NearCacheUtil.publish_invalidation(
+                    request.app.state.redis,
+                    RedisInitKeyConfig.SYS_CONFIG.key,
+                    list({config_info.config_key, page_object.config_key}),
                 )
                 return CrudResponseModel(is_success=True, message='更新成功')
             except Exception as e:
@@ -164,10 +174,13 @@ class ConfigService:
                     if config_info.config_type == CommonConstant.YES:
                         raise ServiceException(message=f'内置参数{config_info.config_key}不能删除')
                     await ConfigDao.delete_config_dao(query_db, ConfigModel(configId=int(config_id)))
-                    delete_config_key_list.append(f'{RedisInitKeyConfig.SYS_CONFIG.key}:{config_info.config_key}')
+                    delete_config_key_list.append(config_info.config_key)
                 await query_db.commit()
                 if delete_config_key_list:
-                    await request.app.state.redis.delete(*delete_config_key_list)
+                    await request.app.state.redis.hdel(RedisInitKeyConfig.SYS_CONFIG.key, *delete_config_key_list)
+                    await NearCacheUtil.publish_invalidation(
+                        request.app.state.redis, RedisInitKeyConfig.SYS_CONFIG.key, delete_config_key_list
+                    )
                 return CrudResponseModel(is_success=True, message='删除成功')
             except Exception as e:
                 await query_db.rollback()
@@ -20,8 +20,10 @@ from module_admin.entity.vo.dict_vo import (
     DictTypeModel,
     DictTypePageQueryModel,
 )
+from utils.cache_util import CacheUtil
 from utils.common_util import CamelCaseUtil
 from utils.excel_util import ExcelUtil
+from utils.near_cache_util import NearCacheUtil
 
 
 class DictTypeService:
@@ -79,7 +81,10 @@ class DictTypeService:
         try:
             await DictTypeDao.add_dict_type_dao(query_db, page_object)
             await query_db.commit()
-            await request.app.state.redis.set(f'{RedisInitKeyConfig.SYS_DICT.key}:{page_object.dict_type}', '')
+            await request.app.state.redis.hset(RedisInitKeyConfig.SYS_DICT.key, page_object.dict_type, '')
+            await NearCacheUtil.publish_invalidation(
+                request.app.state.redis, RedisInitKeyConfig.SYS_DICT.key, page_object.dict_type
+            )
             result = {'is_success': True, 'message': '新增成功'}
         except Exception as e:
             await query_db.rollback()
@@ -120,10 +125,16 @@ class DictTypeService:
                 await query_db.commit()
                 if dict_type_info.dict_type != page_object.dict_type:
                     dict_data = [CamelCaseUtil.transform_result(row) for row in dict_data_list if row]
-                    await request.app.state.redis.set(
-                        f'{RedisInitKeyConfig.SYS_DICT.key}:{page_object.dict_type}',
+                    await request.app.state.redis.hset(
+                        RedisInitKeyConfig.SYS_DICT.key,
+                        page_object.dict_type,
                         json.dumps(dict_data, ensure_ascii=False, default=str),
                     )
+                    await NearCacheUtil.publish_invalidation(
+                        request.app.state.redis,
+                        RedisInitKeyConfig.SYS_DICT.key,
+                        [dict_type_info.dict_type, page_object.dict_type],
+                    )
                 return CrudResponseModel(is_success=True, message='更新成功')
             except Exception as e:
                 await query_db.rollback()
@@ -152,10 +163,13 @@ class DictTypeService:
                     if (await DictDataDao.count_dict_data_dao(query_db, dict_type_into.dict_type)) > 0:
                         raise ServiceException(message=f'{dict_type_into.dict_name}已分配，不能删除')
                     await DictTypeDao.delete_dict_type_dao(query_db, DictTypeModel(dictId=int(dict_id)))
-                    delete_dict_type_list.append(f'{RedisInitKeyConfig.SYS_DICT.key}:{dict_type_into.dict_type}')
+                    delete_dict_type_list.append(dict_type_into.dict_type)
                 await query_db.commit()
                 if delete_dict_type_list:
-                    await request.app.state.redis.delete(*delete_dict_type_list)
+                    await request.app.state.redis.hdel(RedisInitKeyConfig.SYS_DICT.key, *delete_dict_type_list)
+                    await NearCacheUtil.publish_invalidation(
+                        request.app.state.redis, RedisInitKeyConfig.SYS_DICT.key, delete_dict_type_list
+                    )
                 return CrudResponseModel(is_success=True, message='删除成功')
             except Exception as e:
                 await query_db.rollback()
@@ -265,20 +279,18 @@ class DictDataService:
         :param redis: redis对象
         :return:
         """
-        # 获取以sys_dict:开头的键列表
-        keys = await redis.keys(f'{RedisInitKeyConfig.SYS_DICT.key}:*')
-        # 删除匹配的键
-        if keys:
-            await redis.delete(*keys)
         dict_type_all = await DictTypeDao.get_all_dict_type(query_db)
+        dict_cache = {}
         for dict_type_obj in [item for item in dict_type_all if item.status == '0']:
             dict_type = dict_type_obj.dict_type
             dict_data_list = await DictDataDao.query_dict_data_list(query_db, dict_type)
             dict_data = [CamelCaseUtil.transform_result(row) for row in dict_data_list if row]
-            await redis.set(
-                f'{RedisInitKeyConfig.SYS_DICT.key}:{dict_type}',
-                json.dumps(dict_data, ensure_ascii=False, default=str),
-            )
+            dict_cache[dict_type] = json.dumps(dict_data, ensure_ascii=False, default=str)
+        # 整个字典缓存存放在一个Hash中，重建时原子替换
+        await CacheUtil.replace_hash(redis, RedisInitKeyConfig.SYS_DICT.key, dict_cache)
+        # 清理旧版本按 sys_dict:<字典类型> 逐键存储的缓存
+        await CacheUtil.unlink_by_pattern(redis, f'{RedisInitKeyConfig.SYS_DICT.key}:*')
+        await NearCacheUtil.publish_invalidation(redis, RedisInitKeyConfig.SYS_DICT.key)
 
     @classmethod
     async def query_dict_data_list_from_cache_services(
@@ -289,14 +301,17 @@ class DictDataService:
 
         :param redis: redis对象
         :param dict_type: 字典类型
-        :return: 字典数据列表信息对象
+        :return: 字典数据列表信息对象（近端缓存中的共享对象，调用方不应修改）
         """
-        result = []
-        dict_data_list_result = await redis.get(f'{RedisInitKeyConfig.SYS_DICT.key}:{dict_type}')
-        if dict_data_list_result:
-            result = json.loads(dict_data_list_result)
 
-        return CamelCaseUtil.transform_result(result)
+        async def load_from_redis() -> list[dict[str, Any]]:
+            result = []
+            dict_data_list_result = await redis.hget(RedisInitKeyConfig.SYS_DICT.key, dict_type)
+            if dict_data_list_result:
+                result = json.loads(dict_data_list_result)
+            return CamelCaseUtil.transform_result(result)
+
+        return await NearCacheUtil.get_or_load(RedisInitKeyConfig.SYS_DICT.key, dict_type, load_from_redis)
 
     @classmethod
     async def check_dict_data_unique_services(cls, query_db: AsyncSession, page_object: DictDataModel) -> bool:
@@ -333,10 +348,14 @@ class DictDataService:
             await DictDataDao.add_dict_data_dao(query_db, page_object)
             await query_db.commit()
             dict_data_list = await cls.query_dict_data_list_services(query_db, page_object.dict_type)
-            await request.app.state.redis.set(
-                f'{RedisInitKeyConfig.SYS_DICT.key}:{page_object.dict_type}',
+            await request.app.state.redis.hset(
+                RedisInitKeyConfig.SYS_DICT.key,
+                page_object.dict_type,
                 json.dumps(CamelCaseUtil.transform_result(dict_data_list), ensure_ascii=False, default=str),
             )
+            await NearCacheUtil.publish_invalidation(
+                request.app.state.redis, RedisInitKeyConfig.SYS_DICT.key, page_object.dict_type
+            )
             return CrudResponseModel(is_success=True, message='新增成功')
         except Exception as e:
             await query_db.rollback()
@@ -365,10 +384,14 @@ class DictDataService:
                 await DictDataDao.edit_dict_data_dao(query_db, edit_data_type)
                 await query_db.commit()
                 dict_data_list = await cls.query_dict_data_list_services(query_db, page_object.dict_type)
-                await request.app.state.redis.set(
-                    f'{RedisInitKeyConfig.SYS_DICT.key}:{page_object.dict_type}',
+                await request.app.state.redis.hset(
+                    RedisInitKeyConfig.SYS_DICT.key,
+                    page_object.dict_type,
                     json.dumps(CamelCaseUtil.transform_result(dict_data_list), ensure_ascii=False, default=str),
                 )
+                await NearCacheUtil.publish_invalidation(
+                    request.app.state.redis, RedisInitKeyConfig.SYS_DICT.key, page_object.dict_type
+                )
                 return CrudResponseModel(is_success=True, message='更新成功')
             except Exception as e:
                 await query_db.rollback()
@@ -399,10 +422,14 @@ class DictDataService:
                 await query_db.commit()
                 for dict_type in list(set(delete_dict_type_list)):
                     dict_data_list = await cls.query_dict_data_list_services(query_db, dict_type)
-                    await request.app.state.redis.set(
-                        f'{RedisInitKeyConfig.SYS_DICT.key}:{dict_type}',
+                    await request.app.state.redis.hset(
+                        RedisInitKeyConfig.SYS_DICT.key,
+                        dict_type,
                         json.dumps(CamelCaseUtil.transform_result(dict_data_list), ensure_ascii=False, default=str),
                     )
+                await NearCacheUtil.publish_invalidation(
+                    request.app.state.redis, RedisInitKeyConfig.SYS_DICT.key, list(set(delete_dict_type_list))
+                )
                 return CrudResponseModel(is_success=True, message='删除成功')
             except Exception as e:
                 await query_db.rollback()
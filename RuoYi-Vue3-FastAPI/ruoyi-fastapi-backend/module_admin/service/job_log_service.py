@@ -51,6 +51,27 @@ class JobLogService:
 
         return CrudResponseModel(**result)
 
+    @classmethod
+    async def add_job_log_batch_services(
+        cls, query_db: AsyncSession, job_log_list: list[JobLogModel]
+    ) -> CrudResponseModel:
+        """
+        批量新增定时任务日志信息service
+
+        :param query_db: orm对象
+        :param job_log_list: 新增定时任务日志对象列表
+        :return: 批量新增定时任务日志校验结果
+        """
+        try:
+            await JobLogDao.add_job_log_batch_dao(query_db, job_log_list)
+            await query_db.commit()
+            result = {'is_success': True, 'message': '新增成功'}
+        except Exception as e:
+            await query_db.rollback()
+            result = {'is_success': False, 'message': str(e)}
+
+        return CrudResponseModel(**result)
+
     @classmethod
     async def delete_job_log_services(cls, query_db: AsyncSession, page_object: DeleteJobLogModel) -> CrudResponseModel:
         """
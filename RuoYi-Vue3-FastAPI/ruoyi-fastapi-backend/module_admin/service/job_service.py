@@ -83,6 +83,7 @@ class JobService:
             if job_info.status == '0':
                 SchedulerUtil.add_scheduler_job(job_info=job_info)
             await query_db.commit()
+            await SchedulerUtil.notify_job_changed([add_job.job_id])
             result = {'is_success': True, 'message': '新增成功'}
         except Exception as e:
             await query_db.rollback()
@@ -144,6 +145,7 @@ class JobService:
                     job_info = await cls.job_detail_services(query_db, edit_job.get('job_id'))
                     SchedulerUtil.add_scheduler_job(job_info=job_info)
                 await query_db.commit()
+                await SchedulerUtil.notify_job_changed([edit_job.get('job_id')])
                 return CrudResponseModel(is_success=True, message='更新成功')
             except Exception as e:
                 await query_db.rollback()
@@ -160,10 +162,9 @@ class JobService:
         :param page_object: 定时任务对象
         :return: 执行一次定时任务结果
         """
-        SchedulerUtil.remove_scheduler_job(job_id=page_object.job_id)
         job_info = await cls.job_detail_services(query_db, page_object.job_id)
         if job_info:
-            SchedulerUtil.execute_scheduler_job_once(job_info=job_info)
+            await SchedulerUtil.execute_scheduler_job_once(job_info=job_info)
             return CrudResponseModel(is_success=True, message='执行成功')
         raise ServiceException(message='定时任务不存在')
 
@@ -183,6 +184,7 @@ class JobService:
                     await JobDao.delete_job_dao(query_db, JobModel(jobId=job_id))
                     SchedulerUtil.remove_scheduler_job(job_id=job_id)
                 await query_db.commit()
+                await SchedulerUtil.notify_job_changed(job_id_list)
                 return CrudResponseModel(is_success=True, message='删除成功')
             except Exception as e:
                 await query_db.rollback()
@@ -24,6 +24,7 @@ from module_admin.entity.do.menu_do import SysMenu
 from module_admin.entity.do.user_do import SysUser
 from module_admin.entity.vo.login_vo import MenuTreeModel, MetaModel, RouterModel, SmsCode, UserLogin, UserRegister
 from module_admin.entity.vo.user_vo import AddUserModel, CurrentUserModel, ResetUserModel, TokenData, UserInfoModel
+from module_admin.service.config_service import ConfigService
 from module_admin.service.user_service import UserService
 from utils.common_util import CamelCaseUtil
 from utils.log_util import logger
@@ -141,7 +142,9 @@ class LoginService:
         :param request: Request对象
         :return: 校验结果
         """
-        black_ip_value = await request.app.state.redis.get(f'{RedisInitKeyConfig.SYS_CONFIG.key}:sys.login.blackIPList')
+        black_ip_value = await ConfigService.query_config_list_from_cache_services(
+            request.app.state.redis, 'sys.login.blackIPList'
+        )
         black_ip_list = black_ip_value.split(',') if black_ip_value else []
         
         if not black_ip_list:
@@ -313,8 +316,8 @@ class LoginService:
         :param pwd_update_date: 密码最后更新时间
         :return: 是否初始密码登录
         """
-        init_password_is_modify = await request.app.state.redis.get(
-            f'{RedisInitKeyConfig.SYS_CONFIG.key}:sys.account.initPasswordModify'
+        init_password_is_modify = await ConfigService.query_config_list_from_cache_services(
+            request.app.state.redis, 'sys.account.initPasswordModify'
         )
         return init_password_is_modify == '1' and pwd_update_date is None
 
@@ -327,8 +330,8 @@ class LoginService:
         :param pwd_update_date: 密码最后更新时间
         :return: 密码是否过期
         """
-        password_validate_days = await request.app.state.redis.get(
-            f'{RedisInitKeyConfig.SYS_CONFIG.key}:sys.account.passwordValidateDays'
+        password_validate_days = await ConfigService.query_config_list_from_cache_services(
+            request.app.state.redis, 'sys.account.passwordValidateDays'
         )
         if password_validate_days and int(password_validate_days) > 0:
             if pwd_update_date is None:
@@ -460,10 +463,15 @@ class LoginService:
         :return: 注册结果
         """
         register_enabled = (
-            await request.app.state.redis.get(f'{RedisInitKeyConfig.SYS_CONFIG.key}:sys.account.registerUser') == 'true'
+            await ConfigService.query_config_list_from_cache_services(
+                request.app.state.redis, 'sys.account.registerUser'
+            )
+            == 'true'
         )
         captcha_enabled = (
-            await request.app.state.redis.get(f'{RedisInitKeyConfig.SYS_CONFIG.key}:sys.account.captchaEnabled')
+            await ConfigService.query_config_list_from_cache_services(
+                request.app.state.redis, 'sys.account.captchaEnabled'
+            )
             == 'true'
         )
         if user_register.password == user_register.confirm_password:
@@ -8,6 +8,7 @@ from common.vo import CrudResponseModel
 from config.env import AppConfig, JwtConfig
 from exceptions.exception import ServiceException
 from module_admin.entity.vo.online_vo import DeleteOnlineModel, OnlineQueryModel
+from utils.cache_util import CacheUtil
 from utils.common_util import CamelCaseUtil
 
 
@@ -25,12 +26,15 @@ class OnlineService:
         :param query_object: 查询参数对象
         :return: 在线用户列表信息
         """
-        access_token_keys = await request.app.state.redis.keys(f'{RedisInitKeyConfig.ACCESS_TOKEN.key}*')
-        if not access_token_keys:
-            access_token_keys = []
-        access_token_values_list = [await request.app.state.redis.get(key) for key in access_token_keys]
+        access_token_keys = await CacheUtil.scan_keys(
+            request.app.state.redis, f'{RedisInitKeyConfig.ACCESS_TOKEN.key}:*'
+        )
+        access_token_values_list = await request.app.state.redis.mget(access_token_keys) if access_token_keys else []
         online_info_list = []
         for item in access_token_values_list:
+            # 遍历期间过期的令牌
+            if not item:
+                continue
             payload = jwt.decode(item, JwtConfig.jwt_secret_key, algorithms=[JwtConfig.jwt_algorithm])
             online_dict = {
                 'token_id': payload.get('session_id') if AppConfig.app_same_time_login else payload.get('user_id'),
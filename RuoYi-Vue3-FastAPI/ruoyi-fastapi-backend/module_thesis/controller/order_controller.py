@@ -219,7 +219,7 @@ async def get_order_statistics(
     user_id: Annotated[int | None, Query(description='用户ID')] = None,
 ) -> Response:
     """获取订单统计"""
-    result = await OrderService.get_order_statistics(query_db, user_id)
+    result = await OrderService.get_order_statistics(query_db, user_id, redis=request.app.state.redis)
     return ResponseUtil.success(data=result)
 
 
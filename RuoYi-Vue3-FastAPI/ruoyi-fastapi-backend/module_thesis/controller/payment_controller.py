@@ -15,7 +15,9 @@ from common.aspect.pre_auth import CurrentUserDependency
 from module_admin.entity.vo.user_vo import CurrentUserModel
 from module_thesis.service.payment_gateway_service import PaymentGatewayService
 from module_thesis.service.order_service import OrderService
+from module_thesis.service.statistics_service import StatisticsService
 from exceptions.exception import ServiceException
+from utils.common_util import CamelCaseUtil
 from utils.response_util import ResponseUtil
 from utils.log_util import logger
 
@@ -305,7 +307,7 @@ async def update_config_status(
     if not current_user.user.admin:
         raise ServiceException(message='仅管理员可以修改支付配置')
     
-    await PaymentGatewayService.update_config_status(query_db, config_id, is_enabled)
+    await PaymentGatewayService.update_config_status(query_db, config_id, is_enabled, request.app.state.redis)
     return ResponseUtil.success(message='配置状态更新成功')
 
 
@@ -387,6 +389,26 @@ async def get_transaction_list(
     })
 
 
+@payment_controller.get(
+    '/transaction/stats',
+    summary='获取交易统计',
+    description='获取交易统计信息',
+    response_model=DataResponseModel,
+    dependencies=[UserInterfaceAuthDependency('thesis:transaction:query')]
+)
+async def get_transaction_stats(
+    request: Request,
+    query_db: Annotated[AsyncSession, DBSessionDependency()],
+    start_time: Annotated[str | None, Query(description='开始时间')] = None,
+    end_time: Annotated[str | None, Query(description='结束时间')] = None,
+):
+    """获取交易统计"""
+    stats = await StatisticsService.get_transaction_stats(
+        query_db, request.app.state.redis, start_time, end_time
+    )
+    return ResponseUtil.success(data=stats)
+
+
 @payment_controller.get(
     '/transaction/{transaction_id}',
     summary='获取交易详情',
@@ -425,106 +447,18 @@ async def sync_transaction_status(
     query_db: Annotated[AsyncSession, DBSessionDependency()],
 ):
     """同步交易状态"""
-    from sqlalchemy import select
-    from module_thesis.entity.do.payment_transaction_do import PaymentTransaction
-    
-    # 获取交易记录
-    stmt = select(PaymentTransaction).where(PaymentTransaction.transaction_id == transaction_id)
-    result = await query_db.execute(stmt)
-    transaction = result.scalar_one_or_none()
-    
-    if not transaction:
-        return ResponseUtil.error(msg='交易记录不存在')
-    
-    # 查询支付状态
     try:
-        payment_result = await PaymentGatewayService.query_payment(
-            query_db,
-            transaction.third_party_no,
-            transaction.provider
-        )
-        
-        # 更新交易状态
-        if payment_result.get('status') == 'success':
-            transaction.status = 'success'
-            transaction.completed_time = datetime.now()
-        elif payment_result.get('status') == 'failed':
-            transaction.status = 'failed'
-        
-        await query_db.commit()
+        transaction = await PaymentGatewayService.sync_transaction_status(query_db, transaction_id)
+        if not transaction:
+            return ResponseUtil.error(msg='交易记录不存在')
         
-        logger.info(f'同步交易状态成功: {transaction.transaction_no}')
-        return ResponseUtil.success(msg='同步成功', data=transaction.__dict__)
+        logger.info(f'同步交易状态成功: {transaction.payment_id}, 状态: {transaction.status}')
+        return ResponseUtil.success(msg='同步成功', data=CamelCaseUtil.transform_result(transaction))
     except Exception as e:
         logger.error(f'同步交易状态失败: {str(e)}')
         return ResponseUtil.error(msg=f'同步失败: {str(e)}')
 
 
-@payment_controller.get(
-    '/transaction/stats',
-    summary='获取交易统计',
-    description='获取交易统计信息',
-    response_model=DataResponseModel,
-    dependencies=[UserInterfaceAuthDependency('thesis:transaction:query')]
-)
-async def get_transaction_stats(
-    request: Request,
-    query_db: Annotated[AsyncSession, DBSessionDependency()],
-    start_time: Annotated[str | None, Query(description='开始时间')] = None,
-    end_time: Annotated[str | None, Query(description='结束时间')] = None,
-):
-    """获取交易统计"""
-    from sqlalchemy import select, func, and_
-    from module_thesis.entity.do.payment_transaction_do import PaymentTransaction
-    from decimal import Decimal
-    
-    # 构建查询条件
-    conditions = []
-    if start_time:
-        conditions.append(PaymentTransaction.create_time >= start_time)
-    if end_time:
-        conditions.append(PaymentTransaction.create_time <= end_time)
-    
-    # 总交易额
-    total_stmt = select(func.sum(PaymentTransaction.amount))
-    if conditions:
-        total_stmt = total_stmt.where(and_(*conditions))
-    total_result = await query_db.execute(total_stmt)
-    total_amount = total_result.scalar() or Decimal('0')
-    
-    # 成功交易额
-    success_stmt = select(func.sum(PaymentTransaction.amount)).where(
-        PaymentTransaction.status == 'success'
-    )
-    if conditions:
-        success_stmt = success_stmt.where(and_(*conditions))
-    success_result = await query_db.execute(success_stmt)
-    success_amount = success_result.scalar() or Decimal('0')
-    
-    # 处理中交易额
-    pending_stmt = select(func.sum(PaymentTransaction.amount)).where(
-        PaymentTransaction.status == 'pending'
-    )
-    if conditions:
-        pending_stmt = pending_stmt.where(and_(*conditions))
-    pending_result = await query_db.execute(pending_stmt)
-    pending_amount = pending_result.scalar() or Decimal('0')
-    
-    # 总手续费
-    fee_stmt = select(func.sum(PaymentTransaction.fee))
-    if conditions:
-        fee_stmt = fee_stmt.where(and_(*conditions))
-    fee_result = await query_db.execute(fee_stmt)
-    total_fee = fee_result.scalar() or Decimal('0')
-    
-    return ResponseUtil.success(data={
-        'total': float(total_amount),
-        'success': float(success_amount),
-        'pending': float(pending_amount),
-        'fee': float(total_fee)
-    })
-
-
 @payment_controller.post(
     '/test',
     summary='测试支付',
@@ -797,6 +731,7 @@ async def update_payment_config(
     
     try:
         await query_db.commit()
+        await PaymentGatewayService.invalidate_providers(request.app.state.redis)
         logger.info(f'更新支付配置成功: {provider_type}')
         return ResponseUtil.success(msg='更新成功')
     except Exception as e:
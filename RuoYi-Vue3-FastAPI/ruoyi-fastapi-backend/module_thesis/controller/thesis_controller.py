@@ -16,8 +16,11 @@ from common.aspect.pre_auth import CurrentUserDependency, PreAuthDependency
 from common.enums import BusinessType
 from common.router import APIRouterPro
 from common.vo import DataResponseModel, PageResponseModel, ResponseBaseModel
+from config.database import AsyncSessionLocal
 from module_admin.entity.vo.user_vo import CurrentUserModel
 from module_thesis.entity.vo import (
+    CreateVersionModel,
+    RestoreVersionModel,
     ThesisModel,
     ThesisOutlineModel,
     ThesisChapterModel,
@@ -25,6 +28,7 @@ from module_thesis.entity.vo import (
 )
 from exceptions.exception import ServiceException
 from module_thesis.service import ThesisService
+from module_thesis.utils.progress_notifier import ThesisProgressNotifier
 from utils.log_util import logger
 from utils.response_util import ResponseUtil
 from utils.upload_util import UploadUtil
@@ -222,7 +226,8 @@ async def generate_outline(
     result = await ThesisService.generate_outline(
         query_db,
         outline_data,
-        current_user.user.user_id
+        current_user.user.user_id,
+        redis=request.app.state.redis
     )
     logger.info(result.message)
     return ResponseUtil.success(msg=result.message, data=result.result)
@@ -241,6 +246,7 @@ async def get_thesis_chapters(
     thesis_id: Annotated[int, Path(description='论文ID')],
     query_db: Annotated[AsyncSession, DBSessionDependency()],
     current_user: Annotated[CurrentUserModel, CurrentUserDependency()],
+    include_content: Annotated[bool, Query(description='是否返回章节内容')] = True,
 ) -> Response:
     """获取论文章节"""
     # 权限检查
@@ -248,7 +254,7 @@ async def get_thesis_chapters(
     if not current_user.user.admin and thesis.user_id != current_user.user.user_id:
         return ResponseUtil.error(msg='无权访问此论文')
     
-    result = await ThesisService.get_thesis_chapters(query_db, thesis_id)
+    result = await ThesisService.get_thesis_chapters(query_db, thesis_id, include_content)
     logger.info('获取论文章节成功')
     return ResponseUtil.success(data=result)
 
@@ -298,7 +304,8 @@ async def continue_generate_chapters(
     result = await ThesisService.continue_generate_chapters(
         query_db,
         thesis_id,
-        current_user.user.user_id
+        current_user.user.user_id,
+        redis=request.app.state.redis
     )
     logger.info(result.message)
     return ResponseUtil.success(msg=result.message, data=result.result)
@@ -345,7 +352,8 @@ async def generate_chapter(
         result = await ThesisService.generate_chapter(
             query_db,
             chapter_data,
-            current_user.user.user_id
+            current_user.user.user_id,
+            redis=request.app.state.redis
         )
         logger.info(result.message)
         return ResponseUtil.success(msg=result.message, data=result.result)
@@ -413,7 +421,8 @@ async def batch_generate_chapters(
             query_db,
             thesis_id,
             chapters_data,
-            current_user.user.user_id
+            current_user.user.user_id,
+            redis=request.app.state.redis
         )
         logger.info(result.message)
         return ResponseUtil.success(msg=result.message, data=result.result)
@@ -513,6 +522,107 @@ async def get_thesis_versions(
     return ResponseUtil.success(data=result)
 
 
+@thesis_controller.post(
+    '/version',
+    summary='创建论文版本',
+    description='保存论文当前状态为新版本（与最新版本一致时不创建）',
+    response_model=ResponseBaseModel,
+)
+@Log(title='论文版本', business_type=BusinessType.INSERT)
+async def create_thesis_version(
+    request: Request,
+    version_data: CreateVersionModel,
+    query_db: Annotated[AsyncSession, DBSessionDependency()],
+    current_user: Annotated[CurrentUserModel, CurrentUserDependency()],
+) -> Response:
+    """创建论文版本"""
+    # 权限检查
+    thesis = await ThesisService.get_thesis_detail(query_db, version_data.thesis_id)
+    if not current_user.user.admin and thesis.user_id != current_user.user.user_id:
+        return ResponseUtil.error(msg='无权操作此论文')
+
+    result = await ThesisService.create_version(query_db, version_data, current_user.user.user_name)
+    logger.info(result.message)
+    return ResponseUtil.success(msg=result.message, data=result.result)
+
+
+@thesis_controller.get(
+    '/version/{version_id}',
+    summary='获取版本详情',
+    description='获取指定版本的论文元数据和章节内容',
+    response_model=DataResponseModel,
+)
+async def get_version_detail(
+    request: Request,
+    version_id: Annotated[int, Path(description='版本ID')],
+    query_db: Annotated[AsyncSession, DBSessionDependency()],
+    current_user: Annotated[CurrentUserModel, CurrentUserDependency()],
+) -> Response:
+    """获取版本详情"""
+    # 权限检查
+    thesis = await ThesisService.get_thesis_detail(
+        query_db, await ThesisService.get_version_thesis_id(query_db, version_id)
+    )
+    if not current_user.user.admin and thesis.user_id != current_user.user.user_id:
+        return ResponseUtil.error(msg='无权访问此论文')
+
+    result = await ThesisService.get_version_detail(query_db, version_id)
+    logger.info('获取版本详情成功')
+    return ResponseUtil.success(data=result)
+
+
+@thesis_controller.get(
+    '/version/{version_id}/diff',
+    summary='比较论文版本',
+    description='比较指定版本与基准版本（默认上一个版本）的差异',
+    response_model=DataResponseModel,
+)
+async def diff_thesis_versions(
+    request: Request,
+    version_id: Annotated[int, Path(description='版本ID')],
+    query_db: Annotated[AsyncSession, DBSessionDependency()],
+    current_user: Annotated[CurrentUserModel, CurrentUserDependency()],
+    base_version_id: Annotated[Optional[int], Query(description='基准版本ID')] = None,
+) -> Response:
+    """比较论文版本"""
+    # 权限检查
+    thesis = await ThesisService.get_thesis_detail(
+        query_db, await ThesisService.get_version_thesis_id(query_db, version_id)
+    )
+    if not current_user.user.admin and thesis.user_id != current_user.user.user_id:
+        return ResponseUtil.error(msg='无权访问此论文')
+
+    result = await ThesisService.diff_versions(query_db, version_id, base_version_id)
+    logger.info('比较论文版本成功')
+    return ResponseUtil.success(data=result)
+
+
+@thesis_controller.put(
+    '/version/restore',
+    summary='恢复论文版本',
+    description='将论文恢复到指定版本（恢复前自动保存当前状态）',
+    response_model=ResponseBaseModel,
+)
+@Log(title='论文版本', business_type=BusinessType.UPDATE)
+async def restore_thesis_version(
+    request: Request,
+    restore_data: RestoreVersionModel,
+    query_db: Annotated[AsyncSession, DBSessionDependency()],
+    current_user: Annotated[CurrentUserModel, CurrentUserDependency()],
+) -> Response:
+    """恢复论文版本"""
+    # 权限检查
+    thesis = await ThesisService.get_thesis_detail(
+        query_db, await ThesisService.get_version_thesis_id(query_db, restore_data.version_id)
+    )
+    if not current_user.user.admin and thesis.user_id != current_user.user.user_id:
+        return ResponseUtil.error(msg='无权操作此论文')
+
+    result = await ThesisService.restore_version(query_db, restore_data.version_id, current_user.user.user_name)
+    logger.info(result.message)
+    return ResponseUtil.success(msg=result.message, data=result.result)
+
+
 # ==================== 统计信息 ====================
 
 @thesis_controller.get(
@@ -561,6 +671,44 @@ async def get_thesis_progress(
     return ResponseUtil.success(data=result)
 
 
+@thesis_controller.get(
+    '/{thesis_id}/progress/stream',
+    summary='订阅论文生成进度',
+    description='以SSE方式推送论文生成进度，先推送当前进度，之后在章节状态变化时推送，进度完成后结束',
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            'description': '流式返回进度事件',
+            'content': {
+                'text/event-stream': {},
+            },
+        }
+    },
+)
+async def stream_thesis_progress(
+    request: Request,
+    thesis_id: Annotated[int, Path(description='论文ID')],
+    query_db: Annotated[AsyncSession, DBSessionDependency()],
+    current_user: Annotated[CurrentUserModel, CurrentUserDependency()],
+) -> Response:
+    """订阅论文生成进度"""
+    # 权限检查
+    thesis = await ThesisService.get_thesis_detail(query_db, thesis_id)
+    if not current_user.user.admin and thesis.user_id != current_user.user.user_id:
+        return ResponseUtil.error(msg='无权访问此论文')
+
+    async def load_snapshot() -> dict:
+        # 请求级会话在返回流式响应后即释放，快照使用独立会话
+        async with AsyncSessionLocal() as session:
+            return await ThesisService.get_thesis_progress(session, thesis_id)
+
+    return StreamingResponse(
+        ThesisProgressNotifier.stream(request.app.state.redis, thesis_id, load_snapshot, request.is_disconnected),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
 @thesis_controller.post(
     '/{thesis_id}/format',
     summary='格式化论文',
@@ -583,7 +731,8 @@ async def format_thesis(
     result = await ThesisService.format_thesis(
         query_db,
         thesis_id,
-        current_user.user.user_id
+        current_user.user.user_id,
+        redis=request.app.state.redis
     )
     logger.info(result.message)
     return ResponseUtil.success(msg=result.message, data=result.result)
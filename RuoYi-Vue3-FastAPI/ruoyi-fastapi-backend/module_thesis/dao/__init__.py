@@ -11,7 +11,13 @@ from module_thesis.dao.member_dao import (
 from module_thesis.dao.order_dao import ExportRecordDao, FeatureServiceDao, OrderDao
 from module_thesis.dao.template_dao import FormatTemplateDao, TemplateFormatRuleDao, UniversalInstructionSystemDao
 from module_thesis.dao.outline_prompt_template_dao import OutlinePromptTemplateDao
-from module_thesis.dao.thesis_dao import ThesisChapterDao, ThesisDao, ThesisOutlineDao, ThesisVersionDao
+from module_thesis.dao.thesis_dao import (
+    ThesisChapterDao,
+    ThesisContentBlobDao,
+    ThesisDao,
+    ThesisOutlineDao,
+    ThesisVersionDao,
+)
 
 __all__ = [
     # AI模型相关DAO
@@ -26,6 +32,7 @@ __all__ = [
     'ThesisOutlineDao',
     'ThesisChapterDao',
     'ThesisVersionDao',
+    'ThesisContentBlobDao',
     # 模板相关DAO
     'FormatTemplateDao',
     'TemplateFormatRuleDao',
@@ -40,9 +47,10 @@ __all__ = [
 
 # 支付相关DAO
 from module_thesis.dao.payment_config_dao import PaymentConfigDao
-from module_thesis.dao.payment_transaction_dao import PaymentTransactionDao
+from module_thesis.dao.payment_transaction_dao import PaymentStatDailyDao, PaymentTransactionDao
 
 __all__.extend([
     'PaymentConfigDao',
     'PaymentTransactionDao',
+    'PaymentStatDailyDao',
 ])
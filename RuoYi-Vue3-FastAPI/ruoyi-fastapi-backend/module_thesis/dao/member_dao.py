@@ -1,9 +1,10 @@
 """
 会员管理模块数据库操作层
 """
+from datetime import datetime
 from typing import Any, Union
 
-from sqlalchemy import delete, func, select, update
+from sqlalchemy import case, delete, func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from common.vo import PageModel
@@ -448,3 +449,49 @@ class QuotaRecordDao:
         ).first()
 
         return {'total_words': result.total_words or 0, 'total_usage': result.total_usage or 0}
+
+    @classmethod
+    async def get_usage_statistics(
+        cls,
+        db: AsyncSession,
+        user_id: int,
+        feature_type: str = None,
+        start_time: datetime = None,
+        end_time: datetime = None,
+    ) -> dict:
+        """
+        条件聚合一次扫描统计用户配额使用量和退还量
+
+        :param db: orm对象
+        :param user_id: 用户ID
+        :param feature_type: 功能类型（记录备注以"功能类型 - 业务类型"开头）
+        :param start_time: 开始时间
+        :param end_time: 结束时间
+        :return: 统计数据
+        """
+        result = (
+            await db.execute(
+                select(
+                    func.sum(
+                        case((AiWriteQuotaRecord.operation_type == 'generate', AiWriteQuotaRecord.usage_count), else_=0)
+                    ).label('total_usage'),
+                    func.sum(
+                        case((AiWriteQuotaRecord.operation_type == 'refund', AiWriteQuotaRecord.usage_count), else_=0)
+                    ).label('refund_usage'),
+                    func.sum(
+                        case((AiWriteQuotaRecord.operation_type == 'generate', AiWriteQuotaRecord.word_count), else_=0)
+                    ).label('total_words'),
+                ).where(
+                    AiWriteQuotaRecord.user_id == user_id,
+                    AiWriteQuotaRecord.remark.like(f'{feature_type} - %') if feature_type else True,
+                    AiWriteQuotaRecord.create_time >= start_time if start_time else True,
+                    AiWriteQuotaRecord.create_time <= end_time if end_time else True,
+                )
+            )
+        ).first()
+
+        return {
+            'total_usage': int(result.total_usage or 0),
+            'refund_usage': int(result.refund_usage or 0),
+            'total_words': int(result.total_words or 0),
+        }
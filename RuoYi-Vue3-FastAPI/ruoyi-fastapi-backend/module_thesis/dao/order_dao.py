@@ -4,7 +4,7 @@
 from datetime import datetime
 from typing import Any, Union
 
-from sqlalchemy import delete, func, select, update
+from sqlalchemy import case, delete, func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from common.vo import PageModel
@@ -134,17 +134,31 @@ class OrderDao:
         :param end_date: 结束日期（可选）
         :return: 统计信息字典
         """
+        statuses = ('paid', 'pending', 'refunded', 'cancelled')
         query = select(
             func.count(AiWriteOrder.order_id).label('total_count'),
             func.sum(AiWriteOrder.amount).label('total_amount'),
+            *[
+                func.sum(case((AiWriteOrder.status == status, 1), else_=0)).label(f'{status}_count')
+                for status in statuses
+            ],
+            *[
+                func.sum(case((AiWriteOrder.status == status, AiWriteOrder.amount), else_=0)).label(f'{status}_amount')
+                for status in statuses
+            ],
         ).where(
             AiWriteOrder.user_id == user_id if user_id else True,
             AiWriteOrder.create_time >= start_date if start_date else True,
             AiWriteOrder.create_time <= end_date if end_date else True,
         )
 
+        # 条件聚合，一次扫描得到各状态的笔数和金额
         result = (await db.execute(query)).first()
-        return {'total_count': result.total_count or 0, 'total_amount': float(result.total_amount or 0)}
+        statistics = {'total_count': result.total_count or 0, 'total_amount': float(result.total_amount or 0)}
+        for status in statuses:
+            statistics[f'{status}_count'] = int(getattr(result, f'{status}_count') or 0)
+            statistics[f'{status}_amount'] = float(getattr(result, f'{status}_amount') or 0)
+        return statistics
 
 
 class FeatureServiceDao:
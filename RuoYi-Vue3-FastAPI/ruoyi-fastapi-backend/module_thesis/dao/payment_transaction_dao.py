@@ -1,12 +1,13 @@
 """
 支付流水DAO
 """
-from typing import List, Optional
-from datetime import datetime
-from sqlalchemy import select, update, func
+from typing import Dict, List, Optional
+from datetime import date, datetime
+from sqlalchemy import Row, and_, case, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from module_thesis.entity.do.payment_do import PaymentTransaction
+from module_thesis.entity.do.payment_do import PaymentStatDaily, PaymentTransaction
 
 
 class PaymentTransactionDao:
@@ -118,8 +119,9 @@ class PaymentTransactionDao:
         payment_id: str,
         status: str,
         transaction_no: str = None,
-        payment_time: datetime = None
-    ):
+        payment_time: datetime = None,
+        refund_time: datetime = None
+    ) -> Optional[Row]:
         """
         更新流水状态
 
@@ -128,12 +130,31 @@ class PaymentTransactionDao:
         :param status: 状态
         :param transaction_no: 第三方交易号
         :param payment_time: 支付时间
+        :param refund_time: 退款时间
+        :return: 更新前的流水状态（status、amount、fee_amount、create_time），流水不存在时为None
         """
+        # 锁定流水行，保证并发回调时读到的旧状态与本次更新一致（用于增量维护日统计）
+        previous = (
+            await db.execute(
+                select(
+                    PaymentTransaction.status,
+                    PaymentTransaction.amount,
+                    PaymentTransaction.fee_amount,
+                    PaymentTransaction.create_time,
+                    PaymentTransaction.del_flag
+                )
+                .where(PaymentTransaction.payment_id == payment_id)
+                .with_for_update()
+            )
+        ).first()
+
         update_data = {'status': status, 'update_time': datetime.now()}
         if transaction_no:
             update_data['transaction_no'] = transaction_no
         if payment_time:
             update_data['payment_time'] = payment_time
+        if refund_time:
+            update_data['refund_time'] = refund_time
 
         await db.execute(
             update(PaymentTransaction)
@@ -141,6 +162,7 @@ class PaymentTransactionDao:
             .values(**update_data)
         )
         await db.flush()
+        return previous
 
     @classmethod
     async def get_transaction_list(
@@ -233,6 +255,54 @@ class PaymentTransactionDao:
             'total_fee': float(row.total_fee or 0)
         }
 
+    @classmethod
+    async def get_live_statistics(
+        cls,
+        db: AsyncSession,
+        start_time: datetime = None,
+        end_time: datetime = None,
+        exclude_start: datetime = None,
+        exclude_end: datetime = None
+    ) -> Dict:
+        """
+        条件聚合一次扫描统计流水（按创建时间筛选）
+
+        :param db: 数据库会话
+        :param start_time: 开始时间
+        :param end_time: 结束时间
+        :param exclude_start: 排除区间开始（已由日统计覆盖的整天），为None时排除exclude_end之前的全部流水
+        :param exclude_end: 排除区间结束（不含）
+        :return: 统计信息
+        """
+        def sum_if(status: str, column):
+            return func.sum(case((PaymentTransaction.status == status, column), else_=0))
+
+        query = select(
+            func.count(PaymentTransaction.transaction_id).label('total_count'),
+            func.sum(PaymentTransaction.amount).label('total_amount'),
+            sum_if('success', 1).label('success_count'),
+            sum_if('success', PaymentTransaction.amount).label('success_amount'),
+            sum_if('pending', 1).label('pending_count'),
+            sum_if('pending', PaymentTransaction.amount).label('pending_amount'),
+            sum_if('refunded', 1).label('refunded_count'),
+            sum_if('refunded', PaymentTransaction.amount).label('refunded_amount'),
+            func.sum(PaymentTransaction.fee_amount).label('fee_amount')
+        ).where(PaymentTransaction.del_flag == '0')
+
+        if start_time:
+            query = query.where(PaymentTransaction.create_time >= start_time)
+        if end_time:
+            query = query.where(PaymentTransaction.create_time <= end_time)
+        if exclude_start and exclude_end:
+            query = query.where(
+                or_(PaymentTransaction.create_time < exclude_start, PaymentTransaction.create_time >= exclude_end)
+            )
+        elif exclude_end:
+            query = query.where(PaymentTransaction.create_time >= exclude_end)
+
+        row = (await db.execute(query)).first()
+        return PaymentStatDailyDao.row_to_dict(row)
+
     @classmethod
     async def delete_transaction(cls, db: AsyncSession, transaction_id: int):
         """
@@ -247,3 +317,80 @@ class PaymentTransactionDao:
             .values(del_flag='2')
         )
         await db.flush()
+
+
+class PaymentStatDailyDao:
+    """支付流水日统计数据访问类"""
+
+    STAT_FIELDS = (
+        'total_count',
+        'total_amount',
+        'success_count',
+        'success_amount',
+        'pending_count',
+        'pending_amount',
+        'refunded_count',
+        'refunded_amount',
+        'fee_amount',
+    )
+
+    @classmethod
+    def row_to_dict(cls, row: Optional[Row]) -> Dict:
+        """
+        将聚合结果行转换为统计字典（空值按0处理）
+
+        :param row: 聚合结果行
+        :return: 统计信息
+        """
+        return {
+            field: (int if field.endswith('_count') else float)((getattr(row, field, None) if row else None) or 0)
+            for field in cls.STAT_FIELDS
+        }
+
+    @classmethod
+    async def apply_delta(cls, db: AsyncSession, stat_date: date, delta: Dict):
+        """
+        在日统计上累加增量（当天记录不存在时创建）
+
+        :param db: 数据库会话
+        :param stat_date: 统计日期
+        :param delta: 各统计字段的增量
+        """
+        delta = {field: value for field, value in delta.items() if value}
+        if not delta:
+            return
+        values = {field: getattr(PaymentStatDaily, field) + value for field, value in delta.items()}
+        values['update_time'] = datetime.now()
+        stmt = update(PaymentStatDaily).where(PaymentStatDaily.stat_date == stat_date).values(**values)
+        result = await db.execute(stmt)
+        if result.rowcount:
+            return
+        try:
+            async with db.begin_nested():
+                db.add(PaymentStatDaily(stat_date=stat_date, update_time=datetime.now(), **{
+                    field: delta.get(field, 0) for field in cls.STAT_FIELDS
+                }))
+        except IntegrityError:
+            # 并发创建了当天记录，改为累加
+            await db.execute(stmt)
+
+    @classmethod
+    async def get_statistics(cls, db: AsyncSession, start_date: date = None, end_date: date = None) -> Dict:
+        """
+        汇总日期区间内的日统计
+
+        :param db: 数据库会话
+        :param start_date: 开始日期（含）
+        :param end_date: 结束日期（不含）
+        :return: 统计信息
+        """
+        conditions = []
+        if start_date:
+            conditions.append(PaymentStatDaily.stat_date >= start_date)
+        if end_date:
+            conditions.append(PaymentStatDaily.stat_date < end_date)
+        query = select(*[func.sum(getattr(PaymentStatDaily, field)).label(field) for field in cls.STAT_FIELDS])
+        if conditions:
+            query = query.where(and_(*conditions))
+        row = (await db.execute(query)).first()
+        return cls.row_to_dict(row)
@@ -1,13 +1,20 @@
 """
 格式模板管理模块数据库操作层
 """
+from datetime import datetime
 from typing import Any, Union
 
 from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from common.vo import PageModel
-from module_thesis.entity.do.template_do import AiWriteFormatTemplate, AiWriteTemplateFormatRule, UniversalInstructionSystem
+from module_thesis.entity.do.template_do import (
+    AiWriteFormatAnalysisCache,
+    AiWriteFormatTemplate,
+    AiWriteTemplateFormatRule,
+    UniversalInstructionSystem,
+)
 from utils.page_util import PageUtil
 
 
@@ -405,6 +412,68 @@ class UniversalInstructionSystemDao:
         return True
 
 
+class FormatAnalysisCacheDao:
+    """
+    格式分析缓存数据访问对象
+    """
+
+    @classmethod
+    async def get_cache(
+        cls, db: AsyncSession, content_hash: str, analysis_version: str
+    ) -> Union[AiWriteFormatAnalysisCache, None]:
+        """
+        根据文件内容哈希和分析版本获取缓存
+
+        :param db: orm对象
+        :param content_hash: 文件内容SHA-256
+        :param analysis_version: 分析版本
+        :return: 缓存对象
+        """
+        cache_info = (
+            await db.execute(
+                select(AiWriteFormatAnalysisCache).where(
+                    AiWriteFormatAnalysisCache.content_hash == content_hash,
+                    AiWriteFormatAnalysisCache.analysis_version == analysis_version,
+                )
+            )
+        ).scalars().first()
+
+        return cache_info
+
+    @classmethod
+    async def add_cache(cls, db: AsyncSession, cache_data: dict) -> bool:
+        """
+        新增缓存，同一文件并发分析时以先写入的结果为准
+
+        :param db: orm对象
+        :param cache_data: 缓存数据
+        :return: 是否写入成功
+        """
+        try:
+            # 使用保存点，唯一键冲突时只回滚本次写入，不影响外层事务
+            async with db.begin_nested():
+                db.add(AiWriteFormatAnalysisCache(**cache_data))
+        except IntegrityError:
+            return False
+
+        return True
+
+    @classmethod
+    async def record_hit(cls, db: AsyncSession, cache_id: int) -> None:
+        """
+        记录缓存命中
+
+        :param db: orm对象
+        :param cache_id: 缓存ID
+        :return:
+        """
+        await db.execute(
+            update(AiWriteFormatAnalysisCache)
+            .where(AiWriteFormatAnalysisCache.cache_id == cache_id)
+            .values(hit_count=AiWriteFormatAnalysisCache.hit_count + 1, last_hit_time=datetime.now())
+        )
+
+
 class TemplateFormatRuleDao:
     """
     模板格式规则数据访问对象
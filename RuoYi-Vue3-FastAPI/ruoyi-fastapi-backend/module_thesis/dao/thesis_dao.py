@@ -3,13 +3,16 @@
 """
 from typing import Any, Union
 
-from sqlalchemy import delete, func, select, update
+from sqlalchemy import Row, delete, func, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
 
 from common.vo import PageModel
 from module_thesis.entity.do.thesis_do import (
     AiWriteThesis,
     AiWriteThesisChapter,
+    AiWriteThesisContentBlob,
     AiWriteThesisOutline,
     AiWriteThesisVersion,
 )
@@ -38,6 +41,36 @@ class ThesisDao:
 
         return thesis_info
 
+    @classmethod
+    async def lock_thesis(cls, db: AsyncSession, thesis_id: int) -> None:
+        """
+        锁定论文行（SELECT ... FOR UPDATE），锁在事务结束时释放
+
+        :param db: orm对象
+        :param thesis_id: 论文ID
+        :return:
+        """
+        await db.execute(
+            select(AiWriteThesis.thesis_id).where(AiWriteThesis.thesis_id == thesis_id).with_for_update()
+        )
+
+    @classmethod
+    async def get_thesis_status(cls, db: AsyncSession, thesis_id: int) -> Union[str, None]:
+        """
+        只查询论文状态（进度查询使用，不加载论文其它字段）
+
+        :param db: orm对象
+        :param thesis_id: 论文ID
+        :return: 论文状态，论文不存在时返回None
+        """
+        status = (
+            await db.execute(
+                select(AiWriteThesis.status).where(AiWriteThesis.thesis_id == thesis_id, AiWriteThesis.del_flag == '0')
+            )
+        ).scalar()
+
+        return status
+
     @classmethod
     async def get_thesis_list(
         cls, db: AsyncSession, query_object: dict = None, is_page: bool = False
@@ -167,6 +200,40 @@ class ThesisOutlineDao:
 
         return outline_info
 
+    @classmethod
+    async def get_outline_data_by_thesis_id(cls, db: AsyncSession, thesis_id: int) -> Any:
+        """
+        只查询大纲数据列
+
+        :param db: orm对象
+        :param thesis_id: 论文ID
+        :return: 大纲数据，大纲不存在时返回None
+        """
+        outline_data = (
+            await db.execute(
+                select(AiWriteThesisOutline.outline_data).where(AiWriteThesisOutline.thesis_id == thesis_id)
+            )
+        ).scalar()
+
+        return outline_data
+
+    @classmethod
+    async def has_outline(cls, db: AsyncSession, thesis_id: int) -> bool:
+        """
+        判断论文是否已有大纲记录（不加载大纲数据）
+
+        :param db: orm对象
+        :param thesis_id: 论文ID
+        :return: 是否存在大纲
+        """
+        outline_id = (
+            await db.execute(
+                select(AiWriteThesisOutline.outline_id).where(AiWriteThesisOutline.thesis_id == thesis_id).limit(1)
+            )
+        ).scalar()
+
+        return outline_id is not None
+
     @classmethod
     async def add_outline(cls, db: AsyncSession, outline_data: dict) -> AiWriteThesisOutline:
         """
@@ -210,6 +277,22 @@ class ThesisChapterDao:
     论文章节数据访问对象
     """
 
+    # 章节简要列：不含章节内容（content）和生成提示词（generation_prompt）两个大字段
+    brief_columns = (
+        AiWriteThesisChapter.chapter_id,
+        AiWriteThesisChapter.thesis_id,
+        AiWriteThesisChapter.title,
+        AiWriteThesisChapter.level,
+        AiWriteThesisChapter.order_num,
+        AiWriteThesisChapter.word_count,
+        AiWriteThesisChapter.status,
+        AiWriteThesisChapter.create_by,
+        AiWriteThesisChapter.create_time,
+        AiWriteThesisChapter.update_by,
+        AiWriteThesisChapter.update_time,
+        AiWriteThesisChapter.remark,
+    )
+
     @classmethod
     async def get_chapter_by_id(cls, db: AsyncSession, chapter_id: int) -> Union[AiWriteThesisChapter, None]:
         """
@@ -228,7 +311,7 @@ class ThesisChapterDao:
     @classmethod
     async def get_chapter_list_by_thesis(cls, db: AsyncSession, thesis_id: int) -> list[AiWriteThesisChapter]:
         """
-        获取论文的所有章节
+        获取论文的所有章节（包含章节内容，生成提示词延迟加载；不需要内容时使用get_chapter_brief_list_by_thesis）
 
         :param db: orm对象
         :param thesis_id: 论文ID
@@ -237,6 +320,7 @@ class ThesisChapterDao:
         chapter_list = (
             await db.execute(
                 select(AiWriteThesisChapter)
+                .options(defer(AiWriteThesisChapter.generation_prompt))
                 .where(AiWriteThesisChapter.thesis_id == thesis_id)
                 .order_by(AiWriteThesisChapter.order_num)
             )
@@ -244,6 +328,50 @@ class ThesisChapterDao:
 
         return list(chapter_list)
 
+    @classmethod
+    async def get_chapter_brief_list_by_thesis(
+        cls, db: AsyncSession, thesis_id: int, include_content: bool = False, incomplete_only: bool = False
+    ) -> list[Row]:
+        """
+        获取论文章节的投影列表（默认不查询章节内容和生成提示词）
+
+        :param db: orm对象
+        :param thesis_id: 论文ID
+        :param include_content: 是否同时查询章节内容
+        :param incomplete_only: 是否只查询未完成（状态不是completed）的章节
+        :return: 章节行列表，可按属性访问列值
+        """
+        columns = cls.brief_columns + ((AiWriteThesisChapter.content,) if include_content else ())
+        query = select(*columns).where(AiWriteThesisChapter.thesis_id == thesis_id)
+        if incomplete_only:
+            query = query.where(AiWriteThesisChapter.status != 'completed')
+        chapter_list = (await db.execute(query.order_by(AiWriteThesisChapter.order_num))).all()
+
+        return list(chapter_list)
+
+    @classmethod
+    async def get_chapter_status_by_title_and_thesis(
+        cls, db: AsyncSession, thesis_id: int, title: str
+    ) -> Union[Row, None]:
+        """
+        根据论文ID和章节标题查询章节ID和状态（用于检查章节是否已存在）
+
+        :param db: orm对象
+        :param thesis_id: 论文ID
+        :param title: 章节标题
+        :return: 包含chapter_id、status的行或None
+        """
+        chapter = (
+            await db.execute(
+                select(AiWriteThesisChapter.chapter_id, AiWriteThesisChapter.status).where(
+                    AiWriteThesisChapter.thesis_id == thesis_id,
+                    AiWriteThesisChapter.title == title
+                )
+            )
+        ).first()
+
+        return chapter
+
     @classmethod
     async def get_chapter_by_title_and_thesis(
         cls, db: AsyncSession, thesis_id: int, title: str
@@ -382,6 +510,41 @@ class ThesisChapterDao:
 
         return total_words or 0
 
+    @classmethod
+    async def count_chapters_by_status(cls, db: AsyncSession, thesis_id: int) -> dict[str, int]:
+        """
+        按状态统计论文章节数（单条GROUP BY查询，不读取章节内容）
+
+        :param db: orm对象
+        :param thesis_id: 论文ID
+        :return: 状态到章节数的映射
+        """
+        rows = (
+            await db.execute(
+                select(AiWriteThesisChapter.status, func.count(AiWriteThesisChapter.chapter_id))
+                .where(AiWriteThesisChapter.thesis_id == thesis_id)
+                .group_by(AiWriteThesisChapter.status)
+            )
+        ).all()
+
+        return {status: count for status, count in rows}
+
+    @classmethod
+    async def get_incomplete_chapter_brief_list(cls, db: AsyncSession, thesis_id: int) -> list[dict[str, Any]]:
+        """
+        获取未完成章节的简要信息（只查询ID、标题、序号和状态）
+
+        :param db: orm对象
+        :param thesis_id: 论文ID
+        :return: 未完成章节简要信息列表
+        """
+        rows = await cls.get_chapter_brief_list_by_thesis(db, thesis_id, incomplete_only=True)
+
+        return [
+            {'chapter_id': row.chapter_id, 'chapter_title': row.title, 'order_num': row.order_num, 'status': row.status}
+            for row in rows
+        ]
+
 
 class ThesisVersionDao:
     """
@@ -404,11 +567,9 @@ class ThesisVersionDao:
         return version_info
 
     @classmethod
-    async def get_version_list_by_thesis(
-        cls, db: AsyncSession, thesis_id: int, limit: int = 10
-    ) -> list[AiWriteThesisVersion]:
+    async def get_version_list_by_thesis(cls, db: AsyncSession, thesis_id: int, limit: int = 10) -> list[Row]:
         """
-        获取论文的版本历史
+        获取论文的版本历史（不查询快照清单）
 
         :param db: orm对象
         :param thesis_id: 论文ID
@@ -416,14 +577,150 @@ class ThesisVersionDao:
         :return: 版本列表
         """
         version_list = (
+            await db.execute(
+                select(
+                    AiWriteThesisVersion.version_id,
+                    AiWriteThesisVersion.thesis_id,
+                    AiWriteThesisVersion.version_number,
+                    AiWriteThesisVersion.change_desc,
+                    AiWriteThesisVersion.changed_by,
+                    AiWriteThesisVersion.create_time,
+                    AiWriteThesisVersion.remark,
+                )
+                .where(AiWriteThesisVersion.thesis_id == thesis_id)
+                .order_by(AiWriteThesisVersion.version_number.desc())
+                .limit(limit)
+            )
+        ).all()
+
+        return list(version_list)
+
+    @classmethod
+    async def get_latest_version(cls, db: AsyncSession, thesis_id: int) -> Union[AiWriteThesisVersion, None]:
+        """
+        获取论文的最新版本
+
+        :param db: orm对象
+        :param thesis_id: 论文ID
+        :return: 版本信息对象
+        """
+        version_info = (
             await db.execute(
                 select(AiWriteThesisVersion)
                 .where(AiWriteThesisVersion.thesis_id == thesis_id)
-                .order_by(AiWriteThesisVersion.create_time.desc())
+                .order_by(AiWriteThesisVersion.version_number.desc())
+                .limit(1)
+            )
+        ).scalars().first()
+
+        return version_info
+
+    @classmethod
+    async def get_previous_version(
+        cls, db: AsyncSession, thesis_id: int, version_number: int
+    ) -> Union[AiWriteThesisVersion, None]:
+        """
+        获取指定版本的上一个版本
+
+        :param db: orm对象
+        :param thesis_id: 论文ID
+        :param version_number: 版本号
+        :return: 版本信息对象
+        """
+        version_info = (
+            await db.execute(
+                select(AiWriteThesisVersion)
+                .where(
+                    AiWriteThesisVersion.thesis_id == thesis_id,
+                    AiWriteThesisVersion.version_number < version_number
+                )
+                .order_by(AiWriteThesisVersion.version_number.desc())
+                .limit(1)
+            )
+        ).scalars().first()
+
+        return version_info
+
+    @classmethod
+    async def get_snapshot_chain(
+        cls, db: AsyncSession, thesis_id: int, version_number: int, limit: int
+    ) -> list[Any]:
+        """
+        获取指定版本及其之前若干版本的快照清单（新到旧），用于还原元数据
+
+        :param db: orm对象
+        :param thesis_id: 论文ID
+        :param version_number: 版本号
+        :param limit: 最多查询的版本数
+        :return: 快照清单列表
+        """
+        snapshot_list = (
+            await db.execute(
+                select(AiWriteThesisVersion.snapshot_data)
+                .where(
+                    AiWriteThesisVersion.thesis_id == thesis_id,
+                    AiWriteThesisVersion.version_number <= version_number
+                )
+                .order_by(AiWriteThesisVersion.version_number.desc())
                 .limit(limit)
             )
         ).scalars().all()
 
+        return list(snapshot_list)
+
+    @classmethod
+    async def get_snapshot_list_by_thesis(cls, db: AsyncSession, thesis_id: int) -> list[Any]:
+        """
+        获取论文全部版本的快照清单（只查询清单列）
+
+        :param db: orm对象
+        :param thesis_id: 论文ID
+        :return: 快照清单列表
+        """
+        snapshot_list = (
+            await db.execute(
+                select(AiWriteThesisVersion.snapshot_data).where(AiWriteThesisVersion.thesis_id == thesis_id)
+            )
+        ).scalars().all()
+
+        return list(snapshot_list)
+
+    @classmethod
+    async def count_versions(cls, db: AsyncSession, thesis_id: int) -> int:
+        """
+        统计论文版本数
+
+        :param db: orm对象
+        :param thesis_id: 论文ID
+        :return: 版本数
+        """
+        version_count = (
+            await db.execute(
+                select(func.count(AiWriteThesisVersion.version_id)).where(AiWriteThesisVersion.thesis_id == thesis_id)
+            )
+        ).scalar()
+
+        return version_count or 0
+
+    @classmethod
+    async def get_old_versions(cls, db: AsyncSession, thesis_id: int, keep_count: int) -> list[AiWriteThesisVersion]:
+        """
+        获取超出保留数量的旧版本（按版本号从新到旧保留最新的N个）
+
+        :param db: orm对象
+        :param thesis_id: 论文ID
+        :param keep_count: 保留数量
+        :return: 需要清理的版本列表
+        """
+        version_list = (
+            await db.execute(
+                select(AiWriteThesisVersion)
+                .where(AiWriteThesisVersion.thesis_id == thesis_id)
+                .order_by(AiWriteThesisVersion.version_number.desc())
+                .offset(keep_count)
+            )
+        ).scalars().all()
+
         return list(version_list)
 
     @classmethod
@@ -442,23 +739,124 @@ class ThesisVersionDao:
         return db_version
 
     @classmethod
-    async def delete_old_versions(cls, db: AsyncSession, thesis_id: int, keep_count: int = 10) -> None:
+    async def update_version_snapshot(cls, db: AsyncSession, version_id: int, snapshot_data: dict) -> None:
         """
-        删除旧版本（保留最新的N个版本）
+        更新版本的快照清单
 
         :param db: orm对象
-        :param thesis_id: 论文ID
-        :param keep_count: 保留数量
+        :param version_id: 版本ID
+        :param snapshot_data: 快照清单
         :return:
         """
-        # 查询需要删除的版本ID
-        subquery = (
-            select(AiWriteThesisVersion.version_id)
-            .where(AiWriteThesisVersion.thesis_id == thesis_id)
-            .order_by(AiWriteThesisVersion.create_time.desc())
-            .offset(keep_count)
+        await db.execute(
+            update(AiWriteThesisVersion)
+            .where(AiWriteThesisVersion.version_id == version_id)
+            .values(snapshot_data=snapshot_data)
         )
 
+    @classmethod
+    async def delete_versions(cls, db: AsyncSession, version_ids: list[int]) -> None:
+        """
+        批量删除版本
+
+        :param db: orm对象
+        :param version_ids: 版本ID列表
+        :return:
+        """
+        if not version_ids:
+            return
+        await db.execute(delete(AiWriteThesisVersion).where(AiWriteThesisVersion.version_id.in_(version_ids)))
+
+
+class ThesisContentBlobDao:
+    """
+    论文章节内容存储数据访问对象
+    """
+
+    @classmethod
+    async def get_existing_hashes(cls, db: AsyncSession, thesis_id: int, content_hashes: set[str]) -> set[str]:
+        """
+        查询已存储的内容哈希
+
+        :param db: orm对象
+        :param thesis_id: 论文ID
+        :param content_hashes: 待检查的哈希集合
+        :return: 已存在的哈希集合
+        """
+        if not content_hashes:
+            return set()
+        hash_list = (
+            await db.execute(
+                select(AiWriteThesisContentBlob.content_hash).where(
+                    AiWriteThesisContentBlob.thesis_id == thesis_id,
+                    AiWriteThesisContentBlob.content_hash.in_(content_hashes)
+                )
+            )
+        ).scalars().all()
+
+        return set(hash_list)
+
+    @classmethod
+    async def add_blobs(cls, db: AsyncSession, blobs: list[dict]) -> None:
+        """
+        批量写入章节内容（并发写入同一内容时忽略唯一键冲突）
+
+        :param db: orm对象
+        :param blobs: 内容数据列表
+        :return:
+        """
+        if not blobs:
+            return
+        try:
+            async with db.begin_nested():
+                db.add_all([AiWriteThesisContentBlob(**blob) for blob in blobs])
+        except IntegrityError:
+            # 批量写入冲突时逐条写入，只跳过已存在的内容
+            for blob in blobs:
+                try:
+                    async with db.begin_nested():
+                        db.add(AiWriteThesisContentBlob(**blob))
+                except IntegrityError:
+                    continue
+
+    @classmethod
+    async def get_contents(cls, db: AsyncSession, thesis_id: int, content_hashes: set[str]) -> dict[str, str]:
+        """
+        按哈希读取章节内容
+
+        :param db: orm对象
+        :param thesis_id: 论文ID
+        :param content_hashes: 哈希集合
+        :return: 哈希到内容的映射
+        """
+        if not content_hashes:
+            return {}
+        rows = (
+            await db.execute(
+                select(AiWriteThesisContentBlob.content_hash, AiWriteThesisContentBlob.content).where(
+                    AiWriteThesisContentBlob.thesis_id == thesis_id,
+                    AiWriteThesisContentBlob.content_hash.in_(content_hashes)
+                )
+            )
+        ).all()
+
+        return {content_hash: content for content_hash, content in rows}
+
+    @classmethod
+    async def delete_blobs(cls, db: AsyncSession, thesis_id: int, content_hashes: set[str]) -> None:
+        """
+        删除不再被任何版本引用的章节内容
+
+        :param db: orm对象
+        :param thesis_id: 论文ID
+        :param content_hashes: 哈希集合
+        :return:
+        """
+        if not content_hashes:
+            return
         await db.execute(
-            delete(AiWriteThesisVersion).where(AiWriteThesisVersion.version_id.in_(subquery))
+            delete(AiWriteThesisContentBlob).where(
+                AiWriteThesisContentBlob.thesis_id == thesis_id,
+                AiWriteThesisContentBlob.content_hash.in_(content_hashes)
+            )
         )
@@ -16,12 +16,14 @@ from .thesis_do import (
     AiWriteThesisOutline,
     AiWriteThesisChapter,
     AiWriteThesisVersion,
+    AiWriteThesisContentBlob,
 )
 
 # 格式模板相关实体
 from .template_do import (
     AiWriteFormatTemplate,
     AiWriteTemplateFormatRule,
+    AiWriteFormatAnalysisCache,
 )
 
 # 大纲提示词模板相关实体
@@ -45,9 +47,11 @@ __all__ = [
     'AiWriteThesisOutline',
     'AiWriteThesisChapter',
     'AiWriteThesisVersion',
+    'AiWriteThesisContentBlob',
     # 格式模板
     'AiWriteFormatTemplate',
     'AiWriteTemplateFormatRule',
+    'AiWriteFormatAnalysisCache',
     # 大纲提示词模板
     'AiWriteOutlinePromptTemplate',
     # 订单支付
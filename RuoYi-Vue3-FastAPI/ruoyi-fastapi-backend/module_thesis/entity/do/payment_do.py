@@ -3,7 +3,7 @@
 """
 from datetime import datetime
 from decimal import Decimal
-from sqlalchemy import Column, BigInteger, String, DateTime, CHAR, Integer, JSON, DECIMAL
+from sqlalchemy import Column, BigInteger, String, Date, DateTime, CHAR, Integer, JSON, DECIMAL
 from sqlalchemy.orm import declarative_base
 
 from config.database import Base
@@ -53,3 +53,20 @@ class PaymentTransaction(Base):
     update_by = Column(String(64), default='', comment='更新者')
     update_time = Column(DateTime, comment='更新时间')
     remark = Column(String(500), comment='备注')
+
+
+class PaymentStatDaily(Base):
+    """支付流水日统计表"""
+    __tablename__ = 'ai_write_payment_stat_daily'
+
+    stat_date = Column(Date, primary_key=True, comment='统计日期')
+    total_count = Column(Integer, default=0, comment='流水总数')
+    total_amount = Column(DECIMAL(14, 2), default=0.00, comment='交易总额')
+    success_count = Column(Integer, default=0, comment='成功笔数')
+    success_amount = Column(DECIMAL(14, 2), default=0.00, comment='成功金额')
+    pending_count = Column(Integer, default=0, comment='处理中笔数')
+    pending_amount = Column(DECIMAL(14, 2), default=0.00, comment='处理中金额')
+    refunded_count = Column(Integer, default=0, comment='退款笔数')
+    refunded_amount = Column(DECIMAL(14, 2), default=0.00, comment='退款金额')
+    fee_amount = Column(DECIMAL(14, 2), default=0.00, comment='手续费')
+    update_time = Column(DateTime, comment='更新时间')
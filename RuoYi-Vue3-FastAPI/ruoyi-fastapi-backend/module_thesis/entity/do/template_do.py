@@ -3,7 +3,7 @@
 """
 from datetime import datetime
 
-from sqlalchemy import CHAR, BigInteger, Column, DateTime, Integer, String, JSON
+from sqlalchemy import CHAR, BigInteger, Column, DateTime, Index, Integer, String, JSON
 
 from config.database import Base
 from config.env import DataBaseConfig
@@ -109,3 +109,25 @@ class UniversalInstructionSystem(Base):
         server_default=SqlalchemyUtil.get_server_default_null(DataBaseConfig.db_type),
         comment='备注',
     )
+
+
+class AiWriteFormatAnalysisCache(Base):
+    """
+    格式分析缓存表
+    """
+
+    __tablename__ = 'ai_write_format_analysis_cache'
+    __table_args__ = {'comment': '格式分析缓存表'}
+
+    cache_id = Column(BigInteger, primary_key=True, nullable=False, autoincrement=True, comment='缓存ID')
+    content_hash = Column(CHAR(64), nullable=False, comment='模板文件内容SHA-256')
+    analysis_version = Column(String(100), nullable=False, comment='分析版本（提示词版本+指令系统版本）')
+
+    analysis_result = Column(JSON, nullable=False, comment='分析结果（JSON格式）')
+    file_size = Column(BigInteger, nullable=True, server_default='0', comment='文件大小（字节）')
+    hit_count = Column(Integer, nullable=True, server_default='0', comment='命中次数')
+    last_hit_time = Column(DateTime, nullable=True, comment='最近命中时间')
+
+    create_time = Column(DateTime, nullable=True, default=datetime.now, comment='创建时间')
+
+    uk_content_version = Index('uk_content_version', content_hash, analysis_version, unique=True)
@@ -3,7 +3,7 @@
 """
 from datetime import datetime
 
-from sqlalchemy import CHAR, BigInteger, Column, DateTime, Integer, String, Text, JSON
+from sqlalchemy import CHAR, BigInteger, Column, DateTime, Index, Integer, String, Text, JSON
 
 from config.database import Base
 from config.env import DataBaseConfig
@@ -152,7 +152,7 @@ class AiWriteThesisVersion(Base):
     thesis_id = Column(BigInteger, nullable=False, comment='论文ID')
     version_number = Column(Integer, nullable=False, comment='版本号')
     
-    snapshot_data = Column(JSON, nullable=False, comment='快照数据（JSON格式）')
+    snapshot_data = Column(JSON, nullable=False, comment='快照清单（章节内容哈希列表及元数据增量，JSON格式）')
     
     change_desc = Column(String(200), nullable=True, server_default="''", comment='变更描述')
     changed_by = Column(String(64), nullable=True, server_default="''", comment='变更人')
@@ -164,3 +164,23 @@ class AiWriteThesisVersion(Base):
         server_default=SqlalchemyUtil.get_server_default_null(DataBaseConfig.db_type),
         comment='备注',
     )
+
+
+class AiWriteThesisContentBlob(Base):
+    """
+    论文章节内容存储表（按内容哈希去重，版本快照只引用哈希）
+    """
+
+    __tablename__ = 'ai_write_thesis_content_blob'
+    __table_args__ = {'comment': '论文章节内容存储表'}
+
+    blob_id = Column(BigInteger, primary_key=True, nullable=False, autoincrement=True, comment='内容ID')
+    thesis_id = Column(BigInteger, nullable=False, comment='论文ID')
+    content_hash = Column(CHAR(64), nullable=False, comment='章节内容SHA-256')
+
+    content = Column(Text, nullable=True, comment='章节内容')
+    content_size = Column(Integer, nullable=True, server_default='0', comment='内容长度（字符）')
+
+    create_time = Column(DateTime, nullable=True, default=datetime.now, comment='创建时间')
+
+    uk_thesis_hash = Index('uk_thesis_hash', thesis_id, content_hash, unique=True)
@@ -304,8 +304,9 @@ class ThesisVersionModel(BaseModel):
     version_id: Optional[int] = Field(default=None, description='版本ID')
     thesis_id: Optional[int] = Field(default=None, description='论文ID')
     version_number: Optional[int] = Field(default=None, description='版本号')
-    content_snapshot: Optional[str] = Field(default=None, description='内容快照')
-    create_by: Optional[str] = Field(default=None, description='创建者')
+    snapshot_data: Optional[dict] = Field(default=None, description='快照数据（元数据及章节内容）')
+    change_desc: Optional[str] = Field(default=None, description='变更描述')
+    changed_by: Optional[str] = Field(default=None, description='变更人')
     create_time: Optional[datetime] = Field(default=None, description='创建时间')
     remark: Optional[str] = Field(default=None, description='备注')
 
@@ -124,6 +124,8 @@ class AlipayProvider(PaymentProvider):
                     'order_no': response.get('out_trade_no'),
                     'amount': Decimal(str(response.get('total_amount', '0'))),
                     'paid': response.get('trade_status') in ['TRADE_SUCCESS', 'TRADE_FINISHED'],
+                    # 未付款交易超时关闭
+                    'failed': response.get('trade_status') == 'TRADE_CLOSED',
                     'refunded': False,
                     'transaction_no': response.get('trade_no')
                 }
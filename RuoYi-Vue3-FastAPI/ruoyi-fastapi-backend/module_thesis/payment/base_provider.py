@@ -45,7 +45,7 @@ class PaymentProvider(ABC):
         查询支付
         
         :param payment_id: 支付ID
-        :return: 支付信息
+        :return: 支付信息（paid: 已支付，failed: 交易已关闭或支付失败）
         """
         pass
     
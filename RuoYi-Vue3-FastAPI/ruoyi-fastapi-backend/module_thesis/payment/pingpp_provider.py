@@ -119,6 +119,8 @@ class PingppProvider(PaymentProvider):
                 'order_no': charge.order_no,
                 'amount': Decimal(str(charge.amount)) / 100,
                 'paid': charge.paid,
+                # 渠道返回错误码表示支付失败
+                'failed': not charge.paid and bool(getattr(charge, 'failure_code', None)),
                 'refunded': charge.refunded,
                 'transaction_no': charge.transaction_no
             }
@@ -144,6 +144,8 @@ class WechatProvider(PaymentProvider):
                     'order_no': message.get('out_trade_no'),
                     'amount': Decimal(str(message.get('amount', {}).get('total', 0))) / 100,
                     'paid': trade_state == 'SUCCESS',
+                    # 已关闭或支付失败
+                    'failed': trade_state in ['CLOSED', 'PAYERROR'],
                     'refunded': trade_state == 'REFUND',
                     'transaction_no': message.get('transaction_id')
                 }
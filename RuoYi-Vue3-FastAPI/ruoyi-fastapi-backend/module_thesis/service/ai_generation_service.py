@@ -4,8 +4,9 @@ AI生成服务 - 调用AI模型生成论文内容
 """
 import json
 import sys
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Any, Optional, List, Union
+from typing import Dict, Any, Optional, List, Tuple, Union
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from exceptions.exception import ServiceException
@@ -46,6 +47,7 @@ try:
     # 首先尝试从 src.ai.llm 和 src.ai.config 直接导入（避免导入 __init__.py 中的 agent）
     try:
         from src.ai.llm import create_llm_provider, LLMProvider
+        from src.ai.llm_middleware import build_cached_messages
         from src.ai.config import ModelConfig, ModelProvider, model_config_from_db_model
         logger.info("✅ 成功导入 automation-framework 的统一 AI 接口 (from src.ai.llm/config)")
     except ImportError:
@@ -56,6 +58,7 @@ try:
             logger.info(f"添加 automation-framework/src 到路径: {automation_framework_src}")
         
         from ai.llm import create_llm_provider, LLMProvider
+        from ai.llm_middleware import build_cached_messages
         from ai.config import ModelConfig, ModelProvider, model_config_from_db_model
         logger.info("✅ 成功导入 automation-framework 的统一 AI 接口 (from ai.llm/config)")
         
@@ -73,6 +76,18 @@ except ImportError as e:
     raise
 
 
+@dataclass
+class ChapterGenerationContext:
+    """论文级章节生成上下文（同一篇论文的所有章节共用）"""
+    thesis_info: Dict[str, Any]  # 论文信息
+    degree_text: str  # 学位级别
+    outline_context: Optional[Union[str, dict]]  # 大纲上下文
+    prompt_prefix: str  # 渲染好的提示词稳定前缀（论文信息、大纲、写作规范）
+    word_count_requirement: str  # 每章字数分配
+    format_instructions: Optional[Dict[str, Any]]  # 模板格式指令
+    llm_provider: Any  # AI提供商实例
+
+
 class AiGenerationService:
     """
     AI生成服务类 - 负责调用AI模型生成论文内容
@@ -1230,6 +1245,67 @@ class AiGenerationService:
         logger.info(f"  普通章节（有编号）：{numbered_chapters_info}")
         return outline_data
 
+    @classmethod
+    async def build_chapter_generation_context(
+        cls,
+        query_db: AsyncSession,
+        thesis_info: Dict[str, Any],
+        outline_context: Optional[Union[str, dict]] = None,
+        config_id: Optional[int] = None
+    ) -> ChapterGenerationContext:
+        """
+        构建论文级章节生成上下文（在生成章节前构建一次，供该论文的所有章节共用）
+
+        :param query_db: 数据库会话
+        :param thesis_info: 论文信息
+        :param outline_context: 大纲上下文（可选）
+        :param config_id: AI模型配置ID（可选）
+        :return: 章节生成上下文
+        """
+        llm_provider, _ = await cls._get_ai_provider(query_db, config_id)
+
+        # 学历和格式指令都来自格式模板，只读取一次
+        degree_text = ''
+        format_instructions = None
+        template_id = thesis_info.get('template_id')
+        if template_id:
+            try:
+                from module_thesis.dao.template_dao import FormatTemplateDao
+                template = await FormatTemplateDao.get_template_by_id(query_db, template_id)
+                if template:
+                    degree_text = template.degree_level or ''
+                    if template.format_data:
+                        format_instructions = json.loads(template.format_data) if isinstance(template.format_data, str) else template.format_data
+                        logger.info(f"已读取格式指令，template_id: {template_id}")
+            except Exception as e:
+                logger.warning(f"读取格式模板失败: {str(e)}，将使用默认学历和格式")
+
+        # 如果模板中没有学历，使用默认值
+        if not degree_text:
+            degree_text = '本科'
+
+        outline_str = None
+        if outline_context:
+            # 如果 outline_context 是字典，转换为 JSON 字符串
+            if isinstance(outline_context, dict):
+                outline_str = json.dumps(outline_context, ensure_ascii=False, indent=2)
+            elif isinstance(outline_context, str):
+                outline_str = outline_context
+            else:
+                outline_str = str(outline_context)
+
+        return ChapterGenerationContext(
+            thesis_info=thesis_info,
+            degree_text=degree_text,
+            outline_context=outline_context,
+            prompt_prefix=cls._build_chapter_prompt_prefix(thesis_info, degree_text, outline_str),
+            word_count_requirement=cls._calculate_chapter_word_count_requirement(
+                thesis_info, degree_text, outline_context
+            ),
+            format_instructions=format_instructions,
+            llm_provider=llm_provider
+        )
+
     @classmethod
     async def generate_chapter(
         cls,
@@ -1238,102 +1314,49 @@ class AiGenerationService:
         chapter_info: Dict[str, Any],
         outline_context: Optional[Union[str, dict]] = None,
         config_id: Optional[int] = None,
-        word_count_requirement: Optional[str] = None
+        word_count_requirement: Optional[str] = None,
+        context: Optional[ChapterGenerationContext] = None
     ) -> str:
         """
         生成论文章节内容
-        
+
         :param query_db: 数据库会话
         :param thesis_info: 论文信息
         :param chapter_info: 章节信息（章节号、章节标题、小节信息等）
         :param outline_context: 大纲上下文（可选）
         :param config_id: AI模型配置ID（可选）
+        :param word_count_requirement: 字数要求（可选，不传则使用上下文中的字数分配）
+        :param context: 论文级章节生成上下文（批量生成时由调用方构建一次后传入，不传则现场构建）
         :return: 章节内容
         """
         try:
-            # 获取AI提供商
-            llm_provider, _ = await cls._get_ai_provider(query_db, config_id)
-            
-            # 获取字数要求：根据用户输入的目标总字数和学历（从模板表获取），结合章节数量计算
-            if not word_count_requirement:
-                word_count_requirement = await cls._calculate_chapter_word_count_requirement(
-                    query_db, thesis_info, chapter_info, outline_context
-                )
-            
-            # 读取格式指令（如果有template_id）
-            format_requirements = ""
-            template_id = thesis_info.get('template_id')
-            if template_id:
-                try:
-                    from module_thesis.dao.template_dao import FormatTemplateDao
-                    template = await FormatTemplateDao.get_template_by_id(query_db, template_id)
-                    if template and template.format_data:
-                        import json
-                        format_instructions = json.loads(template.format_data) if isinstance(template.format_data, str) else template.format_data
-                        
-                        # 提取章节格式要求
-                        chapter_level = chapter_info.get('level', 1)
-                        if not chapter_level:
-                            # 尝试从chapter_number推断level
-                            chapter_number = str(chapter_info.get('chapter_number', ''))
-                            if '.' in chapter_number:
-                                chapter_level = len(chapter_number.split('.'))
-                            else:
-                                chapter_level = 1
-                        
-                        heading_config = format_instructions.get('headings', {}).get(f'h{chapter_level}', {})
-                        paragraph_config = format_instructions.get('paragraph', {})
-                        default_font = format_instructions.get('default_font', {})
-                        
-                        # 构建格式要求提示词
-                        format_requirements_parts = []
-                        
-                        # 标题格式
-                        if heading_config:
-                            format_requirements_parts.append("**标题格式**：")
-                            format_requirements_parts.append(f"- 字体：{heading_config.get('font_name', '黑体')}")
-                            format_requirements_parts.append(f"- 字号：{heading_config.get('font_size_pt', 14)}磅")
-                            format_requirements_parts.append(f"- 对齐：{heading_config.get('alignment', 'left')}")
-                            format_requirements_parts.append(f"- 加粗：{'是' if heading_config.get('bold', True) else '否'}")
-                        
-                        # 段落格式
-                        if paragraph_config or default_font:
-                            format_requirements_parts.append("\n**段落格式**：")
-                            if default_font:
-                                format_requirements_parts.append(f"- 字体：{default_font.get('name', '宋体')}")
-                                format_requirements_parts.append(f"- 字号：{default_font.get('size_pt', 12)}磅")
-                            if paragraph_config:
-                                format_requirements_parts.append(f"- 行距：{paragraph_config.get('line_spacing', 1.5)}倍")
-                                format_requirements_parts.append(f"- 首行缩进：{paragraph_config.get('first_line_indent_chars', 0)}字符")
-                                format_requirements_parts.append(f"- 对齐：{paragraph_config.get('alignment', 'justify')}")
-                        
-                        # 标点符号
-                        format_requirements_parts.append("\n**标点符号**：")
-                        format_requirements_parts.append("- 中文部分使用全角标点")
-                        format_requirements_parts.append("- 英文部分使用半角标点")
-                        
-                        if format_requirements_parts:
-                            format_requirements = "\n\n" + "\n".join(format_requirements_parts) + "\n\n**重要**：请确保生成的内容符合以上格式要求。"
-                            
-                            logger.info(f"已读取格式指令，template_id: {template_id}, chapter_level: {chapter_level}")
-                except Exception as e:
-                    logger.warning(f"读取格式指令失败: {str(e)}，将使用默认格式")
-            
-            # 构建提示词
-            prompt = await cls._build_chapter_prompt(query_db, thesis_info, chapter_info, outline_context, word_count_requirement, format_requirements)
-            
+            if context is None:
+                context = await cls.build_chapter_generation_context(query_db, thesis_info, outline_context, config_id)
+
+            # 构建提示词：论文上下文、大纲和写作规范作为稳定前缀（各章节共享，可命中提示词缓存），
+            # 章节信息、小节结构、字数和格式要求作为可变后缀
+            prompt_prefix, prompt_suffix = cls._build_chapter_prompt(context, chapter_info, word_count_requirement)
+
             # 调用AI生成
-            messages = [
-                {"role": "system", "content": "你是一位专业的学术论文写作助手，擅长撰写高质量的学术论文章节内容。"},
-                {"role": "user", "content": prompt}
-            ]
-            
-            logger.info(f"开始生成章节: {chapter_info.get('chapter_title')}, 大纲上下文: {'已提供' if outline_context else '未提供'}")
+            messages = build_cached_messages(
+                "你是一位专业的学术论文写作助手，擅长撰写高质量的学术论文章节内容。",
+                prompt_prefix,
+                prompt_suffix
+            )
+
+            llm_provider = context.llm_provider
+            logger.info(f"开始生成章节: {chapter_info.get('chapter_title')}, 大纲上下文: {'已提供' if context.outline_context else '未提供'}")
             response = await llm_provider.chat(messages, temperature=0.7, max_tokens=4000)
             logger.info(f"章节生成完成，响应长度: {len(response) if response else 0}")
-            
+            if llm_provider.last_usage:
+                usage = llm_provider.last_usage
+                logger.info(
+                    f"章节生成Token用量 - 输入: {usage.prompt_tokens}（缓存命中: {usage.cached_tokens}）, "
+                    f"输出: {usage.completion_tokens}"
+                )
+
             return response
-            
+
         except ServiceException:
             raise
         except Exception as e:
@@ -1341,87 +1364,96 @@ class AiGenerationService:
             raise ServiceException(message=f'生成章节内容失败: {str(e)}')
 
     @classmethod
-    async def _build_chapter_prompt(
+    def _build_chapter_format_requirements(
         cls,
-        query_db: AsyncSession,
-        thesis_info: Dict[str, Any],
-        chapter_info: Dict[str, Any],
-        outline_context: Optional[Union[str, dict]] = None,
-        word_count_requirement: Optional[str] = None,
-        format_requirements: str = ""
+        format_instructions: Optional[Dict[str, Any]],
+        chapter_info: Dict[str, Any]
     ) -> str:
-        """构建章节生成提示词
-        
-        :param format_requirements: 格式要求（从格式指令中提取）
         """
-        import json
+        从格式指令中提取章节格式要求提示词
+
+        :param format_instructions: 格式指令
+        :param chapter_info: 章节信息
+        :return: 格式要求提示词（没有格式指令时为空字符串）
+        """
+        if not format_instructions:
+            return ""
+
+        # 提取章节格式要求
+        chapter_level = chapter_info.get('level', 1)
+        if not chapter_level:
+            # 尝试从chapter_number推断level
+            chapter_number = str(chapter_info.get('chapter_number', ''))
+            if '.' in chapter_number:
+                chapter_level = len(chapter_number.split('.'))
+            else:
+                chapter_level = 1
+
+        heading_config = format_instructions.get('headings', {}).get(f'h{chapter_level}', {})
+        paragraph_config = format_instructions.get('paragraph', {})
+        default_font = format_instructions.get('default_font', {})
+
+        # 构建格式要求提示词
+        format_requirements_parts = []
+
+        # 标题格式
+        if heading_config:
+            format_requirements_parts.append("**标题格式**：")
+            format_requirements_parts.append(f"- 字体：{heading_config.get('font_name', '黑体')}")
+            format_requirements_parts.append(f"- 字号：{heading_config.get('font_size_pt', 14)}磅")
+            format_requirements_parts.append(f"- 对齐：{heading_config.get('alignment', 'left')}")
+            format_requirements_parts.append(f"- 加粗：{'是' if heading_config.get('bold', True) else '否'}")
+
+        # 段落格式
+        if paragraph_config or default_font:
+            format_requirements_parts.append("\n**段落格式**：")
+            if default_font:
+                format_requirements_parts.append(f"- 字体：{default_font.get('name', '宋体')}")
+                format_requirements_parts.append(f"- 字号：{default_font.get('size_pt', 12)}磅")
+            if paragraph_config:
+                format_requirements_parts.append(f"- 行距：{paragraph_config.get('line_spacing', 1.5)}倍")
+                format_requirements_parts.append(f"- 首行缩进：{paragraph_config.get('first_line_indent_chars', 0)}字符")
+                format_requirements_parts.append(f"- 对齐：{paragraph_config.get('alignment', 'justify')}")
+
+        # 标点符号
+        format_requirements_parts.append("\n**标点符号**：")
+        format_requirements_parts.append("- 中文部分使用全角标点")
+        format_requirements_parts.append("- 英文部分使用半角标点")
         
+        return "\n\n" + "\n".join(format_requirements_parts) + "\n\n**重要**：请确保生成的内容符合以上格式要求。"
+
+    @classmethod
+    def _build_chapter_prompt_prefix(
+        cls,
+        thesis_info: Dict[str, Any],
+        degree_text: str,
+        outline_str: Optional[str] = None
+    ) -> str:
+        """
+        构建章节提示词的稳定前缀（同一篇论文所有章节逐字一致）
+
+        :param thesis_info: 论文信息
+        :param degree_text: 学位级别
+        :param outline_str: 渲染后的大纲上下文
+        :return: 提示词前缀
+        """
         title = thesis_info.get('title', '')
         major = thesis_info.get('major', '')
         keywords = thesis_info.get('keywords', '')
-        
-        chapter_number = chapter_info.get('chapter_number', '')
-        chapter_title = chapter_info.get('chapter_title', '')
-        sections = chapter_info.get('sections', [])
-        
-        # 从模板表获取学历（用于显示）
-        degree_text = ''
-        template_id = thesis_info.get('template_id')
-        if template_id:
-            try:
-                from module_thesis.dao.template_dao import FormatTemplateDao
-                template = await FormatTemplateDao.get_template_by_id(query_db, template_id)
-                if template and template.degree_level:
-                    degree_text = template.degree_level
-            except Exception as e:
-                logger.debug(f"从模板获取学历失败: {str(e)}")
-        
-        # 如果模板中没有学历，使用默认值
-        if not degree_text:
-            degree_text = '本科'  # 默认值
-        
-        # 如果未提供字数要求，根据目标总字数和学历（从模板表获取）计算
-        if not word_count_requirement:
-            word_count_requirement = await cls._calculate_chapter_word_count_requirement(
-                query_db, thesis_info, chapter_info, outline_context
-            )
-        
-        prompt = f"""请为以下论文撰写章节内容。
+
+        prefix = f"""请为以下论文撰写章节内容。
 
 ## 论文基本信息：
 - **论文标题**：{title}
 - **专业**：{major}
 - **学位级别**：{degree_text}
 - **关键词**：{keywords}
-
-## 章节信息：
-**第{chapter_number}章 {chapter_title}**
 """
         
-        if sections:
-            prompt += "\n## 小节结构：\n"
-            for idx, section in enumerate(sections, 1):
-                section_number = section.get('section_number', f'{chapter_number}.{idx}')
-                section_title = section.get('section_title', '')
-                content_outline = section.get('content_outline', '')
-                prompt += f"\n### {section_number} {section_title}\n"
-                if content_outline:
-                    prompt += f"**内容概要**：{content_outline}\n"
-        
-        if outline_context:
-            # 如果 outline_context 是字典，转换为 JSON 字符串
-            if isinstance(outline_context, dict):
-                outline_str = json.dumps(outline_context, ensure_ascii=False, indent=2)
-            elif isinstance(outline_context, str):
-                outline_str = outline_context
-            else:
-                outline_str = str(outline_context)
-            
-            prompt += f"\n## 论文大纲上下文（帮助理解论文整体结构）：\n{outline_str}\n"
+        if outline_str:
+            prefix += f"\n## 论文大纲上下文（帮助理解论文整体结构）：\n{outline_str}\n"
         
-        prompt += f"""
-{format_requirements}
-
+        prefix += f"""
 ## 写作要求：
 
 ### 1. 学术规范性
@@ -1431,7 +1463,7 @@ class AiGenerationService:
 - 适当引用相关文献（使用[1]、[2]等标记，如：根据研究[1]表明...）
 
 ### 2. 内容质量
-- **字数要求**：本章节总字数应达到{word_count_requirement}字
+- **字数要求**：本章节总字数应达到文末“本章任务”中给出的字数
 - 内容要充实、有深度，不能空洞
 - 逻辑清晰，论证充分
 - 每个小节至少500字
@@ -1503,49 +1535,79 @@ class AiGenerationService:
 - **必须保留section_number，不要省略编号**
 - 确保内容充实，达到字数要求
 - 使用学术语言，保持逻辑清晰
+"""
+        
+        return prefix
 
-现在请开始撰写章节内容："""
+    @classmethod
+    def _build_chapter_prompt(
+        cls,
+        context: ChapterGenerationContext,
+        chapter_info: Dict[str, Any],
+        word_count_requirement: Optional[str] = None
+    ) -> Tuple[str, str]:
+        """构建章节生成提示词
+
+        提示词拆分为稳定前缀和可变后缀：前缀只包含同一篇论文所有章节共享的内容
+        （论文信息、大纲上下文、写作与输出规范），已在生成上下文中构建好，逐字一致才能命中提供商的提示词缓存；
+        章节相关的内容全部放在后缀中。本方法不访问数据库，可以直接为任意章节调用。
+
+        :param context: 论文级章节生成上下文
+        :param chapter_info: 章节信息
+        :param word_count_requirement: 字数要求（可选，不传则使用上下文中的字数分配）
+        :return: (稳定前缀, 可变后缀) 元组
+        """
+        chapter_number = chapter_info.get('chapter_number', '')
+        chapter_title = chapter_info.get('chapter_title', '')
+        sections = chapter_info.get('sections', [])
+        word_count_requirement = word_count_requirement or context.word_count_requirement
+        try:
+            format_requirements = cls._build_chapter_format_requirements(context.format_instructions, chapter_info)
+        except Exception as e:
+            logger.warning(f"解析格式指令失败: {str(e)}，将使用默认格式")
+            format_requirements = ""
+
+        suffix = f"""
+## 本章任务：
+**第{chapter_number}章 {chapter_title}**
+- **字数要求**：本章节总字数应达到{word_count_requirement}字
+"""
         
-        return prompt
+        if sections:
+            suffix += "\n## 小节结构：\n"
+            for idx, section in enumerate(sections, 1):
+                section_number = section.get('section_number', f'{chapter_number}.{idx}')
+                section_title = section.get('section_title', '')
+                content_outline = section.get('content_outline', '')
+                suffix += f"\n### {section_number} {section_title}\n"
+                if content_outline:
+                    suffix += f"**内容概要**：{content_outline}\n"
+        
+        if format_requirements:
+            suffix += f"\n{format_requirements}\n"
+        
+        suffix += "\n现在请开始撰写章节内容："
+        
+        return context.prompt_prefix, suffix
 
     @classmethod
-    async def _calculate_chapter_word_count_requirement(
+    def _calculate_chapter_word_count_requirement(
         cls,
-        query_db: AsyncSession,
         thesis_info: Dict[str, Any],
-        chapter_info: Dict[str, Any],
+        degree_text: str,
         outline_context: Optional[Union[str, dict]] = None
     ) -> str:
         """
-        根据用户输入的目标总字数和学历（从模板表获取），结合章节数量计算每章节字数要求
-        
-        :param query_db: 数据库会话
-        :param thesis_info: 论文信息（包含total_words和template_id）
-        :param chapter_info: 章节信息
+        根据用户输入的目标总字数和学历，结合章节数量计算每章节字数要求（各章节平均分配）
+
+        :param thesis_info: 论文信息（包含total_words）
+        :param degree_text: 学位级别（从模板表获取）
         :param outline_context: 大纲上下文（用于计算章节数量）
         :return: 字数要求字符串（如：2000-3000）
         """
-        import json
-        
         # 获取目标总字数（用户输入的）
         total_words = thesis_info.get('total_words', 0)
-        template_id = thesis_info.get('template_id')
-        
-        # 从模板表获取学历
-        degree_text = ''
-        if template_id:
-            try:
-                from module_thesis.dao.template_dao import FormatTemplateDao
-                template = await FormatTemplateDao.get_template_by_id(query_db, template_id)
-                if template and template.degree_level:
-                    degree_text = template.degree_level
-            except Exception as e:
-                logger.debug(f"从模板获取学历失败: {str(e)}")
-        
-        # 如果模板中没有学历，使用默认值
-        if not degree_text:
-            degree_text = '本科'  # 默认值
-        
+
         # 计算章节数量
         chapter_count = 1
         if outline_context:
@@ -1,24 +1,28 @@
 """
 论文格式化服务 - 使用AI读取Word文档并生成格式化指令，然后进行格式化
 """
+import asyncio
+import hashlib
 import json
 import os
 import tempfile
 import time
+from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, Any, Optional, TYPE_CHECKING
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from exceptions.exception import ServiceException
-from module_thesis.dao.template_dao import UniversalInstructionSystemDao
+from module_thesis.dao.template_dao import FormatAnalysisCacheDao, UniversalInstructionSystemDao
 from module_thesis.service.ai_generation_service import AiGenerationService
+from module_thesis.utils.chapter_fragment_cache import ChapterFragmentCache
+from module_thesis.utils.format_plan import BODY_STYLE, TITLE_STYLE, FormatPlan
 from utils.log_util import logger
 
 try:
     from docx import Document
     from docx.shared import Pt, RGBColor, Inches
-    from docx.enum.text import WD_ALIGN_PARAGRAPH
     from docx.oxml.ns import qn
     DOCX_AVAILABLE = True
     # 尝试获取版本信息
@@ -47,12 +51,20 @@ except ImportError as e:
     logger.error(f"  请检查是否在正确的虚拟环境中运行，并执行: pip install python-docx")
     logger.warning(f"python-docx 未安装，Word文档处理功能将不可用。请运行: pip install python-docx。错误详情: {error_detail}")
 
+# 格式分析提示词版本，修改格式分析提示词或结果结构时需要递增，使已缓存的分析结果失效
+FORMAT_ANALYSIS_PROMPT_VERSION = 'v1'
+# 进程内缓存的格式方案数量上限
+FORMAT_PLAN_CACHE_SIZE = 32
+
 
 class FormatService:
     """
     论文格式化服务类
     """
     
+    # 格式指令内容哈希 -> 编译后的格式方案
+    _format_plan_cache: 'OrderedDict[str, FormatPlan]' = OrderedDict()
+    
     @classmethod
     async def read_word_document_with_ai(
         cls,
@@ -95,6 +107,29 @@ class FormatService:
                 message=f'模板文件格式不支持（当前格式: {file_ext}）。请使用 .docx 格式的Word文档。文件路径: {word_file_path}'
             )
         
+        # 相同内容的模板文件在提示词和指令系统未变化时直接复用已有的分析结果
+        content_hash, analysis_version = None, None
+        try:
+            content_hash = await asyncio.to_thread(cls._compute_file_sha256, word_file_path)
+            analysis_version = await cls._get_format_analysis_version(query_db)
+            cache_info = await FormatAnalysisCacheDao.get_cache(query_db, content_hash, analysis_version)
+            if cache_info:
+                await FormatAnalysisCacheDao.record_hit(query_db, cache_info.cache_id)
+                logger.info(
+                    f"[读取Word文档] 命中格式分析缓存 - 文件: {word_file_path}, "
+                    f"哈希: {content_hash[:12]}, 版本: {analysis_version}"
+                )
+                cached_result = cache_info.analysis_result
+                return {
+                    'format_instructions': cached_result['format_instructions'],
+                    'natural_language_description': cached_result['natural_language_description'],
+                    'document_text': cached_result['document_text'],
+                    'file_path': word_file_path,
+                    'from_cache': True,
+                }
+        except Exception as e:
+            logger.warning(f"[读取Word文档] 查询格式分析缓存失败，继续调用AI分析: {str(e)}")
+
         try:
             print(f"[读取Word文档] 开始处理文件: {word_file_path}")
             print(f"  开始时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -256,6 +291,19 @@ class FormatService:
             logger.info(f"  JSON格式指令长度: {inst_len} 字符")
             logger.info(f"  JSON格式指令前200字符: {inst_preview}")
             
+            if content_hash and analysis_version:
+                await cls._save_format_analysis_cache(
+                    query_db,
+                    content_hash,
+                    analysis_version,
+                    {
+                        'format_instructions': format_instructions,
+                        'natural_language_description': natural_language_description,
+                        'document_text': document_text,
+                    },
+                    os.path.getsize(word_file_path),
+                )
+            
             return {
                 'format_instructions': format_instructions,  # JSON格式指令（用于执行）
                 'natural_language_description': natural_language_description,  # 自然语言描述（用于展示）
@@ -287,6 +335,74 @@ class FormatService:
             logger.error(f"[读取Word文档] 失败: {error_type} - {error_msg}", exc_info=True)
             raise ServiceException(message=f'读取Word文档失败: {error_msg}')
     
+    @staticmethod
+    def _compute_file_sha256(file_path: str) -> str:
+        """
+        计算文件内容的SHA-256
+
+        :param file_path: 文件路径
+        :return: 十六进制哈希值
+        """
+        sha256 = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    @classmethod
+    async def _get_format_analysis_version(cls, query_db: AsyncSession) -> str:
+        """
+        获取格式分析版本（提示词版本 + 激活的指令系统ID和内容摘要）
+
+        指令系统可能被原地更新，因此以内容摘要而不是版本号标识
+
+        :param query_db: 数据库会话
+        :return: 分析版本
+        """
+        instruction_system = await UniversalInstructionSystemDao.get_active_instruction_system(query_db)
+        if not instruction_system:
+            return f'{FORMAT_ANALYSIS_PROMPT_VERSION}:simple'
+        instruction_data = instruction_system.instruction_data
+        if not isinstance(instruction_data, str):
+            instruction_data = json.dumps(instruction_data, ensure_ascii=False, sort_keys=True)
+        digest = hashlib.sha256(instruction_data.encode('utf-8')).hexdigest()[:16]
+        return f'{FORMAT_ANALYSIS_PROMPT_VERSION}:{instruction_system.id}:{digest}'
+
+    @classmethod
+    async def _save_format_analysis_cache(
+        cls,
+        query_db: AsyncSession,
+        content_hash: str,
+        analysis_version: str,
+        analysis_result: Dict[str, Any],
+        file_size: int
+    ) -> None:
+        """
+        保存格式分析结果到缓存，失败时只记录警告
+
+        :param query_db: 数据库会话
+        :param content_hash: 文件内容SHA-256
+        :param analysis_version: 分析版本
+        :param analysis_result: 分析结果
+        :param file_size: 文件大小（字节）
+        :return:
+        """
+        try:
+            saved = await FormatAnalysisCacheDao.add_cache(
+                query_db,
+                {
+                    'content_hash': content_hash,
+                    'analysis_version': analysis_version,
+                    'analysis_result': analysis_result,
+                    'file_size': file_size,
+                    'hit_count': 0,
+                },
+            )
+            if saved:
+                logger.info(f"[读取Word文档] 格式分析结果已缓存 - 哈希: {content_hash[:12]}, 版本: {analysis_version}")
+        except Exception as e:
+            logger.warning(f"[读取Word文档] 保存格式分析缓存失败: {str(e)}")
+
     @staticmethod
     def _extract_document_text(doc: Any) -> str:
         """
@@ -1472,50 +1588,9 @@ class FormatService:
             if not format_instructions:
                 raise ServiceException(message='未提供格式化指令，无法进行格式化')
             
-            # 解析格式化指令
-            logger.info(f"[格式化流程] 解析格式化指令")
-            logger.debug(f"  格式指令长度: {len(format_instructions) if format_instructions else 0} 字符")
-            try:
-                format_instruction_data = json.loads(format_instructions) if isinstance(format_instructions, str) else format_instructions
-                logger.info(f"  成功解析JSON格式指令")
-            except json.JSONDecodeError:
-                # 如果AI返回的不是纯JSON，尝试提取JSON部分
-                logger.warning(f"  JSON解析失败，尝试提取JSON部分")
-                format_instruction_data = cls._extract_json_from_text(format_instructions)
-            
-            # 从格式化指令中提取格式配置和布局规则
-            # 格式化指令可能包含 format_rules 和 layout_rules 字段，或者直接就是格式配置
-            layout_rules = {}
-            if isinstance(format_instruction_data, dict):
-                if 'format_rules' in format_instruction_data:
-                    # 新格式：格式化指令包含 format_rules
-                    format_config = format_instruction_data['format_rules']
-                    layout_rules = format_instruction_data.get('layout_rules', {})
-                    logger.info(f"  使用新格式指令（包含format_rules）")
-                    
-                    # 检查是否是优化后的新格式（包含 default_font, english_font 等）
-                    if 'default_font' in format_config or 'special_sections' in format_config:
-                        logger.info(f"  检测到优化后的新格式，转换为兼容格式")
-                        format_config, extracted_layout_rules = cls._convert_optimized_format_to_legacy(format_config)
-                        # 合并提取的布局规则
-                        if extracted_layout_rules:
-                            if not layout_rules:
-                                layout_rules = {}
-                            if 'section_spacing' not in layout_rules:
-                                layout_rules['section_spacing'] = {}
-                            layout_rules['section_spacing'].update(extracted_layout_rules.get('section_spacing', {}))
-                else:
-                    # 旧格式：直接就是格式配置
-                    format_config = format_instruction_data
-                    logger.info(f"  使用旧格式指令（直接是格式配置）")
-            else:
-                format_config = format_instruction_data
-                logger.warning(f"  格式指令不是字典类型，使用原值")
-            
-            # 验证和修正格式数据（确保格式符合标准要求）
-            logger.info(f"[格式化流程] 验证和修正格式配置")
-            format_config = cls._validate_and_fix_format_config(format_config)
-            logger.info(f"  格式配置验证完成")
+            # 获取编译后的格式方案（同一份格式指令只解析、转换、校验一次）
+            format_plan = cls._get_format_plan(format_instructions)
+            format_config = format_plan.format_config
             
             # 获取论文的所有章节（只包含已完成的章节）
             from module_thesis.dao.thesis_dao import ThesisChapterDao
@@ -1554,7 +1629,7 @@ class FormatService:
             
             # 创建格式化的Word文档（传入格式配置和布局规则）
             logger.info(f"  开始创建格式化文档...")
-            output_path = cls._create_formatted_document(chapters, format_config, thesis_id, thesis, layout_rules)
+            output_path = cls._create_formatted_document(chapters, format_plan, thesis_id, thesis)
             
             logger.info(f"[格式化流程] 论文格式化完成 - 论文ID: {thesis_id}, 输出文件: {output_path}")
             
@@ -1570,6 +1645,89 @@ class FormatService:
             logger.error(f"格式化论文失败: {str(e)}", exc_info=True)
             raise ServiceException(message=f'格式化论文失败: {str(e)}')
     
+    @classmethod
+    def _get_format_plan(cls, format_instructions: Any) -> FormatPlan:
+        """
+        获取格式指令对应的格式方案，按指令内容缓存，模板格式数据变化后自动使用新的方案
+        
+        :param format_instructions: 格式化指令（JSON字符串或字典）
+        :return: 编译后的格式方案
+        """
+        if isinstance(format_instructions, str):
+            instructions_text = format_instructions
+        else:
+            instructions_text = json.dumps(format_instructions, ensure_ascii=False, sort_keys=True)
+        plan_key = hashlib.sha256(instructions_text.encode('utf-8')).hexdigest()
+        
+        format_plan = cls._format_plan_cache.get(plan_key)
+        if format_plan is not None:
+            cls._format_plan_cache.move_to_end(plan_key)
+            logger.info(f"[格式方案] 命中已编译的格式方案: {plan_key[:12]}")
+            return format_plan
+        
+        format_plan = cls._compile_format_plan(instructions_text)
+        format_plan.plan_key = plan_key
+        cls._format_plan_cache[plan_key] = format_plan
+        while len(cls._format_plan_cache) > FORMAT_PLAN_CACHE_SIZE:
+            cls._format_plan_cache.popitem(last=False)
+        logger.info(f"[格式方案] 格式方案编译完成: {plan_key[:12]}, 样式数量: {len(format_plan.styles)}")
+        return format_plan
+    
+    @classmethod
+    def _compile_format_plan(cls, format_instructions: Any) -> FormatPlan:
+        """
+        解析格式化指令，转换为兼容格式并校验后编译为格式方案
+        
+        :param format_instructions: 格式化指令（JSON字符串或字典）
+        :return: 编译后的格式方案
+        """
+        # 解析格式化指令
+        logger.info(f"[格式方案] 解析格式化指令")
+        logger.debug(f"  格式指令长度: {len(format_instructions) if format_instructions else 0} 字符")
+        try:
+            format_instruction_data = json.loads(format_instructions) if isinstance(format_instructions, str) else format_instructions
+            logger.info(f"  成功解析JSON格式指令")
+        except json.JSONDecodeError:
+            # 如果AI返回的不是纯JSON，尝试提取JSON部分
+            logger.warning(f"  JSON解析失败，尝试提取JSON部分")
+            format_instruction_data = cls._extract_json_from_text(format_instructions)
+        
+        # 从格式化指令中提取格式配置和布局规则
+        # 格式化指令可能包含 format_rules 和 layout_rules 字段，或者直接就是格式配置
+        layout_rules = {}
+        if isinstance(format_instruction_data, dict):
+            if 'format_rules' in format_instruction_data:
+                # 新格式：格式化指令包含 format_rules
+                format_config = format_instruction_data['format_rules']
+                layout_rules = format_instruction_data.get('layout_rules', {})
+                logger.info(f"  使用新格式指令（包含format_rules）")
+                
+                # 检查是否是优化后的新格式（包含 default_font, english_font 等）
+                if 'default_font' in format_config or 'special_sections' in format_config:
+                    logger.info(f"  检测到优化后的新格式，转换为兼容格式")
+                    format_config, extracted_layout_rules = cls._convert_optimized_format_to_legacy(format_config)
+                    # 合并提取的布局规则
+                    if extracted_layout_rules:
+                        if not layout_rules:
+                            layout_rules = {}
+                        if 'section_spacing' not in layout_rules:
+                            layout_rules['section_spacing'] = {}
+                        layout_rules['section_spacing'].update(extracted_layout_rules.get('section_spacing', {}))
+            else:
+                # 旧格式：直接就是格式配置
+                format_config = format_instruction_data
+                logger.info(f"  使用旧格式指令（直接是格式配置）")
+        else:
+            format_config = format_instruction_data
+            logger.warning(f"  格式指令不是字典类型，使用原值")
+        
+        # 验证和修正格式数据（确保格式符合标准要求）
+        logger.info(f"[格式方案] 验证和修正格式配置")
+        format_config = cls._validate_and_fix_format_config(format_config)
+        logger.info(f"  格式配置验证完成")
+        
+        return FormatPlan(format_config, layout_rules)
+    
     @classmethod
     def _convert_optimized_format_to_legacy(cls, optimized_format: Dict[str, Any]) -> tuple[Dict[str, Any], Dict[str, Any]]:
         """
@@ -3187,16 +3345,18 @@ class FormatService:
     def _create_formatted_document(
         cls,
         chapters: list,
-        format_config: Dict[str, Any],
+        format_plan: FormatPlan,
         thesis_id: int,
-        thesis = None,
-        layout_rules: Dict[str, Any] = None
+        thesis = None
     ) -> str:
         """
         创建格式化的Word文档
         
+        格式方案中的样式先注册到文档，段落只引用样式名，只有首段不缩进、Markdown加粗等
+        少量差异直接设置在段落或run上
+        
         :param chapters: 章节列表（已完成状态）
-        :param format_config: 格式配置
+        :param format_plan: 编译后的格式方案
         :param thesis_id: 论文ID
         :param thesis: 论文对象（可选，用于添加标题等信息）
         :return: 输出文件路径
@@ -3216,6 +3376,8 @@ class FormatService:
             raise ServiceException(message=error_msg)
         
         try:
+            import re
+            format_config = format_plan.format_config
             logger.info(f"[格式化开始] 论文ID: {thesis_id}, 章节数量: {len(chapters)}")
             
             # 创建新文档
@@ -3238,8 +3400,6 @@ class FormatService:
             # 插入固定页面（封面、原创性声明等）
             logger.info(f"[步骤3/7] 处理固定页面")
             special_pages = format_config.get('special_pages', {})
-            logger.info(f"[步骤3/7] format_config 中 special_pages 类型: {type(special_pages).__name__}")
-            logger.info(f"[步骤3/7] format_config 中 special_pages 值: {special_pages}")
             
             if special_pages and isinstance(special_pages, dict) and len(special_pages) > 0:
                 page_types = list(special_pages.keys())
@@ -3256,7 +3416,6 @@ class FormatService:
                     if page_type in special_pages:
                         page_info = special_pages[page_type]
                         logger.info(f"[步骤3/7] 处理固定页面: {page_type}")
-                        logger.info(f"[步骤3/7]  页面信息: {page_info}")
                         
                         if not isinstance(page_info, dict):
                             logger.warning(f"[步骤3/7] ✗ 固定页面 {page_type} 的信息格式错误（不是字典），跳过")
@@ -3279,153 +3438,30 @@ class FormatService:
                         else:
                             skipped_count += 1
                             logger.warning(f"[步骤3/7]  固定页面 {page_type} 的文件路径为空，跳过")
-                    else:
-                        logger.debug(f"[步骤3/7]  固定页面 {page_type} 不在 special_pages 中，跳过")
                 
                 logger.info(f"[步骤3/7] ✓ 固定页面处理完成: 成功 {inserted_count} 个, 跳过 {skipped_count} 个, 失败 {failed_count} 个")
             else:
                 logger.info(f"[步骤3/7] ⚠ 未检测到固定页面（format_data 中没有 special_pages 字段或为空）")
             
-            # 获取格式配置
-            logger.info(f"[步骤4/7] 解析格式配置")
-            font_config = format_config.get('font', {})
-            
-            # 优先从format_rules读取配置（新格式），如果没有则从旧格式读取
-            headings_config = {}
-            if 'format_rules' in format_config:
-                format_rules = format_config['format_rules']
-                # 优先从format_rules.headings读取标题配置
-                if 'headings' in format_rules:
-                    headings_config = format_rules['headings']
-                    logger.info(f"  从format_rules.headings读取标题配置")
-                # 如果没有，尝试从旧格式读取
-                elif 'headings' in format_config:
-                    headings_config = format_config.get('headings', {})
-                    logger.info(f"  从旧格式headings读取标题配置")
-            else:
-                # 旧格式：直接从format_config读取
-                headings_config = format_config.get('headings', {})
-                logger.info(f"  从旧格式headings读取标题配置")
-            
-            # 设置默认字体（优先从format_rules.default_font读取，如果没有则从font读取）
-            default_font_name = '宋体'
-            default_font_size_pt = 12
-            
-            # 优先从format_rules.default_font读取（新格式）
-            if 'format_rules' in format_config:
-                format_rules = format_config['format_rules']
-                if 'default_font' in format_rules:
-                    default_font_config = format_rules['default_font']
-                    default_font_name = default_font_config.get('name', font_config.get('name', '宋体'))
-                    default_font_size_pt = default_font_config.get('size_pt', font_config.get('size', 12))
-                    logger.info(f"  从format_rules.default_font读取默认字体: {default_font_name}, {default_font_size_pt}磅")
-                elif font_config:
-                    default_font_name = font_config.get('name', '宋体')
-                    default_font_size_pt = font_config.get('size', 12)
-                    logger.info(f"  从font配置读取默认字体: {default_font_name}, {default_font_size_pt}磅")
-            elif font_config:
-                default_font_name = font_config.get('name', '宋体')
-                default_font_size_pt = font_config.get('size', 12)
-                logger.info(f"  从font配置读取默认字体: {default_font_name}, {default_font_size_pt}磅")
-            else:
-                logger.warning(f"  未找到字体配置，使用默认值: {default_font_name}, {default_font_size_pt}磅")
-            
-            # 优先从format_rules.paragraph读取段落配置（新格式）
-            para_config = {}
-            if 'format_rules' in format_config:
-                format_rules = format_config['format_rules']
-                if 'paragraph' in format_rules:
-                    para_config = format_rules['paragraph']
-                    logger.info(f"  从format_rules.paragraph读取段落配置")
-                elif 'paragraph' in format_config:
-                    # 如果format_rules中没有，尝试从旧格式读取
-                    para_config = format_config.get('paragraph', {})
-                    logger.info(f"  从旧格式paragraph读取段落配置")
-            elif 'paragraph' in format_config:
-                # 旧格式：直接从format_config读取
-                para_config = format_config.get('paragraph', {})
-                logger.info(f"  从旧格式paragraph读取段落配置")
-            
-            # 记录标题配置信息
-            if headings_config:
-                h1_info = headings_config.get('h1', {})
-                h2_info = headings_config.get('h2', {})
-                h3_info = headings_config.get('h3', {})
-                logger.info(f"  标题配置: h1={h1_info.get('font_name', 'N/A')} {h1_info.get('font_size_pt', h1_info.get('font_size', 'N/A'))}磅, h2={h2_info.get('font_name', 'N/A')} {h2_info.get('font_size_pt', h2_info.get('font_size', 'N/A'))}磅, h3={h3_info.get('font_name', 'N/A')} {h3_info.get('font_size_pt', h3_info.get('font_size', 'N/A'))}磅")
-            else:
+            # 注册格式方案中的样式（包括Normal样式的默认字体）
+            logger.info(f"[步骤4/7] 注册格式样式")
+            format_plan.register_styles(doc)
+            logger.info(f"  ✓ 已注册 {len(format_plan.styles)} 个样式，默认字体: {format_plan.default_font_name}, {format_plan.default_font_size_pt}磅")
+            if not format_plan.headings_config:
                 logger.warning(f"  ⚠ 未找到标题配置（headings_config为空），标题格式可能使用默认值")
             
-            # 优先从format_rules.special_sections读取特殊章节配置（新格式）
-            special_sections_config = {}
-            if 'format_rules' in format_config:
-                format_rules = format_config['format_rules']
-                if 'special_sections' in format_rules:
-                    special_sections_config = format_rules['special_sections']
-                    logger.info(f"  从format_rules.special_sections读取特殊章节配置")
-                elif 'special_sections' in format_config:
-                    # 如果format_rules中没有，尝试从旧格式读取
-                    special_sections_config = format_config.get('special_sections', {})
-                    logger.info(f"  从旧格式special_sections读取特殊章节配置")
-            elif 'special_sections' in format_config:
-                # 旧格式：直接从format_config读取
-                special_sections_config = format_config.get('special_sections', {})
-                logger.info(f"  从旧格式special_sections读取特殊章节配置")
-            
-            # 记录段落配置信息
-            if para_config:
-                logger.info(f"  段落配置: 行距={para_config.get('line_spacing', 1.5)}, 首行缩进={para_config.get('first_line_indent_chars', para_config.get('first_line_indent', 2))}字符, 对齐={para_config.get('alignment', 'justify')}")
-            else:
-                logger.warning(f"  ⚠ 未找到段落配置（para_config为空），段落格式可能使用默认值")
-            
-            # 记录特殊章节配置信息
-            if special_sections_config:
-                for section_type in ['conclusion', 'table_of_contents', 'references', 'acknowledgement']:
-                    if section_type in special_sections_config:
-                        section_config = special_sections_config[section_type]
-                        title_font = section_config.get('title_font', 'N/A')
-                        title_size = section_config.get('title_size_pt', section_config.get('title_size', 'N/A'))
-                        logger.info(f"  特殊章节配置 {section_type}: 标题字体={title_font}, 标题字号={title_size}磅")
-            else:
-                logger.warning(f"  ⚠ 未找到特殊章节配置（special_sections_config为空），特殊章节格式可能使用默认值")
-            
-            default_font_size = Pt(default_font_size_pt)
-            
-            # 设置文档级别的默认字体（通过Normal样式）
-            try:
-                from docx.oxml.ns import qn
-                normal_style = doc.styles['Normal']
-                normal_style.font.name = default_font_name
-                normal_style.font.size = default_font_size
-                normal_style._element.rPr.rFonts.set(qn('w:eastAsia'), default_font_name)  # 设置中文字体
-                logger.info(f"  ✓ 已设置文档默认字体（Normal样式）: {default_font_name}, {default_font_size_pt}磅")
-            except Exception as e:
-                logger.warning(f"  设置文档默认字体失败: {str(e)}，将继续为每个段落单独设置字体")
-            
-            logger.info(f"  默认字体: {default_font_name}, 字号: {default_font_size_pt}磅")
-            
-            # 获取布局规则
-            if layout_rules is None:
-                layout_rules = {}
-            
-            title_spacing = layout_rules.get('title_spacing', {})
-            heading_spacing = layout_rules.get('heading_spacing', {})
-            chapter_spacing = layout_rules.get('chapter_spacing', {})
-            section_spacing = layout_rules.get('section_spacing', {})
-            paragraph_spacing = layout_rules.get('paragraph_spacing', {})
-            logger.info(f"  布局规则: 标题后空行={title_spacing.get('after_title', 1)}, 章节间距={chapter_spacing.get('between_chapters', 'page_break')}")
+            chapter_spacing = format_plan.chapter_spacing
+            special_section_format_rules = format_plan.special_section_format_rules
+            number_style = format_plan.number_style
+            logger.info(f"  布局规则: 标题后空行={format_plan.title_spacing.get('after_title', 1)}, 章节间距={chapter_spacing.get('between_chapters', 'page_break')}")
             
             # 添加论文标题（如果有）
             if thesis and thesis.title:
                 logger.info(f"[步骤5/7] 添加论文标题: {thesis.title}")
-                title_para = doc.add_paragraph()
-                title_run = title_para.add_run(thesis.title)
-                title_run.font.name = default_font_name
-                title_run.font.size = Pt(18)  # 标题字体稍大
-                title_run.font.bold = True
-                title_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
+                doc.add_paragraph(thesis.title, style=TITLE_STYLE)
                 
                 # 应用标题后的空行规则
-                after_title_lines = title_spacing.get('after_title', 1)
+                after_title_lines = format_plan.title_spacing.get('after_title', 1)
                 for _ in range(after_title_lines):
                     doc.add_paragraph()
                 logger.info(f"  标题后添加 {after_title_lines} 个空行")
@@ -3438,15 +3474,11 @@ class FormatService:
                 for ch in chapters
             )
             
-            # 从格式配置中读取是否自动生成目录
-            application_rules = format_config.get('application_rules', {})
-            should_generate_toc = application_rules.get('auto_generate_toc', False)
-            
             # 如果需要生成目录且没有目录章节，则自动生成
-            if should_generate_toc and not has_toc_chapter:
+            if format_plan.auto_generate_toc and not has_toc_chapter:
                 logger.info(f"[步骤6/7] 检测到需要自动生成目录")
                 try:
-                    toc_chapter = cls._generate_table_of_contents(chapters, format_config, layout_rules)
+                    toc_chapter = cls._generate_table_of_contents(chapters, format_config, format_plan.layout_rules)
                     if toc_chapter and hasattr(toc_chapter, 'toc_entries') and len(toc_chapter.toc_entries) > 0:
                         # 将目录插入到第一个位置（在摘要之前）
                         chapters.insert(0, toc_chapter)
@@ -3458,44 +3490,9 @@ class FormatService:
             chapters = sorted(chapters, key=lambda x: getattr(x, 'order_num', 0) if hasattr(x, 'order_num') else 0)
             logger.info(f"[步骤7/7] 开始处理章节内容，共 {len(chapters)} 个章节")
             
-            # 获取章节编号格式配置
-            application_rules = format_config.get('application_rules', {})
-            chapter_numbering_format = application_rules.get('chapter_numbering_format', {})
-            level_1_format = chapter_numbering_format.get('level_1', {})
-            numbering_pattern = level_1_format.get('pattern', '{number} {title}')
-            number_style = level_1_format.get('number_style', 'arabic')
-            
-            # 获取特殊章节格式规则（用于判断哪些章节应该有编号）
-            special_section_format_rules = application_rules.get('special_section_format_rules', {})
-            
-            # 如果缺失，提供默认值（所有特殊章节默认不应有编号）
-            if not special_section_format_rules:
-                logger.warning("    警告: format_data 中缺少 'special_section_format_rules'，使用默认值（所有特殊章节不应有编号）")
-                special_section_format_rules = {
-                    'abstract': {'should_have_numbering': False},
-                    'keywords': {'should_have_numbering': False},
-                    'conclusion': {'should_have_numbering': False},
-                    'references': {'should_have_numbering': False},
-                    'acknowledgement': {'should_have_numbering': False},
-                    'appendix': {'should_have_numbering': False},
-                    'table_of_contents': {'should_have_numbering': False}
-                }
-            
-            # 获取文档结构顺序（用于区分前置部分、正文部分、后置部分）
-            document_structure = application_rules.get('document_structure', {})
-            section_order = document_structure.get('section_order', [])
-            required_sections = document_structure.get('required_sections', [])
-            optional_sections = document_structure.get('optional_sections', [])
-            
-            # 前置部分（Front Matter）：封面、目录、摘要、关键词等
-            front_matter_sections = ['封面', '诚信声明', '目录', '中文题目', '摘要', '关键词']
-            # 后置部分（Back Matter）：参考文献、致谢、附录等
-            back_matter_sections = ['参考文献', '致谢', '附录']
-            
             # 统计正文章节的编号（只对正文部分编号）
             body_chapter_index = 0
-            # 标记是否已经进入正文部分
-            in_body_section = False
+            fragment_cache = ChapterFragmentCache(thesis_id)
             
             # 遍历章节，添加内容
             for idx, chapter in enumerate(chapters):
@@ -3503,27 +3500,17 @@ class FormatService:
                     logger.warning(f"  章节 {idx+1}: {chapter.title} - 内容为空，跳过")
                     continue
                 
-                # 首先根据章节标题的编号格式确定章节级别（如果level未设置）
+                # 先根据标题编号确定章节级别（在清理编号之前，因为需要从编号中提取级别）
+                # 格式：1 → level 1, 1.1 → level 2, 1.1.1 → level 3
                 if not hasattr(chapter, 'level') or chapter.level is None:
-                    # 从标题编号中提取级别
-                    # 格式：1 → level 1, 1.1 → level 2, 1.1.1 → level 3
-                    import re
                     title = chapter.title if chapter.title else ''
-                    
-                    # 匹配编号格式
-                    if re.match(r'^\d+\.\d+\.\d+', title):  # 1.1.1 格式 → level 3
+                    if re.match(r'^\d+\.\d+\.\d+', title):
                         chapter.level = 3
-                        logger.info(f"  根据编号格式确定章节级别: {title} → level 3")
-                    elif re.match(r'^\d+\.\d+', title):  # 1.1 格式 → level 2
+                    elif re.match(r'^\d+\.\d+', title):
                         chapter.level = 2
-                        logger.info(f"  根据编号格式确定章节级别: {title} → level 2")
-                    elif re.match(r'^\d+', title):  # 1 格式 → level 1
-                        chapter.level = 1
-                        logger.info(f"  根据编号格式确定章节级别: {title} → level 1")
                     else:
-                        # 默认级别为1
                         chapter.level = 1
-                        logger.debug(f"  使用默认级别: {title} → level 1")
+                    logger.debug(f"  根据编号格式确定章节级别: {title} → level {chapter.level}")
                 
                 logger.info(f"  处理章节 {idx+1}/{len(chapters)}: {chapter.title} (级别: {chapter.level})")
                 
@@ -3565,9 +3552,6 @@ class FormatService:
                     is_back_matter = True
                 elif any(fm in chapter.title for fm in ['封面', '诚信声明', '中文题目']):
                     is_front_matter = True
-                else:
-                    # 普通正文章节
-                    in_body_section = True
                 
                 # 特殊章节需要另起页（除了第一个章节）
                 if is_special_chapter and idx > 0:
@@ -3578,41 +3562,13 @@ class FormatService:
                     between_chapters = chapter_spacing.get('between_chapters', 'page_break')
                     if between_chapters == 'page_break':
                         doc.add_page_break()
-                        logger.debug(f"    章节之间添加分页符")
                     elif isinstance(between_chapters, int) and between_chapters > 0:
                         for _ in range(between_chapters):
                             doc.add_paragraph()
-                        logger.debug(f"    章节之间添加 {between_chapters} 个空行")
                 
                 # 章节开始前的空行
-                before_chapter = chapter_spacing.get('before_chapter', 0)
-                for _ in range(before_chapter):
+                for _ in range(chapter_spacing.get('before_chapter', 0)):
                     doc.add_paragraph()
-                if before_chapter > 0:
-                    logger.debug(f"    章节前添加 {before_chapter} 个空行")
-                
-                # 处理章节标题
-                # 0. 先根据标题编号确定章节级别（在清理编号之前，因为需要从编号中提取级别）
-                import re
-                original_title = chapter.title if chapter.title else ''
-                
-                # 如果level未设置，从标题编号中提取级别
-                if not hasattr(chapter, 'level') or chapter.level is None:
-                    # 从标题编号中提取级别
-                    # 格式：1 → level 1, 1.1 → level 2, 1.1.1 → level 3
-                    if re.match(r'^\d+\.\d+\.\d+', original_title):  # 1.1.1 格式 → level 3
-                        chapter.level = 3
-                        logger.info(f"    根据编号格式确定章节级别: {original_title} → level 3")
-                    elif re.match(r'^\d+\.\d+', original_title):  # 1.1 格式 → level 2
-                        chapter.level = 2
-                        logger.info(f"    根据编号格式确定章节级别: {original_title} → level 2")
-                    elif re.match(r'^\d+', original_title):  # 1 格式 → level 1
-                        chapter.level = 1
-                        logger.info(f"    根据编号格式确定章节级别: {original_title} → level 1")
-                    else:
-                        # 默认级别为1
-                        chapter.level = 1
-                        logger.debug(f"    使用默认级别: {original_title} → level 1")
                 
                 # 1. 移除可能存在的编号前缀（在确定级别之后清理编号）
                 original_title_before_clean = chapter.title
@@ -3620,694 +3576,92 @@ class FormatService:
                 # 移除中文编号（如"第一章 XXX" -> "XXX"）
                 chapter.title = re.sub(r'^第[一二三四五六七八九十]+章\s*', '', chapter.title)
                 # 移除阿拉伯数字编号（如"1 XXX"、"1. XXX"、"1、XXX"、"1.1 XXX"、"1.1.1 XXX" -> "XXX"）
-                # 注意：需要匹配数字后跟空格、点号、顿号等，但也要匹配数字后直接跟中文字符的情况
                 chapter.title = re.sub(r'^\d+\.\d+\.\d+\s+', '', chapter.title)  # 1.1.1 格式
                 chapter.title = re.sub(r'^\d+\.\d+\s+', '', chapter.title)  # 1.1 格式
                 chapter.title = re.sub(r'^\d+[\.\s、]+\s*', '', chapter.title)  # 数字+分隔符+空格
-                chapter.title = re.sub(r'^\d+\s+', '', chapter.title)  # 数字+空格（单独处理，确保匹配"1 目录"这种情况）
+                chapter.title = re.sub(r'^\d+\s+', '', chapter.title)  # 数字+空格（确保匹配"1 目录"这种情况）
                 chapter.title = chapter.title.strip()
                 
                 if chapter.title != original_title_before_clean:
                     logger.info(f"    清理标题编号: {original_title_before_clean} -> {chapter.title}")
                 
-                # 1. 如果是特殊章节，确保标题格式正确
-                if is_special_chapter:
-                    if special_chapter_type == 'conclusion':
-                        # 结论标题必须是"结　　论"（两个全角空格）
-                        if chapter.title != '结　　论' and '结论' in chapter.title:
-                            chapter.title = '结　　论'
-                            logger.info(f"    修正结论标题格式: {chapter.title}")
-                    elif special_chapter_type == 'table_of_contents':
-                        # 目录标题必须是"目　　录"（两个全角空格）
-                        if chapter.title != '目　　录' and '目录' in chapter.title:
-                            chapter.title = '目　　录'
-                            logger.info(f"    修正目录标题格式: {chapter.title}")
+                # 特殊章节确保标题格式正确
+                if special_chapter_type == 'conclusion':
+                    # 结论标题必须是"结　　论"（两个全角空格）
+                    if chapter.title != '结　　论' and '结论' in chapter.title:
+                        chapter.title = '结　　论'
+                elif special_chapter_type == 'table_of_contents':
+                    # 目录标题必须是"目　　录"（两个全角空格）
+                    if chapter.title != '目　　录' and '目录' in chapter.title:
+                        chapter.title = '目　　录'
                 
                 # 2. 判断章节是否应该有编号
-                should_have_numbering = False
-                
                 if is_front_matter or is_back_matter:
                     # 前置部分和后置部分默认不应有编号
                     should_have_numbering = False
-                    logger.info(f"    章节 '{chapter.title}' 属于{'前置' if is_front_matter else '后置'}部分，不应有编号")
                 elif is_special_chapter:
                     # 特殊章节根据配置判断是否应该有编号
                     special_rule = special_section_format_rules.get(special_chapter_type, {})
                     should_have_numbering = special_rule.get('should_have_numbering', False)
-                    logger.info(f"    特殊章节 '{chapter.title}' ({special_chapter_type}) should_have_numbering: {should_have_numbering}")
                 else:
                     # 普通正文章节应该有编号
                     should_have_numbering = True
-                    logger.info(f"    普通正文章节 '{chapter.title}' 应该有编号")
                 
-                # 3. 如果需要编号，添加编号
+                # 3. 如果需要编号，添加编号（标题中的旧编号已在上面清理）
                 if should_have_numbering:
-                    # 增加编号索引（无论是普通章节还是特殊章节，只要需要编号就增加）
                     body_chapter_index += 1
-                    
-                    # 检查标题是否已经包含编号，如果包含则先移除
-                    import re
-                    original_title = chapter.title
-                    title_has_number = False
-                    
-                    if number_style == 'arabic':
-                        # 检查是否以数字开头（如"1 XXX"、"1. XXX"、"1、XXX"）
-                        if re.match(r'^\d+[\.\s、]', chapter.title):
-                            title_has_number = True
-                            # 移除数字编号
-                            chapter.title = re.sub(r'^\d+[\.\s、]+', '', chapter.title).strip()
-                    elif number_style == 'chinese':
-                        # 检查是否以"第X章"开头
-                        if re.match(r'^第[一二三四五六七八九十]+章', chapter.title):
-                            title_has_number = True
-                            # 移除中文编号
-                            chapter.title = re.sub(r'^第[一二三四五六七八九十]+章\s+', '', chapter.title).strip()
-                    
-                    if title_has_number:
-                        logger.info(f"    移除旧编号: {original_title} -> {chapter.title}")
-                    
-                    # 添加新编号（无论之前是否有编号，都需要添加正确的新编号）
-                    if number_style == 'arabic':
-                        # 阿拉伯数字格式：1 XXX
-                        formatted_number = str(body_chapter_index)
-                        chapter.title = f"{formatted_number} {chapter.title}"
-                    elif number_style == 'chinese':
+                    if number_style == 'chinese':
                         # 中文格式：第一章 XXX
-                        chinese_num = cls._number_to_chinese(body_chapter_index)
-                        chapter.title = f"第{chinese_num}章 {chapter.title}"
+                        chapter.title = f"第{cls._number_to_chinese(body_chapter_index)}章 {chapter.title}"
                     else:
-                        # 默认使用阿拉伯数字
+                        # 阿拉伯数字格式：1 XXX
                         chapter.title = f"{body_chapter_index} {chapter.title}"
                     logger.info(f"    为章节添加编号: {chapter.title}")
-                else:
-                    # 不应该有编号，标题已经在前面清理过了，这里只需要确认
-                    # 再次检查确保没有编号（双重保险）
-                    import re
-                    original_title = chapter.title
-                    
-                    # 再次移除可能残留的编号（双重保险）
-                    chapter.title = re.sub(r'^第[一二三四五六七八九十]+章\s*', '', chapter.title)
-                    chapter.title = re.sub(r'^\d+[\.\s、]+\s*', '', chapter.title)
-                    chapter.title = re.sub(r'^\d+\s+', '', chapter.title)  # 单独处理"数字+空格"的情况
-                    chapter.title = chapter.title.strip()
-                    
-                    if chapter.title != original_title:
-                        logger.info(f"    二次清理编号: {original_title} -> {chapter.title}")
-                    else:
-                        logger.debug(f"    章节标题无需编号: {chapter.title}")
                 
                 # 添加章节标题
-                title_para = doc.add_paragraph()
-                title_run = title_para.add_run(chapter.title)
-                title_run.bold = True
-                
-                # 应用标题格式
-                # 优先从special_sections读取特殊章节的标题格式，否则从headings读取普通章节格式
-                font_size_pt = None
-                font_name = None
-                bold = True
-                title_alignment = 'left'
-                
-                # 特殊章节的间距配置（用于后续应用）
-                special_title_spacing_before = None
-                special_title_spacing_after = None
-                
-                if is_special_chapter and special_chapter_type and special_sections_config:
-                    # 特殊章节：从format_rules.special_sections.{type}读取
-                    section_config = special_sections_config.get(special_chapter_type, {})
-                    if section_config:
-                        # 读取标题字体和字号
-                        font_name = section_config.get('title_font')
-                        font_size_pt = section_config.get('title_size_pt') or section_config.get('title_size')
-                        bold = section_config.get('title_bold', True)
-                        title_alignment = section_config.get('title_alignment', 'center')
-                        # 读取标题间距
-                        special_title_spacing_before = section_config.get('title_spacing_before_pt')
-                        special_title_spacing_after = section_config.get('title_spacing_after_pt')
-                        logger.info(f"    从special_sections.{special_chapter_type}读取特殊章节标题格式: {font_name} {font_size_pt}磅, 对齐={title_alignment}, 前间距={special_title_spacing_before}磅, 后间距={special_title_spacing_after}磅")
-                
-                # 如果不是特殊章节或特殊章节配置不完整，从headings读取
-                if font_size_pt is None or not font_name:
-                    # 普通章节：从headings读取（根据章节级别）
-                    chapter_level = chapter.level if hasattr(chapter, 'level') else 1
-                    level_key = f'h{chapter_level}'
-                    
-                    if headings_config and level_key in headings_config:
-                        heading_style = headings_config[level_key]
-                        
-                        # 读取字体大小（支持 font_size_pt 和 font_size 两种字段名）
-                        font_size_pt = heading_style.get('font_size_pt') or heading_style.get('font_size')
-                        if font_size_pt is None:
-                            logger.error(f"    标题格式配置中缺少字体大小（font_size_pt 或 font_size），级别: {level_key}")
-                            raise ValueError(f"标题格式配置不完整：级别 {level_key} 缺少字体大小")
-                        
-                        # 读取字体名称（必须从配置中读取）
-                        font_name = heading_style.get('font_name')
-                        if not font_name:
-                            logger.error(f"    标题格式配置中缺少字体名称（font_name），级别: {level_key}")
-                            raise ValueError(f"标题格式配置不完整：级别 {level_key} 缺少字体名称")
-                        
-                        # 读取加粗状态（默认为True，但优先使用配置值）
-                        bold = heading_style.get('bold', True)
-                        title_alignment = heading_style.get('alignment', 'left')
-                        
-                        logger.info(f"    从headings.{level_key}读取普通章节标题格式: {font_name} {font_size_pt}磅, 对齐={title_alignment}")
-                    else:
-                        logger.error(f"    未找到级别 {chapter_level} 的标题格式配置（headings.{level_key}）")
-                        raise ValueError(f"标题格式配置缺失：未找到级别 {chapter_level} 的配置（headings.{level_key}）")
-                
-                # 应用标题格式（无论从special_sections还是headings读取）
-                if font_size_pt is None or not font_name:
-                    logger.error(f"    标题格式配置不完整：字体大小或字体名称为空")
-                    raise ValueError(f"标题格式配置不完整：字体大小或字体名称为空")
-                
-                title_run.font.size = Pt(font_size_pt)
-                title_run.font.name = font_name
-                title_run.font.bold = bold
-                
-                # 设置中文字体
-                try:
-                    from docx.oxml.ns import qn
-                    title_run._element.rPr.rFonts.set(qn('w:eastAsia'), font_name)
-                except:
-                    pass
-                
-                logger.info(f"    应用标题格式: {font_name} {font_size_pt}磅, 加粗={bold}, 对齐={title_alignment}")
-                
-                # 设置标题对齐（title_alignment已在上面从配置中读取）
-                if title_alignment == 'center':
-                    title_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                elif title_alignment == 'right':
-                    title_para.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+                # 特殊章节优先使用special_sections中的标题样式，否则按章节级别使用标题样式
+                chapter_level = chapter.level if chapter.level else 1
+                level_key = f'h{chapter_level}'
+                title_style = None
+                if is_special_chapter and format_plan.has_style(FormatPlan.special_title_style(special_chapter_type)):
+                    title_style = FormatPlan.special_title_style(special_chapter_type)
+                elif not format_plan.has_style(FormatPlan.heading_style(chapter_level)):
+                    logger.error(f"    未找到级别 {chapter_level} 的标题格式配置（headings.{level_key}）")
+                    raise ValueError(f"标题格式配置缺失：未找到级别 {chapter_level} 的配置（headings.{level_key}）")
+                elif chapter_level in format_plan.incomplete_headings:
+                    logger.error(f"    标题格式配置中缺少字体大小或字体名称，级别: {level_key}")
+                    raise ValueError(f"标题格式配置不完整：级别 {level_key} 缺少字体大小或字体名称")
                 else:
-                    title_para.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                
-                # 设置标题段间距（从格式指令中获取）
-                # 优先使用特殊章节的间距配置，否则使用headings的间距配置
-                if special_title_spacing_before is not None:
-                    title_para.paragraph_format.space_before = Pt(special_title_spacing_before)
-                    logger.info(f"    应用特殊章节标题前间距: {special_title_spacing_before}磅")
-                elif headings_config and level_key in headings_config:
-                    heading_style = headings_config[level_key]
-                    if 'spacing_before_pt' in heading_style:
-                        title_para.paragraph_format.space_before = Pt(heading_style['spacing_before_pt'])
-                    elif 'spacing_before' in heading_style:
-                        title_para.paragraph_format.space_before = Pt(heading_style['spacing_before'])
-                
-                if special_title_spacing_after is not None:
-                    title_para.paragraph_format.space_after = Pt(special_title_spacing_after)
-                    logger.info(f"    应用特殊章节标题后间距: {special_title_spacing_after}磅")
-                elif headings_config and level_key in headings_config:
-                    heading_style = headings_config[level_key]
-                    if 'spacing_after_pt' in heading_style:
-                        title_para.paragraph_format.space_after = Pt(heading_style['spacing_after_pt'])
-                    elif 'spacing_after' in heading_style:
-                        title_para.paragraph_format.space_after = Pt(heading_style['spacing_after'])
-                
-                # 应用标题后的空行规则（从layout_rules中获取）
-                heading_spacing_config = heading_spacing.get(level_key, {})
-                after_heading_lines = heading_spacing_config.get('after', 1)  # 默认空1行
-                for _ in range(after_heading_lines):
-                    doc.add_paragraph()
-                if after_heading_lines > 0:
-                    logger.debug(f"    标题后添加 {after_heading_lines} 个空行")
-                
-                # 获取特殊格式配置
-                special_formats = format_config.get('special_formats', {})
+                    title_style = FormatPlan.heading_style(chapter_level)
+                # 如果是自动生成的目录章节，生成目录内容
+                if special_chapter_type == 'table_of_contents' and getattr(chapter, 'is_toc', False) and hasattr(chapter, 'toc_entries'):
+                    toc_content_lines = []
+                    for entry in chapter.toc_entries:
+                        # 根据级别添加缩进，格式：标题 ... 页码
+                        indent = '  ' * (entry.get('level', 1) - 1)
+                        page_num = entry.get('page_number', '')
+                        title = entry.get('title', '')
+                        toc_content_lines.append(f"{indent}{title} ... {page_num}" if page_num else f"{indent}{title}")
+                    chapter.content = '\n'.join(toc_content_lines)
+                    logger.info(f"    目录内容已生成，共 {len(toc_content_lines)} 行")
                 
-                # 使用前面已经识别的章节类型（避免重复识别）
-                # is_special_section 和 special_type 已经在前面设置
-                
-                # 如果是目录章节，生成目录内容
-                if is_special_chapter and special_chapter_type == 'table_of_contents':
-                    logger.info(f"    处理目录章节")
-                    
-                    # 如果是自动生成的目录章节，生成目录内容
-                    if hasattr(chapter, 'is_toc') and chapter.is_toc and hasattr(chapter, 'toc_entries'):
-                        logger.info(f"    生成目录内容，共 {len(chapter.toc_entries)} 个条目")
-                        # 生成目录内容（Markdown格式）
-                        toc_content_lines = []
-                        for entry in chapter.toc_entries:
-                            level = entry.get('level', 1)
-                            title = entry.get('title', '')
-                            page_num = entry.get('page_number', '')
-                            
-                            # 根据级别添加缩进
-                            indent = '  ' * (level - 1)
-                            
-                            # 生成目录行（格式：标题 ... 页码）
-                            if page_num:
-                                toc_line = f"{indent}{title} ... {page_num}"
-                            else:
-                                toc_line = f"{indent}{title}"
-                            
-                            toc_content_lines.append(toc_line)
-                        
-                        # 将生成的目录内容赋值给章节内容
-                        chapter.content = '\n'.join(toc_content_lines)
-                        logger.info(f"    目录内容已生成，共 {len(toc_content_lines)} 行")
-                
-                # 设置 is_special_section 和 special_type 用于后续格式应用
-                is_special_section = is_special_chapter
-                special_type = special_chapter_type
-                
-                # 应用特殊章节前的布局规则（在标题之前）
-                if is_special_section and special_type in section_spacing:
-                    section_spacing_config = section_spacing[special_type]
-                    before_section = section_spacing_config.get('before', 0)
-                    # 注意：这里需要在标题之前添加空行，但标题已经添加了，所以这里先记录，稍后处理
-                    # 实际上，特殊章节的before应该在章节开始前处理，已在chapter_spacing中处理
-                
-                # 处理章节内容（支持Markdown格式）
-                content_lines = chapter.content.split('\n')
-                total_lines = len(content_lines)
-                logger.info(f"    开始处理章节内容，共 {total_lines} 行")
-                current_heading_level = None
-                is_first_line = True  # 用于识别特殊章节的第一行（可能是标题）
-                
-                # 如果是目录章节，记录需要在第一行（目录标题）前后添加的空行数
-                toc_title_before_lines = 0
-                toc_title_after_lines = 0
-                if is_special_section and special_type == 'table_of_contents':
-                    toc_spacing_config = section_spacing.get('table_of_contents', {})
-                    toc_title_before_lines = toc_spacing_config.get('title_before', 0)
-                    toc_title_after_lines = toc_spacing_config.get('title_after', 0)
-                    if toc_title_before_lines > 0 or toc_title_after_lines > 0:
-                        logger.info(f"    目录标题空行规则: 前{toc_title_before_lines}行, 后{toc_title_after_lines}行")
-                
-                processed_lines = 0
-                markdown_headings_count = 0
-                paragraphs_count = 0
-                
-                for line_num, line in enumerate(content_lines, 1):
-                    line = line.strip()
-                    if not line:
-                        # 空行
-                        doc.add_paragraph()
-                        continue
-                    
-                    processed_lines += 1
-                    
-                    # 如果是目录章节的第一行，且需要添加标题前的空行
-                    if is_special_section and special_type == 'table_of_contents' and is_first_line and toc_title_before_lines > 0:
-                        for _ in range(toc_title_before_lines):
-                            doc.add_paragraph()
-                        logger.debug(f"      第{line_num}行前: 添加目录标题前空行 {toc_title_before_lines} 行")
-                    
-                    # 检测Markdown标题（## 或 ###）
-                    if line.startswith('##'):
-                            # 二级标题
-                        markdown_headings_count += 1
-                        heading_text = line.lstrip('#').strip()
-                        logger.debug(f"      第{line_num}行: Markdown二级标题 - {heading_text}")
-                        heading_para = doc.add_paragraph()
-                        heading_run = heading_para.add_run(heading_text)
-                        
-                        # 应用标题格式（使用h2配置，必须从配置中读取）
-                        if headings_config and 'h2' in headings_config:
-                            h2_style = headings_config['h2']
-                            
-                            # 读取字体大小（支持 font_size_pt 和 font_size 两种字段名）
-                            font_size_pt = h2_style.get('font_size_pt') or h2_style.get('font_size')
-                            if font_size_pt is None:
-                                logger.warning(f"      二级标题格式配置中缺少字体大小，使用默认值14磅")
-                                font_size_pt = 14
-                            
-                            # 读取字体名称（必须从配置中读取）
-                            font_name = h2_style.get('font_name')
-                            if not font_name:
-                                logger.warning(f"      二级标题格式配置中缺少字体名称，使用默认值'黑体'")
-                                font_name = '黑体'
-                            
-                            # 读取加粗状态
-                            bold = h2_style.get('bold', True)
-                            
-                            heading_run.font.size = Pt(font_size_pt)
-                            heading_run.font.name = font_name
-                            heading_run.font.bold = bold
-                            
-                            # 设置中文字体
-                            try:
-                                from docx.oxml.ns import qn
-                                heading_run._element.rPr.rFonts.set(qn('w:eastAsia'), font_name)
-                            except:
-                                pass
-                            
-                            # 设置段间距（支持 spacing_before_pt 和 spacing_before 两种字段名）
-                            if 'spacing_before_pt' in h2_style:
-                                heading_para.paragraph_format.space_before = Pt(h2_style['spacing_before_pt'])
-                            elif 'spacing_before' in h2_style:
-                                heading_para.paragraph_format.space_before = Pt(h2_style['spacing_before'])
-                            if 'spacing_after_pt' in h2_style:
-                                heading_para.paragraph_format.space_after = Pt(h2_style['spacing_after_pt'])
-                            elif 'spacing_after' in h2_style:
-                                heading_para.paragraph_format.space_after = Pt(h2_style['spacing_after'])
-                            
-                            # 设置对齐方式
-                            alignment = h2_style.get('alignment', 'left')
-                            if alignment == 'center':
-                                heading_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                            elif alignment == 'right':
-                                heading_para.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-                            else:
-                                heading_para.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                        else:
-                            logger.error(f"      未找到二级标题格式配置（headings.h2）")
-                            raise ValueError("标题格式配置缺失：未找到二级标题配置（headings.h2）")
-                        
-                        # 应用二级标题后的空行规则（从layout_rules中获取）
-                        h2_spacing_config = heading_spacing.get('h2', {})
-                        after_h2_lines = h2_spacing_config.get('after', 0)  # 默认不空行
-                        for _ in range(after_h2_lines):
-                            doc.add_paragraph()
-                        continue
-                    elif line.startswith('###'):
-                        # 三级标题
-                        markdown_headings_count += 1
-                        heading_text = line.lstrip('#').strip()
-                        logger.debug(f"      第{line_num}行: Markdown三级标题 - {heading_text}")
-                        heading_para = doc.add_paragraph()
-                        heading_run = heading_para.add_run(heading_text)
-                        
-                        # 应用标题格式（使用h3配置，必须从配置中读取）
-                        if headings_config and 'h3' in headings_config:
-                            h3_style = headings_config['h3']
-                            
-                            # 读取字体大小（支持 font_size_pt 和 font_size 两种字段名）
-                            font_size_pt = h3_style.get('font_size_pt') or h3_style.get('font_size')
-                            if font_size_pt is None:
-                                logger.warning(f"      三级标题格式配置中缺少字体大小，使用默认值12磅")
-                                font_size_pt = 12
-                            
-                            # 读取字体名称（必须从配置中读取）
-                            font_name = h3_style.get('font_name')
-                            if not font_name:
-                                logger.warning(f"      三级标题格式配置中缺少字体名称，使用默认值'黑体'")
-                                font_name = '黑体'
-                            
-                            # 读取加粗状态
-                            bold = h3_style.get('bold', True)
-                            
-                            heading_run.font.size = Pt(font_size_pt)
-                            heading_run.font.name = font_name
-                            heading_run.font.bold = bold
-                            
-                            # 设置中文字体
-                            try:
-                                from docx.oxml.ns import qn
-                                heading_run._element.rPr.rFonts.set(qn('w:eastAsia'), font_name)
-                            except:
-                                pass
-                            
-                            # 设置段间距（支持 spacing_before_pt 和 spacing_before 两种字段名）
-                            if 'spacing_before_pt' in h3_style:
-                                heading_para.paragraph_format.space_before = Pt(h3_style['spacing_before_pt'])
-                            elif 'spacing_before' in h3_style:
-                                heading_para.paragraph_format.space_before = Pt(h3_style['spacing_before'])
-                            if 'spacing_after_pt' in h3_style:
-                                heading_para.paragraph_format.space_after = Pt(h3_style['spacing_after_pt'])
-                            elif 'spacing_after' in h3_style:
-                                heading_para.paragraph_format.space_after = Pt(h3_style['spacing_after'])
-                            
-                            # 设置对齐方式
-                            alignment = h3_style.get('alignment', 'left')
-                            if alignment == 'center':
-                                heading_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                            elif alignment == 'right':
-                                heading_para.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-                            else:
-                                heading_para.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                        else:
-                            logger.error(f"      未找到三级标题格式配置（headings.h3）")
-                            raise ValueError("标题格式配置缺失：未找到三级标题配置（headings.h3）")
-                        
-                        # 应用三级标题后的空行规则（从layout_rules中获取）
-                        h3_spacing_config = heading_spacing.get('h3', {})
-                        after_h3_lines = h3_spacing_config.get('after', 0)  # 默认不空行
-                        for _ in range(after_h3_lines):
-                            doc.add_paragraph()
-                        continue
-                    
-                    # 处理普通段落（支持Markdown加粗）
-                    paragraphs_count += 1
-                    if paragraphs_count % 10 == 0:  # 每10个段落记录一次进度
-                        logger.debug(f"      已处理 {paragraphs_count} 个段落 ({processed_lines}/{total_lines} 行)")
-                    
-                    para = doc.add_paragraph()
-                    
-                    # 处理Markdown加粗（**文本**）
-                    import re
-                    parts = re.split(r'(\*\*.*?\*\*)', line)
-                    has_bold = any(part.startswith('**') and part.endswith('**') for part in parts)
-                    if has_bold:
-                        logger.debug(f"      第{line_num}行: 包含Markdown加粗文本")
-                    for part in parts:
-                        if part.startswith('**') and part.endswith('**'):
-                            # 加粗文本
-                            bold_text = part.strip('*')
-                            run = para.add_run(bold_text)
-                            run.font.name = default_font_name
-                            run.font.size = default_font_size
-                            run.font.bold = True
-                            # 设置中文字体
-                            try:
-                                from docx.oxml.ns import qn
-                                run._element.rPr.rFonts.set(qn('w:eastAsia'), default_font_name)
-                            except:
-                                pass
-                        elif part.strip():
-                            # 普通文本
-                            run = para.add_run(part)
-                            run.font.name = default_font_name
-                            run.font.size = default_font_size
-                            # 设置中文字体
-                            try:
-                                from docx.oxml.ns import qn
-                                run._element.rPr.rFonts.set(qn('w:eastAsia'), default_font_name)
-                            except:
-                                pass
-                    
-                    # 应用特殊格式（如果是特殊章节）
-                    if is_special_section and special_type in special_formats:
-                        special_format = special_formats[special_type]
-                        
-                        # 检查是否是标题行（第一行且较短，可能是标题）
-                        if is_first_line and len(line) < 50:
-                            # 应用标题格式
-                            if 'title_format' in special_format:
-                                title_format = special_format['title_format']
-                                for run in para.runs:
-                                    run.font.name = title_format.get('font_name', '黑体')
-                                    run.font.size = Pt(title_format.get('font_size', 15))
-                                    run.font.bold = title_format.get('bold', True)
-                                
-                                alignment = title_format.get('alignment', 'center')
-                                if alignment == 'center':
-                                    para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                                elif alignment == 'right':
-                                    para.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-                                else:
-                                    para.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                                
-                                # 如果是目录标题，应用标题后的空行规则
-                                if special_type == 'table_of_contents' and toc_title_after_lines > 0:
-                                    for _ in range(toc_title_after_lines):
-                                        doc.add_paragraph()
-                                    logger.info(f"      第{line_num}行后: 目录标题后添加 {toc_title_after_lines} 个空行")
-                            is_first_line = False
-                        else:
-                            # 应用内容格式
-                            if 'content_format' in special_format:
-                                content_format = special_format['content_format']
-                                for run in para.runs:
-                                    run.font.name = content_format.get('font_name', '宋体')
-                                    run.font.size = Pt(content_format.get('font_size', 12))
-                                
-                                if 'line_spacing' in content_format:
-                                    para.paragraph_format.line_spacing = content_format['line_spacing']
-                            elif 'font_name' in special_format:  # 关键词等简单格式
-                                for run in para.runs:
-                                    run.font.name = special_format.get('font_name', '宋体')
-                                    run.font.size = Pt(special_format.get('font_size', 12))
-                                
-                                if 'line_spacing' in special_format:
-                                    para.paragraph_format.line_spacing = special_format['line_spacing']
-                            
-                            # 目录条目格式应用（支持多级目录格式）
-                            # 注意：这段代码需要在 if/elif 块外，确保无论走哪个分支都能执行
-                            if special_type == 'table_of_contents':
-                                # 检查是否有level_formats（多级目录格式）
-                                level_formats = special_format.get('level_formats', {})
-                                
-                                # 判断当前行的目录级别（通过内容特征）
-                                # 一级目录：如"一、绪论"、"1 绪论"、"一 、绪论"（注意空格）
-                                # 二级目录：如"（一）"、"1.1"、"（一）"
-                                # 三级目录：如"1.1.1"
-                                import re
-                                line_text = line.strip()
-                                toc_level = 1  # 默认一级
-                                
-                                # 判断目录级别（更精确的匹配）
-                                if re.match(r'^[一二三四五六七八九十]+[、．\s]', line_text) or re.match(r'^\d+[、．\s]', line_text):
-                                    # 一级目录（中文编号或数字编号开头，可能有空格）
-                                    toc_level = 1
-                                elif re.match(r'^[（(][一二三四五六七八九十]+[）)]', line_text) or re.match(r'^\d+\.\d+', line_text):
-                                    # 二级目录（（一）或1.1格式）
-                                    toc_level = 2
-                                elif re.match(r'^\d+\.\d+\.\d+', line_text):
-                                    # 三级目录（1.1.1格式）
-                                    toc_level = 3
-                                
-                                # 应用对应级别的目录格式（优先级：level_formats > entry_format）
-                                level_key = f'level{toc_level}'
-                                applied_format = None
-                                
-                                if level_formats and level_key in level_formats:
-                                    # 使用对应级别的格式
-                                    applied_format = level_formats[level_key]
-                                    logger.debug(f"      第{line_num}行: 应用目录格式 - 级别{toc_level}, 字体={applied_format.get('font_name', 'N/A')}, 字号={applied_format.get('font_size', 'N/A')}磅")
-                                elif 'entry_format' in special_format:
-                                    # 使用通用目录条目格式
-                                    applied_format = special_format['entry_format']
-                                    logger.debug(f"      第{line_num}行: 应用目录通用格式 - 字体={applied_format.get('font_name', 'N/A')}, 字号={applied_format.get('font_size', 'N/A')}磅")
-                                
-                                if applied_format:
-                                    # 应用字体格式
-                                    for run in para.runs:
-                                        if 'font_name' in applied_format:
-                                            run.font.name = applied_format['font_name']
-                                        if 'font_size' in applied_format:
-                                            run.font.size = Pt(applied_format['font_size'])
-                                    
-                                    # 应用缩进（level_formats中有indent字段）
-                                    if 'indent' in applied_format:
-                                        para.paragraph_format.left_indent = Pt(applied_format['indent'])
-                                    
-                                    # 应用行距
-                                    if 'line_spacing' in applied_format:
-                                        para.paragraph_format.line_spacing = applied_format['line_spacing']
-                                    
-                                    # 应用对齐方式
-                                    alignment = applied_format.get('alignment', 'justify')
-                                    if alignment == 'justify':
-                                        para.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-                                    elif alignment == 'center':
-                                        para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                                    elif alignment == 'right':
-                                        para.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-                                    else:
-                                        para.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                                    
-                                    # 应用段间距
-                                    if 'spacing_before' in applied_format:
-                                        para.paragraph_format.space_before = Pt(applied_format['spacing_before'])
-                                    if 'spacing_after' in applied_format:
-                                        para.paragraph_format.space_after = Pt(applied_format['spacing_after'])
-                            is_first_line = False
-                    else:
-                        # 应用普通段落格式
-                        alignment = para_config.get('alignment', 'left')
-                        if alignment == 'center':
-                            para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                        elif alignment == 'right':
-                            para.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-                        elif alignment == 'justify':
-                            para.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-                        else:
-                            para.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                        
-                        # 确保段落中的所有runs都应用了默认字体（防止出现默认字体）
-                        for run in para.runs:
-                            if not run.font.name or run.font.name in ['ＭＳ 明朝', 'MS Mincho', 'Calibri', 'Times New Roman']:
-                                run.font.name = default_font_name
-                                run.font.size = default_font_size
-                                # 设置中文字体
-                                try:
-                                    from docx.oxml.ns import qn
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), default_font_name)
-                                except:
-                                    pass
-                        
-                        # 设置行距
-                        if 'line_spacing' in para_config:
-                            line_spacing_value = para_config['line_spacing']
-                            if isinstance(line_spacing_value, (int, float)):
-                                para.paragraph_format.line_spacing = line_spacing_value
-                            elif isinstance(line_spacing_value, str):
-                                try:
-                                    para.paragraph_format.line_spacing = float(line_spacing_value)
-                                except ValueError:
-                                    para.paragraph_format.line_spacing = 1.5
-                        
-                        # 设置段间距
-                        if 'spacing_before' in para_config:
-                            para.paragraph_format.space_before = Pt(para_config['spacing_before'])
-                        if 'spacing_after' in para_config:
-                            para.paragraph_format.space_after = Pt(para_config['spacing_after'])
-                    
-                    # 设置段落对齐方式（从para_config读取）
-                    if 'alignment' in para_config:
-                        alignment = para_config['alignment']
-                        if alignment == 'justify':
-                            para.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-                        elif alignment == 'center':
-                            para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                        elif alignment == 'right':
-                            para.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-                        elif alignment == 'left':
-                            para.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                        else:
-                            para.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY  # 默认两端对齐
-                    
-                    # 设置首行缩进
-                    # 优先从first_line_indent_chars读取（字符数），如果没有则从first_line_indent读取（磅值）
-                    is_first_para = (line == content_lines[0].strip() if content_lines else False)
-                    first_para_indent = paragraph_spacing.get('first_paragraph_indent', True)
-                    
-                    if 'first_line_indent_chars' in para_config:
-                        # 字符数转换为磅值：1字符 ≈ 12磅（假设12磅字体）
-                        indent_chars = para_config['first_line_indent_chars']
-                        if isinstance(indent_chars, (int, float)):
-                            # 如果首段不需要缩进，且这是首段，则不缩进
-                            if is_first_para and not first_para_indent:
-                                para.paragraph_format.first_line_indent = Pt(0)
-                            else:
-                                # 字符数转换为磅值：1字符 ≈ 12磅（基于默认字体大小）
-                                indent_pt = indent_chars * default_font_size_pt
-                                para.paragraph_format.first_line_indent = Pt(indent_pt)
-                                logger.debug(f"      第{line_num}行: 应用首行缩进 {indent_chars}字符（{indent_pt}磅）")
-                    elif 'first_line_indent' in para_config:
-                        # 如果首段不需要缩进，且这是首段，则不缩进
-                        if is_first_para and not first_para_indent:
-                            para.paragraph_format.first_line_indent = Pt(0)
-                        else:
-                            para.paragraph_format.first_line_indent = Pt(para_config['first_line_indent'])
-                    
-                    # 段落之间的空行处理
-                    if not is_first_para:
-                        between_paragraphs = paragraph_spacing.get('between_paragraphs', 0)
-                        if between_paragraphs > 0:
-                            # 在段落之间添加空行（已在循环外通过doc.add_paragraph()处理）
-                            pass
-                
-                # 应用特殊章节后的布局规则
-                if is_special_section and special_type in section_spacing:
-                    section_spacing_config = section_spacing[special_type]
-                    after_section = section_spacing_config.get('after', 0)
-                    for _ in range(after_section):
-                        doc.add_paragraph()
-                    if after_section > 0:
-                        logger.debug(f"    特殊章节后添加 {after_section} 个空行")
-                
-                # 章节结束后的空行
-                after_chapter = chapter_spacing.get('after_chapter', 0)
-                for _ in range(after_chapter):
-                    doc.add_paragraph()
-                if after_chapter > 0:
-                    logger.debug(f"    章节后添加 {after_chapter} 个空行")
-                
-                logger.info(f"    章节 {idx+1} 处理完成: 处理了 {processed_lines} 行内容, {paragraphs_count} 个段落, {markdown_headings_count} 个Markdown标题")
+                # 标题和正文按片段缓存：格式方案、最终标题、样式和内容都未变化时直接复用已渲染的片段
+                fragment_key = fragment_cache.key(
+                    format_plan.plan_key, chapter.title, title_style, special_chapter_type, chapter_level, chapter.content
+                )
+                if fragment_cache.restore(doc, fragment_key):
+                    logger.info(f"    章节 {idx+1} 未变化，复用已渲染的片段")
+                    continue
+                fragment_start = fragment_cache.mark(doc)
+                paragraphs_count, markdown_headings_count = cls._render_chapter_body(
+                    doc, format_plan, chapter, title_style, special_chapter_type, level_key
+                )
+                fragment_cache.capture(doc, fragment_start, fragment_key)
+                logger.info(f"    章节 {idx+1} 处理完成: {paragraphs_count} 个段落, {markdown_headings_count} 个Markdown标题")
         
+            fragment_cache.prune()
+            logger.info(f"  章节片段: 复用 {fragment_cache.hits} 个, 重新渲染 {fragment_cache.misses} 个")
+            
             # 保存文档
             logger.info(f"[步骤6/6] 保存格式化文档")
             output_dir = Path('uploads/thesis/formatted')
@@ -4352,6 +3706,127 @@ class FormatService:
             logger.error(f"创建格式化文档时发生错误: {str(e)}", exc_info=True)
             raise ServiceException(message=f'创建格式化文档失败: {str(e)}')
     
+    @classmethod
+    def _render_chapter_body(
+        cls,
+        doc: Any,
+        format_plan: FormatPlan,
+        chapter: Any,
+        title_style: str,
+        special_chapter_type: Optional[str],
+        level_key: str
+    ) -> tuple[int, int]:
+        """
+        渲染章节标题和正文（Markdown标题、加粗、特殊章节格式和章节后的空行）
+        
+        :param doc: python-docx Document对象
+        :param format_plan: 编译后的格式方案
+        :param chapter: 章节对象（标题已完成编号处理）
+        :param title_style: 章节标题样式名
+        :param special_chapter_type: 特殊章节类型，普通章节为None
+        :param level_key: 标题级别键（h1/h2/h3）
+        :return: (段落数, Markdown标题数)
+        """
+        import re
+        
+        doc.add_paragraph(chapter.title, style=title_style)
+        logger.info(f"    应用标题样式: {title_style}")
+        
+        # 应用标题后的空行规则（从layout_rules中获取）
+        for _ in range(format_plan.heading_spacing.get(level_key, {}).get('after', 1)):
+            doc.add_paragraph()
+        
+        special_format = format_plan.special_formats.get(special_chapter_type) if special_chapter_type else None
+        lead_style = FormatPlan.special_lead_style(special_chapter_type) if special_format else None
+        content_style = BODY_STYLE
+        if special_format and format_plan.has_style(FormatPlan.special_content_style(special_chapter_type)):
+            content_style = FormatPlan.special_content_style(special_chapter_type)
+        
+        # 目录标题前后的空行
+        toc_title_before_lines = 0
+        toc_title_after_lines = 0
+        if special_chapter_type == 'table_of_contents':
+            toc_spacing_config = format_plan.section_spacing.get('table_of_contents', {})
+            toc_title_before_lines = toc_spacing_config.get('title_before', 0)
+            toc_title_after_lines = toc_spacing_config.get('title_after', 0)
+        
+        # 处理章节内容（支持Markdown格式）
+        content_lines = chapter.content.split('\n')
+        first_content_line = content_lines[0].strip() if content_lines else ''
+        is_first_line = True  # 用于识别特殊章节的第一行（可能是标题）
+        paragraphs_count = 0
+        markdown_headings_count = 0
+        
+        for line in content_lines:
+            line = line.strip()
+            if not line:
+                # 空行
+                doc.add_paragraph()
+                continue
+            
+            # 如果是目录章节的第一行，添加目录标题前的空行
+            if is_first_line and toc_title_before_lines > 0:
+                for _ in range(toc_title_before_lines):
+                    doc.add_paragraph()
+            
+            # 检测Markdown标题（## 或 ###）
+            if line.startswith('##'):
+                heading_level = 3 if line.startswith('###') else 2
+                if not format_plan.has_style(FormatPlan.heading_style(heading_level)):
+                    logger.error(f"      未找到标题格式配置（headings.h{heading_level}）")
+                    raise ValueError(f"标题格式配置缺失：未找到{'三' if heading_level == 3 else '二'}级标题配置（headings.h{heading_level}）")
+                markdown_headings_count += 1
+                doc.add_paragraph(line.lstrip('#').strip(), style=FormatPlan.heading_style(heading_level))
+                # 应用标题后的空行规则（从layout_rules中获取，默认不空行）
+                for _ in range(format_plan.heading_spacing.get(f'h{heading_level}', {}).get('after', 0)):
+                    doc.add_paragraph()
+                continue
+            
+            # 处理普通段落（支持Markdown加粗）
+            paragraphs_count += 1
+            if special_format is not None and is_first_line and len(line) < 50 and format_plan.has_style(lead_style):
+                paragraph_style = lead_style
+            elif special_chapter_type == 'table_of_contents' and not is_first_line:
+                # 判断目录级别：一级如"一、绪论"、"1 绪论"，二级如"（一）"、"1.1"，三级如"1.1.1"
+                toc_level = 1
+                if re.match(r'^[一二三四五六七八九十]+[、．\s]', line) or re.match(r'^\d+[、．\s]', line):
+                    toc_level = 1
+                elif re.match(r'^[（(][一二三四五六七八九十]+[）)]', line) or re.match(r'^\d+\.\d+', line):
+                    toc_level = 2
+                elif re.match(r'^\d+\.\d+\.\d+', line):
+                    toc_level = 3
+                toc_style = FormatPlan.toc_style(toc_level)
+                paragraph_style = toc_style if format_plan.has_style(toc_style) else content_style
+            else:
+                paragraph_style = content_style
+            
+            para = doc.add_paragraph(style=paragraph_style)
+            for part in re.split(r'(\*\*.*?\*\*)', line):
+                if part.startswith('**') and part.endswith('**'):
+                    para.add_run(part.strip('*')).bold = True
+                elif part.strip():
+                    para.add_run(part)
+            
+            # 首段不缩进时只覆盖首段的首行缩进
+            if not format_plan.paragraph_spacing.get('first_paragraph_indent', True) and line == first_content_line:
+                para.paragraph_format.first_line_indent = Pt(0)
+            
+            if paragraph_style == lead_style and toc_title_after_lines > 0:
+                for _ in range(toc_title_after_lines):
+                    doc.add_paragraph()
+            is_first_line = False
+        
+        # 应用特殊章节后的布局规则
+        if special_chapter_type and special_chapter_type in format_plan.section_spacing:
+            for _ in range(format_plan.section_spacing[special_chapter_type].get('after', 0)):
+                doc.add_paragraph()
+        
+        # 章节结束后的空行
+        for _ in range(format_plan.chapter_spacing.get('after_chapter', 0)):
+            doc.add_paragraph()
+        
+        return paragraphs_count, markdown_headings_count
+    
     @classmethod
     def _generate_table_of_contents(
         cls,
@@ -758,9 +758,10 @@ class MemberService:
         :param end_time: 结束时间
         :return: 使用总量
         """
-        return await QuotaRecordDao.get_usage_statistics(
+        statistics = await QuotaRecordDao.get_usage_statistics(
             query_db, user_id, feature_type, start_time, end_time
         )
+        return statistics['total_usage'] - statistics['refund_usage']
 
 
     # ==================== 用户会员详细管理 ====================
@@ -6,6 +6,7 @@ from datetime import datetime
 from decimal import Decimal
 import uuid
 
+from redis import asyncio as aioredis
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from common.vo import CrudResponseModel, PageModel
@@ -21,6 +22,7 @@ from module_thesis.entity.vo import (
     DeductQuotaModel,
 )
 from module_thesis.service.member_service import MemberService
+from module_thesis.service.statistics_service import StatisticsService
 from utils.common_util import CamelCaseUtil
 
 
@@ -304,7 +306,8 @@ class OrderService:
         query_db: AsyncSession,
         user_id: int = None,
         start_date: datetime = None,
-        end_date: datetime = None
+        end_date: datetime = None,
+        redis: aioredis.Redis = None
     ) -> dict:
         """
         获取订单统计
@@ -313,9 +316,15 @@ class OrderService:
         :param user_id: 用户ID（可选）
         :param start_date: 开始日期（可选）
         :param end_date: 结束日期（可选）
+        :param redis: redis对象（可选，传入时短时缓存统计结果）
         :return: 统计信息
         """
-        return await OrderDao.get_order_statistics(query_db, user_id, start_date, end_date)
+        return await StatisticsService.get_cached(
+            redis,
+            'order',
+            {'user_id': user_id, 'start_date': start_date, 'end_date': end_date},
+            lambda: OrderDao.get_order_statistics(query_db, user_id, start_date, end_date),
+        )
 
     # ==================== 功能服务管理 ====================
 
@@ -5,16 +5,20 @@ from typing import Dict, Optional, List
 from decimal import Decimal
 from datetime import datetime
 
+from redis import asyncio as aioredis
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from exceptions.exception import ServiceException
 from module_thesis.dao import PaymentConfigDao, PaymentTransactionDao
+from module_thesis.entity.do.payment_do import PaymentTransaction
 from module_thesis.payment.base_provider import PaymentProvider
 from module_thesis.payment.pingpp_provider import PingppProvider
 from module_thesis.payment.alipay_provider import AlipayProvider
 from module_thesis.payment.wechat_provider import WechatProvider
+from module_thesis.service.statistics_service import StatisticsService
 from utils.log_util import logger
 from utils.config_crypto import ConfigCrypto
+from utils.near_cache_util import NearCacheUtil
 from utils.sensitive_filter import mask_sensitive_data
 
 
@@ -28,6 +32,66 @@ class PaymentGatewayService:
         'wechat': WechatProvider
     }
     
+    # 已初始化提供商的近端缓存命名空间（配置更新后经Redis广播失效，各worker同时丢弃）
+    PROVIDER_CACHE_NAMESPACE = 'payment_provider'
+    ENABLED_CONFIGS_CACHE_KEY = '__enabled__'
+    
+    @classmethod
+    async def _load_enabled_configs(cls, query_db: AsyncSession) -> List[Dict]:
+        """
+        读取启用的支付配置摘要（不含密钥），按优先级从高到低排序
+        
+        :param query_db: 数据库会话
+        :return: 配置摘要列表
+        """
+        configs = await PaymentConfigDao.get_enabled_configs(query_db)
+        return [
+            {
+                'provider_type': config.provider_type,
+                'provider_name': config.provider_name,
+                'supported_channels': list(config.supported_channels or []),
+                'priority': config.priority,
+                'fee_rate': float(config.fee_rate)
+            }
+            for config in sorted(configs, key=lambda x: x.priority, reverse=True)
+        ]
+    
+    @classmethod
+    async def _load_provider(cls, query_db: AsyncSession, provider_type: str) -> PaymentProvider:
+        """
+        读取并解密配置，初始化支付提供商（解析密钥证书、创建SDK客户端）
+        
+        :param query_db: 数据库会话
+        :param provider_type: 提供商类型
+        :return: 支付提供商实例
+        """
+        config = await PaymentConfigDao.get_config_by_type(query_db, provider_type)
+        if not config or config.is_enabled != '1':
+            raise ServiceException(message=f'支付提供商{provider_type}未启用')
+        
+        # 解密配置
+        try:
+            decrypted_config = ConfigCrypto.decrypt_dict(config.config_data)
+        except Exception as e:
+            logger.error(f'解密支付配置失败: {str(e)}')
+            # 如果解密失败，尝试使用原始配置（可能未加密）
+            decrypted_config = config.config_data
+        
+        # 创建提供商实例
+        provider_class = cls.PROVIDER_MAP.get(config.provider_type)
+        if not provider_class:
+            raise ServiceException(message=f'不支持的支付提供商: {config.provider_type}')
+        
+        try:
+            provider = provider_class(decrypted_config)
+        except ServiceException as e:
+            raise e
+        except Exception as e:
+            logger.error(f'初始化支付提供商失败: {str(e)}')
+            raise ServiceException(message='初始化支付提供商失败，请检查配置')
+        logger.info(f'初始化支付提供商: {provider_type}')
+        return provider
+    
     @classmethod
     async def get_provider(
         cls,
@@ -38,55 +102,50 @@ class PaymentGatewayService:
         """
         获取支付提供商
         
+        已初始化的提供商实例（及其SDK客户端）按提供商类型缓存复用，
+        配置变更时由invalidate_providers使缓存失效
+        
         :param query_db: 数据库会话
         :param provider_type: 指定提供商类型（可选）
         :param channel: 支付渠道（用于自动选择提供商）
         :return: (支付提供商实例, 提供商类型)
         """
-        if provider_type:
-            # 指定提供商
-            config = await PaymentConfigDao.get_config_by_type(query_db, provider_type)
-            if not config or config.is_enabled != '1':
-                raise ServiceException(message=f'支付提供商{provider_type}未启用')
-        else:
+        if not provider_type:
             # 自动选择：根据渠道和优先级
-            configs = await PaymentConfigDao.get_enabled_configs(query_db)
+            configs = await NearCacheUtil.get_or_load(
+                cls.PROVIDER_CACHE_NAMESPACE,
+                cls.ENABLED_CONFIGS_CACHE_KEY,
+                lambda: cls._load_enabled_configs(query_db)
+            )
             
             if not configs:
                 raise ServiceException(message='没有可用的支付提供商')
             
             # 如果指定了渠道，筛选支持该渠道的提供商
             if channel:
-                configs = [c for c in configs if channel in c.supported_channels]
+                configs = [c for c in configs if channel in c['supported_channels']]
                 if not configs:
                     raise ServiceException(message=f'没有支持{channel}渠道的支付提供商')
             
-            # 按优先级排序，选择第一个
-            configs = sorted(configs, key=lambda x: x.priority, reverse=True)
-            config = configs[0]
-            provider_type = config.provider_type
+            # 已按优先级排序，选择第一个
+            provider_type = configs[0]['provider_type']
         
-        # 解密配置
-        try:
-            decrypted_config = ConfigCrypto.decrypt_dict(config.config_data)
-        except Exception as e:
-            logger.error(f'解密支付配置失败: {str(e)}')
-            # 如果解密失败，尝试使用原始配置（可能未加密）
-            decrypted_config = config.config_data
-        
-        # 创建提供商实例
-        provider_class = cls.PROVIDER_MAP.get(config.provider_type)
-        if not provider_class:
-            raise ServiceException(message=f'不支持的支付提供商: {config.provider_type}')
+        provider = await NearCacheUtil.get_or_load(
+            cls.PROVIDER_CACHE_NAMESPACE,
+            provider_type,
+            lambda: cls._load_provider(query_db, provider_type)
+        )
+        return provider, provider_type
+    
+    @classmethod
+    async def invalidate_providers(cls, redis: aioredis.Redis) -> None:
+        """
+        支付配置变更后使所有worker缓存的提供商实例失效
         
-        try:
-            provider = provider_class(decrypted_config)
-            return provider, provider_type
-        except ServiceException as e:
-            raise e
-        except Exception as e:
-            logger.error(f'初始化支付提供商失败: {str(e)}')
-            raise ServiceException(message='初始化支付提供商失败，请检查配置')
+        :param redis: redis对象
+        :return:
+        """
+        await NearCacheUtil.publish_invalidation(redis, cls.PROVIDER_CACHE_NAMESPACE)
     
     @classmethod
     async def create_payment(
@@ -156,6 +215,9 @@ class PaymentGatewayService:
                 'create_time': datetime.now()
             }
             await PaymentTransactionDao.add_transaction(query_db, transaction_data)
+            await StatisticsService.record_transaction_created(
+                query_db, transaction_data['create_time'], amount, transaction_data['fee_amount'], 'pending'
+            )
             await query_db.commit()
             
             logger.info(f'创建支付成功: order_no={order_no}, provider={actual_provider_type}, channel={channel}')
@@ -190,13 +252,14 @@ class PaymentGatewayService:
             
             # 更新流水状态
             if result.get('paid'):
-                await PaymentTransactionDao.update_transaction_status(
+                previous = await PaymentTransactionDao.update_transaction_status(
                     query_db,
                     payment_id,
                     'success',
                     result.get('transaction_no'),
                     datetime.now()
                 )
+                await StatisticsService.record_status_change(query_db, previous, 'success')
                 await query_db.commit()
             
             return result
@@ -204,6 +267,31 @@ class PaymentGatewayService:
             logger.error(f'查询支付失败: {str(e)}')
             raise ServiceException(message=f'查询支付失败: {str(e)}')
     
+    @classmethod
+    async def sync_transaction_status(cls, query_db: AsyncSession, transaction_id: int) -> Optional[PaymentTransaction]:
+        """
+        从支付平台同步流水状态（状态变化同步累加到日统计）
+
+        :param query_db: 数据库会话
+        :param transaction_id: 流水ID
+        :return: 同步后的流水对象，流水不存在时返回None
+        """
+        transaction = await PaymentTransactionDao.get_transaction_by_id(query_db, transaction_id)
+        if not transaction:
+            return None
+
+        # 已支付时query_payment会更新为成功状态；交易已关闭或支付失败时标记为失败（只处理待支付的流水）
+        result = await cls.query_payment(query_db, transaction.payment_id, transaction.provider_type)
+        if not result.get('paid') and result.get('failed') and transaction.status == 'pending':
+            previous = await PaymentTransactionDao.update_transaction_status(
+                query_db, transaction.payment_id, 'failed'
+            )
+            await StatisticsService.record_status_change(query_db, previous, 'failed')
+            await query_db.commit()
+
+        await query_db.refresh(transaction)
+        return transaction
+
     @classmethod
     async def create_refund(
         cls,
@@ -229,12 +317,13 @@ class PaymentGatewayService:
             
             # 更新流水状态
             if result.get('succeed'):
-                await PaymentTransactionDao.update_transaction_status(
+                previous = await PaymentTransactionDao.update_transaction_status(
                     query_db,
                     payment_id,
                     'refunded',
                     refund_time=datetime.now()
                 )
+                await StatisticsService.record_status_change(query_db, previous, 'refunded')
                 await query_db.commit()
             
             logger.info(f'创建退款成功: payment_id={payment_id}, amount={amount}')
@@ -253,7 +342,11 @@ class PaymentGatewayService:
         :param query_db: 数据库会话
         :return: 支付渠道列表
         """
-        configs = await PaymentConfigDao.get_enabled_configs(query_db)
+        configs = await NearCacheUtil.get_or_load(
+            cls.PROVIDER_CACHE_NAMESPACE,
+            cls.ENABLED_CONFIGS_CACHE_KEY,
+            lambda: cls._load_enabled_configs(query_db)
+        )
         
         channels = []
         channel_map = {
@@ -271,16 +364,16 @@ class PaymentGatewayService:
         
         seen_channels = set()
         for config in configs:
-            for channel in config.supported_channels:
+            for channel in config['supported_channels']:
                 if channel not in seen_channels:
                     channel_info = channel_map.get(channel, {'name': channel, 'icon': 'payment'})
                     channels.append({
                         'channel': channel,
                         'name': channel_info['name'],
                         'icon': channel_info['icon'],
-                        'provider': config.provider_name,
-                        'provider_type': config.provider_type,
-                        'fee_rate': float(config.fee_rate)
+                        'provider': config['provider_name'],
+                        'provider_type': config['provider_type'],
+                        'fee_rate': config['fee_rate']
                     })
                     seen_channels.add(channel)
         
@@ -316,7 +409,8 @@ class PaymentGatewayService:
         cls,
         query_db: AsyncSession,
         config_id: int,
-        is_enabled: str
+        is_enabled: str,
+        redis: aioredis.Redis = None
     ):
         """
         更新配置状态
@@ -324,10 +418,13 @@ class PaymentGatewayService:
         :param query_db: 数据库会话
         :param config_id: 配置ID
         :param is_enabled: 是否启用
+        :param redis: redis对象，用于广播提供商缓存失效
         """
         try:
             await PaymentConfigDao.update_status(query_db, config_id, is_enabled)
             await query_db.commit()
+            if redis is not None:
+                await cls.invalidate_providers(redis)
             logger.info(f'更新支付配置状态成功: config_id={config_id}, is_enabled={is_enabled}')
         except Exception as e:
             await query_db.rollback()
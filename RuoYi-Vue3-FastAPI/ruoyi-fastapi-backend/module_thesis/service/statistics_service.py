@@ -0,0 +1,237 @@
+"""
+统计服务
+支付流水按创建日期维护日统计表，流水新增和状态变化时在同一事务内累加增量；
+查询时已结束的整天读取日统计，其余时间段（当天、首尾不足一天的部分）一次条件聚合扫描流水表，
+结果短时间缓存在Redis中
+"""
+import json
+from collections.abc import Awaitable, Callable
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any, Optional, Union
+
+from redis import asyncio as aioredis
+from sqlalchemy import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from common.enums import RedisInitKeyConfig
+from exceptions.exception import ServiceException
+from module_thesis.dao import PaymentStatDailyDao, PaymentTransactionDao
+from utils.log_util import logger
+
+
+class StatisticsService:
+    """
+    统计服务类
+    """
+
+    # 统计结果缓存时间（秒）
+    cache_ttl_seconds = 60
+
+    # 单独统计的流水状态
+    stat_statuses = ('success', 'pending', 'refunded')
+
+    @classmethod
+    async def get_cached(
+        cls,
+        redis: Optional[aioredis.Redis],
+        name: str,
+        params: dict[str, Any],
+        loader: Callable[[], Awaitable[dict[str, Any]]],
+    ) -> dict[str, Any]:
+        """
+        读取短时缓存的统计结果，未命中时调用loader计算并写入缓存
+
+        :param redis: redis对象，为None时不缓存
+        :param name: 统计名称
+        :param params: 统计参数（参与缓存键）
+        :param loader: 统计计算函数
+        :return: 统计结果
+        """
+        if redis is None:
+            return await loader()
+        cache_key = f'{RedisInitKeyConfig.STATISTICS.key}:{name}:{json.dumps(params, sort_keys=True, default=str)}'
+        try:
+            cached = await redis.get(cache_key)
+            if cached:
+                return json.loads(cached)
+        except Exception as e:
+            logger.warning(f'读取统计缓存失败: {cache_key}, 错误: {str(e)}')
+        result = await loader()
+        try:
+            await redis.set(cache_key, json.dumps(result, default=str), ex=timedelta(seconds=cls.cache_ttl_seconds))
+        except Exception as e:
+            logger.warning(f'写入统计缓存失败: {cache_key}, 错误: {str(e)}')
+        return result
+
+    # ==================== 支付流水日统计维护 ====================
+
+    @classmethod
+    def status_delta(
+        cls, amount: Union[Decimal, float, None], status: Optional[str], sign: int = 1
+    ) -> dict[str, Union[int, Decimal]]:
+        """
+        计算单笔流水在某个状态下对日统计的贡献
+
+        :param amount: 流水金额
+        :param status: 流水状态
+        :param sign: 1为计入，-1为移出
+        :return: 状态相关字段的增量
+        """
+        if status not in cls.stat_statuses:
+            return {}
+        return {f'{status}_count': sign, f'{status}_amount': sign * Decimal(str(amount or 0))}
+
+    @classmethod
+    def transition_delta(
+        cls, amount: Union[Decimal, float, None], old_status: Optional[str], new_status: Optional[str]
+    ) -> dict[str, Union[int, Decimal]]:
+        """
+        计算流水状态变化对日统计的增量（总笔数、总金额、手续费不变）
+
+        :param amount: 流水金额
+        :param old_status: 原状态
+        :param new_status: 新状态
+        :return: 增量
+        """
+        delta: dict[str, Union[int, Decimal]] = {}
+        if old_status == new_status:
+            return delta
+        for field, value in [
+            *cls.status_delta(amount, old_status, -1).items(),
+            *cls.status_delta(amount, new_status).items(),
+        ]:
+            delta[field] = delta.get(field, 0) + value
+        return delta
+
+    @classmethod
+    async def record_transaction_created(
+        cls,
+        query_db: AsyncSession,
+        create_time: datetime,
+        amount: Union[Decimal, float],
+        fee_amount: Union[Decimal, float, None],
+        status: str,
+    ) -> None:
+        """
+        新增流水后累加当天统计（与流水写入在同一事务中提交）
+
+        :param query_db: orm对象
+        :param create_time: 流水创建时间
+        :param amount: 流水金额
+        :param fee_amount: 手续费
+        :param status: 流水状态
+        :return:
+        """
+        delta = {
+            'total_count': 1,
+            'total_amount': Decimal(str(amount or 0)),
+            'fee_amount': Decimal(str(fee_amount or 0)),
+            **cls.status_delta(amount, status),
+        }
+        await PaymentStatDailyDao.apply_delta(query_db, create_time.date(), delta)
+
+    @classmethod
+    async def record_status_change(cls, query_db: AsyncSession, previous: Optional[Row], new_status: str) -> None:
+        """
+        流水状态变化后调整其创建日期的统计（与状态更新在同一事务中提交）
+
+        :param query_db: orm对象
+        :param previous: 更新前的流水状态（PaymentTransactionDao.update_transaction_status的返回值）
+        :param new_status: 新状态
+        :return:
+        """
+        if previous is None or previous.create_time is None or previous.del_flag != '0':
+            return
+        delta = cls.transition_delta(previous.amount, previous.status, new_status)
+        await PaymentStatDailyDao.apply_delta(query_db, previous.create_time.date(), delta)
+
+    # ==================== 支付流水统计查询 ====================
+
+    @staticmethod
+    def _parse_time(value: Optional[str], field_name: str) -> Optional[datetime]:
+        if not value:
+            return None
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            raise ServiceException(message=f'{field_name}格式不正确') from None
+
+    @staticmethod
+    def split_rollup_range(
+        start_time: Optional[datetime], end_time: Optional[datetime], today: date
+    ) -> Optional[tuple[Optional[date], date]]:
+        """
+        计算查询区间内可以直接读取日统计的整天范围（不含当天）
+
+        :param start_time: 开始时间（含）
+        :param end_time: 结束时间（含）
+        :param today: 当天日期
+        :return: (开始日期（含，None表示不限）, 结束日期（不含）)，没有完整的已结束日期时为None
+        """
+        rollup_start = None
+        if start_time is not None:
+            rollup_start = start_time.date() if start_time.time() == time.min else start_time.date() + timedelta(days=1)
+        rollup_end = today
+        if end_time is not None:
+            last_day = end_time.date() if end_time.time() >= time(23, 59, 59) else end_time.date() - timedelta(days=1)
+            rollup_end = min(rollup_end, last_day + timedelta(days=1))
+        if rollup_start is not None and rollup_start >= rollup_end:
+            return None
+        return rollup_start, rollup_end
+
+    @classmethod
+    async def _compute_transaction_stats(
+        cls, query_db: AsyncSession, start_time: Optional[datetime], end_time: Optional[datetime]
+    ) -> dict[str, Any]:
+        rollup_range = cls.split_rollup_range(start_time, end_time, date.today())
+        if rollup_range is None:
+            return await PaymentTransactionDao.get_live_statistics(query_db, start_time, end_time)
+
+        rollup_start, rollup_end = rollup_range
+        rollup = await PaymentStatDailyDao.get_statistics(query_db, rollup_start, rollup_end)
+        live = await PaymentTransactionDao.get_live_statistics(
+            query_db,
+            start_time,
+            end_time,
+            exclude_start=datetime.combine(rollup_start, time.min) if rollup_start else None,
+            exclude_end=datetime.combine(rollup_end, time.min),
+        )
+        return {field: rollup[field] + live[field] for field in PaymentStatDailyDao.STAT_FIELDS}
+
+    @classmethod
+    async def get_transaction_stats(
+        cls,
+        query_db: AsyncSession,
+        redis: Optional[aioredis.Redis],
+        start_time: Optional[str] = None,
+        end_time: Optional[str] = None,
+    ) -> dict[str, Any]:
+        """
+        获取支付流水统计
+
+        :param query_db: orm对象
+        :param redis: redis对象
+        :param start_time: 开始时间
+        :param end_time: 结束时间
+        :return: 统计信息
+        """
+        start = cls._parse_time(start_time, '开始时间')
+        end = cls._parse_time(end_time, '结束时间')
+        stats = await cls.get_cached(
+            redis,
+            'payment_transaction',
+            {'start_time': start, 'end_time': end},
+            lambda: cls._compute_transaction_stats(query_db, start, end),
+        )
+        return {
+            'total': round(stats['total_amount'], 2),
+            'success': round(stats['success_amount'], 2),
+            'pending': round(stats['pending_amount'], 2),
+            'refunded': round(stats['refunded_amount'], 2),
+            'fee': round(stats['fee_amount'], 2),
+            'total_count': stats['total_count'],
+            'success_count': stats['success_count'],
+            'pending_count': stats['pending_count'],
+            'refunded_count': stats['refunded_count'],
+        }
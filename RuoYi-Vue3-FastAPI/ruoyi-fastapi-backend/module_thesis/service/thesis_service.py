@@ -1,9 +1,11 @@
 """
 论文管理服务层
 """
+from collections.abc import Awaitable, Callable
 from typing import Any, Union, Optional, Dict
 from datetime import datetime
 
+from redis import asyncio as aioredis
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from common.vo import CrudResponseModel, PageModel
@@ -12,6 +14,7 @@ from module_thesis.dao import (
     ThesisDao,
     ThesisOutlineDao,
     ThesisChapterDao,
+    ThesisContentBlobDao,
     ThesisVersionDao,
 )
 from module_thesis.entity.vo import (
@@ -19,14 +22,35 @@ from module_thesis.entity.vo import (
     ThesisOutlineModel,
     ThesisChapterModel,
     ThesisVersionModel,
+    CreateVersionModel,
     ThesisPageQueryModel,
     DeductQuotaModel,
 )
 from module_thesis.service.member_service import MemberService
+from module_thesis.utils.progress_notifier import ThesisProgressNotifier
+from module_thesis.utils.version_manifest import (
+    CHAPTER_FIELDS,
+    KEYFRAME_INTERVAL,
+    META_FIELDS,
+    build_manifest,
+    chapter_hashes,
+    content_hash,
+    diff_manifests,
+    is_keyframe,
+    is_manifest,
+    resolve_meta,
+    same_snapshot,
+)
 from utils.common_util import CamelCaseUtil
 from utils.log_util import logger
+from utils.single_flight_util import SingleFlight
 import re
 
+# 每篇论文保留的版本数（章节内容按哈希去重存储，未变化的章节不占用额外空间）
+THESIS_VERSION_KEEP_COUNT = 200
+# 超出保留数量达到该批次后才清理旧版本
+THESIS_VERSION_PRUNE_BATCH = 20
+
 
 class ThesisService:
 
@@ -259,12 +283,63 @@ class ThesisService:
 
     # ==================== 大纲管理 ====================
 
+    @classmethod
+    async def _single_flight(
+        cls,
+        redis: Optional[aioredis.Redis],
+        thesis_id: int,
+        operation: str,
+        func: Callable[[], Awaitable[CrudResponseModel]]
+    ) -> CrudResponseModel:
+        """
+        按（论文, 操作）合并重复的生成请求：重复点击、前端超时重试等并发请求
+        等待进行中的那一次执行并共享其结果，不会重复调用大模型和扣减配额
+
+        :param redis: redis对象，为None时只合并本进程内的请求
+        :param thesis_id: 论文ID
+        :param operation: 操作名称
+        :param func: 实际执行的操作
+        :return: 操作结果
+        """
+        return await SingleFlight.run(
+            redis,
+            f'thesis:{thesis_id}:{operation}',
+            func,
+            dumps=lambda result: result.model_dump(mode='json'),
+            loads=lambda data: CrudResponseModel(**data),
+        )
+
     @classmethod
     async def generate_outline(
         cls,
         query_db: AsyncSession,
         outline_data: ThesisOutlineModel,
-        user_id: int
+        user_id: int,
+        redis: Optional[aioredis.Redis] = None
+    ) -> CrudResponseModel:
+        """
+        生成论文大纲（需要扣减配额），同一论文并发的重复请求共享同一次生成结果
+
+        :param query_db: 数据库会话
+        :param outline_data: 大纲数据
+        :param user_id: 用户ID
+        :param redis: redis对象，用于合并重复请求和推送生成进度
+        :return: 操作结果
+        """
+        return await cls._single_flight(
+            redis,
+            outline_data.thesis_id,
+            'outline',
+            lambda: cls._generate_outline(query_db, outline_data, user_id, redis)
+        )
+
+    @classmethod
+    async def _generate_outline(
+        cls,
+        query_db: AsyncSession,
+        outline_data: ThesisOutlineModel,
+        user_id: int,
+        redis: Optional[aioredis.Redis] = None
     ) -> CrudResponseModel:
         """
         生成论文大纲（需要扣减配额）
@@ -272,6 +347,7 @@ class ThesisService:
         :param query_db: 数据库会话
         :param outline_data: 大纲数据
         :param user_id: 用户ID
+        :param redis: redis对象，用于推送生成进度（为None时不推送）
         :return: 操作结果
         """
         # 检查论文是否存在
@@ -346,6 +422,7 @@ class ThesisService:
 
             # 统一提交事务
             await query_db.commit()
+            await cls._publish_progress(query_db, redis, outline_data.thesis_id)
             return CrudResponseModel(
                 is_success=True,
                 message='大纲生成成功',
@@ -397,7 +474,38 @@ class ThesisService:
         cls,
         query_db: AsyncSession,
         chapter_data: ThesisChapterModel,
-        user_id: int
+        user_id: int,
+        redis: Optional[aioredis.Redis] = None
+    ) -> CrudResponseModel:
+        """
+        生成论文章节（需要扣减配额），同一章节并发的重复请求共享同一次生成结果
+
+        :param query_db: 数据库会话
+        :param chapter_data: 章节数据
+        :param user_id: 用户ID
+        :param redis: redis对象，用于合并重复请求和推送生成进度
+        :return: 操作结果
+        """
+        # 只按标题请求的章节没有章节号，按清理后的标题区分
+        if chapter_data.chapter_number is not None:
+            chapter_key = f'chapter:{chapter_data.chapter_number}'
+        else:
+            chapter_title, _ = cls._clean_chapter_title(chapter_data.chapter_title or '')
+            chapter_key = f'chapter:title:{chapter_title}'
+        return await cls._single_flight(
+            redis,
+            chapter_data.thesis_id,
+            chapter_key,
+            lambda: cls._generate_chapter(query_db, chapter_data, user_id, redis)
+        )
+
+    @classmethod
+    async def _generate_chapter(
+        cls,
+        query_db: AsyncSession,
+        chapter_data: ThesisChapterModel,
+        user_id: int,
+        redis: Optional[aioredis.Redis] = None
     ) -> CrudResponseModel:
         """
         生成论文章节（需要扣减配额）
@@ -405,6 +513,7 @@ class ThesisService:
         :param query_db: 数据库会话
         :param chapter_data: 章节数据
         :param user_id: 用户ID
+        :param redis: redis对象，用于推送生成进度（为None时不推送）
         :return: 操作结果
         """
         # 检查论文是否存在
@@ -506,9 +615,7 @@ class ThesisService:
             await ThesisDao.update_word_count(query_db, chapter_data.thesis_id, total_words)
 
             # 检查是否所有章节都已完成，如果是则更新论文状态为formatted（表示章节内容已生成，等待格式化）
-            all_chapters = await ThesisChapterDao.get_chapter_list_by_thesis(query_db, chapter_data.thesis_id)
-            completed_chapters = [c for c in all_chapters if c.status == 'completed']
-            if len(all_chapters) > 0 and len(completed_chapters) == len(all_chapters):
+            if await cls._all_chapters_completed(query_db, chapter_data.thesis_id):
                 # 所有章节都已完成，更新论文状态为formatted（下一步是格式化）
                 await ThesisDao.update_thesis(query_db, {
                     'thesis_id': chapter_data.thesis_id,
@@ -527,6 +634,7 @@ class ThesisService:
 
             # 统一提交事务
             await query_db.commit()
+            await cls._publish_progress(query_db, redis, chapter_data.thesis_id)
             return CrudResponseModel(
                 is_success=True,
                 message='章节生成成功',
@@ -545,7 +653,8 @@ class ThesisService:
         query_db: AsyncSession,
         thesis_id: int,
         chapters_data: list[ThesisChapterModel],
-        user_id: int
+        user_id: int,
+        redis: Optional[aioredis.Redis] = None
     ) -> CrudResponseModel:
         """
         批量生成章节（需要扣减配额）
@@ -556,6 +665,7 @@ class ThesisService:
         :param thesis_id: 论文ID
         :param chapters_data: 章节数据列表
         :param user_id: 用户ID
+        :param redis: redis对象，用于推送生成进度（为None时不推送）
         :return: 操作结果
         """
         # 检查论文是否存在
@@ -596,6 +706,11 @@ class ThesisService:
             # 调用AI生成服务
             from module_thesis.service.ai_generation_service import AiGenerationService
 
+            # 论文级生成上下文只构建一次（AI提供商、格式指令、大纲渲染、字数分配），各章节共用
+            generation_context = await AiGenerationService.build_chapter_generation_context(
+                query_db, thesis_info, outline_context
+            )
+
             # 批量生成章节内容（部分成功策略 + 断点续传）
             # 确保按照chapter_number顺序生成（与大纲顺序一致）
             chapters_data_sorted = sorted(chapters_data, key=lambda x: x.chapter_number if hasattr(x, 'chapter_number') and isinstance(x.chapter_number, int) else 999)
@@ -607,7 +722,7 @@ class ThesisService:
             
             for chapter_data in chapters_data_sorted:
                 # 检查章节是否已存在且已完成
-                existing_chapter = await ThesisChapterDao.get_chapter_by_title_and_thesis(
+                existing_chapter = await ThesisChapterDao.get_chapter_status_by_title_and_thesis(
                     query_db, thesis_id, chapter_data.chapter_title
                 )
                 
@@ -643,6 +758,7 @@ class ThesisService:
                 new_chapter = await ThesisChapterDao.add_chapter(query_db, chapter_dict_pre)
                 await query_db.flush()
                 chapter_id = new_chapter.chapter_id
+                await cls._publish_progress(query_db, redis, thesis_id)
                 
                 try:
                     # 从大纲中提取对应章节的小节信息
@@ -680,7 +796,7 @@ class ThesisService:
                     
                     # 调用AI生成章节内容
                     ai_content = await AiGenerationService.generate_chapter(
-                        query_db, thesis_info, chapter_info, outline_context
+                        query_db, thesis_info, chapter_info, outline_context, context=generation_context
                     )
                     
                     # 计算字数（改进的字数计算）
@@ -696,6 +812,7 @@ class ThesisService:
                         'status': 'completed'
                     }
                     await ThesisChapterDao.update_chapter(query_db, update_data)
+                    await cls._publish_progress(query_db, redis, thesis_id)
                     
                     generated_chapters.append({
                         'chapter_id': chapter_id,
@@ -720,6 +837,7 @@ class ThesisService:
                         'status': 'pending'  # 标记为待生成，可以继续生成
                     }
                     await ThesisChapterDao.update_chapter(query_db, update_data)
+                    await cls._publish_progress(query_db, redis, thesis_id)
                     
                     failed_chapters.append({
                         'chapter_id': chapter_id,
@@ -740,9 +858,7 @@ class ThesisService:
             await ThesisDao.update_word_count(query_db, thesis_id, total_words)
 
             # 检查是否所有章节都已完成，如果是则更新论文状态为formatted（表示章节内容已生成，等待格式化）
-            all_chapters = await ThesisChapterDao.get_chapter_list_by_thesis(query_db, thesis_id)
-            completed_chapters = [c for c in all_chapters if c.status == 'completed']
-            if len(all_chapters) > 0 and len(completed_chapters) == len(all_chapters):
+            if await cls._all_chapters_completed(query_db, thesis_id):
                 # 所有章节都已完成，更新论文状态为formatted（下一步是格式化）
                 await ThesisDao.update_thesis(query_db, {
                     'thesis_id': thesis_id,
@@ -762,6 +878,7 @@ class ThesisService:
 
             # 统一提交事务
             await query_db.commit()
+            await cls._publish_progress(query_db, redis, thesis_id)
             
             # 构建返回消息
             success_count = len(generated_chapters)
@@ -792,25 +909,31 @@ class ThesisService:
             )
         except ServiceException as e:
             await query_db.rollback()
+            await cls._publish_progress(query_db, redis, thesis_id)
             raise e
         except Exception as e:
             await query_db.rollback()
+            await cls._publish_progress(query_db, redis, thesis_id)
             raise ServiceException(message=f'批量生成章节失败: {str(e)}')
 
     @classmethod
     async def get_thesis_chapters(
         cls,
         query_db: AsyncSession,
-        thesis_id: int
+        thesis_id: int,
+        include_content: bool = True
     ) -> list[ThesisChapterModel]:
         """
         获取论文的所有章节
 
         :param query_db: 数据库会话
         :param thesis_id: 论文ID
+        :param include_content: 是否返回章节内容，只需要章节列表时传False
         :return: 章节列表
         """
-        chapters = await ThesisChapterDao.get_chapter_list_by_thesis(query_db, thesis_id)
+        chapters = await ThesisChapterDao.get_chapter_brief_list_by_thesis(
+            query_db, thesis_id, include_content=include_content
+        )
         return [ThesisChapterModel(**CamelCaseUtil.transform_result(chapter)) for chapter in chapters]
 
     @classmethod
@@ -826,30 +949,21 @@ class ThesisService:
         :param thesis_id: 论文ID
         :return: 生成进度信息
         """
-        # 获取所有章节
-        all_chapters = await ThesisChapterDao.get_chapter_list_by_thesis(query_db, thesis_id)
-        
-        total_count = len(all_chapters)
-        completed_count = len([c for c in all_chapters if c.status == 'completed'])
-        generating_count = len([c for c in all_chapters if c.status == 'generating'])
-        pending_count = len([c for c in all_chapters if c.status == 'pending'])
-        
-        # 获取未完成的章节列表
-        incomplete_chapters = [
-            {
-                'chapter_id': c.chapter_id,
-                'chapter_title': c.title,
-                'order_num': c.order_num,
-                'status': c.status
-            }
-            for c in all_chapters if c.status != 'completed'
-        ]
+        # 按状态聚合计数，未完成章节只查询简要列，不读取章节内容
+        status_counts = await ThesisChapterDao.count_chapters_by_status(query_db, thesis_id)
+        total_count = sum(status_counts.values())
+        completed_count = status_counts.get('completed', 0)
+        incomplete_chapters = (
+            await ThesisChapterDao.get_incomplete_chapter_brief_list(query_db, thesis_id)
+            if completed_count < total_count
+            else []
+        )
         
         return {
             'total_count': total_count,
             'completed_count': completed_count,
-            'generating_count': generating_count,
-            'pending_count': pending_count,
+            'generating_count': status_counts.get('generating', 0),
+            'pending_count': status_counts.get('pending', 0),
             'progress_percentage': round((completed_count / total_count * 100) if total_count > 0 else 0, 2),
             'incomplete_chapters': incomplete_chapters
         }
@@ -859,7 +973,8 @@ class ThesisService:
         cls,
         query_db: AsyncSession,
         thesis_id: int,
-        user_id: int
+        user_id: int,
+        redis: Optional[aioredis.Redis] = None
     ) -> CrudResponseModel:
         """
         继续生成未完成的章节（断点续传）
@@ -867,13 +982,16 @@ class ThesisService:
         :param query_db: 数据库会话
         :param thesis_id: 论文ID
         :param user_id: 用户ID
+        :param redis: redis对象，用于推送生成进度（为None时不推送）
         :return: 操作结果
         """
         # 检查论文是否存在
         thesis = await cls.get_thesis_detail(query_db, thesis_id)
         
         # 获取未完成的章节
-        incomplete_chapters = await ThesisChapterDao.get_incomplete_chapters_by_thesis(query_db, thesis_id)
+        incomplete_chapters = await ThesisChapterDao.get_chapter_brief_list_by_thesis(
+            query_db, thesis_id, incomplete_only=True
+        )
         
         if not incomplete_chapters:
             return CrudResponseModel(
@@ -921,6 +1039,11 @@ class ThesisService:
             # 调用AI生成服务
             from module_thesis.service.ai_generation_service import AiGenerationService
             
+            # 论文级生成上下文只构建一次，各章节共用
+            generation_context = await AiGenerationService.build_chapter_generation_context(
+                query_db, thesis_info, outline_context
+            )
+            
             generated_count = 0
             failed_chapters = []
             
@@ -949,10 +1072,11 @@ class ThesisService:
                         'chapter_id': chapter.chapter_id,
                         'status': 'generating'
                     })
+                    await cls._publish_progress(query_db, redis, thesis_id)
                     
                     # 调用AI生成章节内容
                     ai_content = await AiGenerationService.generate_chapter(
-                        query_db, thesis_info, chapter_info, outline_context
+                        query_db, thesis_info, chapter_info, outline_context, context=generation_context
                     )
                     
                     # 计算字数
@@ -966,6 +1090,7 @@ class ThesisService:
                         'status': 'completed'
                     }
                     await ThesisChapterDao.update_chapter(query_db, update_data)
+                    await cls._publish_progress(query_db, redis, thesis_id)
                     
                     generated_count += 1
                     logger.info(f"继续生成章节成功 - 论文ID: {thesis_id}, 章节: {chapter.title}, 章节ID: {chapter.chapter_id}")
@@ -984,6 +1109,7 @@ class ThesisService:
                         'chapter_id': chapter.chapter_id,
                         'status': 'pending'
                     })
+                    await cls._publish_progress(query_db, redis, thesis_id)
                     
                     failed_chapters.append({
                         'chapter_id': chapter.chapter_id,
@@ -996,9 +1122,7 @@ class ThesisService:
             await ThesisDao.update_word_count(query_db, thesis_id, total_words)
             
             # 检查是否所有章节都已完成，如果是则更新论文状态为formatted（表示章节内容已生成，等待格式化）
-            all_chapters = await ThesisChapterDao.get_chapter_list_by_thesis(query_db, thesis_id)
-            completed_chapters = [c for c in all_chapters if c.status == 'completed']
-            if len(all_chapters) > 0 and len(completed_chapters) == len(all_chapters):
+            if await cls._all_chapters_completed(query_db, thesis_id):
                 # 所有章节都已完成，更新论文状态为formatted（下一步是格式化）
                 await ThesisDao.update_thesis(query_db, {
                     'thesis_id': thesis_id,
@@ -1018,6 +1142,7 @@ class ThesisService:
             
             # 统一提交事务
             await query_db.commit()
+            await cls._publish_progress(query_db, redis, thesis_id)
             
             failed_count = len(failed_chapters)
             message = f'继续生成完成，成功{generated_count}个章节'
@@ -1037,9 +1162,11 @@ class ThesisService:
             
         except ServiceException as e:
             await query_db.rollback()
+            await cls._publish_progress(query_db, redis, thesis_id)
             raise e
         except Exception as e:
             await query_db.rollback()
+            await cls._publish_progress(query_db, redis, thesis_id)
             raise ServiceException(message=f'继续生成章节失败: {str(e)}')
 
     @classmethod
@@ -1071,10 +1198,8 @@ class ThesisService:
 
             # 如果章节状态更新为completed，检查是否所有章节都已完成
             if update_data.get('status') == 'completed':
-                # 重新查询所有章节（包括刚更新的章节）
-                all_chapters = await ThesisChapterDao.get_chapter_list_by_thesis(query_db, chapter.thesis_id)
-                completed_chapters = [c for c in all_chapters if c.status == 'completed']
-                if len(all_chapters) > 0 and len(completed_chapters) == len(all_chapters):
+                # 重新统计章节状态（包括刚更新的章节）
+                if await cls._all_chapters_completed(query_db, chapter.thesis_id):
                     # 所有章节都已完成，更新论文状态为formatted（下一步是格式化）
                     await ThesisDao.update_thesis(query_db, {
                         'thesis_id': chapter.thesis_id,
@@ -1116,35 +1241,184 @@ class ThesisService:
 
     # ==================== 版本管理 ====================
 
+    @classmethod
+    async def _capture_thesis_state(
+        cls,
+        query_db: AsyncSession,
+        thesis_id: int
+    ) -> tuple[list[dict[str, Any]], dict[str, str], dict[str, Any]]:
+        """
+        读取论文当前状态，章节内容按哈希归并
+
+        :param query_db: 数据库会话
+        :param thesis_id: 论文ID
+        :return: (章节列表, 哈希到内容的映射, 论文元数据)
+        """
+        thesis = await ThesisDao.get_thesis_by_id(query_db, thesis_id)
+        if not thesis:
+            raise ServiceException(message='论文不存在')
+        meta = {field: getattr(thesis, field) for field in META_FIELDS}
+
+        chapters = []
+        contents = {}
+        for row in await ThesisChapterDao.get_chapter_brief_list_by_thesis(query_db, thesis_id, include_content=True):
+            chapter_hash = content_hash(row.content)
+            contents[chapter_hash] = row.content or ''
+            chapters.append({**{field: getattr(row, field) for field in CHAPTER_FIELDS}, 'hash': chapter_hash})
+        return chapters, contents, meta
+
+    @classmethod
+    async def _resolve_version_meta(cls, query_db: AsyncSession, version: Any) -> dict[str, Any]:
+        """
+        还原版本的完整元数据（从该版本向前查找到最近的关键帧）
+
+        :param query_db: 数据库会话
+        :param version: 版本对象
+        :return: 完整元数据
+        """
+        if is_keyframe(version.snapshot_data):
+            return dict(version.snapshot_data['meta'])
+        chain = []
+        for manifest in await ThesisVersionDao.get_snapshot_chain(
+            query_db, version.thesis_id, version.version_number, KEYFRAME_INTERVAL
+        ):
+            if not is_manifest(manifest):
+                break
+            chain.append(manifest)
+            if is_keyframe(manifest):
+                break
+        return resolve_meta(chain)
+
+    @classmethod
+    async def _create_version_snapshot(
+        cls,
+        query_db: AsyncSession,
+        thesis_id: int,
+        change_desc: str = '',
+        changed_by: str = ''
+    ) -> tuple[Any, bool]:
+        """
+        保存论文当前状态为新版本（不提交事务）
+
+        章节内容只在哈希首次出现时写入内容存储表，版本本身只保存章节哈希列表和元数据增量；
+        与最新版本完全一致时不创建新版本。
+        先锁定论文行，同一论文的版本创建与旧版本清理串行执行，避免并发清理删除本次复用的章节内容
+
+        :param query_db: 数据库会话
+        :param thesis_id: 论文ID
+        :param change_desc: 变更描述
+        :param changed_by: 变更人
+        :return: (版本对象, 是否新建)
+        """
+        await ThesisDao.lock_thesis(query_db, thesis_id)
+        chapters, contents, meta = await cls._capture_thesis_state(query_db, thesis_id)
+
+        latest = await ThesisVersionDao.get_latest_version(query_db, thesis_id)
+        base_meta = None
+        if latest is not None and is_manifest(latest.snapshot_data):
+            base_meta = await cls._resolve_version_meta(query_db, latest)
+            if same_snapshot(latest.snapshot_data, chapters, meta, base_meta):
+                return latest, False
+
+        version_number = (latest.version_number if latest else 0) + 1
+        keyframe = base_meta is None or (version_number - 1) % KEYFRAME_INTERVAL == 0
+        manifest = build_manifest(chapters, meta, base_meta, keyframe)
+
+        # 只写入尚未存储的章节内容
+        existing_hashes = await ThesisContentBlobDao.get_existing_hashes(query_db, thesis_id, set(contents))
+        await ThesisContentBlobDao.add_blobs(
+            query_db,
+            [
+                {
+                    'thesis_id': thesis_id,
+                    'content_hash': chapter_hash,
+                    'content': content,
+                    'content_size': len(content)
+                }
+                for chapter_hash, content in contents.items() if chapter_hash not in existing_hashes
+            ]
+        )
+
+        new_version = await ThesisVersionDao.add_version(query_db, {
+            'thesis_id': thesis_id,
+            'version_number': version_number,
+            'snapshot_data': manifest,
+            'change_desc': (change_desc or '')[:200],
+            'changed_by': changed_by or '',
+            'create_time': datetime.now()
+        })
+        await cls._prune_versions(query_db, thesis_id)
+        return new_version, True
+
+    @classmethod
+    async def _prune_versions(cls, query_db: AsyncSession, thesis_id: int) -> None:
+        """
+        清理超出保留数量的旧版本，并删除不再被引用的章节内容
+
+        超出数量达到一个批次后才清理，扫描剩余版本清单的开销由一批版本分摊
+
+        :param query_db: 数据库会话
+        :param thesis_id: 论文ID
+        :return:
+        """
+        if await ThesisVersionDao.count_versions(query_db, thesis_id) <= THESIS_VERSION_KEEP_COUNT + THESIS_VERSION_PRUNE_BATCH:
+            return
+
+        # 第一个是保留下来的最旧版本，其余为需要删除的版本
+        oldest_kept, *old_versions = await ThesisVersionDao.get_old_versions(
+            query_db, thesis_id, THESIS_VERSION_KEEP_COUNT - 1
+        )
+        # 保留的最旧版本如果只保存了元数据增量，改写为关键帧，避免依赖被删除的版本
+        if is_manifest(oldest_kept.snapshot_data) and not is_keyframe(oldest_kept.snapshot_data):
+            manifest = dict(oldest_kept.snapshot_data)
+            manifest.pop('meta_delta', None)
+            manifest['meta'] = await cls._resolve_version_meta(query_db, oldest_kept)
+            await ThesisVersionDao.update_version_snapshot(query_db, oldest_kept.version_id, manifest)
+
+        candidate_hashes = set()
+        for version in old_versions:
+            if is_manifest(version.snapshot_data):
+                candidate_hashes |= chapter_hashes(version.snapshot_data)
+        await ThesisVersionDao.delete_versions(query_db, [version.version_id for version in old_versions])
+
+        if candidate_hashes:
+            for manifest in await ThesisVersionDao.get_snapshot_list_by_thesis(query_db, thesis_id):
+                if is_manifest(manifest):
+                    candidate_hashes -= chapter_hashes(manifest)
+            await ThesisContentBlobDao.delete_blobs(query_db, thesis_id, candidate_hashes)
+        logger.info(f'清理论文旧版本 - 论文ID: {thesis_id}, 删除版本数: {len(old_versions)}, 删除内容数: {len(candidate_hashes)}')
+
     @classmethod
     async def create_version(
         cls,
         query_db: AsyncSession,
-        version_data: ThesisVersionModel
+        version_data: CreateVersionModel,
+        changed_by: str = ''
     ) -> CrudResponseModel:
         """
-        创建论文版本
+        创建论文版本（保存论文当前状态）
 
         :param query_db: 数据库会话
         :param version_data: 版本数据
+        :param changed_by: 变更人
         :return: 操作结果
         """
         # 检查论文是否存在
         await cls.get_thesis_detail(query_db, version_data.thesis_id)
 
         try:
-            version_dict = version_data.model_dump(exclude_none=True)
-            new_version = await ThesisVersionDao.add_version(query_db, version_dict)
-
-            # 清理旧版本（保留最新10个）
-            await ThesisVersionDao.delete_old_versions(query_db, version_data.thesis_id, keep_count=10)
-
+            version, created = await cls._create_version_snapshot(
+                query_db, version_data.thesis_id, version_data.remark, changed_by
+            )
             await query_db.commit()
             return CrudResponseModel(
                 is_success=True,
-                message='版本创建成功',
-                result={'version_id': new_version.version_id}
+                message='版本创建成功' if created else '论文内容与最新版本一致，未创建新版本',
+                result={'version_id': version.version_id, 'version_number': version.version_number, 'created': created}
             )
+        except ServiceException as e:
+            await query_db.rollback()
+            raise e
         except Exception as e:
             await query_db.rollback()
             raise ServiceException(message=f'版本创建失败: {str(e)}')
@@ -1157,7 +1431,7 @@ class ThesisService:
         limit: int = 10
     ) -> list[ThesisVersionModel]:
         """
-        获取论文版本历史
+        获取论文版本历史（不包含快照数据）
 
         :param query_db: 数据库会话
         :param thesis_id: 论文ID
@@ -1167,6 +1441,20 @@ class ThesisService:
         versions = await ThesisVersionDao.get_version_list_by_thesis(query_db, thesis_id, limit)
         return [ThesisVersionModel(**CamelCaseUtil.transform_result(version)) for version in versions]
 
+    @classmethod
+    async def get_version_thesis_id(cls, query_db: AsyncSession, version_id: int) -> int:
+        """
+        获取版本所属的论文ID（用于权限检查）
+
+        :param query_db: 数据库会话
+        :param version_id: 版本ID
+        :return: 论文ID
+        """
+        version = await ThesisVersionDao.get_version_by_id(query_db, version_id)
+        if not version:
+            raise ServiceException(message='版本不存在')
+        return version.thesis_id
+
     @classmethod
     async def get_version_detail(
         cls,
@@ -1174,7 +1462,7 @@ class ThesisService:
         version_id: int
     ) -> ThesisVersionModel:
         """
-        获取版本详情
+        获取版本详情（由章节哈希列表还原出完整的元数据和章节内容）
 
         :param query_db: 数据库会话
         :param version_id: 版本ID
@@ -1183,7 +1471,157 @@ class ThesisService:
         version = await ThesisVersionDao.get_version_by_id(query_db, version_id)
         if not version:
             raise ServiceException(message='版本不存在')
-        return ThesisVersionModel(**CamelCaseUtil.transform_result(version))
+        version_detail = ThesisVersionModel(**CamelCaseUtil.transform_result(version))
+        manifest = version.snapshot_data
+        if is_manifest(manifest):
+            contents = await ThesisContentBlobDao.get_contents(query_db, version.thesis_id, chapter_hashes(manifest))
+            version_detail.snapshot_data = {
+                'meta': await cls._resolve_version_meta(query_db, version),
+                'chapters': [
+                    {
+                        **{field: chapter.get(field) for field in CHAPTER_FIELDS},
+                        'content': contents.get(chapter['hash'], '')
+                    }
+                    for chapter in manifest['chapters']
+                ]
+            }
+        return version_detail
+
+    @classmethod
+    async def diff_versions(
+        cls,
+        query_db: AsyncSession,
+        version_id: int,
+        base_version_id: Optional[int] = None
+    ) -> dict[str, Any]:
+        """
+        比较两个版本的差异（只比较章节哈希和属性，不读取章节内容）
+
+        :param query_db: 数据库会话
+        :param version_id: 版本ID
+        :param base_version_id: 对比的基准版本ID，为空时与上一个版本比较
+        :return: 差异信息
+        """
+        version = await ThesisVersionDao.get_version_by_id(query_db, version_id)
+        if not version:
+            raise ServiceException(message='版本不存在')
+        if base_version_id is not None:
+            base_version = await ThesisVersionDao.get_version_by_id(query_db, base_version_id)
+            if not base_version or base_version.thesis_id != version.thesis_id:
+                raise ServiceException(message='对比版本不存在')
+        else:
+            base_version = await ThesisVersionDao.get_previous_version(
+                query_db, version.thesis_id, version.version_number
+            )
+            if not base_version:
+                raise ServiceException(message='该版本是最早的版本，没有可对比的版本')
+        if not is_manifest(version.snapshot_data) or not is_manifest(base_version.snapshot_data):
+            raise ServiceException(message='旧格式版本不支持比较')
+
+        diff = diff_manifests(
+            base_version.snapshot_data,
+            version.snapshot_data,
+            await cls._resolve_version_meta(query_db, base_version),
+            await cls._resolve_version_meta(query_db, version)
+        )
+        return {
+            'version_number': version.version_number,
+            'base_version_number': base_version.version_number,
+            **diff
+        }
+
+    @classmethod
+    async def restore_version(
+        cls,
+        query_db: AsyncSession,
+        version_id: int,
+        changed_by: str = ''
+    ) -> CrudResponseModel:
+        """
+        将论文恢复到指定版本
+
+        恢复前先保存当前状态；只改写与目标版本不一致的章节，内容未变化的章节不读取也不写入
+
+        :param query_db: 数据库会话
+        :param version_id: 版本ID
+        :param changed_by: 变更人
+        :return: 操作结果
+        """
+        version = await ThesisVersionDao.get_version_by_id(query_db, version_id)
+        if not version:
+            raise ServiceException(message='版本不存在')
+        if not is_manifest(version.snapshot_data):
+            raise ServiceException(message='旧格式版本不支持恢复')
+        thesis_id = version.thesis_id
+        target_number = version.version_number
+
+        try:
+            # 锁定论文行后再读取目标版本的内容，期间不会被并发的版本清理删除
+            await ThesisDao.lock_thesis(query_db, thesis_id)
+
+            # 先读取目标版本的元数据和内容：下面的自动保存可能触发旧版本清理，目标版本较旧时会被一并删除
+            target_meta = await cls._resolve_version_meta(query_db, version)
+            target_chapters = version.snapshot_data['chapters']
+            current_chapters, _, _ = await cls._capture_thesis_state(query_db, thesis_id)
+            current_by_id = {chapter['chapter_id']: chapter for chapter in current_chapters}
+
+            changed_hashes = {
+                chapter['hash'] for chapter in target_chapters
+                if chapter['hash'] != current_by_id.get(chapter['chapter_id'], {}).get('hash')
+            }
+            contents = await ThesisContentBlobDao.get_contents(query_db, thesis_id, changed_hashes)
+            missing_hashes = changed_hashes - set(contents)
+            if missing_hashes:
+                raise ServiceException(message='版本内容已丢失，无法恢复')
+
+            # 恢复前保存当前状态（与最新版本一致时不会产生新版本）
+            await cls._create_version_snapshot(query_db, thesis_id, f'恢复到版本{target_number}前自动保存', changed_by)
+
+            attribute_fields = CHAPTER_FIELDS[1:]
+            target_ids = set()
+            for chapter in target_chapters:
+                current = current_by_id.get(chapter['chapter_id'])
+                if current is None:
+                    # 章节已被删除，重新创建
+                    await ThesisChapterDao.add_chapter(query_db, {
+                        'thesis_id': thesis_id,
+                        **{field: chapter.get(field) for field in attribute_fields},
+                        'content': contents[chapter['hash']]
+                    })
+                    continue
+                target_ids.add(chapter['chapter_id'])
+                update_data = {
+                    field: chapter.get(field) for field in attribute_fields if current.get(field) != chapter.get(field)
+                }
+                if chapter['hash'] in changed_hashes:
+                    update_data['content'] = contents[chapter['hash']]
+                if update_data:
+                    update_data['chapter_id'] = chapter['chapter_id']
+                    update_data['update_by'] = changed_by
+                    update_data['update_time'] = datetime.now()
+                    await ThesisChapterDao.update_chapter(query_db, update_data)
+            for chapter_id in set(current_by_id) - target_ids:
+                await ThesisChapterDao.delete_chapter(query_db, chapter_id)
+
+            await ThesisDao.update_thesis(query_db, {'thesis_id': thesis_id, **target_meta})
+            total_words = await ThesisChapterDao.count_thesis_words(query_db, thesis_id)
+            await ThesisDao.update_word_count(query_db, thesis_id, total_words)
+
+            restored_version, _ = await cls._create_version_snapshot(
+                query_db, thesis_id, f'恢复到版本{target_number}', changed_by
+            )
+            await query_db.commit()
+            return CrudResponseModel(
+                is_success=True,
+                message=f'已恢复到版本{target_number}',
+                result={'version_id': restored_version.version_id, 'version_number': restored_version.version_number}
+            )
+        except ServiceException as e:
+            await query_db.rollback()
+            raise e
+        except Exception as e:
+            await query_db.rollback()
+            raise ServiceException(message=f'版本恢复失败: {str(e)}')
 
     @classmethod
     def _calculate_word_count(cls, content: str) -> int:
@@ -1223,38 +1661,29 @@ class ThesisService:
         :param thesis_id: 论文ID
         :return: 进度信息
         """
-        # 检查大纲（必须存在且有实际内容）
-        outline = await ThesisOutlineDao.get_outline_by_thesis_id(query_db, thesis_id)
-        has_outline = False
-        if outline and outline.outline_data:
-            # 检查大纲数据是否有实际内容
-            outline_data = outline.outline_data
-            # 如果是字符串，尝试解析
-            if isinstance(outline_data, str):
-                try:
-                    import json
-                    outline_data = json.loads(outline_data)
-                except (json.JSONDecodeError, TypeError):
-                    outline_data = None
-            
-            # 验证大纲数据是否有有效的章节
-            if outline_data and isinstance(outline_data, dict):
-                chapters = outline_data.get('chapters') or outline_data.get('chapters')
-                if chapters and isinstance(chapters, list) and len(chapters) > 0:
-                    has_outline = True
+        # 获取论文状态（只查询状态列）
+        thesis_status = await ThesisDao.get_thesis_status(query_db, thesis_id)
+        if thesis_status is None:
+            raise ServiceException(message='论文不存在')
         
-        # 检查章节
-        chapters = await ThesisChapterDao.get_chapter_list_by_thesis(query_db, thesis_id)
-        completed_chapters = [c for c in chapters if c.status == 'completed']
-        total_chapters = len(chapters)
-        chapters_completed = total_chapters > 0 and len(completed_chapters) == total_chapters
+        # 检查章节（按状态聚合计数，不读取章节内容）
+        status_counts = await ThesisChapterDao.count_chapters_by_status(query_db, thesis_id)
+        total_chapters = sum(status_counts.values())
+        completed_count = status_counts.get('completed', 0)
+        chapters_completed = total_chapters > 0 and completed_count == total_chapters
         
-        # 获取论文信息以检查状态
-        thesis = await cls.get_thesis_detail(query_db, thesis_id)
+        # 检查大纲（必须存在且有实际内容）
+        # 章节由大纲生成，已有章节时只确认大纲记录存在，不再读取和解析大纲JSON
+        if total_chapters > 0:
+            has_outline = await ThesisOutlineDao.has_outline(query_db, thesis_id)
+        else:
+            has_outline = cls._outline_has_chapters(
+                await ThesisOutlineDao.get_outline_data_by_thesis_id(query_db, thesis_id)
+            )
         
         # 检查格式化状态
         # 状态流转：generating -> formatted -> completed
-        is_formatted = thesis.status == 'formatted' or thesis.status == 'completed'
+        is_formatted = thesis_status == 'formatted' or thesis_status == 'completed'
         
         # 计算进度
         progress = 0
@@ -1273,20 +1702,106 @@ class ThesisService:
             'chapters_progress': 40 if chapters_completed else 0,
             'chapters_info': {
                 'total': total_chapters,
-                'completed': len(completed_chapters),
-                'progress_percentage': round((len(completed_chapters) / total_chapters * 100) if total_chapters > 0 else 0, 2)
+                'completed': completed_count,
+                'generating': status_counts.get('generating', 0),
+                'pending': status_counts.get('pending', 0),
+                'progress_percentage': round((completed_count / total_chapters * 100) if total_chapters > 0 else 0, 2)
             },
             'formatted': is_formatted,
             'format_progress': 40 if is_formatted else 0,
             'format_progress_detail': 100 if is_formatted else 0
         }
 
+    @classmethod
+    async def _all_chapters_completed(cls, query_db: AsyncSession, thesis_id: int) -> bool:
+        """
+        判断论文的章节是否已全部完成（按状态聚合计数，不读取章节内容）
+
+        :param query_db: 数据库会话
+        :param thesis_id: 论文ID
+        :return: 是否全部完成
+        """
+        status_counts = await ThesisChapterDao.count_chapters_by_status(query_db, thesis_id)
+        total_count = sum(status_counts.values())
+        return total_count > 0 and status_counts.get('completed', 0) == total_count
+
+    @staticmethod
+    def _outline_has_chapters(outline_data: Any) -> bool:
+        """
+        判断大纲数据是否包含有效的章节列表
+
+        :param outline_data: 大纲数据（字典或JSON字符串）
+        :return: 是否包含章节
+        """
+        if not outline_data:
+            return False
+        # 如果是字符串，尝试解析
+        if isinstance(outline_data, str):
+            try:
+                import json
+                outline_data = json.loads(outline_data)
+            except (json.JSONDecodeError, TypeError):
+                return False
+        if not isinstance(outline_data, dict):
+            return False
+        chapters = outline_data.get('chapters')
+        return bool(chapters and isinstance(chapters, list))
+
+    @classmethod
+    async def _publish_progress(
+        cls,
+        query_db: AsyncSession,
+        redis: Optional[aioredis.Redis],
+        thesis_id: int
+    ) -> None:
+        """
+        发布论文进度（在生成流程所在会话中计算，事务提交前也能反映最新进度）
+
+        :param query_db: 数据库会话
+        :param redis: redis对象，为None时不发布
+        :param thesis_id: 论文ID
+        :return:
+        """
+        if redis is None:
+            return
+        try:
+            progress = await cls.get_thesis_progress(query_db, thesis_id)
+        except Exception as e:
+            logger.warning(f'计算论文进度失败 - 论文ID: {thesis_id}, 错误: {str(e)}')
+            return
+        await ThesisProgressNotifier.publish(redis, thesis_id, progress)
+
     @classmethod
     async def format_thesis(
         cls,
         query_db: AsyncSession,
         thesis_id: int,
-        user_id: int = None
+        user_id: int = None,
+        redis: Optional[aioredis.Redis] = None
+    ) -> CrudResponseModel:
+        """
+        格式化论文，同一论文并发的重复请求共享同一次格式化结果
+
+        :param query_db: 数据库会话
+        :param thesis_id: 论文ID
+        :param user_id: 用户ID
+        :param redis: redis对象，用于合并重复请求和推送生成进度
+        :return: 操作结果
+        """
+        return await cls._single_flight(
+            redis,
+            thesis_id,
+            'format',
+            lambda: cls._format_thesis(query_db, thesis_id, user_id, redis)
+        )
+
+    @classmethod
+    async def _format_thesis(
+        cls,
+        query_db: AsyncSession,
+        thesis_id: int,
+        user_id: int = None,
+        redis: Optional[aioredis.Redis] = None
     ) -> CrudResponseModel:
         """
         格式化论文（从模板表获取Word文档路径）
@@ -1294,6 +1809,7 @@ class ThesisService:
         :param query_db: 数据库会话
         :param thesis_id: 论文ID
         :param user_id: 用户ID
+        :param redis: redis对象，用于推送生成进度（为None时不推送）
         :return: 操作结果
         """
         # 检查论文是否存在
@@ -1309,7 +1825,7 @@ class ThesisService:
                 raise ServiceException(message=f'论文状态不正确（当前状态：{thesis.status}），无法进行格式化。请先完成章节生成。')
         
         # 检查章节是否都已完成（双重检查，确保数据一致性）
-        chapters = await ThesisChapterDao.get_chapter_list_by_thesis(query_db, thesis_id)
+        chapters = await ThesisChapterDao.get_chapter_brief_list_by_thesis(query_db, thesis_id)
         if not chapters:
             raise ServiceException(message='论文没有章节，无法进行格式化')
         
@@ -1416,6 +1932,7 @@ class ThesisService:
             })
             
             await query_db.commit()
+            await cls._publish_progress(query_db, redis, thesis_id)
             
             logger.info(f"论文格式化完成 - 论文ID: {thesis_id}, 输出文件: {format_result['formatted_file_path']}")
             
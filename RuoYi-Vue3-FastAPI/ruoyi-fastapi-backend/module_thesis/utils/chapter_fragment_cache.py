@@ -0,0 +1,135 @@
+"""
+论文章节OOXML片段缓存
+每个章节渲染后的段落（w:p）序列化为片段文件，按格式方案和章节内容的哈希命名；
+重新导出时未变化的章节直接把片段插入文档，只有修改过的章节重新渲染
+"""
+import copy
+import hashlib
+import os
+from pathlib import Path
+from typing import Any, Optional
+
+from utils.log_util import logger
+
+try:
+    from docx.oxml import OxmlElement, parse_xml
+    from docx.oxml.ns import qn
+    from lxml import etree
+except ImportError:
+    pass
+
+
+class ChapterFragmentCache:
+    """
+    单篇论文的章节片段缓存
+
+    片段只包含章节标题、正文段落和分页符，格式通过样式名引用（样式由格式方案注册），
+    不含图片等关系引用，因此可以安全地插入任意使用同一格式方案生成的文档
+    """
+
+    def __init__(self, thesis_id: int, base_dir: Optional[Path] = None) -> None:
+        self.fragment_dir = (base_dir or Path('uploads/thesis/formatted/fragments')) / f'thesis_{thesis_id}'
+        self.hits = 0
+        self.misses = 0
+        self._used_keys: set[str] = set()
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        """
+        计算片段键
+
+        :param parts: 影响渲染结果的所有输入（格式方案键、标题、样式、内容等）
+        :return: 片段键
+        """
+        sha256 = hashlib.sha256()
+        for part in parts:
+            sha256.update(str(part).encode('utf-8'))
+            sha256.update(b'\x00')
+        return sha256.hexdigest()
+
+    def _path(self, fragment_key: str) -> Path:
+        return self.fragment_dir / f'{fragment_key}.xml'
+
+    @staticmethod
+    def _body_end(body: Any) -> int:
+        """
+        文档主体中最后一个内容元素之后的位置（w:sectPr 之前）
+        """
+        children = list(body)
+        sect_pr = body.find(qn('w:sectPr'))
+        return children.index(sect_pr) if sect_pr is not None else len(children)
+
+    def mark(self, doc: Any) -> int:
+        """
+        记录章节渲染前的位置
+
+        :param doc: python-docx Document对象
+        :return: 位置标记
+        """
+        return self._body_end(doc.element.body)
+
+    def capture(self, doc: Any, start: int, fragment_key: str) -> None:
+        """
+        保存从位置标记到当前末尾之间渲染出的片段，写入失败只记录警告
+
+        :param doc: python-docx Document对象
+        :param start: mark返回的位置标记
+        :param fragment_key: 片段键
+        :return:
+        """
+        self.misses += 1
+        self._used_keys.add(fragment_key)
+        body = doc.element.body
+        wrapper = OxmlElement('w:body')
+        for element in list(body)[start : self._body_end(body)]:
+            wrapper.append(copy.deepcopy(element))
+        path = self._path(fragment_key)
+        try:
+            self.fragment_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+            tmp_path.write_bytes(etree.tostring(wrapper))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f'保存章节片段失败: {path}, 错误: {str(e)}')
+
+    def restore(self, doc: Any, fragment_key: str) -> bool:
+        """
+        将已缓存的片段插入文档末尾
+
+        :param doc: python-docx Document对象
+        :param fragment_key: 片段键
+        :return: 是否命中缓存
+        """
+        path = self._path(fragment_key)
+        try:
+            wrapper = parse_xml(path.read_bytes())
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning(f'读取章节片段失败，将重新渲染: {path}, 错误: {str(e)}')
+            return False
+        body = doc.element.body
+        sect_pr = body.find(qn('w:sectPr'))
+        for element in list(wrapper):
+            if sect_pr is not None:
+                sect_pr.addprevious(element)
+            else:
+                body.append(element)
+        self.hits += 1
+        self._used_keys.add(fragment_key)
+        return True
+
+    def prune(self) -> None:
+        """
+        删除本次导出未使用的片段（章节已修改或已删除），避免片段目录无限增长
+
+        :return:
+        """
+        if not self.fragment_dir.exists():
+            return
+        for path in self.fragment_dir.glob('*.xml'):
+            if path.stem not in self._used_keys:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
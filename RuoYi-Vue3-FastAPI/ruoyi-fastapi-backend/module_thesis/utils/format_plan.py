@@ -0,0 +1,330 @@
+"""
+论文格式方案（编译后的格式配置）
+将格式配置中的字体、字号、间距、标题和特殊章节格式一次性解析为命名的段落样式，
+渲染时段落只引用样式名，不再逐段、逐run设置格式
+"""
+from typing import Any, Dict, Optional
+
+try:
+    from docx.enum.style import WD_STYLE_TYPE
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.oxml.ns import qn
+    from docx.shared import Pt
+
+    DOCX_AVAILABLE = True
+except ImportError:
+    DOCX_AVAILABLE = False
+
+
+BODY_STYLE = 'Thesis Body'
+TITLE_STYLE = 'Thesis Title'
+
+SPECIAL_SECTION_TYPES = ['table_of_contents', 'abstract', 'keywords', 'conclusion', 'references', 'acknowledgement', 'appendix']
+
+# 标题缺少字体配置时的默认值（Markdown标题使用）
+_HEADING_DEFAULTS = {1: (16, '黑体'), 2: (14, '黑体'), 3: (12, '黑体')}
+
+
+def _to_float(value: Any, default: Optional[float] = None) -> Optional[float]:
+    """
+    转换为浮点数，无法转换时返回默认值
+    """
+    if isinstance(value, bool):
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return default
+    return default
+
+
+def _first_present(config: Dict[str, Any], *keys: str) -> Any:
+    """
+    按顺序返回第一个存在且不为None的字段值
+    """
+    for key in keys:
+        if config.get(key) is not None:
+            return config[key]
+    return None
+
+
+class FormatPlan:
+    """
+    编译后的格式方案
+
+    同一份格式指令只编译一次（由FormatService按指令内容缓存），每次生成文档时通过register_styles
+    把样式写入新文档，段落通过样式名引用格式
+    """
+
+    def __init__(self, format_config: Dict[str, Any], layout_rules: Dict[str, Any]) -> None:
+        self.format_config = format_config
+        self.layout_rules = layout_rules or {}
+        # 格式指令内容哈希，由FormatService在缓存方案时设置，用于章节片段缓存的键
+        self.plan_key = ''
+
+        format_rules = format_config.get('format_rules', {})
+        font_config = format_config.get('font', {})
+        default_font = format_rules.get('default_font', {})
+        self.default_font_name = default_font.get('name', font_config.get('name', '宋体'))
+        self.default_font_size_pt = _to_float(
+            _first_present(default_font, 'size_pt') or _first_present(font_config, 'size', 'size_pt'), 12
+        )
+        self.headings_config = format_rules.get('headings') or format_config.get('headings', {})
+        self.para_config = format_rules.get('paragraph') or format_config.get('paragraph', {})
+        self.special_sections_config = format_rules.get('special_sections') or format_config.get('special_sections', {})
+        self.special_formats = format_config.get('special_formats', {})
+
+        self.title_spacing = self.layout_rules.get('title_spacing', {})
+        self.heading_spacing = self.layout_rules.get('heading_spacing', {})
+        self.chapter_spacing = self.layout_rules.get('chapter_spacing', {})
+        self.section_spacing = self.layout_rules.get('section_spacing', {})
+        self.paragraph_spacing = self.layout_rules.get('paragraph_spacing', {})
+
+        application_rules = format_config.get('application_rules', {})
+        level_1_format = application_rules.get('chapter_numbering_format', {}).get('level_1', {})
+        self.number_style = level_1_format.get('number_style', 'arabic')
+        self.special_section_format_rules = application_rules.get('special_section_format_rules') or {
+            section_type: {'should_have_numbering': False} for section_type in SPECIAL_SECTION_TYPES
+        }
+        self.auto_generate_toc = application_rules.get('auto_generate_toc', False)
+
+        # 样式名 -> (基础样式名, 格式定义)，按依赖顺序保存
+        self.styles: Dict[str, tuple[Optional[str], Dict[str, Any]]] = {}
+        # 配置不完整（缺少字体或字号）的标题级别，章节标题遇到时报错
+        self.incomplete_headings: set[int] = set()
+        self._compile()
+
+    def _compile(self) -> None:
+        """
+        解析所有格式定义
+        """
+        self.styles[TITLE_STYLE] = (
+            None,
+            {'font_name': self.default_font_name, 'font_size': 18, 'bold': True, 'alignment': 'center'},
+        )
+        self.styles[BODY_STYLE] = (None, self._compile_body())
+
+        for level in (1, 2, 3):
+            heading = self.headings_config.get(f'h{level}')
+            if heading:
+                self.styles[self.heading_style(level)] = (None, self._compile_heading(level, heading))
+
+        for section_type, section_config in (self.special_sections_config or {}).items():
+            if not isinstance(section_config, dict):
+                continue
+            font_name = section_config.get('title_font')
+            font_size = _first_present(section_config, 'title_size_pt', 'title_size')
+            if not font_name or font_size is None:
+                continue
+            # 特殊章节未配置间距时沿用一级标题的间距
+            h1 = self.headings_config.get('h1', {})
+            space_before = section_config.get('title_spacing_before_pt')
+            if space_before is None:
+                space_before = _first_present(h1, 'spacing_before_pt', 'spacing_before')
+            space_after = section_config.get('title_spacing_after_pt')
+            if space_after is None:
+                space_after = _first_present(h1, 'spacing_after_pt', 'spacing_after')
+            self.styles[self.special_title_style(section_type)] = (
+                None,
+                {
+                    'font_name': font_name,
+                    'font_size': _to_float(font_size),
+                    'bold': section_config.get('title_bold', True),
+                    'alignment': section_config.get('title_alignment', 'center'),
+                    'space_before': _to_float(space_before),
+                    'space_after': _to_float(space_after),
+                    'first_line_indent': 0,
+                },
+            )
+
+        for section_type, special_format in (self.special_formats or {}).items():
+            if not isinstance(special_format, dict):
+                continue
+            title_format = special_format.get('title_format')
+            if title_format:
+                self.styles[self.special_lead_style(section_type)] = (
+                    BODY_STYLE,
+                    {
+                        'font_name': title_format.get('font_name', '黑体'),
+                        'font_size': _to_float(title_format.get('font_size'), 15),
+                        'bold': title_format.get('bold', True),
+                        'alignment': title_format.get('alignment', 'center'),
+                        'first_line_indent': 0,
+                    },
+                )
+            content_format = special_format.get('content_format')
+            if not content_format and 'font_name' in special_format:
+                # 关键词等简单格式
+                content_format = special_format
+            if content_format:
+                self.styles[self.special_content_style(section_type)] = (
+                    BODY_STYLE,
+                    {
+                        'font_name': content_format.get('font_name', '宋体'),
+                        'font_size': _to_float(content_format.get('font_size'), 12),
+                        'line_spacing': _to_float(content_format.get('line_spacing')),
+                    },
+                )
+
+        toc_format = (self.special_formats or {}).get('table_of_contents') or {}
+        toc_base = (
+            self.special_content_style('table_of_contents')
+            if self.special_content_style('table_of_contents') in self.styles
+            else BODY_STYLE
+        )
+        level_formats = toc_format.get('level_formats', {})
+        for level in (1, 2, 3):
+            applied_format = level_formats.get(f'level{level}') or toc_format.get('entry_format')
+            if applied_format:
+                self.styles[self.toc_style(level)] = (toc_base, self._compile_toc_entry(applied_format))
+
+    def _compile_body(self) -> Dict[str, Any]:
+        """
+        正文段落格式
+        """
+        para_config = self.para_config
+        line_spacing = para_config.get('line_spacing')
+        if isinstance(line_spacing, str):
+            line_spacing = _to_float(line_spacing, 1.5)
+        if 'first_line_indent_chars' in para_config:
+            # 字符数转换为磅值：1字符 ≈ 默认字号
+            indent_chars = _to_float(para_config['first_line_indent_chars'])
+            first_line_indent = indent_chars * self.default_font_size_pt if indent_chars is not None else None
+        else:
+            first_line_indent = _to_float(para_config.get('first_line_indent'))
+        return {
+            'font_name': self.default_font_name,
+            'font_size': self.default_font_size_pt,
+            'alignment': para_config.get('alignment', 'left'),
+            'line_spacing': _to_float(line_spacing),
+            'space_before': _to_float(para_config.get('spacing_before')),
+            'space_after': _to_float(para_config.get('spacing_after')),
+            'first_line_indent': first_line_indent,
+        }
+
+    def _compile_heading(self, level: int, heading: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        标题格式，缺少字体或字号时记录为不完整并使用默认值
+        """
+        default_size, default_name = _HEADING_DEFAULTS[level]
+        font_size = _first_present(heading, 'font_size_pt', 'font_size')
+        font_name = heading.get('font_name')
+        if font_size is None or not font_name:
+            self.incomplete_headings.add(level)
+        return {
+            'font_name': font_name or default_name,
+            'font_size': _to_float(font_size, default_size),
+            'bold': heading.get('bold', True),
+            'alignment': heading.get('alignment', 'left'),
+            'space_before': _to_float(_first_present(heading, 'spacing_before_pt', 'spacing_before')),
+            'space_after': _to_float(_first_present(heading, 'spacing_after_pt', 'spacing_after')),
+            'first_line_indent': 0,
+        }
+
+    @staticmethod
+    def _compile_toc_entry(applied_format: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        目录条目格式
+        """
+        return {
+            'font_name': applied_format.get('font_name'),
+            'font_size': _to_float(applied_format.get('font_size')),
+            'left_indent': _to_float(applied_format.get('indent')),
+            'line_spacing': _to_float(applied_format.get('line_spacing')),
+            'alignment': applied_format.get('alignment', 'justify'),
+            'space_before': _to_float(applied_format.get('spacing_before')),
+            'space_after': _to_float(applied_format.get('spacing_after')),
+        }
+
+    @staticmethod
+    def heading_style(level: int) -> str:
+        return f'Thesis Heading {level}'
+
+    @staticmethod
+    def special_title_style(section_type: str) -> str:
+        return f"Thesis {section_type.replace('_', ' ').title()} Title"
+
+    @staticmethod
+    def special_lead_style(section_type: str) -> str:
+        return f"Thesis {section_type.replace('_', ' ').title()} Lead"
+
+    @staticmethod
+    def special_content_style(section_type: str) -> str:
+        return f"Thesis {section_type.replace('_', ' ').title()} Content"
+
+    @staticmethod
+    def toc_style(level: int) -> str:
+        return f'Thesis TOC {level}'
+
+    def has_style(self, style_name: str) -> bool:
+        """
+        是否存在指定样式
+
+        :param style_name: 样式名
+        :return: 是否存在
+        """
+        return style_name in self.styles
+
+    def register_styles(self, doc: Any) -> None:
+        """
+        将方案中的样式写入文档，并设置文档默认字体（Normal样式）
+
+        :param doc: python-docx Document对象
+        :return:
+        """
+        normal_style = doc.styles['Normal']
+        self._apply_spec(
+            normal_style, {'font_name': self.default_font_name, 'font_size': self.default_font_size_pt}
+        )
+        for style_name, (base_style_name, spec) in self.styles.items():
+            try:
+                style = doc.styles[style_name]
+            except KeyError:
+                style = doc.styles.add_style(style_name, WD_STYLE_TYPE.PARAGRAPH)
+            style.base_style = doc.styles[base_style_name] if base_style_name else normal_style
+            style.quick_style = True
+            self._apply_spec(style, spec)
+
+    @staticmethod
+    def _apply_spec(style: Any, spec: Dict[str, Any]) -> None:
+        """
+        将格式定义应用到样式
+        """
+        font = style.font
+        if spec.get('font_name'):
+            font.name = spec['font_name']
+            # 设置中文字体
+            font.element.get_or_add_rPr().get_or_add_rFonts().set(qn('w:eastAsia'), spec['font_name'])
+        if spec.get('font_size') is not None:
+            font.size = Pt(spec['font_size'])
+        if spec.get('bold') is not None:
+            font.bold = spec['bold']
+
+        paragraph_format = style.paragraph_format
+        if spec.get('alignment'):
+            paragraph_format.alignment = _ALIGNMENTS.get(spec['alignment'], WD_ALIGN_PARAGRAPH.LEFT)
+        if spec.get('line_spacing') is not None:
+            paragraph_format.line_spacing = spec['line_spacing']
+        if spec.get('space_before') is not None:
+            paragraph_format.space_before = Pt(spec['space_before'])
+        if spec.get('space_after') is not None:
+            paragraph_format.space_after = Pt(spec['space_after'])
+        if spec.get('first_line_indent') is not None:
+            paragraph_format.first_line_indent = Pt(spec['first_line_indent'])
+        if spec.get('left_indent') is not None:
+            paragraph_format.left_indent = Pt(spec['left_indent'])
+
+
+_ALIGNMENTS = (
+    {
+        'left': WD_ALIGN_PARAGRAPH.LEFT,
+        'center': WD_ALIGN_PARAGRAPH.CENTER,
+        'right': WD_ALIGN_PARAGRAPH.RIGHT,
+        'justify': WD_ALIGN_PARAGRAPH.JUSTIFY,
+    }
+    if DOCX_AVAILABLE
+    else {}
+)
@@ -0,0 +1,120 @@
+"""
+论文生成进度推送
+生成流程在章节状态变化时通过Redis pub/sub发布进度投影，SSE接口订阅后转发给前端，
+前端不再轮询进度接口
+"""
+import asyncio
+import json
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Any, Optional
+
+from redis import asyncio as aioredis
+
+from utils.log_util import logger
+
+
+class ThesisProgressNotifier:
+    """
+    论文进度通知工具类
+
+    生成流程在单个事务中执行，提交前其它会话查询不到中间进度，
+    因此发布的消息直接携带生成流程所在会话计算出的进度投影
+    """
+
+    channel_prefix = 'thesis_progress'
+    heartbeat_seconds = 15
+    stream_timeout_seconds = 3600
+
+    @classmethod
+    def channel(cls, thesis_id: int) -> str:
+        """
+        获取论文进度频道名
+
+        :param thesis_id: 论文ID
+        :return: 频道名
+        """
+        return f'{cls.channel_prefix}:{thesis_id}'
+
+    @staticmethod
+    def is_finished(progress: dict[str, Any]) -> bool:
+        """
+        判断进度是否已到终态（大纲、章节、格式化全部完成）
+
+        :param progress: 进度投影
+        :return: 是否结束
+        """
+        return progress.get('total_progress', 0) >= 100
+
+    @classmethod
+    async def publish(cls, redis: Optional[aioredis.Redis], thesis_id: int, progress: dict[str, Any]) -> None:
+        """
+        发布进度投影，发布失败只记录警告，不影响生成流程
+
+        :param redis: redis对象，为None时不发布
+        :param thesis_id: 论文ID
+        :param progress: 进度投影
+        :return:
+        """
+        if redis is None:
+            return
+        try:
+            await redis.publish(cls.channel(thesis_id), json.dumps(progress, ensure_ascii=False, default=str))
+        except Exception as e:
+            logger.warning(f'发布论文进度失败 - 论文ID: {thesis_id}, 错误: {str(e)}')
+
+    @staticmethod
+    def _format_event(event: str, data: Any) -> str:
+        payload = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False, default=str)
+        return f'event: {event}\ndata: {payload}\n\n'
+
+    @classmethod
+    async def stream(
+        cls,
+        redis: aioredis.Redis,
+        thesis_id: int,
+        snapshot_loader: Callable[[], Awaitable[dict[str, Any]]],
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+    ) -> AsyncIterator[str]:
+        """
+        SSE事件流：先订阅频道再发送当前进度快照，之后转发发布的进度，空闲时发送心跳，
+        进度到达终态、客户端断开或超过最长时长后结束
+
+        :param redis: redis对象
+        :param thesis_id: 论文ID
+        :param snapshot_loader: 加载当前进度快照的函数
+        :param is_disconnected: 判断客户端是否已断开的函数
+        :return: SSE文本片段
+        """
+        pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            # 先订阅再读快照，快照与订阅之间发布的进度不会丢失
+            await pubsub.subscribe(cls.channel(thesis_id))
+            snapshot = await snapshot_loader()
+            yield cls._format_event('progress', snapshot)
+            if cls.is_finished(snapshot):
+                return
+            deadline = time.monotonic() + cls.stream_timeout_seconds
+            while time.monotonic() < deadline:
+                if is_disconnected is not None and await is_disconnected():
+                    return
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=cls.heartbeat_seconds)
+                if message is None:
+                    yield ': heartbeat\n\n'
+                    continue
+                data = message.get('data')
+                yield cls._format_event('progress', data)
+                try:
+                    if cls.is_finished(json.loads(data)):
+                        return
+                except (TypeError, ValueError):
+                    pass
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f'论文进度推送中断 - 论文ID: {thesis_id}, 错误: {str(e)}')
+        finally:
+            try:
+                await pubsub.aclose() if hasattr(pubsub, 'aclose') else await pubsub.close()
+            except Exception:
+                pass
@@ -0,0 +1,170 @@
+"""
+论文版本快照清单
+章节内容按SHA-256哈希单独存储一次，版本只保存章节哈希列表和论文元数据；
+元数据每隔若干版本保存一次完整值（关键帧），其余版本只保存相对上一版本的变化
+"""
+import hashlib
+from typing import Any, Optional
+
+MANIFEST_FORMAT = 'cas-v1'
+
+# 随版本保存的论文元数据字段
+META_FIELDS = ('title', 'major', 'degree_level', 'research_direction', 'keywords', 'thesis_type', 'template_id')
+
+# 随版本保存的章节字段（内容以哈希引用）
+CHAPTER_FIELDS = ('chapter_id', 'title', 'level', 'order_num', 'status', 'word_count')
+
+# 元数据关键帧间隔
+KEYFRAME_INTERVAL = 20
+
+
+def content_hash(content: Optional[str]) -> str:
+    """
+    计算章节内容哈希
+
+    :param content: 章节内容
+    :return: SHA-256十六进制字符串
+    """
+    return hashlib.sha256((content or '').encode('utf-8')).hexdigest()
+
+
+def is_manifest(snapshot_data: Any) -> bool:
+    """
+    判断快照数据是否为内容寻址清单（旧版本保存的是完整快照）
+
+    :param snapshot_data: 版本快照数据
+    :return: 是否为清单
+    """
+    return isinstance(snapshot_data, dict) and snapshot_data.get('format') == MANIFEST_FORMAT
+
+
+def is_keyframe(manifest: dict[str, Any]) -> bool:
+    """
+    判断清单是否保存了完整元数据
+
+    :param manifest: 快照清单
+    :return: 是否为关键帧
+    """
+    return 'meta' in manifest
+
+
+def meta_delta(base_meta: dict[str, Any], meta: dict[str, Any]) -> dict[str, Any]:
+    """
+    计算元数据相对基准的变化
+
+    :param base_meta: 基准元数据
+    :param meta: 当前元数据
+    :return: 发生变化的字段
+    """
+    return {field: meta.get(field) for field in META_FIELDS if meta.get(field) != base_meta.get(field)}
+
+
+def build_manifest(
+    chapters: list[dict[str, Any]],
+    meta: dict[str, Any],
+    base_meta: Optional[dict[str, Any]] = None,
+    keyframe: bool = True,
+) -> dict[str, Any]:
+    """
+    构建快照清单
+
+    :param chapters: 章节列表，每项包含CHAPTER_FIELDS和hash
+    :param meta: 当前论文元数据
+    :param base_meta: 上一版本的元数据，keyframe为False时必须提供
+    :param keyframe: 是否保存完整元数据
+    :return: 快照清单
+    """
+    manifest = {
+        'format': MANIFEST_FORMAT,
+        'chapters': [{**{field: chapter.get(field) for field in CHAPTER_FIELDS}, 'hash': chapter['hash']} for chapter in chapters],
+    }
+    if keyframe or base_meta is None:
+        manifest['meta'] = {field: meta.get(field) for field in META_FIELDS}
+    else:
+        manifest['meta_delta'] = meta_delta(base_meta, meta)
+    return manifest
+
+
+def resolve_meta(chain: list[dict[str, Any]]) -> dict[str, Any]:
+    """
+    还原版本的完整元数据
+
+    :param chain: 从目标版本向前直到关键帧的清单列表（新到旧）
+    :return: 完整元数据
+    """
+    meta: dict[str, Any] = {}
+    for manifest in reversed(chain):
+        if is_keyframe(manifest):
+            meta = dict(manifest['meta'])
+        else:
+            meta.update(manifest.get('meta_delta') or {})
+    return meta
+
+
+def chapter_hashes(manifest: dict[str, Any]) -> set[str]:
+    """
+    获取清单引用的全部内容哈希
+
+    :param manifest: 快照清单
+    :return: 哈希集合
+    """
+    return {chapter['hash'] for chapter in manifest.get('chapters', [])}
+
+
+def same_snapshot(
+    manifest: dict[str, Any], chapters: list[dict[str, Any]], meta: dict[str, Any], base_meta: dict[str, Any]
+) -> bool:
+    """
+    判断当前论文状态是否与清单完全一致（一致时不必创建新版本）
+
+    :param manifest: 最新版本的清单
+    :param chapters: 当前章节列表
+    :param meta: 当前元数据
+    :param base_meta: 最新版本的完整元数据
+    :return: 是否一致
+    """
+    current = build_manifest(chapters, meta)
+    return current['chapters'] == manifest.get('chapters') and not meta_delta(base_meta, meta)
+
+
+def diff_manifests(
+    old: dict[str, Any], new: dict[str, Any], old_meta: dict[str, Any], new_meta: dict[str, Any]
+) -> dict[str, Any]:
+    """
+    比较两个版本（只比较哈希和章节属性，不读取章节内容）
+
+    :param old: 旧版本清单
+    :param new: 新版本清单
+    :param old_meta: 旧版本完整元数据
+    :param new_meta: 新版本完整元数据
+    :return: 差异信息
+    """
+    old_chapters = {chapter['chapter_id']: chapter for chapter in old.get('chapters', [])}
+    new_chapters = {chapter['chapter_id']: chapter for chapter in new.get('chapters', [])}
+    added = [chapter for chapter_id, chapter in new_chapters.items() if chapter_id not in old_chapters]
+    removed = [chapter for chapter_id, chapter in old_chapters.items() if chapter_id not in new_chapters]
+    modified = []
+    for chapter_id, chapter in new_chapters.items():
+        previous = old_chapters.get(chapter_id)
+        if previous is None:
+            continue
+        changes = [field for field in CHAPTER_FIELDS[1:] if previous.get(field) != chapter.get(field)]
+        if previous['hash'] != chapter['hash']:
+            changes.append('content')
+        if changes:
+            modified.append(
+                {
+                    'chapter_id': chapter_id,
+                    'title': chapter.get('title'),
+                    'changes': changes,
+                    'word_count_delta': (chapter.get('word_count') or 0) - (previous.get('word_count') or 0),
+                }
+            )
+    return {
+        'meta_changes': {
+            field: {'old': old_meta.get(field), 'new': new_meta.get(field)} for field in meta_delta(old_meta, new_meta)
+        },
+        'added_chapters': added,
+        'removed_chapters': removed,
+        'modified_chapters': modified,
+    }
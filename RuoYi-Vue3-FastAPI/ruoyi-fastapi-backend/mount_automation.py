@@ -4,6 +4,7 @@
 """
 import os
 import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Optional
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
@@ -181,6 +182,30 @@ def mount_automation_app(main_app: FastAPI) -> bool:
                 logger.error(f"WebSocket error: {e}", exc_info=True)
                 manager.disconnect(websocket)
         
+        # 随主应用启动自动化任务调度器（多worker时自动选举主节点，各worker共同消费执行队列）
+        # 以及通知发件箱分发器
+        from src.task.scheduler import APSCHEDULER_AVAILABLE, get_global_scheduler
+        from src.notifications.outbox import outbox_dispatcher
+        from src.notifications.triggers import trigger as notification_trigger
+        
+        parent_lifespan = main_app.router.lifespan_context
+        
+        @asynccontextmanager
+        async def automation_lifespan(app: FastAPI):
+            async with parent_lifespan(app) as state:
+                await outbox_dispatcher.start()
+                if APSCHEDULER_AVAILABLE:
+                    await get_global_scheduler().start_scheduler()
+                try:
+                    yield state
+                finally:
+                    if APSCHEDULER_AVAILABLE:
+                        await get_global_scheduler().stop_scheduler()
+                    await notification_trigger.drain()
+                    await outbox_dispatcher.stop()
+        
+        main_app.router.lifespan_context = automation_lifespan
+        
         # 添加 automation 的根路径
         @main_app.get("/automation")
         async def automation_root():
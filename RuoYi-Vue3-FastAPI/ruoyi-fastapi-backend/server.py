@@ -23,6 +23,7 @@ from middlewares.handle import handle_middleware
 from sub_applications.handle import handle_sub_applications
 from utils.common_util import worship
 from utils.log_util import logger
+from utils.near_cache_util import NearCacheUtil
 
 
 # 生命周期事件
@@ -34,11 +35,13 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     app.state.redis = await RedisUtil.create_redis_pool()
     await RedisUtil.init_sys_dict(app.state.redis)
     await RedisUtil.init_sys_config(app.state.redis)
-    await SchedulerUtil.init_system_scheduler()
+    await NearCacheUtil.start_listener(app.state.redis)
+    await SchedulerUtil.init_system_scheduler(app.state.redis)
     logger.info(f'🚀 {AppConfig.app_name}启动成功')
     yield
-    await RedisUtil.close_redis_pool(app)
+    await NearCacheUtil.stop_listener()
     await SchedulerUtil.close_system_scheduler()
+    await RedisUtil.close_redis_pool(app)
 
 
 def setup_docs_static_resources(
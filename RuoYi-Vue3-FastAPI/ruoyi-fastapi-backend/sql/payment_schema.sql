@@ -72,6 +72,45 @@ CREATE TABLE IF NOT EXISTS ai_write_payment_transaction (
   INDEX idx_create_time (create_time)
 ) ENGINE=INNODB DEFAULT CHARSET=utf8mb4 COMMENT = '支付流水表';
 
+-- 支付流水日统计表（按流水创建日期汇总，流水新增和状态变化时增量更新）
+CREATE TABLE IF NOT EXISTS ai_write_payment_stat_daily (
+  stat_date         DATE            NOT NULL                   COMMENT '统计日期',
+  total_count       INT(11)         DEFAULT 0                  COMMENT '流水总数',
+  total_amount      DECIMAL(14,2)   DEFAULT 0.00               COMMENT '交易总额',
+  success_count     INT(11)         DEFAULT 0                  COMMENT '成功笔数',
+  success_amount    DECIMAL(14,2)   DEFAULT 0.00               COMMENT '成功金额',
+  pending_count     INT(11)         DEFAULT 0                  COMMENT '处理中笔数',
+  pending_amount    DECIMAL(14,2)   DEFAULT 0.00               COMMENT '处理中金额',
+  refunded_count    INT(11)         DEFAULT 0                  COMMENT '退款笔数',
+  refunded_amount   DECIMAL(14,2)   DEFAULT 0.00               COMMENT '退款金额',
+  fee_amount        DECIMAL(14,2)   DEFAULT 0.00               COMMENT '手续费',
+  update_time       DATETIME                                   COMMENT '更新时间',
+  PRIMARY KEY (stat_date)
+) ENGINE=INNODB DEFAULT CHARSET=utf8mb4 COMMENT = '支付流水日统计表';
+
+-- 按已有流水回填日统计
+INSERT INTO ai_write_payment_stat_daily (stat_date, total_count, total_amount, success_count, success_amount, pending_count, pending_amount, refunded_count, refunded_amount, fee_amount, update_time)
+SELECT DATE(create_time),
+       COUNT(*),
+       IFNULL(SUM(amount), 0),
+       SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END),
+       IFNULL(SUM(CASE WHEN status = 'success' THEN amount ELSE 0 END), 0),
+       SUM(CASE WHEN status = 'pending' THEN 1 ELSE 0 END),
+       IFNULL(SUM(CASE WHEN status = 'pending' THEN amount ELSE 0 END), 0),
+       SUM(CASE WHEN status = 'refunded' THEN 1 ELSE 0 END),
+       IFNULL(SUM(CASE WHEN status = 'refunded' THEN amount ELSE 0 END), 0),
+       IFNULL(SUM(fee_amount), 0),
+       NOW()
+FROM ai_write_payment_transaction
+WHERE del_flag = '0' AND create_time IS NOT NULL
+GROUP BY DATE(create_time)
+ON DUPLICATE KEY UPDATE
+  total_count = VALUES(total_count), total_amount = VALUES(total_amount),
+  success_count = VALUES(success_count), success_amount = VALUES(success_amount),
+  pending_count = VALUES(pending_count), pending_amount = VALUES(pending_amount),
+  refunded_count = VALUES(refunded_count), refunded_amount = VALUES(refunded_amount),
+  fee_amount = VALUES(fee_amount), update_time = VALUES(update_time);
+
 -- =============================================
 -- 初始化配置数据
 -- =============================================
@@ -384,7 +384,7 @@ create table ai_write_thesis_version (
   thesis_id         bigint(20)      not null                   comment '论文ID',
   version_number    int(11)         not null                   comment '版本号',
   
-  snapshot_data     json            not null                   comment '快照数据（JSON格式）',
+  snapshot_data     json            not null                   comment '快照清单（章节内容哈希列表及元数据增量，JSON格式）',
   
   change_desc       varchar(200)    default ''                 comment '变更描述',
   changed_by        varchar(64)     default ''                 comment '变更人',
@@ -394,3 +394,41 @@ create table ai_write_thesis_version (
   primary key (version_id),
   index idx_thesis (thesis_id, version_number)
 ) engine=innodb auto_increment=100 comment = '论文版本历史表';
+
+
+-- ----------------------------
+-- 14、格式分析缓存表
+-- ----------------------------
+drop table if exists ai_write_format_analysis_cache;
+create table ai_write_format_analysis_cache (
+  cache_id          bigint(20)      not null auto_increment    comment '缓存ID',
+  content_hash      char(64)        not null                   comment '模板文件内容SHA-256',
+  analysis_version  varchar(100)    not null                   comment '分析版本（提示词版本+指令系统版本）',
+  
+  analysis_result   json            not null                   comment '分析结果（JSON格式）',
+  file_size         bigint(20)      default 0                  comment '文件大小（字节）',
+  hit_count         int(11)         default 0                  comment '命中次数',
+  last_hit_time     datetime        default null               comment '最近命中时间',
+  
+  create_time       datetime                                   comment '创建时间',
+  primary key (cache_id),
+  unique key uk_content_version (content_hash, analysis_version)
+) engine=innodb auto_increment=100 comment = '格式分析缓存表';
+
+
+-- ----------------------------
+-- 15、论文章节内容存储表（按内容哈希去重）
+-- ----------------------------
+drop table if exists ai_write_thesis_content_blob;
+create table ai_write_thesis_content_blob (
+  blob_id           bigint(20)      not null auto_increment    comment '内容ID',
+  thesis_id         bigint(20)      not null                   comment '论文ID',
+  content_hash      char(64)        not null                   comment '章节内容SHA-256',
+  
+  content           longtext                                   comment '章节内容',
+  content_size      int(11)         default 0                  comment '内容长度（字符）',
+  
+  create_time       datetime                                   comment '创建时间',
+  primary key (blob_id),
+  unique key uk_thesis_hash (thesis_id, content_hash)
+) engine=innodb auto_increment=100 comment = '论文章节内容存储表';
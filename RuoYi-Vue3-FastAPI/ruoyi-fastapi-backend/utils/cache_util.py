@@ -0,0 +1,99 @@
+import uuid
+from typing import Optional
+
+from redis import asyncio as aioredis
+
+
+class CacheUtil:
+    """
+    Redis缓存键管理工具类
+
+    只使用SCAN系列命令遍历键，删除使用非事务管道批量UNLINK（后台线程释放内存），
+    避免KEYS/DEL在键数量较多时阻塞整个Redis实例。
+    """
+
+    scan_count = 1000
+    batch_size = 500
+
+    @classmethod
+    async def scan_keys(cls, redis: aioredis.Redis, match: str, limit: Optional[int] = None) -> list[str]:
+        """
+        使用SCAN获取匹配的键列表
+
+        :param redis: redis对象
+        :param match: 匹配模式
+        :param limit: 最多返回的键数量，为None时不限制
+        :return: 键列表
+        """
+        keys = []
+        async for key in redis.scan_iter(match=match, count=cls.scan_count):
+            keys.append(key)
+            if limit is not None and len(keys) >= limit:
+                break
+        return keys
+
+    @classmethod
+    async def unlink_keys(cls, redis: aioredis.Redis, keys: list[str]) -> int:
+        """
+        分批UNLINK指定的键
+
+        :param redis: redis对象
+        :param keys: 键列表
+        :return: 删除的键数量
+        """
+        deleted = 0
+        for start in range(0, len(keys), cls.batch_size):
+            pipe = redis.pipeline(transaction=False)
+            pipe.unlink(*keys[start : start + cls.batch_size])
+            deleted += sum(await pipe.execute())
+        return deleted
+
+    @classmethod
+    async def unlink_by_pattern(cls, redis: aioredis.Redis, match: str) -> int:
+        """
+        边SCAN边分批UNLINK匹配的键（不在内存中保存全部键）
+
+        :param redis: redis对象
+        :param match: 匹配模式
+        :return: 删除的键数量
+        """
+        deleted = 0
+        batch = []
+        async for key in redis.scan_iter(match=match, count=cls.scan_count):
+            batch.append(key)
+            if len(batch) >= cls.batch_size:
+                deleted += await cls.unlink_keys(redis, batch)
+                batch = []
+        if batch:
+            deleted += await cls.unlink_keys(redis, batch)
+        return deleted
+
+    @classmethod
+    async def replace_hash(cls, redis: aioredis.Redis, name: str, mapping: dict[str, str]) -> None:
+        """
+        原子替换整个Hash：先写入临时键再RENAME，重建期间读取方始终能读到完整的旧数据或新数据
+
+        :param redis: redis对象
+        :param name: Hash键名
+        :param mapping: 新的field-value映射
+        :return:
+        """
+        if not mapping:
+            await redis.unlink(name)
+            return
+        tmp_name = f'{name}:rebuild:{uuid.uuid4().hex}'
+        pipe = redis.pipeline(transaction=True)
+        pipe.hset(tmp_name, mapping=mapping)
+        pipe.rename(tmp_name, name)
+        await pipe.execute()
+
+    @classmethod
+    async def hash_fields(cls, redis: aioredis.Redis, name: str) -> list[str]:
+        """
+        使用HSCAN获取Hash的全部field
+
+        :param redis: redis对象
+        :param name: Hash键名
+        :return: field列表
+        """
+        return [field async for field, _ in redis.hscan_iter(name, count=cls.scan_count)]
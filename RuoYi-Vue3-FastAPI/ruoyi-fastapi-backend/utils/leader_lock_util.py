@@ -0,0 +1,126 @@
+import os
+import socket
+import time
+import uuid
+from typing import Optional
+
+from redis import asyncio as aioredis
+
+# 加锁成功时递增并返回隔离令牌，失败返回0
+ACQUIRE_SCRIPT = """
+if redis.call('set', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return redis.call('incr', KEYS[2])
+end
+return 0
+"""
+
+# 仅当锁仍由自己持有时续期
+RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# 仅当锁仍由自己持有时释放
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# 仅当锁仍由自己持有且隔离令牌未变化时写入队列，失败返回-1
+FENCED_PUSH_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] and redis.call('get', KEYS[2]) == ARGV[2] then
+    return redis.call('lpush', KEYS[3], unpack(ARGV, 3))
+end
+return -1
+"""
+
+
+class LeaderLock:
+    """
+    基于Redis的主节点租约锁
+
+    多个进程竞争同一个锁键，持有者需要在租约到期前续期；每次成功加锁时递增隔离令牌（fencing token），
+    持有者的写操作通过fenced_lpush以令牌为条件执行，进程暂停或网络分区导致租约被他人接管后，
+    旧持有者的写入会被拒绝。
+    """
+
+    def __init__(self, redis: aioredis.Redis, name: str, ttl_seconds: int) -> None:
+        self.redis = redis
+        self.key = f'leader_lock:{name}'
+        self.fencing_key = f'leader_lock:{name}:fencing_token'
+        self.ttl_ms = int(ttl_seconds * 1000)
+        self.holder = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.token: Optional[int] = None
+        self._deadline = 0.0
+        self._acquire = redis.register_script(ACQUIRE_SCRIPT)
+        self._renew = redis.register_script(RENEW_SCRIPT)
+        self._release = redis.register_script(RELEASE_SCRIPT)
+        self._fenced_push = redis.register_script(FENCED_PUSH_SCRIPT)
+
+    @property
+    def is_leader(self) -> bool:
+        """
+        当前进程是否持有锁且本地租约未到期
+
+        :return: 是否为主节点
+        """
+        return self.token is not None and time.monotonic() < self._deadline
+
+    async def acquire(self) -> Optional[int]:
+        """
+        尝试加锁
+
+        :return: 加锁成功时返回隔离令牌，否则返回None
+        """
+        started = time.monotonic()
+        token = int(await self._acquire(keys=[self.key, self.fencing_key], args=[self.holder, self.ttl_ms]))
+        if token:
+            self.token = token
+            self._deadline = started + self.ttl_ms / 1000
+            return token
+        return None
+
+    async def renew(self) -> bool:
+        """
+        续期租约
+
+        :return: 是否续期成功，失败说明锁已被他人持有
+        """
+        started = time.monotonic()
+        if await self._renew(keys=[self.key], args=[self.holder, self.ttl_ms]):
+            self._deadline = started + self.ttl_ms / 1000
+            return True
+        self.token = None
+        return False
+
+    async def release(self) -> None:
+        """
+        主动释放锁，其他进程无需等待租约到期即可接管
+
+        :return:
+        """
+        if self.token is not None:
+            self.token = None
+            await self._release(keys=[self.key], args=[self.holder])
+
+    async def fenced_lpush(self, name: str, *values: str) -> bool:
+        """
+        以当前隔离令牌为条件执行LPUSH
+
+        :param name: 列表键名
+        :param values: 写入的值
+        :return: 是否写入成功，失败说明已失去主节点身份
+        """
+        if self.token is None:
+            return False
+        result = await self._fenced_push(
+            keys=[self.key, self.fencing_key, name], args=[self.holder, self.token, *values]
+        )
+        if int(result) < 0:
+            self.token = None
+            return False
+        return True
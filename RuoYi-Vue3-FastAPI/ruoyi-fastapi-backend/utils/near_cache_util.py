@@ -0,0 +1,198 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from typing import Any, Optional, Union
+
+from redis import asyncio as aioredis
+
+from utils.log_util import logger
+
+
+class NearCacheUtil:
+    """
+    进程内近端缓存工具类
+
+    位于Redis之前的一级缓存，用于字典、参数配置这类读多写少的数据。
+    每个命名空间维护一个单调递增的版本号：写操作通过Redis递增版本号并经由pub/sub
+    广播失效消息，各worker收到后丢弃本地条目；读操作只有在加载期间版本号未变化时
+    才写入本地缓存，避免失效消息与回源读取交错时缓存旧值。
+    本地条目另有兜底过期时间，订阅连接中断期间错过的失效消息也能自动恢复。
+    """
+
+    channel = 'near_cache:invalidate'
+    ttl_seconds = 300
+    _origin = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+    _entries: dict[str, dict[str, tuple[int, float, Any]]] = {}
+    _versions: dict[str, int] = {}
+    _listener_task: Optional[asyncio.Task] = None
+    _hits = 0
+    _misses = 0
+
+    @classmethod
+    def _bump_local_version(cls, namespace: str, key: Optional[str] = None, version: Optional[int] = None) -> None:
+        """
+        使本地缓存失效并推进版本号
+
+        :param namespace: 命名空间
+        :param key: 缓存键，为None时使整个命名空间失效
+        :param version: 远端版本号
+        :return:
+        """
+        current = cls._versions.get(namespace, 0)
+        cls._versions[namespace] = max(current + 1, version or 0)
+        if key is None:
+            cls._entries.pop(namespace, None)
+        else:
+            cls._entries.get(namespace, {}).pop(key, None)
+
+    @classmethod
+    async def get_or_load(cls, namespace: str, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        从近端缓存获取数据，未命中时调用loader回源（通常为读取Redis）
+
+        :param namespace: 命名空间
+        :param key: 缓存键
+        :param loader: 回源加载函数
+        :return: 缓存数据（调用方应视为只读）
+        """
+        entry = cls._entries.get(namespace, {}).get(key)
+        version = cls._versions.get(namespace, 0)
+        if entry and entry[0] == version and entry[1] > time.monotonic():
+            cls._hits += 1
+            return entry[2]
+
+        cls._misses += 1
+        value = await loader()
+        # 加载期间收到失效消息时不写入，下一次读取重新回源
+        if cls._versions.get(namespace, 0) == version:
+            cls._entries.setdefault(namespace, {})[key] = (version, time.monotonic() + cls.ttl_seconds, value)
+        return value
+
+    @classmethod
+    async def publish_invalidation(
+        cls, redis: aioredis.Redis, namespace: str, keys: Optional[Union[str, list[str]]] = None
+    ) -> None:
+        """
+        广播失效消息（在新增、编辑、删除、刷新缓存之后调用）
+
+        :param redis: redis对象
+        :param namespace: 命名空间
+        :param keys: 失效的缓存键，为None时使整个命名空间失效
+        :return:
+        """
+        key_list = [keys] if isinstance(keys, str) else keys
+        version = await redis.incr(f'{cls.channel}:version:{namespace}')
+        if key_list is None:
+            cls._bump_local_version(namespace, version=version)
+        else:
+            for key in key_list:
+                cls._bump_local_version(namespace, key, version)
+        message = {'origin': cls._origin, 'namespace': namespace, 'keys': key_list, 'version': version}
+        await redis.publish(cls.channel, json.dumps(message, ensure_ascii=False))
+
+    @classmethod
+    def _handle_message(cls, data: str) -> None:
+        """
+        处理失效消息
+
+        :param data: 消息内容
+        :return:
+        """
+        try:
+            message = json.loads(data)
+        except (TypeError, ValueError):
+            return
+        if message.get('origin') == cls._origin:
+            return
+        namespace = message.get('namespace')
+        keys = message.get('keys')
+        if keys is None:
+            cls._bump_local_version(namespace, version=message.get('version'))
+        else:
+            for key in keys:
+                cls._bump_local_version(namespace, key, message.get('version'))
+
+    @classmethod
+    async def _listen(cls, redis: aioredis.Redis) -> None:
+        """
+        订阅失效频道，连接异常时清空本地缓存并重连
+
+        :param redis: redis对象
+        :return:
+        """
+        while True:
+            pubsub = redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(cls.channel)
+                # 订阅建立前可能错过消息，重新订阅后一律从Redis回源
+                cls.clear()
+                async for message in pubsub.listen():
+                    if message.get('type') == 'message':
+                        cls._handle_message(message.get('data'))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f'近端缓存失效订阅中断，稍后重连：{e}')
+                cls.clear()
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.aclose() if hasattr(pubsub, 'aclose') else await pubsub.close()
+                except Exception:
+                    pass
+
+    @classmethod
+    async def start_listener(cls, redis: aioredis.Redis) -> None:
+        """
+        应用启动时开始订阅失效消息
+
+        :param redis: redis对象
+        :return:
+        """
+        if cls._listener_task is None or cls._listener_task.done():
+            cls._listener_task = asyncio.create_task(cls._listen(redis))
+            logger.info('✅️ 近端缓存失效订阅已启动')
+
+    @classmethod
+    async def stop_listener(cls) -> None:
+        """
+        应用关闭时停止订阅
+
+        :return:
+        """
+        if cls._listener_task is not None:
+            cls._listener_task.cancel()
+            try:
+                await cls._listener_task
+            except asyncio.CancelledError:
+                pass
+            cls._listener_task = None
+        cls.clear()
+
+    @classmethod
+    def clear(cls) -> None:
+        """
+        清空本地缓存
+
+        :return:
+        """
+        for namespace in list(cls._entries.keys()) + list(cls._versions.keys()):
+            cls._bump_local_version(namespace)
+
+    @classmethod
+    def get_stats(cls) -> dict[str, Any]:
+        """
+        获取近端缓存统计
+
+        :return: 命中次数、未命中次数及各命名空间条目数
+        """
+        total = cls._hits + cls._misses
+        return {
+            'hits': cls._hits,
+            'misses': cls._misses,
+            'hit_rate': round(cls._hits / total, 4) if total else 0.0,
+            'entries': {namespace: len(entries) for namespace, entries in cls._entries.items()},
+        }
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from typing import Any, Optional
+
+from redis import asyncio as aioredis
+
+from exceptions.exception import ServiceException
+from utils.leader_lock_util import RELEASE_SCRIPT, RENEW_SCRIPT
+from utils.log_util import logger
+
+
+class SingleFlight:
+    """
+    基于Redis的单飞（single-flight）工具类
+
+    同一操作键同时只执行一次：本进程内的重复调用直接等待同一个Future，
+    其他worker的重复调用在加锁失败后等待持有者写入结果键（结果以本次执行ID标记），
+    持有者异常退出、锁过期后由等待者接管执行
+    """
+
+    key_prefix = 'single_flight'
+    poll_interval = 0.5
+    _inflight: dict[str, asyncio.Future] = {}
+
+    @classmethod
+    def _lock_key(cls, name: str) -> str:
+        return f'{cls.key_prefix}:{name}:lock'
+
+    @classmethod
+    def _result_key(cls, name: str) -> str:
+        return f'{cls.key_prefix}:{name}:result'
+
+    @classmethod
+    async def run(
+        cls,
+        redis: Optional[aioredis.Redis],
+        name: str,
+        func: Callable[[], Awaitable[Any]],
+        dumps: Callable[[Any], Any] = lambda value: value,
+        loads: Callable[[Any], Any] = lambda value: value,
+        lock_ttl: int = 120,
+        result_ttl: int = 60,
+        wait_timeout: int = 1800,
+    ) -> Any:
+        """
+        以单飞方式执行操作，重复调用共享同一次执行的结果或异常
+
+        :param redis: redis对象，为None时只在本进程内合并
+        :param name: 操作键，如 thesis:1:outline
+        :param func: 实际执行的操作
+        :param dumps: 将结果转换为可JSON序列化的数据（供其他worker读取）
+        :param loads: 将结果键中的数据还原为结果
+        :param lock_ttl: 锁租约时长（秒），执行期间自动续期
+        :param result_ttl: 结果键保留时长（秒）
+        :param wait_timeout: 等待其他worker执行结果的最长时间（秒）
+        :return: 操作结果
+        """
+        inflight = cls._inflight.get(name)
+        if inflight is not None:
+            logger.info(f'合并重复请求，等待进行中的操作: {name}')
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        cls._inflight[name] = future
+        try:
+            if redis is None:
+                result = await func()
+            else:
+                result = await cls._run_distributed(
+                    redis, name, func, dumps, loads, lock_ttl, result_ttl, wait_timeout
+                )
+        except asyncio.CancelledError:
+            future.set_exception(ServiceException(message='相同操作已中断，请重试'))
+            future.exception()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # 标记异常已读取，没有等待者时不产生未处理异常警告
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            cls._inflight.pop(name, None)
+
+    @classmethod
+    async def _run_distributed(
+        cls,
+        redis: aioredis.Redis,
+        name: str,
+        func: Callable[[], Awaitable[Any]],
+        dumps: Callable[[Any], Any],
+        loads: Callable[[Any], Any],
+        lock_ttl: int,
+        result_ttl: int,
+        wait_timeout: int,
+    ) -> Any:
+        lock_key = cls._lock_key(name)
+        result_key = cls._result_key(name)
+        flight_id = uuid.uuid4().hex
+        try:
+            acquired = await redis.set(lock_key, flight_id, nx=True, px=lock_ttl * 1000)
+        except Exception as e:
+            logger.warning(f'单飞加锁失败，直接执行: {name}, 错误: {str(e)}')
+            return await func()
+        if acquired:
+            return await cls._lead(redis, name, flight_id, func, dumps, lock_ttl, result_ttl)
+
+        logger.info(f'相同操作正在其他进程执行，等待结果: {name}')
+        following = await redis.get(lock_key)
+        deadline = time.monotonic() + wait_timeout
+        while time.monotonic() < deadline:
+            raw = await redis.get(result_key)
+            if raw:
+                payload = json.loads(raw)
+                if following is not None and payload.get('flight') == following:
+                    if payload.get('ok'):
+                        return loads(payload.get('value'))
+                    raise ServiceException(message=payload.get('message') or '操作失败')
+            holder = await redis.get(lock_key)
+            if holder is None:
+                # 锁已释放但没有读到对应结果（持有者异常退出或锁过期），尝试接管执行
+                if await redis.set(lock_key, flight_id, nx=True, px=lock_ttl * 1000):
+                    return await cls._lead(redis, name, flight_id, func, dumps, lock_ttl, result_ttl)
+                continue
+            following = holder
+            await asyncio.sleep(cls.poll_interval)
+        raise ServiceException(message='相同操作正在进行中，请稍后查看结果')
+
+    @classmethod
+    async def _lead(
+        cls,
+        redis: aioredis.Redis,
+        name: str,
+        flight_id: str,
+        func: Callable[[], Awaitable[Any]],
+        dumps: Callable[[Any], Any],
+        lock_ttl: int,
+        result_ttl: int,
+    ) -> Any:
+        lock_key = cls._lock_key(name)
+        renew = redis.register_script(RENEW_SCRIPT)
+        release = redis.register_script(RELEASE_SCRIPT)
+
+        async def keep_alive() -> None:
+            while True:
+                await asyncio.sleep(lock_ttl / 3)
+                if not await renew(keys=[lock_key], args=[flight_id, lock_ttl * 1000]):
+                    logger.warning(f'单飞锁续期失败，锁已被接管: {name}')
+                    return
+
+        keep_alive_task = asyncio.create_task(keep_alive())
+        payload: dict[str, Any] = {'flight': flight_id, 'ok': False, 'message': '相同操作执行失败，请重试'}
+        try:
+            result = await func()
+            payload = {'flight': flight_id, 'ok': True, 'value': dumps(result)}
+            return result
+        except ServiceException as e:
+            payload['message'] = e.message
+            raise
+        finally:
+            keep_alive_task.cancel()
+            try:
+                # 先写结果再释放锁，等待者在锁消失前一定能读到结果
+                await redis.set(
+                    cls._result_key(name), json.dumps(payload, ensure_ascii=False, default=str), ex=result_ttl
+                )
+                await release(keys=[lock_key], args=[flight_id])
+            except Exception as e:
+                logger.warning(f'单飞写入结果或释放锁失败: {name}, 错误: {str(e)}')
@@ -0,0 +1,25 @@
+-- 文件存储改为内容寻址：为已有的 file_storage 表添加内容哈希和过期时间字段
+-- 新建库直接执行 schema.sql 即可，已部署的库执行本脚本
+
+-- 注意：请根据实际数据库名修改或删除 USE 语句
+-- USE `automation_framework`;
+
+-- 1. 添加 content_hash 字段（内容寻址存储的对象键，旧记录为空，仍按 file_path 读取）
+ALTER TABLE file_storage
+ADD COLUMN content_hash CHAR(64) NULL COMMENT '内容SHA256（内容寻址存储的对象键）' AFTER file_size;
+
+-- 2. 添加 expires_at 字段
+ALTER TABLE file_storage
+ADD COLUMN expires_at DATETIME NULL COMMENT '过期时间（为空表示不过期）' AFTER metadata;
+
+-- 3. 添加索引
+ALTER TABLE file_storage
+ADD INDEX idx_content_hash (content_hash),
+ADD INDEX idx_expires_at (expires_at);
+
+-- 4. 旧版按类型分目录存放（storage/screenshots、logs、videos、exports）且没有记录的文件，
+--    在项目目录下执行以下命令导入对象存储并补写记录（可重复执行）：
+--    python -c "import asyncio; from src.files.storage import file_storage; print(asyncio.run(file_storage.import_legacy_files()))"
+
+-- 查看修改后的表结构
+DESCRIBE file_storage;
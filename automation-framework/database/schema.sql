@@ -49,6 +49,36 @@ CREATE TABLE IF NOT EXISTS `schedules` (
     FOREIGN KEY (`task_id`) REFERENCES `tasks`(`id`) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='调度表';
 
+-- 调度器租约表（多实例部署时的主节点选举）
+CREATE TABLE IF NOT EXISTS `scheduler_leases` (
+    `name` VARCHAR(64) PRIMARY KEY COMMENT '租约名称',
+    `holder` VARCHAR(128) NOT NULL COMMENT '当前持有者（主机名:进程号:随机串）',
+    `fencing_token` BIGINT NOT NULL DEFAULT 1 COMMENT '隔离令牌，每次更换持有者时递增',
+    `expires_at` DATETIME NOT NULL COMMENT '租约过期时间',
+    `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='调度器租约表';
+
+-- 调度执行队列表（主节点写入到期的调度，各实例按空闲容量认领执行）
+CREATE TABLE IF NOT EXISTS `schedule_runs` (
+    `id` INT AUTO_INCREMENT PRIMARY KEY,
+    `schedule_id` INT NOT NULL COMMENT '关联调度ID',
+    `task_id` INT NOT NULL COMMENT '关联任务ID',
+    `scheduled_time` DATETIME NOT NULL COMMENT '计划执行时间',
+    `fencing_token` BIGINT NOT NULL COMMENT '写入时主节点的隔离令牌',
+    `status` VARCHAR(50) NOT NULL DEFAULT 'pending' COMMENT '状态: pending, running, completed, failed',
+    `worker_id` VARCHAR(128) COMMENT '认领的实例',
+    `claimed_at` DATETIME COMMENT '认领时间',
+    `lease_expires_at` DATETIME COMMENT '执行租约到期时间（执行期间由认领的实例续期，过期后可被重新认领）',
+    `finished_at` DATETIME COMMENT '结束时间',
+    `error_message` TEXT COMMENT '错误信息',
+    `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    UNIQUE KEY `uk_schedule_time` (`schedule_id`, `scheduled_time`),
+    INDEX `idx_status_id` (`status`, `id`),
+    INDEX `idx_task_id` (`task_id`),
+    FOREIGN KEY (`schedule_id`) REFERENCES `schedules`(`id`) ON DELETE CASCADE,
+    FOREIGN KEY (`task_id`) REFERENCES `tasks`(`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='调度执行队列表';
+
 -- 执行记录表
 CREATE TABLE IF NOT EXISTS `execution_records` (
     `id` INT AUTO_INCREMENT PRIMARY KEY,
@@ -66,6 +96,8 @@ CREATE TABLE IF NOT EXISTS `execution_records` (
     INDEX `idx_task_id` (`task_id`),
     INDEX `idx_status` (`status`),
     INDEX `idx_start_time` (`start_time`),
+    INDEX `idx_task_start_status` (`task_id`, `start_time`, `status`, `duration`),
+    INDEX `idx_start_status_duration` (`start_time`, `status`, `duration`),
     FOREIGN KEY (`task_id`) REFERENCES `tasks`(`id`) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='执行记录表';
 
@@ -158,6 +190,26 @@ CREATE TABLE IF NOT EXISTS `notification_configs` (
     INDEX `idx_name` (`name`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='通知配置表';
 
+-- 通知发件箱表
+CREATE TABLE IF NOT EXISTS `notification_outbox` (
+    `id` INT AUTO_INCREMENT PRIMARY KEY,
+    `channel` VARCHAR(255) NOT NULL COMMENT '通知渠道（notification_configs.name）',
+    `event_type` VARCHAR(50) NOT NULL COMMENT '事件类型: task_completed, task_failed, system_alert',
+    `message` TEXT NOT NULL COMMENT '渲染后的消息内容',
+    `payload` JSON COMMENT '发送参数（标题等）',
+    `digest_key` VARCHAR(255) COMMENT '摘要合并键，同一渠道同一键的突发消息合并发送',
+    `status` VARCHAR(20) NOT NULL DEFAULT 'pending' COMMENT '状态: pending, sending, sent, failed',
+    `attempts` INT NOT NULL DEFAULT 0 COMMENT '已尝试次数',
+    `worker_id` VARCHAR(128) COMMENT '认领的实例',
+    `next_attempt_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '下次可发送时间',
+    `claimed_at` DATETIME COMMENT '认领时间',
+    `sent_at` DATETIME COMMENT '发送成功时间',
+    `last_error` TEXT COMMENT '最近一次错误',
+    `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    INDEX `idx_status_next_attempt` (`status`, `next_attempt_at`),
+    INDEX `idx_channel_digest` (`channel`, `digest_key`, `status`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='通知发件箱表';
+
 -- ============================================
 -- 4. 文件和插件表
 -- ============================================
@@ -169,14 +221,18 @@ CREATE TABLE IF NOT EXISTS `file_storage` (
     `file_path` VARCHAR(512) NOT NULL COMMENT '文件路径',
     `file_type` VARCHAR(50) NOT NULL COMMENT '文件类型: screenshot, log, video, export',
     `file_size` INT NOT NULL COMMENT '文件大小（字节）',
+    `content_hash` CHAR(64) COMMENT '内容SHA256（内容寻址存储的对象键）',
     `mime_type` VARCHAR(100) COMMENT 'MIME类型',
     `related_type` VARCHAR(50) COMMENT '关联类型: task, execution, session',
     `related_id` INT COMMENT '关联ID',
     `metadata` JSON COMMENT '元数据',
+    `expires_at` DATETIME COMMENT '过期时间（为空表示不过期）',
     `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
     INDEX `idx_file_type` (`file_type`),
     INDEX `idx_related` (`related_type`, `related_id`),
-    INDEX `idx_created_at` (`created_at`)
+    INDEX `idx_created_at` (`created_at`),
+    INDEX `idx_content_hash` (`content_hash`),
+    INDEX `idx_expires_at` (`expires_at`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='文件存储表';
 
 -- 插件表
@@ -5,6 +5,8 @@ AI模块 - 提供LLM、Agent和场景规划功能
 from .llm import LLMProvider, create_llm_provider
 from .config import ModelConfig, ModelProvider, model_config_from_db_model
 from .rate_limiter import RateLimiter, RateLimitConfig, get_rate_limiter
+from .llm_middleware import TokenUsage, build_cached_messages, get_usage_tracker
+from .plan_cache import PlanCache, PlanCacheConfig, get_plan_cache
 
 # 延迟导入 agent 和 scenario_planner（避免循环导入）
 def __getattr__(name):
@@ -45,6 +47,12 @@ __all__ = [
     "RateLimiter",
     "RateLimitConfig",
     "get_rate_limiter",
+    "TokenUsage",
+    "build_cached_messages",
+    "get_usage_tracker",
+    "PlanCache",
+    "PlanCacheConfig",
+    "get_plan_cache",
     "AnthropicSkillsLoader",
     "load_anthropic_skills",
 ]
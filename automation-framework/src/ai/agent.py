@@ -1,12 +1,13 @@
 """
 AI Agent和任务规划器
 """
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from dataclasses import dataclass
 
 from .llm import LLMProvider, create_llm_provider
 from .vision import VisionModel, create_vision_model
 from .config import ModelConfig
+from .plan_cache import PlanCache, get_plan_cache
 from .scenario_planner import ScenarioPlanner, ScenarioType
 from ..core.interfaces import Action
 
@@ -25,8 +26,12 @@ class TaskPlanner:
     任务规划器 - 将自然语言任务分解为操作序列
     """
     
-    def __init__(self, llm: LLMProvider):
+    # 基础规划器在规划缓存中使用的场景命名空间
+    CACHE_SCENARIO = "base_planner"
+    
+    def __init__(self, llm: LLMProvider, plan_cache: Optional[PlanCache] = None):
         self.llm = llm
+        self.plan_cache = plan_cache or get_plan_cache()
         
     async def parse_task(self, natural_language: str) -> TaskDescription:
         """
@@ -131,6 +136,37 @@ Available actions: GoToURL, Click, Type, WaitForElement, GetText, Screenshot"""
             print(f"Failed to parse plan: {e}")
             return []
     
+    async def parse_and_plan(
+        self,
+        natural_language: str
+    ) -> Tuple[TaskDescription, List[Dict[str, Any]]]:
+        """
+        解析任务并生成执行计划（优先使用规划缓存）
+        
+        Args:
+            natural_language: 自然语言任务描述
+            
+        Returns:
+            (结构化任务描述, 操作序列)
+        """
+        model_config = getattr(self.llm, "config", None)
+        cached = await self.plan_cache.get(natural_language, self.CACHE_SCENARIO, model_config)
+        if cached is not None:
+            return cached["task_description"], cached["plan"]
+        
+        task_desc = await self.parse_task(natural_language)
+        plan = await self.plan(task_desc)
+        
+        # 仅缓存有效的计划，解析失败的结果下次重新规划
+        if plan:
+            await self.plan_cache.put(
+                natural_language,
+                self.CACHE_SCENARIO,
+                {"task_description": task_desc, "plan": plan},
+                model_config
+            )
+        return task_desc, plan
+    
     async def replan(
         self,
         original_plan: List[Dict[str, Any]],
@@ -184,12 +220,16 @@ class Agent:
         self,
         llm_config: ModelConfig,
         vision_config: Optional[ModelConfig] = None,
-        enable_scenario: bool = True
+        enable_scenario: bool = True,
+        plan_cache: Optional[PlanCache] = None
     ):
         self.llm = create_llm_provider(llm_config)
         self.vision = create_vision_model(vision_config) if vision_config else None
-        self.planner = TaskPlanner(self.llm)
-        self.scenario_planner = ScenarioPlanner(self.llm, self.planner) if enable_scenario else None
+        self.plan_cache = plan_cache or get_plan_cache()
+        self.planner = TaskPlanner(self.llm, self.plan_cache)
+        self.scenario_planner = (
+            ScenarioPlanner(self.llm, self.planner, self.plan_cache) if enable_scenario else None
+        )
         self.memory: List[Dict[str, Any]] = []
         
     async def execute_task(
@@ -226,9 +266,8 @@ class Agent:
                 "status": "planned"
             }
         else:
-            # 使用基础规划器
-            task_desc = await self.planner.parse_task(task)
-            plan = await self.planner.plan(task_desc)
+            # 使用基础规划器（带规划缓存）
+            task_desc, plan = await self.planner.parse_and_plan(task)
             
             # 记录到记忆
             self.memory.append({
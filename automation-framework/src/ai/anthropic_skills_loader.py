@@ -331,8 +331,8 @@ class AnthropicSkillsLoader:
                 template = self.convert_to_scenario_template(skill)
                 if template:
                     # 使用推断的场景类型或创建新的
-                    # 注意：如果场景类型已存在，会覆盖原有模板
-                    scenario_planner.SCENARIO_TEMPLATES[template.scenario_type] = template
+                    # 注意：如果场景类型已存在，会覆盖原有模板（同时使该场景的规划缓存失效）
+                    scenario_planner.register_template(template)
                     registered_count += 1
                     logger.info(f"Registered skill as scenario: {skill_name}")
             except Exception as e:
@@ -8,6 +8,21 @@ import time
 
 from .config import ModelConfig
 from .rate_limiter import get_rate_limiter, RateLimitConfig
+from .llm_middleware import (
+    TokenUsage,
+    get_usage_tracker,
+    to_plain_messages,
+    to_anthropic_messages,
+    usage_from_openai,
+    usage_from_anthropic,
+    usage_from_ollama,
+)
+
+try:
+    from ..performance.instruments import record_llm_call
+except ImportError:
+    # 以顶层包 ai 导入时（如 RuoYi 后端直接把 src 加入 sys.path）无法使用相对导入，跳过指标埋点
+    record_llm_call = None
 
 
 class LLMProvider(ABC):
@@ -15,18 +30,46 @@ class LLMProvider(ABC):
     
     def __init__(self, config: ModelConfig):
         self.config = config
+        # 最近一次调用的Token用量
+        self.last_usage: Optional[TokenUsage] = None
+    
+    @property
+    def provider_name(self) -> str:
+        """提供商名称"""
+        return getattr(self.config.provider, "value", str(self.config.provider))
+    
+    def _record_usage(self, usage: TokenUsage, started_at: float) -> None:
+        """记录一次成功调用的Token用量和耗时"""
+        latency = time.time() - started_at
+        self.last_usage = usage
+        get_usage_tracker().record(self.provider_name, self.config.model, usage, latency)
+        if record_llm_call:
+            record_llm_call(
+                self.provider_name,
+                self.config.model,
+                latency,
+                success=True,
+                prompt_tokens=usage.prompt_tokens,
+                completion_tokens=usage.completion_tokens,
+                cached_tokens=usage.cached_tokens
+            )
+    
+    def _record_error(self, started_at: float) -> None:
+        """记录一次失败的调用（重试耗尽或不可重试的错误）"""
+        if record_llm_call:
+            record_llm_call(self.provider_name, self.config.model, time.time() - started_at, success=False)
         
     @abstractmethod
     async def chat(
         self,
-        messages: List[Dict[str, str]],
+        messages: List[Dict[str, Any]],
         **kwargs
     ) -> str:
         """
         聊天接口
         
         Args:
-            messages: 消息列表
+            messages: 消息列表（可由 build_cached_messages 构建带缓存前缀的消息）
             **kwargs: 额外参数
             
         Returns:
@@ -37,7 +80,7 @@ class LLMProvider(ABC):
     @abstractmethod
     async def stream(
         self,
-        messages: List[Dict[str, str]],
+        messages: List[Dict[str, Any]],
         **kwargs
     ) -> AsyncIterator[str]:
         """
@@ -83,12 +126,13 @@ class OpenAIProvider(LLMProvider):
     
     async def chat(
         self,
-        messages: List[Dict[str, str]],
+        messages: List[Dict[str, Any]],
         **kwargs
     ) -> str:
         """OpenAI聊天接口（带限流和重试）"""
         max_retries = 3
         base_delay = 1.0
+        started_at = time.time()
         
         for attempt in range(max_retries):
             try:
@@ -97,12 +141,14 @@ class OpenAIProvider(LLMProvider):
                 
                 params = {
                     "model": self.config.model,
-                    "messages": messages,
+                    "messages": to_plain_messages(messages),
                     **self.config.params,
                     **kwargs
                 }
                 
+                started_at = time.time()
                 response = await self.client.chat.completions.create(**params)
+                self._record_usage(usage_from_openai(getattr(response, "usage", None)), started_at)
                 return response.choices[0].message.content
                 
             except Exception as e:
@@ -135,6 +181,7 @@ class OpenAIProvider(LLMProvider):
                     continue
                 
                 # 构建详细的错误信息
+                self._record_error(started_at)
                 if is_connection_error:
                     base_url = self.config.api_base or "默认端点"
                     raise Exception(
@@ -150,22 +197,33 @@ class OpenAIProvider(LLMProvider):
     
     async def stream(
         self,
-        messages: List[Dict[str, str]],
+        messages: List[Dict[str, Any]],
         **kwargs
     ) -> AsyncIterator[str]:
         """OpenAI流式输出"""
         params = {
             "model": self.config.model,
-            "messages": messages,
+            "messages": to_plain_messages(messages),
             "stream": True,
+            # 最后一个数据块携带用量信息（choices为空）
+            "stream_options": {"include_usage": True},
             **self.config.params,
             **kwargs
         }
         
-        stream = await self.client.chat.completions.create(**params)
-        async for chunk in stream:
-            if chunk.choices[0].delta.content:
-                yield chunk.choices[0].delta.content
+        started_at = time.time()
+        usage = TokenUsage()
+        try:
+            stream = await self.client.chat.completions.create(**params)
+            async for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    usage = usage_from_openai(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception:
+            self._record_error(started_at)
+            raise
+        self._record_usage(usage, started_at)
 
 
 class AnthropicProvider(LLMProvider):
@@ -190,30 +248,21 @@ class AnthropicProvider(LLMProvider):
     
     async def chat(
         self,
-        messages: List[Dict[str, str]],
+        messages: List[Dict[str, Any]],
         **kwargs
     ) -> str:
         """Anthropic聊天接口（带限流和重试）"""
         max_retries = 3
         base_delay = 1.0
+        started_at = time.time()
         
         for attempt in range(max_retries):
             try:
                 # 限流控制
                 await self.rate_limiter.acquire(self.api_key)
                 
-                # 转换消息格式
-                system_message = None
-                converted_messages = []
-                
-                for msg in messages:
-                    if msg["role"] == "system":
-                        system_message = msg["content"]
-                    else:
-                        converted_messages.append({
-                            "role": msg["role"],
-                            "content": msg["content"]
-                        })
+                # 转换消息格式（带缓存标记的前缀转换为 cache_control 内容块）
+                system_message, converted_messages = to_anthropic_messages(messages)
                 
                 params = {
                     "model": self.config.model,
@@ -225,7 +274,9 @@ class AnthropicProvider(LLMProvider):
                 if system_message:
                     params["system"] = system_message
                 
+                started_at = time.time()
                 response = await self.client.messages.create(**params)
+                self._record_usage(usage_from_anthropic(getattr(response, "usage", None)), started_at)
                 return response.content[0].text
                 
             except Exception as e:
@@ -258,6 +309,7 @@ class AnthropicProvider(LLMProvider):
                     continue
                 
                 # 构建详细的错误信息
+                self._record_error(started_at)
                 if is_connection_error:
                     base_url = self.config.api_base or "默认端点"
                     raise Exception(
@@ -273,37 +325,33 @@ class AnthropicProvider(LLMProvider):
     
     async def stream(
         self,
-        messages: List[Dict[str, str]],
+        messages: List[Dict[str, Any]],
         **kwargs
     ) -> AsyncIterator[str]:
         """Anthropic流式输出"""
-        # 转换消息格式
-        system_message = None
-        converted_messages = []
-        
-        for msg in messages:
-            if msg["role"] == "system":
-                system_message = msg["content"]
-            else:
-                converted_messages.append({
-                    "role": msg["role"],
-                    "content": msg["content"]
-                })
+        # 转换消息格式（带缓存标记的前缀转换为 cache_control 内容块）
+        system_message, converted_messages = to_anthropic_messages(messages)
         
         params = {
             "model": self.config.model,
             "messages": converted_messages,
             "max_tokens": kwargs.get("max_tokens", 4096),
-            "stream": True,
             **self.config.params,
         }
         
         if system_message:
             params["system"] = system_message
         
-        async with self.client.messages.stream(**params) as stream:
-            async for text in stream.text_stream:
-                yield text
+        started_at = time.time()
+        try:
+            async with self.client.messages.stream(**params) as stream:
+                async for text in stream.text_stream:
+                    yield text
+                final_message = await stream.get_final_message()
+        except Exception:
+            self._record_error(started_at)
+            raise
+        self._record_usage(usage_from_anthropic(getattr(final_message, "usage", None)), started_at)
 
 
 class OllamaProvider(LLMProvider):
@@ -315,7 +363,7 @@ class OllamaProvider(LLMProvider):
         
     async def chat(
         self,
-        messages: List[Dict[str, str]],
+        messages: List[Dict[str, Any]],
         **kwargs
     ) -> str:
         """Ollama聊天接口"""
@@ -324,20 +372,26 @@ class OllamaProvider(LLMProvider):
         url = f"{self.api_base}/api/chat"
         payload = {
             "model": self.config.model,
-            "messages": messages,
+            "messages": to_plain_messages(messages),
             "stream": False,
             **self.config.params,
             **kwargs
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload) as response:
-                data = await response.json()
-                return data["message"]["content"]
+        started_at = time.time()
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(url, json=payload) as response:
+                    data = await response.json()
+        except Exception:
+            self._record_error(started_at)
+            raise
+        self._record_usage(usage_from_ollama(data), started_at)
+        return data["message"]["content"]
     
     async def stream(
         self,
-        messages: List[Dict[str, str]],
+        messages: List[Dict[str, Any]],
         **kwargs
     ) -> AsyncIterator[str]:
         """Ollama流式输出"""
@@ -347,19 +401,28 @@ class OllamaProvider(LLMProvider):
         url = f"{self.api_base}/api/chat"
         payload = {
             "model": self.config.model,
-            "messages": messages,
+            "messages": to_plain_messages(messages),
             "stream": True,
             **self.config.params,
             **kwargs
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload) as response:
-                async for line in response.content:
-                    if line:
-                        data = json.loads(line)
-                        if "message" in data and "content" in data["message"]:
-                            yield data["message"]["content"]
+        started_at = time.time()
+        usage = TokenUsage()
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(url, json=payload) as response:
+                    async for line in response.content:
+                        if line:
+                            data = json.loads(line)
+                            if "message" in data and "content" in data["message"]:
+                                yield data["message"]["content"]
+                            if data.get("done"):
+                                usage = usage_from_ollama(data)
+        except Exception:
+            self._record_error(started_at)
+            raise
+        self._record_usage(usage, started_at)
 
 
 class QwenProvider(LLMProvider):
@@ -393,12 +456,13 @@ class QwenProvider(LLMProvider):
     
     async def chat(
         self,
-        messages: List[Dict[str, str]],
+        messages: List[Dict[str, Any]],
         **kwargs
     ) -> str:
         """Qwen聊天接口（带限流和重试）"""
         max_retries = 3
         base_delay = 1.0
+        started_at = time.time()
         
         for attempt in range(max_retries):
             try:
@@ -407,12 +471,14 @@ class QwenProvider(LLMProvider):
                 
                 params = {
                     "model": self.config.model,
-                    "messages": messages,
+                    "messages": to_plain_messages(messages),
                     **self.config.params,
                     **kwargs
                 }
                 
+                started_at = time.time()
                 response = await self.client.chat.completions.create(**params)
+                self._record_usage(usage_from_openai(getattr(response, "usage", None)), started_at)
                 return response.choices[0].message.content
                 
             except Exception as e:
@@ -446,6 +512,7 @@ class QwenProvider(LLMProvider):
                     continue
                 
                 # 构建详细的错误信息
+                self._record_error(started_at)
                 if is_connection_error:
                     base_url = self.config.api_base or "默认端点"
                     raise Exception(
@@ -461,22 +528,33 @@ class QwenProvider(LLMProvider):
     
     async def stream(
         self,
-        messages: List[Dict[str, str]],
+        messages: List[Dict[str, Any]],
         **kwargs
     ) -> AsyncIterator[str]:
         """Qwen流式输出"""
         params = {
             "model": self.config.model,
-            "messages": messages,
+            "messages": to_plain_messages(messages),
             "stream": True,
+            # 最后一个数据块携带用量信息（choices为空）
+            "stream_options": {"include_usage": True},
             **self.config.params,
             **kwargs
         }
         
-        stream = await self.client.chat.completions.create(**params)
-        async for chunk in stream:
-            if chunk.choices[0].delta.content:
-                yield chunk.choices[0].delta.content
+        started_at = time.time()
+        usage = TokenUsage()
+        try:
+            stream = await self.client.chat.completions.create(**params)
+            async for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    usage = usage_from_openai(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception:
+            self._record_error(started_at)
+            raise
+        self._record_usage(usage, started_at)
 
 
 def create_llm_provider(config: ModelConfig) -> LLMProvider:
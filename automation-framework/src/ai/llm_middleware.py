@@ -0,0 +1,255 @@
+"""
+LLM中间件 - 提示词前缀复用与Token用量统计
+
+提示词结构：稳定前缀（系统提示、论文上下文、大纲、格式指令等）在前，
+可变后缀（本次请求特有的内容）在后。带有 cache_control 标记的消息/内容块
+表示缓存断点，Anthropic 会据此启用 prompt caching；OpenAI/Qwen 的前缀缓存
+是自动的，只需保证前缀内容逐字一致并位于最前面。
+"""
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+# 缓存断点标记（与Anthropic API的字段保持一致）
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def build_cached_messages(
+    system: Optional[str],
+    stable_prefix: str,
+    variable_suffix: str
+) -> List[Dict[str, Any]]:
+    """
+    构建“稳定前缀 + 可变后缀”结构的消息列表
+
+    Args:
+        system: 系统提示词（可选）
+        stable_prefix: 多次请求之间保持不变的内容
+        variable_suffix: 每次请求变化的内容
+
+    Returns:
+        消息列表（由各Provider在发送前转换为对应API格式）
+    """
+    messages: List[Dict[str, Any]] = []
+    if system:
+        messages.append({"role": "system", "content": system, "cache_control": CACHE_CONTROL})
+    content: List[Dict[str, Any]] = [
+        {"type": "text", "text": stable_prefix, "cache_control": CACHE_CONTROL}
+    ]
+    if variable_suffix:
+        content.append({"type": "text", "text": variable_suffix})
+    messages.append({"role": "user", "content": content})
+    return messages
+
+
+def _content_to_text(content: Any) -> str:
+    """将内容块列表合并为纯文本"""
+    if isinstance(content, list):
+        return "".join(
+            block.get("text", "") if isinstance(block, dict) else str(block)
+            for block in content
+        )
+    return content if content is not None else ""
+
+
+def to_plain_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """
+    转换为纯文本消息（OpenAI/Qwen/Ollama）
+
+    去掉缓存标记并合并内容块；前缀保持逐字一致，以便服务端自动前缀缓存命中。
+    """
+    return [
+        {"role": msg["role"], "content": _content_to_text(msg.get("content"))}
+        for msg in messages
+    ]
+
+
+def to_anthropic_messages(
+    messages: List[Dict[str, Any]]
+) -> Tuple[Optional[Any], List[Dict[str, Any]]]:
+    """
+    转换为Anthropic消息格式
+
+    Returns:
+        (system参数, 消息列表)；带缓存标记的内容会转换为带 cache_control 的内容块
+    """
+    system_blocks: List[Dict[str, Any]] = []
+    converted: List[Dict[str, Any]] = []
+
+    for msg in messages:
+        content = msg.get("content")
+        if msg["role"] == "system":
+            block = {"type": "text", "text": _content_to_text(content)}
+            if msg.get("cache_control"):
+                block["cache_control"] = msg["cache_control"]
+            system_blocks.append(block)
+            continue
+
+        if isinstance(content, list):
+            blocks = []
+            for block in content:
+                item = {"type": "text", "text": block.get("text", "")}
+                if block.get("cache_control"):
+                    item["cache_control"] = block["cache_control"]
+                blocks.append(item)
+            converted.append({"role": msg["role"], "content": blocks})
+        elif msg.get("cache_control"):
+            converted.append({
+                "role": msg["role"],
+                "content": [{"type": "text", "text": content or "", "cache_control": msg["cache_control"]}]
+            })
+        else:
+            converted.append({"role": msg["role"], "content": content})
+
+    if not system_blocks:
+        return None, converted
+    # 没有缓存标记时保持原来的字符串形式
+    if not any("cache_control" in b for b in system_blocks):
+        return "\n\n".join(b["text"] for b in system_blocks), converted
+    return system_blocks, converted
+
+
+@dataclass
+class TokenUsage:
+    """单次调用的Token用量"""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0  # 命中提示词缓存的输入Token数
+    cache_write_tokens: int = 0  # 写入提示词缓存的输入Token数（Anthropic）
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def to_dict(self) -> Dict[str, int]:
+        """转换为字典"""
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cache_write_tokens": self.cache_write_tokens,
+            "total_tokens": self.total_tokens,
+        }
+
+
+def _get(obj: Any, name: str, default: Any = 0) -> Any:
+    """同时兼容SDK对象和字典"""
+    if obj is None:
+        return default
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+
+def usage_from_openai(usage: Any) -> TokenUsage:
+    """从OpenAI兼容响应（OpenAI/Qwen）的 usage 字段提取用量"""
+    details = _get(usage, "prompt_tokens_details", None)
+    return TokenUsage(
+        prompt_tokens=_get(usage, "prompt_tokens") or 0,
+        completion_tokens=_get(usage, "completion_tokens") or 0,
+        cached_tokens=_get(details, "cached_tokens") or 0,
+    )
+
+
+def usage_from_anthropic(usage: Any) -> TokenUsage:
+    """从Anthropic响应的 usage 字段提取用量（input_tokens 不含缓存部分）"""
+    cached = _get(usage, "cache_read_input_tokens") or 0
+    cache_write = _get(usage, "cache_creation_input_tokens") or 0
+    return TokenUsage(
+        prompt_tokens=(_get(usage, "input_tokens") or 0) + cached + cache_write,
+        completion_tokens=_get(usage, "output_tokens") or 0,
+        cached_tokens=cached,
+        cache_write_tokens=cache_write,
+    )
+
+
+def usage_from_ollama(data: Dict[str, Any]) -> TokenUsage:
+    """从Ollama响应提取用量"""
+    return TokenUsage(
+        prompt_tokens=data.get("prompt_eval_count") or 0,
+        completion_tokens=data.get("eval_count") or 0,
+    )
+
+
+@dataclass
+class ModelUsageStats:
+    """单个模型的累计用量"""
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    cache_write_tokens: int = 0
+    total_latency: float = 0.0
+    last_call_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cache_write_tokens": self.cache_write_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+            "cache_hit_ratio": round(self.cached_tokens / self.prompt_tokens, 4) if self.prompt_tokens else 0.0,
+            "average_latency": round(self.total_latency / self.calls, 4) if self.calls else 0.0,
+        }
+
+
+class UsageTracker:
+    """
+    Token用量统计 - 按（provider, model）累计每次调用的用量
+    """
+
+    def __init__(self):
+        self._stats: Dict[Tuple[str, str], ModelUsageStats] = defaultdict(ModelUsageStats)
+
+    def record(self, provider: str, model: str, usage: TokenUsage, latency: float = 0.0) -> None:
+        """
+        记录一次调用
+
+        Args:
+            provider: 提供商
+            model: 模型名称
+            usage: Token用量
+            latency: 调用耗时（秒）
+        """
+        stats = self._stats[(provider, model)]
+        stats.calls += 1
+        stats.prompt_tokens += usage.prompt_tokens
+        stats.completion_tokens += usage.completion_tokens
+        stats.cached_tokens += usage.cached_tokens
+        stats.cache_write_tokens += usage.cache_write_tokens
+        stats.total_latency += latency
+        stats.last_call_at = time.time()
+
+    def get_summary(self) -> Dict[str, Any]:
+        """获取汇总数据（总计 + 按模型明细）"""
+        total = ModelUsageStats()
+        by_model = []
+        for (provider, model), stats in self._stats.items():
+            total.calls += stats.calls
+            total.prompt_tokens += stats.prompt_tokens
+            total.completion_tokens += stats.completion_tokens
+            total.cached_tokens += stats.cached_tokens
+            total.cache_write_tokens += stats.cache_write_tokens
+            total.total_latency += stats.total_latency
+            by_model.append({"provider": provider, "model": model, **stats.to_dict()})
+        return {**total.to_dict(), "models": by_model}
+
+    def reset(self) -> None:
+        """清空统计"""
+        self._stats.clear()
+
+
+# 全局用量统计实例
+_global_usage_tracker: Optional[UsageTracker] = None
+
+
+def get_usage_tracker() -> UsageTracker:
+    """获取全局用量统计实例"""
+    global _global_usage_tracker
+    if _global_usage_tracker is None:
+        _global_usage_tracker = UsageTracker()
+    return _global_usage_tracker
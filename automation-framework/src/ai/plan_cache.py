@@ -0,0 +1,339 @@
+"""
+任务规划缓存 - 缓存自然语言任务的规划结果，避免重复调用LLM
+"""
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import math
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .config import ModelConfig
+
+logger = logging.getLogger(__name__)
+
+# 嵌入函数：输入文本，返回向量
+EmbeddingFunc = Callable[[str], Awaitable[List[float]]]
+
+
+@dataclass
+class PlanCacheConfig:
+    """规划缓存配置"""
+    enabled: bool = True
+    ttl_seconds: int = 24 * 3600  # 缓存有效期（秒）
+    max_entries: int = 1000  # 最大缓存条目数（LRU淘汰）
+    similarity_threshold: float = 0.95  # 相似度命中阈值（仅在配置了嵌入函数时生效）
+
+
+@dataclass
+class PlanCacheEntry:
+    """规划缓存条目"""
+    key: str
+    scenario_type: str
+    model_key: str
+    normalized_prompt: str
+    result: Dict[str, Any]
+    created_at: float
+    embedding: Optional[List[float]] = None
+    hits: int = 0
+
+
+@dataclass
+class PlanCacheStats:
+    """规划缓存统计"""
+    exact_hits: int = 0
+    similar_hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    expirations: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+
+    @property
+    def hits(self) -> int:
+        return self.exact_hits + self.similar_hits
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            "hits": self.hits,
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 4),
+            "stores": self.stores,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+def normalize_prompt(text: str) -> str:
+    """
+    规范化任务描述（去除首尾空白、合并连续空白）
+
+    大小写和标点可能影响规划结果（如输入的文本内容、URL），因此保留原样
+
+    Args:
+        text: 原始任务描述
+
+    Returns:
+        规范化后的文本
+    """
+    return re.sub(r"\s+", " ", text.strip())
+
+
+def make_model_key(model_config: Optional[ModelConfig]) -> str:
+    """
+    根据模型配置生成缓存键片段（不包含api_key）
+
+    Args:
+        model_config: 模型配置
+
+    Returns:
+        模型配置指纹
+    """
+    if model_config is None:
+        return "default"
+    provider = getattr(model_config.provider, "value", model_config.provider)
+    payload = json.dumps(
+        {
+            "provider": provider,
+            "model": model_config.model,
+            "api_base": model_config.api_base,
+            "params": model_config.params or {},
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _cosine_similarity(a: List[float], b: List[float]) -> float:
+    """计算余弦相似度"""
+    if not a or not b or len(a) != len(b):
+        return 0.0
+    dot = sum(x * y for x, y in zip(a, b))
+    norm_a = math.sqrt(sum(x * x for x in a))
+    norm_b = math.sqrt(sum(y * y for y in b))
+    if norm_a == 0 or norm_b == 0:
+        return 0.0
+    return dot / (norm_a * norm_b)
+
+
+class PlanCache:
+    """
+    规划缓存 - 以（规范化任务描述, 场景类型, 模型配置）为键缓存规划结果
+
+    查找顺序：先精确匹配，再（可选）基于嵌入向量的相似度匹配。
+    场景模板或Skills变更时应调用 invalidate() 使对应缓存失效。
+    """
+
+    def __init__(
+        self,
+        config: Optional[PlanCacheConfig] = None,
+        embedder: Optional[EmbeddingFunc] = None
+    ):
+        """
+        初始化规划缓存
+
+        Args:
+            config: 缓存配置
+            embedder: 嵌入函数（可选，提供后启用相似度查找）
+        """
+        self.config = config or PlanCacheConfig()
+        self.embedder = embedder
+        self.stats = PlanCacheStats()
+        self._entries: "OrderedDict[str, PlanCacheEntry]" = OrderedDict()
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def make_key(normalized_prompt: str, scenario_type: str, model_key: str) -> str:
+        """生成缓存键"""
+        raw = f"{scenario_type}\x00{model_key}\x00{normalized_prompt}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _is_expired(self, entry: PlanCacheEntry, now: float) -> bool:
+        return self.config.ttl_seconds > 0 and now - entry.created_at > self.config.ttl_seconds
+
+    async def _embed(self, text: str) -> Optional[List[float]]:
+        if not self.embedder:
+            return None
+        try:
+            return await self.embedder(text)
+        except Exception as e:
+            logger.warning(f"Plan cache embedding failed: {e}")
+            return None
+
+    async def get(
+        self,
+        prompt: str,
+        scenario_type: str,
+        model_config: Optional[ModelConfig] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        查找缓存的规划结果
+
+        Args:
+            prompt: 自然语言任务描述
+            scenario_type: 场景类型
+            model_config: 模型配置
+
+        Returns:
+            规划结果的副本，未命中返回None
+        """
+        if not self.config.enabled:
+            return None
+
+        normalized = normalize_prompt(prompt)
+        model_key = make_model_key(model_config)
+        key = self.make_key(normalized, scenario_type, model_key)
+        now = time.time()
+
+        async with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._is_expired(entry, now):
+                    del self._entries[key]
+                    self.stats.expirations += 1
+                else:
+                    self._entries.move_to_end(key)
+                    entry.hits += 1
+                    self.stats.exact_hits += 1
+                    return copy.deepcopy(entry.result)
+
+        if self.embedder:
+            embedding = await self._embed(normalized)
+            if embedding:
+                async with self._lock:
+                    best: Optional[PlanCacheEntry] = None
+                    best_score = self.config.similarity_threshold
+                    for candidate in self._entries.values():
+                        if (
+                            candidate.scenario_type != scenario_type
+                            or candidate.model_key != model_key
+                            or candidate.embedding is None
+                            or self._is_expired(candidate, now)
+                        ):
+                            continue
+                        score = _cosine_similarity(embedding, candidate.embedding)
+                        if score >= best_score:
+                            best, best_score = candidate, score
+                    if best is not None:
+                        self._entries.move_to_end(best.key)
+                        best.hits += 1
+                        self.stats.similar_hits += 1
+                        return copy.deepcopy(best.result)
+
+        self.stats.misses += 1
+        return None
+
+    async def put(
+        self,
+        prompt: str,
+        scenario_type: str,
+        result: Dict[str, Any],
+        model_config: Optional[ModelConfig] = None
+    ) -> None:
+        """
+        写入规划结果
+
+        Args:
+            prompt: 自然语言任务描述
+            scenario_type: 场景类型
+            result: 规划结果
+            model_config: 模型配置
+        """
+        if not self.config.enabled:
+            return
+
+        normalized = normalize_prompt(prompt)
+        model_key = make_model_key(model_config)
+        key = self.make_key(normalized, scenario_type, model_key)
+        embedding = await self._embed(normalized)
+
+        entry = PlanCacheEntry(
+            key=key,
+            scenario_type=scenario_type,
+            model_key=model_key,
+            normalized_prompt=normalized,
+            result=copy.deepcopy(result),
+            created_at=time.time(),
+            embedding=embedding,
+        )
+
+        async with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self.stats.stores += 1
+            while len(self._entries) > self.config.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def invalidate(self, scenario_type: Optional[str] = None) -> int:
+        """
+        使缓存失效（场景模板或Skills变更时调用）
+
+        Args:
+            scenario_type: 场景类型（为None时清空全部缓存）
+
+        Returns:
+            失效的条目数
+        """
+        if scenario_type is None:
+            count = len(self._entries)
+            self._entries.clear()
+        else:
+            keys = [k for k, e in self._entries.items() if e.scenario_type == scenario_type]
+            for k in keys:
+                del self._entries[k]
+            count = len(keys)
+        self.stats.invalidations += count
+        return count
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计（含命中率）"""
+        return {
+            **self.stats.to_dict(),
+            "size": len(self._entries),
+            "max_entries": self.config.max_entries,
+            "ttl_seconds": self.config.ttl_seconds,
+            "similarity_enabled": self.embedder is not None,
+        }
+
+
+# 全局规划缓存实例
+_global_plan_cache: Optional[PlanCache] = None
+
+
+def get_plan_cache(config: Optional[PlanCacheConfig] = None) -> PlanCache:
+    """
+    获取全局规划缓存实例
+
+    Args:
+        config: 缓存配置（仅在首次调用时生效）
+
+    Returns:
+        规划缓存实例
+    """
+    global _global_plan_cache
+    if _global_plan_cache is None:
+        _global_plan_cache = PlanCache(config)
+    return _global_plan_cache
+
+
+def set_plan_cache(cache: PlanCache) -> None:
+    """设置全局规划缓存"""
+    global _global_plan_cache
+    _global_plan_cache = cache
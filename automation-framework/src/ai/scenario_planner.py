@@ -6,6 +6,7 @@ from dataclasses import dataclass
 from enum import Enum
 
 from .llm import LLMProvider
+from .plan_cache import PlanCache, get_plan_cache
 from .agent import TaskPlanner, TaskDescription
 
 
@@ -168,16 +169,33 @@ class ScenarioPlanner:
         ),
     }
     
-    def __init__(self, llm: LLMProvider, base_planner: Optional[TaskPlanner] = None):
+    def __init__(
+        self,
+        llm: LLMProvider,
+        base_planner: Optional[TaskPlanner] = None,
+        plan_cache: Optional[PlanCache] = None
+    ):
         """
         初始化场景规划器
         
         Args:
             llm: 大语言模型提供者
             base_planner: 基础任务规划器（可选）
+            plan_cache: 规划缓存（可选，默认使用全局缓存）
         """
         self.llm = llm
-        self.base_planner = base_planner or TaskPlanner(llm)
+        self.plan_cache = plan_cache or get_plan_cache()
+        self.base_planner = base_planner or TaskPlanner(llm, self.plan_cache)
+    
+    def register_template(self, template: ScenarioTemplate) -> None:
+        """
+        注册（或覆盖）场景模板，并使该场景的规划缓存失效
+        
+        Args:
+            template: 场景模板
+        """
+        self.SCENARIO_TEMPLATES[template.scenario_type] = template
+        self.plan_cache.invalidate(template.scenario_type.value)
     
     def detect_scenario(self, natural_language: str) -> Optional[ScenarioType]:
         """
@@ -234,6 +252,26 @@ class ScenarioPlanner:
         if scenario_type is None:
             scenario_type = self.detect_scenario(natural_language)
         
+        # 优先使用规划缓存（相同描述、场景和模型配置无需再次调用LLM）
+        cache_scenario = (scenario_type or ScenarioType.GENERIC).value
+        model_config = getattr(self.llm, "config", None)
+        cached = await self.plan_cache.get(natural_language, cache_scenario, model_config)
+        if cached is not None:
+            return cached
+        
+        result = await self._plan_scenario(natural_language, scenario_type)
+        
+        # 仅缓存有效的计划，解析失败的结果下次重新规划
+        if result.get("plan"):
+            await self.plan_cache.put(natural_language, cache_scenario, result, model_config)
+        return result
+    
+    async def _plan_scenario(
+        self,
+        natural_language: str,
+        scenario_type: Optional[ScenarioType]
+    ) -> Dict[str, Any]:
+        """调用LLM生成场景化执行计划（不经过缓存）"""
         # 如果没有检测到场景，使用通用规划器
         if scenario_type is None or scenario_type == ScenarioType.GENERIC:
             task_desc = await self.base_planner.parse_task(natural_language)
@@ -8,6 +8,9 @@ from contextlib import asynccontextmanager
 import logging
 
 from ..models.database import init_db, close_db
+from ..task.scheduler import APSCHEDULER_AVAILABLE, get_global_scheduler
+from ..notifications.outbox import outbox_dispatcher
+from ..notifications.triggers import trigger as notification_trigger
 from .routers import tasks, executions, configs, notifications, auth, files, sessions, monitor
 from .websocket import manager
 
@@ -41,10 +44,24 @@ async def lifespan(app: FastAPI):
     else:
         logger.info("Admin not available, skipping")
     
+    # 启动任务调度器（多实例时自动选举主节点，各实例共同消费执行队列）
+    if APSCHEDULER_AVAILABLE:
+        await get_global_scheduler().start_scheduler()
+    else:
+        logger.info("APScheduler not available, task scheduler disabled")
+    
+    # 启动通知发件箱分发器（通知在后台异步发送）
+    await outbox_dispatcher.start()
+    
     yield
     
     # Shutdown
     logger.info("Shutting down application...")
+    if APSCHEDULER_AVAILABLE:
+        await get_global_scheduler().stop_scheduler()
+    # 已触发的通知先写入发件箱，未发送的消息下次启动后继续发送
+    await notification_trigger.drain()
+    await outbox_dispatcher.stop()
     await close_db()
     logger.info("Database closed")
 
@@ -1052,25 +1052,12 @@ async def admin_delete_file(
     file_id: int,
     db: AsyncSession = Depends(get_db)
 ):
-    """删除文件记录"""
-    result = await db.execute(select(FileStorage).where(FileStorage.id == file_id))
-    file = result.scalar_one_or_none()
+    """删除文件记录（内容对象没有其他引用时一并删除）"""
+    from ...files.storage import file_storage
     
-    if not file:
+    if not await file_storage.delete_file(str(file_id), db_session=db):
         raise HTTPException(status_code=404, detail="File not found")
     
-    # 删除物理文件
-    import os
-    if os.path.exists(file.file_path):
-        try:
-            os.remove(file.file_path)
-        except Exception as e:
-            pass  # 记录错误但不阻止删除记录
-    
-    # 删除数据库记录
-    await db.execute(delete(FileStorage).where(FileStorage.id == file_id))
-    await db.commit()
-    
     return SuccessResponse(message="File deleted successfully")
 
 
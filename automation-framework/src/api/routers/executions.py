@@ -1,13 +1,35 @@
 """
 历史记录API路由
 """
-from fastapi import APIRouter, Query
+from datetime import datetime
+from fastapi import APIRouter, Query, Depends, HTTPException
 from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ...task.history import HistoryManager
+from ...core.types import TaskStatus
+from ...task.history import get_global_history_manager
+from ..dependencies import get_db
 
 router = APIRouter()
-history_manager = HistoryManager()
+history_manager = get_global_history_manager()
+
+
+def _parse_status(status: Optional[str]) -> Optional[TaskStatus]:
+    if not status:
+        return None
+    try:
+        return TaskStatus(status)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid status: {status}") from None
+
+
+def _parse_date(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {value}") from None
 
 
 @router.get("", response_model=List[dict])
@@ -15,24 +37,25 @@ async def list_executions(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     task_id: Optional[str] = None,
-    status: Optional[str] = None
+    status: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
 ):
     """列出执行记录"""
     records = await history_manager.list_records(
-        skip=skip,
-        limit=limit,
         task_id=task_id,
-        status=status
+        status=_parse_status(status),
+        limit=limit,
+        offset=skip,
+        db_session=db
     )
     return [r.to_dict() for r in records]
 
 
 @router.get("/{execution_id}", response_model=dict)
-async def get_execution(execution_id: str):
+async def get_execution(execution_id: str, db: AsyncSession = Depends(get_db)):
     """获取执行详情"""
-    record = await history_manager.get_record(execution_id)
+    record = await history_manager.get_record(execution_id, db_session=db)
     if not record:
-        from fastapi import HTTPException
         raise HTTPException(status_code=404, detail="Execution not found")
     return record.to_dict()
 
@@ -52,13 +75,15 @@ async def export_executions(
 async def get_task_statistics(
     task_id: Optional[str] = None,
     start_date: Optional[str] = None,
-    end_date: Optional[str] = None
+    end_date: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
 ):
     """获取任务统计信息"""
     stats = await history_manager.get_statistics(
         task_id=task_id,
-        start_date=start_date,
-        end_date=end_date
+        start_date=_parse_date(start_date),
+        end_date=_parse_date(end_date),
+        db_session=db
     )
     return stats
 
@@ -67,31 +92,31 @@ async def get_task_statistics(
 async def get_success_rate(
     task_id: Optional[str] = None,
     start_date: Optional[str] = None,
-    end_date: Optional[str] = None
+    end_date: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
 ):
     """获取成功率统计"""
     stats = await history_manager.get_statistics(
         task_id=task_id,
-        start_date=start_date,
-        end_date=end_date
+        start_date=_parse_date(start_date),
+        end_date=_parse_date(end_date),
+        db_session=db
     )
-    total = stats.get("total_executions", 0)
-    success = stats.get("successful_executions", 0)
-    success_rate = (success / total * 100) if total > 0 else 0
-    
+
     return {
-        "total_executions": total,
-        "successful_executions": success,
-        "failed_executions": stats.get("failed_executions", 0),
-        "success_rate": round(success_rate, 2)
+        "total_executions": stats["total"],
+        "successful_executions": stats["success"],
+        "failed_executions": stats["failed"],
+        "success_rate": round(stats["success_rate"] * 100, 2)
     }
 
 
 @router.get("/statistics/trends", response_model=dict)
 async def get_trends(
     task_id: Optional[str] = None,
-    days: int = Query(7, ge=1, le=90)
+    days: int = Query(7, ge=1, le=90),
+    db: AsyncSession = Depends(get_db)
 ):
     """获取执行趋势分析"""
-    trends = await history_manager.get_trends(task_id=task_id, days=days)
+    trends = await history_manager.get_trends(task_id=task_id, days=days, db_session=db)
     return trends
@@ -4,7 +4,7 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Query
 from fastapi.responses import StreamingResponse, FileResponse
 from typing import List, Optional
-import io
+from urllib.parse import quote
 
 from ...files.storage import file_storage
 
@@ -54,41 +54,44 @@ async def upload_multiple_files(
 
 @router.get("/{file_id}/download")
 async def download_file(file_id: str):
-    """下载文件"""
-    file_data = await file_storage.get_file(file_id)
-    if not file_data:
+    """下载文件（分块流式返回）"""
+    info = await file_storage.get_file_info(file_id)
+    stream = await file_storage.open_stream(file_id) if info else None
+    if not stream:
         raise HTTPException(status_code=404, detail="File not found")
     
     return StreamingResponse(
-        io.BytesIO(file_data),
+        stream,
         media_type="application/octet-stream",
-        headers={"Content-Disposition": f"attachment; filename={file_id}"}
+        headers={
+            "Content-Disposition": f"attachment; filename*=UTF-8''{quote(info['filename'])}",
+            "Content-Length": str(info["size"])
+        }
     )
 
 
 @router.get("/{file_id}/preview")
 async def preview_file(file_id: str):
     """预览文件"""
-    file_data = await file_storage.get_file(file_id)
-    if not file_data:
+    info = await file_storage.get_file_info(file_id)
+    stream = await file_storage.open_stream(file_id) if info else None
+    if not stream:
         raise HTTPException(status_code=404, detail="File not found")
     
-    # 根据文件类型设置media_type
-    media_type = "image/png"  # 默认为图片
+    # 根据文件记录的MIME类型返回，未知时默认为图片
+    media_type = info.get("mime_type") or "image/png"
     
-    return StreamingResponse(
-        io.BytesIO(file_data),
-        media_type=media_type
-    )
+    return StreamingResponse(stream, media_type=media_type)
 
 
 @router.get("", response_model=List[dict])
 async def list_files(
     file_type: Optional[str] = Query(None, regex="^(screenshot|log|video|export)$"),
-    limit: int = Query(100, ge=1, le=1000)
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0)
 ):
     """列出文件"""
-    files = await file_storage.list_files(file_type=file_type, limit=limit)
+    files = await file_storage.list_files(file_type=file_type, limit=limit, offset=offset)
     return files
 
 
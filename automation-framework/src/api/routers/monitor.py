@@ -1,8 +1,12 @@
 """
 监控API路由
 """
+from typing import Optional
 from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
 from ...observability.monitor import PerformanceMonitor
+from ...performance import metrics_registry, performance_metrics
+from ...ai.plan_cache import get_plan_cache
 
 router = APIRouter()
 monitor = PerformanceMonitor()
@@ -32,5 +36,33 @@ async def get_metrics():
 @router.get("/tasks")
 async def get_task_status():
     """获取任务状态"""
-    # TODO: 实现任务状态查询
-    return {"active_tasks": 0, "queued_tasks": 0}
+    return await performance_metrics.collect_task_metrics()
+
+
+@router.get("/models")
+async def get_model_metrics():
+    """获取模型调用指标（延迟分位数、Token、成本、错误率）"""
+    return await performance_metrics.collect_model_metrics()
+
+
+@router.get("/prometheus", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus格式指标导出"""
+    await performance_metrics.collect_system_metrics()
+    return PlainTextResponse(
+        metrics_registry.render_prometheus(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@router.get("/plan-cache")
+async def get_plan_cache_stats():
+    """获取任务规划缓存统计（命中率等）"""
+    return get_plan_cache().get_stats()
+
+
+@router.delete("/plan-cache")
+async def clear_plan_cache(scenario_type: Optional[str] = None):
+    """清空任务规划缓存（可按场景类型清理）"""
+    count = get_plan_cache().invalidate(scenario_type)
+    return {"invalidated": count}
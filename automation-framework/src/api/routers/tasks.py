@@ -335,6 +335,7 @@ async def parse_natural_language_task(
         # 导入TaskPlanner
         from ...ai.agent import TaskPlanner
         from ...ai.llm import create_llm_provider
+        from ...ai.config import model_config_from_db_model
         from ...models.sqlalchemy_models import ModelConfig as ModelConfigModel
         from sqlalchemy import select
         
@@ -353,14 +354,11 @@ async def parse_natural_language_task(
             )
         
         # 创建LLM提供者和TaskPlanner
-        llm = create_llm_provider(model_config)
+        llm = create_llm_provider(model_config_from_db_model(model_config))
         planner = TaskPlanner(llm)
         
-        # 解析任务
-        task_desc = await planner.parse_task(description)
-        
-        # 生成计划
-        plan = await planner.plan(task_desc)
+        # 解析任务并生成计划（重复的任务描述直接命中规划缓存）
+        task_desc, plan = await planner.parse_and_plan(description)
         
         # 转换为Action对象
         from ...core.action_serializer import deserialize_actions
@@ -419,14 +417,7 @@ async def create_schedule(
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    # 获取执行器用于回调
-    executor = get_global_executor(db_session=db)
-    
-    # 定义回调函数
-    async def execute_scheduled_task(t_id: str):
-        """调度任务执行回调"""
-        await executor.execute_task(t_id, db_session=db)
-    
+    # 调度写入数据库后由主节点触发，到期的执行由各实例从执行队列认领
     scheduler = get_global_scheduler(db_session=db)
     
     if schedule_data.schedule_type == "once":
@@ -439,7 +430,6 @@ async def create_schedule(
         schedule_id = await scheduler.schedule_once(
             task_id,
             run_date,
-            execute_scheduled_task,
             db_session=db
         )
     elif schedule_data.schedule_type == "interval":
@@ -448,7 +438,6 @@ async def create_schedule(
         schedule_id = await scheduler.schedule_interval(
             task_id,
             schedule_data.interval_seconds,
-            execute_scheduled_task,
             db_session=db
         )
     elif schedule_data.schedule_type == "cron":
@@ -457,7 +446,6 @@ async def create_schedule(
         schedule_id = await scheduler.schedule_cron(
             task_id,
             schedule_data.cron_expression,
-            execute_scheduled_task,
             db_session=db
         )
     else:
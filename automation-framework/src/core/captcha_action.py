@@ -1,6 +1,7 @@
 """
 验证码处理操作 - 支持多种验证码类型
 """
+import time
 from typing import Optional, Dict, Any
 from playwright.async_api import Page
 from .interfaces import Action, Driver
@@ -97,7 +98,7 @@ class HandleCaptcha(Action):
                     logger.info(f"已在验证码输入框 {input_selector} 中填写值")
                     return True
             except Exception as e:
-                logger.debug(f\"填写验证码输入框失败, selector={input_selector}, error={e}\")
+                logger.debug(f"填写验证码输入框失败, selector={input_selector}, error={e}")
                 continue
         return False
     
@@ -119,6 +120,8 @@ class HandleCaptcha(Action):
         if not self.validate():
             raise ValueError("Invalid captcha handler parameters")
         
+        started_at = time.monotonic()
+        
         if not hasattr(driver, '_current_page'):
             raise RuntimeError("Driver does not have a current page")
         
@@ -230,7 +233,8 @@ class HandleCaptcha(Action):
             statistics.record_captcha(
                 captcha_type=captcha_type,
                 success=result.get("success", False),
-                method=result.get("method", "fallback")
+                method=result.get("method", "fallback"),
+                duration=time.monotonic() - started_at
             )
             
             return result
@@ -245,7 +249,8 @@ class HandleCaptcha(Action):
         statistics.record_captcha(
             captcha_type=captcha_type_enum,
             success=strategy_result.success,
-            method=strategy_result.method
+            method=strategy_result.method,
+            duration=time.monotonic() - started_at
         )
         
         # 返回结果
@@ -7,6 +7,7 @@ from collections import defaultdict
 import logging
 
 from .captcha_types import CaptchaType
+from ..performance.instruments import record_captcha as record_captcha_metric
 
 logger = logging.getLogger(__name__)
 
@@ -26,7 +27,8 @@ class CaptchaStatistics:
         self,
         captcha_type: CaptchaType,
         success: bool,
-        method: Optional[str] = None
+        method: Optional[str] = None,
+        duration: Optional[float] = None
     ) -> None:
         """
         记录验证码处理结果
@@ -35,8 +37,10 @@ class CaptchaStatistics:
             captcha_type: 验证码类型
             success: 是否成功
             method: 处理方法（如"vision", "ocr", "manual"）
+            duration: 处理耗时（秒）
         """
         type_str = captcha_type.value
+        record_captcha_metric(type_str, success, duration)
         self.type_counts[type_str] += 1
         self.total_count += 1
         
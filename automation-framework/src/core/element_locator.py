@@ -6,6 +6,8 @@ from enum import Enum
 import re
 import logging
 
+from .locator_memory import locate_with_memory
+
 logger = logging.getLogger(__name__)
 
 
@@ -152,35 +154,36 @@ class MultiLocatorStrategy:
         """
         self.locators = locators
     
+    def signature(self) -> str:
+        """定位器组合的签名（作为策略记忆的键）"""
+        return " | ".join(f"{locator.locator_type.value}:{locator.selector}" for locator in self.locators)
+    
     async def find_element(self, page, timeout: Optional[int] = None) -> Optional[Any]:
         """
-        尝试多种定位策略查找元素
+        并发尝试多种定位策略，返回最先可见的元素
+        
+        上次在该站点命中的定位器会被优先单独尝试（见 core.locator_memory）。
         
         Args:
             page: Playwright Page对象
             timeout: 总超时时间（如果为None，使用第一个定位器的超时时间）
             
         Returns:
-            找到的元素，如果都失败返回None
+            找到的元素（Playwright Locator），如果都失败返回None
         """
         if not self.locators:
             return None
         
         total_timeout = timeout or self.locators[0].timeout
-        start_time = None
-        
-        for locator in self.locators:
-            try:
-                playwright_locator = locator.to_playwright_locator(page)
-                element = await playwright_locator.first.wait_for(
-                    state="visible",
-                    timeout=min(locator.timeout, total_timeout)
-                )
-                if element:
-                    logger.info(f"Element found using {locator.locator_type.value} strategy: {locator.selector}")
-                    return element
-            except Exception as e:
-                logger.debug(f"Locator {locator.locator_type.value}:{locator.selector} failed: {e}")
-                continue
+        candidates = [
+            (f"{locator.locator_type.value}:{locator.selector}", locator.to_playwright_locator(page))
+            for locator in self.locators
+        ]
+        result = await locate_with_memory(page, self.signature(), candidates, total_timeout)
+        if result is None:
+            logger.debug(f"No locator matched: {self.signature()}")
+            return None
         
-        return None
+        strategy, element = result
+        logger.info(f"Element found using {strategy}")
+        return element
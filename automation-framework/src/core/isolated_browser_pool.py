@@ -1,20 +1,382 @@
 """
-隔离的浏览器实例池 - 为每个用户提供独立的浏览器实例池
+隔离的浏览器实例池 - 为每个用户提供隔离的浏览器环境
+
+两种隔离模式：
+- context（默认）：少量共享浏览器进程，每个用户一个独立的 BrowserContext（存储、Cookie、代理互相隔离），
+  同一用户的任务在该上下文中各开一个页面。新建上下文前按可用内存做准入控制，空闲上下文按 LRU 回收，
+  回收前把 storage_state 写盘，用户再次使用时恢复登录态
+- process：每个用户一组独立的浏览器进程（隔离最强，每个 Chromium 约 150-300 MB）
 """
 import asyncio
+import json
 import logging
-from typing import Dict, Optional
+import os
+import re
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
 from datetime import datetime
 
 from ..execution.browser_pool import BrowserPool, BrowserInstance
+from ..drivers.browser_driver import BrowserDriver
 from ..core.types import BrowserType
 
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    psutil = None
+    PSUTIL_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
 
+class SharedBrowser:
+    """共享浏览器进程"""
+    
+    def __init__(self, index: int, browser: Any):
+        self.index = index
+        self.browser = browser
+        self.context_count = 0
+    
+    @property
+    def is_connected(self) -> bool:
+        return self.browser is not None and self.browser.is_connected()
+
+
+class UserContext:
+    """用户的浏览器上下文"""
+    
+    def __init__(self, user_id: int, context: Any, browser: SharedBrowser):
+        self.user_id = user_id
+        self.context = context
+        self.browser = browser
+        self.active_tasks: Set[str] = set()
+        self.created_at = datetime.now()
+        self.last_used = datetime.now()
+    
+    def is_idle(self) -> bool:
+        return not self.active_tasks
+    
+    def get_idle_time(self) -> float:
+        """获取空闲时间（秒）"""
+        if self.active_tasks:
+            return 0.0
+        return (datetime.now() - self.last_used).total_seconds()
+
+
+class SharedContextPool:
+    """
+    共享浏览器 + 用户级上下文池
+    """
+    
+    def __init__(
+        self,
+        browser_processes: int = 2,
+        max_contexts: int = 200,
+        max_idle_time: int = 300,
+        min_available_memory_mb: int = 1024,
+        context_memory_mb: int = 40,
+        storage_dir: Optional[Path] = None,
+        browser_type: BrowserType = BrowserType.CHROMIUM,
+        headless: bool = True
+    ):
+        """
+        初始化共享上下文池
+        
+        Args:
+            browser_processes: 共享浏览器进程数
+            max_contexts: 最多同时存在的用户上下文数
+            max_idle_time: 上下文最大空闲时间（秒），超时后回收
+            min_available_memory_mb: 新建上下文后系统至少保留的可用内存（MB）
+            context_memory_mb: 单个上下文的预估内存（MB），用于准入判断
+            storage_dir: storage_state 保存目录，默认取环境变量 BROWSER_STATE_DIR 或 ./data/browser_state
+            browser_type: 浏览器类型
+            headless: 是否无头模式
+        """
+        self.browser_processes = max(1, browser_processes)
+        self.max_contexts = max_contexts
+        self.max_idle_time = max_idle_time
+        self.min_available_memory_mb = min_available_memory_mb
+        self.context_memory_mb = context_memory_mb
+        self.storage_dir = Path(storage_dir or os.getenv("BROWSER_STATE_DIR", "./data/browser_state"))
+        self.browser_type = browser_type
+        self.headless = headless
+        
+        self._playwright: Any = None
+        self._browsers: List[Optional[SharedBrowser]] = [None] * self.browser_processes
+        # 按最近使用排序：最久未使用的在前
+        self._contexts: "OrderedDict[int, UserContext]" = OrderedDict()
+        self._drivers: Dict[tuple, BrowserDriver] = {}
+        self._lock = asyncio.Lock()
+        self._released = asyncio.Condition(self._lock)
+        self._cleanup_task: Optional[asyncio.Task] = None
+    
+    async def start(self) -> None:
+        """启动空闲上下文回收任务"""
+        if self._cleanup_task is None or self._cleanup_task.done():
+            self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+    
+    async def acquire(
+        self,
+        user_id: int,
+        task_id: str,
+        timeout: float = 30.0,
+        context_options: Optional[Dict[str, Any]] = None
+    ) -> Optional[BrowserInstance]:
+        """
+        为用户的任务获取浏览器实例（用户上下文中的新页面）
+        
+        Args:
+            user_id: 用户ID
+            task_id: 任务ID
+            timeout: 等待准入的超时时间（秒）
+            context_options: 新建上下文时的参数（proxy、viewport、user_agent、locale 等）
+            
+        Returns:
+            浏览器实例，超时返回None
+        """
+        key = (user_id, task_id)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        
+        async with self._released:
+            if key in self._drivers:
+                return BrowserInstance(f"{user_id}:{task_id}", self._drivers[key], self.browser_type)
+            
+            user_context = self._contexts.get(user_id)
+            while user_context is None:
+                if await self._admit():
+                    user_context = await self._create_context(user_id, context_options or {})
+                    break
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    logger.warning(f"Browser context admission timed out for user {user_id}")
+                    return None
+                try:
+                    await asyncio.wait_for(self._released.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    pass
+                user_context = self._contexts.get(user_id)
+            
+            user_context.active_tasks.add(task_id)
+            user_context.last_used = datetime.now()
+            self._contexts.move_to_end(user_id)
+        
+        driver = BrowserDriver(browser_type=self.browser_type, headless=self.headless)
+        try:
+            await driver.attach_context(user_context.context)
+        except Exception:
+            async with self._released:
+                user_context.active_tasks.discard(task_id)
+                self._released.notify_all()
+            raise
+        self._drivers[key] = driver
+        
+        instance = BrowserInstance(f"{user_id}:{task_id}", driver, self.browser_type)
+        instance.mark_busy()
+        logger.info(f"Acquired browser context for user {user_id}, task {task_id}")
+        return instance
+    
+    async def release(self, user_id: int, task_id: str) -> None:
+        """
+        释放任务的页面（上下文保留给同一用户的后续任务）
+        
+        Args:
+            user_id: 用户ID
+            task_id: 任务ID
+        """
+        driver = self._drivers.pop((user_id, task_id), None)
+        if driver:
+            try:
+                await driver.stop()
+            except Exception as e:
+                logger.warning(f"Failed to close pages for user {user_id}, task {task_id}: {e}")
+        
+        async with self._released:
+            user_context = self._contexts.get(user_id)
+            if user_context:
+                user_context.active_tasks.discard(task_id)
+                user_context.last_used = datetime.now()
+            self._released.notify_all()
+    
+    async def evict_user(self, user_id: int) -> None:
+        """
+        回收用户上下文（保存 storage_state 后关闭）
+        
+        Args:
+            user_id: 用户ID
+        """
+        async with self._released:
+            user_context = self._contexts.get(user_id)
+            if user_context is None:
+                return
+            for key in [key for key in self._drivers if key[0] == user_id]:
+                try:
+                    await self._drivers.pop(key).stop()
+                except Exception:
+                    pass
+            user_context.active_tasks.clear()
+            await self._evict(user_context)
+            self._released.notify_all()
+    
+    async def stop(self) -> None:
+        """保存所有用户的状态并关闭共享浏览器"""
+        if self._cleanup_task:
+            self._cleanup_task.cancel()
+            try:
+                await self._cleanup_task
+            except asyncio.CancelledError:
+                pass
+            self._cleanup_task = None
+        
+        for user_id in list(self._contexts.keys()):
+            await self.evict_user(user_id)
+        
+        async with self._lock:
+            for shared in self._browsers:
+                if shared and shared.browser:
+                    try:
+                        await shared.browser.close()
+                    except Exception:
+                        pass
+            self._browsers = [None] * self.browser_processes
+            if self._playwright:
+                await self._playwright.stop()
+                self._playwright = None
+    
+    async def _admit(self) -> bool:
+        """
+        准入判断（调用方持有锁）：数量或内存不足时先按 LRU 回收空闲上下文
+        
+        Returns:
+            是否可以新建上下文
+        """
+        while True:
+            if len(self._contexts) < self.max_contexts and self._has_memory_headroom():
+                return True
+            victim = next((c for c in self._contexts.values() if c.is_idle()), None)
+            if victim is None:
+                return False
+            logger.info(f"Evicting idle browser context of user {victim.user_id} under pressure")
+            await self._evict(victim)
+    
+    def _has_memory_headroom(self) -> bool:
+        """系统可用内存在新建一个上下文后是否仍高于保留值"""
+        if not PSUTIL_AVAILABLE:
+            return True
+        available_mb = psutil.virtual_memory().available / (1024 * 1024)
+        return available_mb - self.context_memory_mb >= self.min_available_memory_mb
+    
+    async def _get_browser(self) -> SharedBrowser:
+        """选择上下文最少的共享浏览器，断开的进程按需重启"""
+        if self._playwright is None:
+            from playwright.async_api import async_playwright
+            self._playwright = await async_playwright().start()
+        
+        index = min(
+            range(self.browser_processes),
+            key=lambda i: self._browsers[i].context_count if self._browsers[i] and self._browsers[i].is_connected else -1
+        )
+        shared = self._browsers[index]
+        if shared is None or not shared.is_connected:
+            launcher = getattr(self._playwright, self.browser_type.value)
+            shared = SharedBrowser(index, await launcher.launch(headless=self.headless))
+            self._browsers[index] = shared
+            # 进程崩溃后，其上的上下文全部失效
+            for user_id in [uid for uid, c in self._contexts.items() if c.browser.index == index]:
+                del self._contexts[user_id]
+            logger.info(f"Launched shared browser process #{index}")
+        return shared
+    
+    async def _create_context(self, user_id: int, context_options: Dict[str, Any]) -> UserContext:
+        """新建用户上下文（调用方持有锁），有保存的 storage_state 时恢复"""
+        shared = await self._get_browser()
+        options = {"viewport": {"width": 1280, "height": 720}, **context_options}
+        proxy = options.get("proxy")
+        if proxy is not None and hasattr(proxy, "to_playwright_proxy"):
+            options["proxy"] = proxy.to_playwright_proxy()
+        state_path = self._state_path(user_id)
+        if "storage_state" not in options and state_path.exists():
+            options["storage_state"] = str(state_path)
+        options = {k: v for k, v in options.items() if v is not None}
+        
+        try:
+            context = await shared.browser.new_context(**options)
+        except Exception as e:
+            if "storage_state" not in options:
+                raise
+            # 保存的状态损坏时丢弃，使用空白上下文
+            logger.warning(f"Failed to restore storage state for user {user_id}: {e}")
+            options.pop("storage_state")
+            context = await shared.browser.new_context(**options)
+        
+        shared.context_count += 1
+        user_context = UserContext(user_id, context, shared)
+        self._contexts[user_id] = user_context
+        logger.info(f"Created browser context for user {user_id} on shared browser #{shared.index}")
+        return user_context
+    
+    async def _evict(self, user_context: UserContext) -> None:
+        """保存 storage_state 并关闭上下文（调用方持有锁）"""
+        self._contexts.pop(user_context.user_id, None)
+        user_context.browser.context_count -= 1
+        try:
+            state = await user_context.context.storage_state()
+            await asyncio.to_thread(self._write_state, user_context.user_id, state)
+        except Exception as e:
+            logger.warning(f"Failed to save storage state for user {user_context.user_id}: {e}")
+        try:
+            await user_context.context.close()
+        except Exception:
+            pass
+    
+    def _state_path(self, user_id: Any) -> Path:
+        safe_id = re.sub(r"[^0-9A-Za-z_-]", "_", str(user_id))
+        return self.storage_dir / f"user_{safe_id}.json"
+    
+    def _write_state(self, user_id: int, state: Dict[str, Any]) -> None:
+        """原子写入 storage_state（含 Cookie，文件权限仅限当前用户）"""
+        self.storage_dir.mkdir(parents=True, exist_ok=True)
+        path = self._state_path(user_id)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, path)
+    
+    async def _cleanup_loop(self) -> None:
+        """定期回收超过空闲时间的上下文"""
+        while True:
+            try:
+                await asyncio.sleep(60)
+                async with self._released:
+                    for user_context in list(self._contexts.values()):
+                        if user_context.get_idle_time() > self.max_idle_time:
+                            await self._evict(user_context)
+                    self._released.notify_all()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Browser context cleanup error: {e}")
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        stats = {
+            "browsers": sum(1 for shared in self._browsers if shared and shared.is_connected),
+            "contexts": len(self._contexts),
+            "active_contexts": sum(1 for c in self._contexts.values() if not c.is_idle()),
+            "active_tasks": len(self._drivers),
+            "max_contexts": self.max_contexts,
+        }
+        if PSUTIL_AVAILABLE:
+            stats["available_memory_mb"] = round(psutil.virtual_memory().available / (1024 * 1024))
+        return stats
+
+
 class IsolatedBrowserPool:
     """
-    隔离的浏览器实例池 - 确保每个用户使用独立的浏览器实例
+    隔离的浏览器实例池 - 确保每个用户使用独立的浏览器环境
     """
     
     def __init__(
@@ -22,21 +384,38 @@ class IsolatedBrowserPool:
         max_pool_size_per_user: int = 3,
         max_idle_time: int = 300,
         browser_type: BrowserType = BrowserType.CHROMIUM,
-        headless: bool = True
+        headless: bool = True,
+        isolation: str = "context",
+        shared_pool: Optional[SharedContextPool] = None
     ):
         """
         初始化隔离的浏览器池
         
         Args:
-            max_pool_size_per_user: 每个用户的最大浏览器实例数
+            max_pool_size_per_user: 每个用户的最大浏览器实例数（process 模式）
             max_idle_time: 最大空闲时间（秒）
             browser_type: 浏览器类型
             headless: 是否无头模式
+            isolation: 隔离模式：context（共享浏览器进程 + 用户级上下文）或 process（用户独占浏览器进程）
+            shared_pool: context 模式使用的上下文池，默认按环境变量创建
         """
+        if isolation not in ("context", "process"):
+            raise ValueError(f"Unsupported isolation mode: {isolation}")
         self._max_pool_size_per_user = max_pool_size_per_user
         self._max_idle_time = max_idle_time
         self._browser_type = browser_type
         self._headless = headless
+        self._isolation = isolation
+        self._shared_pool = shared_pool
+        if isolation == "context" and shared_pool is None:
+            self._shared_pool = SharedContextPool(
+                browser_processes=int(os.getenv("BROWSER_SHARED_PROCESSES", "2")),
+                max_contexts=int(os.getenv("BROWSER_MAX_CONTEXTS", "200")),
+                max_idle_time=max_idle_time,
+                min_available_memory_mb=int(os.getenv("BROWSER_MIN_AVAILABLE_MEMORY_MB", "1024")),
+                browser_type=browser_type,
+                headless=headless
+            )
         
         # 用户池映射: user_id -> BrowserPool
         self._pools: Dict[int, BrowserPool] = {}
@@ -51,7 +430,8 @@ class IsolatedBrowserPool:
         self,
         user_id: int,
         task_id: str,
-        timeout: float = 30.0
+        timeout: float = 30.0,
+        context_options: Optional[Dict[str, Any]] = None
     ) -> Optional[BrowserInstance]:
         """
         获取浏览器实例（用户隔离）
@@ -60,10 +440,15 @@ class IsolatedBrowserPool:
             user_id: 用户ID
             task_id: 任务ID
             timeout: 超时时间（秒）
+            context_options: 用户上下文参数（proxy、user_agent 等，context 模式下在首次创建上下文时生效）
             
         Returns:
             浏览器实例
         """
+        if self._isolation == "context":
+            await self._shared_pool.start()
+            return await self._shared_pool.acquire(user_id, task_id, timeout, context_options)
+        
         async with self._lock:
             # 检查是否已有实例
             key = (user_id, task_id)
@@ -111,6 +496,10 @@ class IsolatedBrowserPool:
             user_id: 用户ID
             task_id: 任务ID
         """
+        if self._isolation == "context":
+            await self._shared_pool.release(user_id, task_id)
+            return
+        
         async with self._lock:
             key = (user_id, task_id)
             if key in self._task_instances:
@@ -135,6 +524,10 @@ class IsolatedBrowserPool:
         Args:
             user_id: 用户ID
         """
+        if self._isolation == "context":
+            await self._shared_pool.evict_user(user_id)
+            return
+        
         async with self._lock:
             if user_id in self._pools:
                 pool = self._pools[user_id]
@@ -153,12 +546,26 @@ class IsolatedBrowserPool:
     
     async def stop_all(self) -> None:
         """停止所有浏览器池"""
+        if self._shared_pool is not None:
+            await self._shared_pool.stop()
+        
         async with self._lock:
             for user_id, pool in list(self._pools.items()):
                 await pool.stop()
             self._pools.clear()
             self._task_instances.clear()
             logger.info("All browser pools stopped")
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        if self._isolation == "context":
+            return {"isolation": "context", **self._shared_pool.get_statistics()}
+        return {
+            "isolation": "process",
+            "users": len(self._pools),
+            "active_tasks": len(self._task_instances),
+            "pools": {user_id: pool.get_statistics() for user_id, pool in self._pools.items()},
+        }
 
 
 # 全局隔离浏览器池实例
@@ -169,5 +576,7 @@ def get_global_isolated_pool() -> IsolatedBrowserPool:
     """获取全局隔离浏览器池"""
     global _global_isolated_pool
     if _global_isolated_pool is None:
-        _global_isolated_pool = IsolatedBrowserPool()
+        _global_isolated_pool = IsolatedBrowserPool(
+            isolation=os.getenv("BROWSER_ISOLATION", "context")
+        )
     return _global_isolated_pool
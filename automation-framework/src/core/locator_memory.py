@@ -0,0 +1,265 @@
+"""
+元素定位竞速与策略记忆
+
+多个候选定位方式并发等待，有候选可见时取其中优先级最高的一个（精确选择器优先于宽松的回退策略）；命中的策略按 (站点, 选择器) 持久化，
+下次先用较短的时间单独尝试上次命中的策略，未命中再让全部候选并发竞速，
+一次定位失败的耗时上限为 timeout，而不是逐个策略尝试时的 N × timeout。
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+
+async def race_locators(
+    candidates: List[Tuple[str, Any]],
+    timeout: int,
+    state: str = "visible"
+) -> Optional[Tuple[str, Any]]:
+    """
+    并发等待多个候选定位器，返回满足状态的候选中优先级最高的一个
+
+    某个候选先满足状态时，立即复查排在它前面且仍在等待的候选，
+    避免宽松的回退策略（如文本匹配）先于精确选择器命中而被选中并记住。
+
+    Args:
+        candidates: (策略名, Playwright Locator) 列表，按优先级从高到低排列
+        timeout: 超时时间（毫秒），所有候选共享同一个时限
+        state: 等待的元素状态
+
+    Returns:
+        (策略名, 命中的 Locator)，全部失败返回 None
+    """
+    if not candidates:
+        return None
+
+    tasks = [
+        asyncio.create_task(locator.first.wait_for(state=state, timeout=timeout))
+        for _, locator in candidates
+    ]
+    try:
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    logger.debug(f"Locator candidate failed: {task.exception()}")
+            winner = next((i for i, task in enumerate(tasks) if task.done() and task.exception() is None), None)
+            if winner is None:
+                continue
+            for index in range(winner):
+                if not tasks[index].done() and await _matches_now(candidates[index][1], state):
+                    winner = index
+                    break
+            strategy, locator = candidates[winner]
+            return strategy, locator.first
+        return None
+    finally:
+        # 取消仍在等待的候选（浏览器端的等待随之失效）
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _matches_now(locator: Any, state: str) -> bool:
+    """不等待，检查定位器当前是否已满足状态"""
+    try:
+        await locator.first.wait_for(state=state, timeout=1)
+        return True
+    except Exception:
+        return False
+
+
+class LocatorMemory:
+    """
+    定位策略记忆 - 按 (站点, 选择器) 记录上次命中的策略
+
+    数据保存在 JSON 文件中，只在命中的策略发生变化时写盘（临时文件 + 原子替换）。
+    """
+
+    def __init__(self, storage_path: Optional[Path] = None, max_entries: int = 5000):
+        """
+        初始化策略记忆
+
+        Args:
+            storage_path: 存储文件路径，默认取环境变量 LOCATOR_MEMORY_PATH 或 ./data/locator_memory.json
+            max_entries: 最多保存的条目数，超出时淘汰最久未命中的条目
+        """
+        self.storage_path = storage_path or Path(
+            os.getenv("LOCATOR_MEMORY_PATH", "./data/locator_memory.json")
+        )
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def site_of(page: Any) -> str:
+        """
+        获取页面所属站点（host:port）
+
+        Args:
+            page: Playwright Page对象
+
+        Returns:
+            站点标识，无法解析时返回空字符串
+        """
+        try:
+            return urlparse(page.url).netloc
+        except Exception:
+            return ""
+
+    @staticmethod
+    def _key(site: str, selector: str) -> str:
+        return f"{site}\n{selector}"
+
+    def get(self, site: str, selector: str) -> Optional[str]:
+        """
+        获取上次命中的策略
+
+        Args:
+            site: 站点
+            selector: 选择器（或多定位器的签名）
+
+        Returns:
+            策略名，没有记录时返回None
+        """
+        key = self._key(site, selector)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry["strategy"]
+
+    async def record(self, site: str, selector: str, strategy: str) -> None:
+        """
+        记录命中的策略
+
+        Args:
+            site: 站点
+            selector: 选择器（或多定位器的签名）
+            strategy: 命中的策略名
+        """
+        key = self._key(site, selector)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["strategy"] == strategy:
+                entry["hits"] += 1
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = {
+                "strategy": strategy,
+                "hits": 1,
+                "updated_at": datetime.now().isoformat(),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        await asyncio.to_thread(self._save)
+
+    async def forget(self, site: str, selector: str) -> None:
+        """
+        删除记录（记住的策略失效时调用）
+
+        Args:
+            site: 站点
+            selector: 选择器（或多定位器的签名）
+        """
+        with self._lock:
+            if self._entries.pop(self._key(site, selector), None) is None:
+                return
+        await asyncio.to_thread(self._save)
+
+    def _load(self) -> None:
+        """从文件加载"""
+        if not self.storage_path.exists():
+            return
+        try:
+            with open(self.storage_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._entries = OrderedDict(data.get("entries", {}))
+        except Exception as e:
+            logger.warning(f"Failed to load locator memory from {self.storage_path}: {e}")
+
+    def _save(self) -> None:
+        """原子写入文件"""
+        with self._lock:
+            data = {"entries": dict(self._entries)}
+        try:
+            self.storage_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.storage_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.storage_path)
+        except Exception as e:
+            logger.warning(f"Failed to save locator memory to {self.storage_path}: {e}")
+
+
+async def locate_with_memory(
+    page: Any,
+    memory_key: str,
+    candidates: List[Tuple[str, Any]],
+    timeout: int,
+    memory: Optional[LocatorMemory] = None,
+    preferred_timeout: int = 1000
+) -> Optional[Tuple[str, Any]]:
+    """
+    结合策略记忆的竞速定位
+
+    有记录时先用 preferred_timeout 单独尝试记住的策略（常见情况下只产生一次探测），
+    未命中再用剩余时间让全部候选并发竞速，并更新记录。
+
+    Args:
+        page: Playwright Page对象
+        memory_key: 记忆的键（选择器或多定位器的签名）
+        candidates: (策略名, Playwright Locator) 列表
+        timeout: 总超时时间（毫秒）
+        memory: 策略记忆，默认使用全局实例
+        preferred_timeout: 单独尝试记住的策略的时间（毫秒）
+
+    Returns:
+        (策略名, 命中的 Locator)，全部失败返回 None
+    """
+    memory = memory or get_global_locator_memory()
+    site = LocatorMemory.site_of(page)
+    remembered = memory.get(site, memory_key)
+    remaining = timeout
+
+    if remembered is not None:
+        preferred = [(strategy, locator) for strategy, locator in candidates if strategy == remembered]
+        if preferred:
+            budget = min(preferred_timeout, timeout)
+            result = await race_locators(preferred, budget)
+            if result is not None:
+                await memory.record(site, memory_key, remembered)
+                return result
+            remaining = max(timeout - budget, 0)
+
+    result = await race_locators(candidates, remaining) if remaining > 0 else None
+    if result is not None:
+        await memory.record(site, memory_key, result[0])
+    elif remembered is not None:
+        await memory.forget(site, memory_key)
+    return result
+
+
+# 全局策略记忆
+_global_locator_memory: Optional[LocatorMemory] = None
+
+
+def get_global_locator_memory() -> LocatorMemory:
+    """获取全局策略记忆"""
+    global _global_locator_memory
+    if _global_locator_memory is None:
+        _global_locator_memory = LocatorMemory()
+    return _global_locator_memory
@@ -1,16 +1,28 @@
 """
 智能等待 - 等待特定条件而非固定时间
+
+元素、文本、网络类条件直接使用 Playwright 的原生等待（wait_for / wait_for_function /
+expect_response），在浏览器内由 DOM 变化或网络事件驱动，不再按固定间隔发起 CDP 往返；
+DomCompositeCondition 把多个条件合成一个页面内的 MutationObserver，在第一次相关 DOM 变化时结束等待。
+只有 CustomCondition 这类无法在页面内表达的条件仍按 poll_interval 轮询。
 """
 import asyncio
+import fnmatch
+import json
 import logging
-from typing import Callable, Optional, Any, Dict
-from datetime import datetime, timedelta
+import time
+from typing import Callable, Optional, Any, Dict, List, Union
 from .interfaces import Action, Driver
 from .types import ActionType
 
 logger = logging.getLogger(__name__)
 
 
+def _page_of(driver: Any) -> Any:
+    """获取驱动当前的 Playwright 页面"""
+    return driver._current_page
+
+
 class WaitCondition:
     """等待条件基类"""
     
@@ -20,14 +32,14 @@ class WaitCondition:
         
         Args:
             timeout: 超时时间（毫秒）
-            poll_interval: 轮询间隔（毫秒）
+            poll_interval: 轮询间隔（毫秒），仅用于无法事件驱动的条件
         """
         self.timeout = timeout
         self.poll_interval = poll_interval
     
     async def check(self, driver: Any) -> bool:
         """
-        检查条件是否满足
+        检查条件是否满足（单次检查）
         
         Args:
             driver: 驱动实例
@@ -37,9 +49,18 @@ class WaitCondition:
         """
         raise NotImplementedError
     
+    def js_predicate(self) -> Optional[str]:
+        """
+        页面内判断函数的 JS 源码（供 DomCompositeCondition 合并使用）
+        
+        Returns:
+            形如 "() => boolean" 的函数源码，不能在页面内表达时返回None
+        """
+        return None
+    
     async def wait(self, driver: Any) -> bool:
         """
-        等待条件满足
+        等待条件满足（默认实现：按 poll_interval 轮询 check）
         
         Args:
             driver: 驱动实例
@@ -47,62 +68,107 @@ class WaitCondition:
         Returns:
             是否在超时前满足条件
         """
-        start_time = datetime.now()
-        timeout_delta = timedelta(milliseconds=self.timeout)
-        poll_delta = timedelta(milliseconds=self.poll_interval)
+        start_time = time.monotonic()
+        deadline = start_time + self.timeout / 1000
         
-        while datetime.now() - start_time < timeout_delta:
+        while True:
             try:
                 if await self.check(driver):
-                    elapsed = (datetime.now() - start_time).total_seconds()
-                    logger.debug(f"Wait condition satisfied after {elapsed:.2f}s")
+                    logger.debug(f"Wait condition satisfied after {time.monotonic() - start_time:.2f}s")
                     return True
             except Exception as e:
                 logger.debug(f"Wait condition check failed: {e}")
             
-            await asyncio.sleep(self.poll_interval / 1000)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(self.poll_interval / 1000, remaining))
         
-        elapsed = (datetime.now() - start_time).total_seconds()
-        logger.warning(f"Wait condition timeout after {elapsed:.2f}s")
+        logger.warning(f"Wait condition timeout after {time.monotonic() - start_time:.2f}s")
         return False
 
 
-class ElementVisibleCondition(WaitCondition):
-    """等待元素可见"""
+# 页面内可见性判断与元素查找（与 Playwright 的 visible 语义一致：非空包围盒且 visibility 不为 hidden）
+_JS_HELPERS = """
+    const isVisible = el => {
+        const rect = el.getBoundingClientRect();
+        return rect.width > 0 && rect.height > 0 && window.getComputedStyle(el).visibility !== 'hidden';
+    };
+    const find = (kind, selector) => kind === 'xpath'
+        ? document.evaluate(selector, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue
+        : document.querySelector(selector);
+"""
+
+
+class ElementCondition(WaitCondition):
+    """元素状态条件基类"""
+    
+    state = "visible"
     
     def __init__(self, selector: str, timeout: int = 30000, poll_interval: int = 100):
         super().__init__(timeout, poll_interval)
+        from .element_locator import ElementLocator
         self.selector = selector
+        self.locator = ElementLocator(selector)
+    
+    def _playwright_locator(self, driver: Any) -> Any:
+        return self.locator.to_playwright_locator(_page_of(driver)).first
+    
+    def _js_find(self) -> Optional[str]:
+        """页面内查找元素的 JS 表达式（仅支持 CSS 与 XPath）"""
+        from .element_locator import LocatorType
+        if self.locator.locator_type == LocatorType.XPATH:
+            return f"find('xpath', {json.dumps(self.selector)})"
+        if self.locator.locator_type == LocatorType.CSS:
+            return f"find('css', {json.dumps(self.selector)})"
+        return None
+    
+    async def wait(self, driver: Any) -> bool:
+        """使用 Playwright 原生等待（浏览器内由 DOM 变化驱动）"""
+        try:
+            await self._playwright_locator(driver).wait_for(state=self.state, timeout=self.timeout)
+            return True
+        except Exception as e:
+            logger.warning(f"Wait for {self.selector} to be {self.state} failed: {e}")
+            return False
+
+
+class ElementVisibleCondition(ElementCondition):
+    """等待元素可见"""
+    
+    state = "visible"
     
     async def check(self, driver: Any) -> bool:
         """检查元素是否可见"""
-        from .element_locator import ElementLocator
-        locator = ElementLocator(self.selector)
-        playwright_locator = locator.to_playwright_locator(driver._current_page)
         try:
-            await playwright_locator.first.wait_for(state="visible", timeout=100)
-            return True
-        except:
+            return await self._playwright_locator(driver).is_visible()
+        except Exception:
             return False
+    
+    def js_predicate(self) -> Optional[str]:
+        find = self._js_find()
+        if find is None:
+            return None
+        return f"() => {{ const el = {find}; return !!el && isVisible(el); }}"
 
 
-class ElementNotVisibleCondition(WaitCondition):
+class ElementNotVisibleCondition(ElementCondition):
     """等待元素不可见"""
     
-    def __init__(self, selector: str, timeout: int = 30000, poll_interval: int = 100):
-        super().__init__(timeout, poll_interval)
-        self.selector = selector
+    state = "hidden"
     
     async def check(self, driver: Any) -> bool:
         """检查元素是否不可见"""
-        from .element_locator import ElementLocator
-        locator = ElementLocator(self.selector)
-        playwright_locator = locator.to_playwright_locator(driver._current_page)
         try:
-            count = await playwright_locator.count()
-            return count == 0 or not await playwright_locator.first.is_visible()
-        except:
+            return not await self._playwright_locator(driver).is_visible()
+        except Exception:
             return True
+    
+    def js_predicate(self) -> Optional[str]:
+        find = self._js_find()
+        if find is None:
+            return None
+        return f"() => {{ const el = {find}; return !el || !isVisible(el); }}"
 
 
 class TextPresentCondition(WaitCondition):
@@ -115,10 +181,113 @@ class TextPresentCondition(WaitCondition):
     async def check(self, driver: Any) -> bool:
         """检查文本是否出现"""
         try:
-            content = await driver._current_page.content()
+            content = await _page_of(driver).content()
             return self.text in content
-        except:
+        except Exception:
+            return False
+    
+    def js_predicate(self) -> Optional[str]:
+        return f"() => (document.documentElement.textContent || '').includes({json.dumps(self.text)})"
+    
+    async def wait(self, driver: Any) -> bool:
+        """在页面内随 DOM 变化判断，文本出现时立即结束"""
+        return await DomCompositeCondition([self], timeout=self.timeout).wait(driver)
+
+
+class FunctionCondition(WaitCondition):
+    """等待页面内 JS 表达式返回真值（page.wait_for_function）"""
+    
+    def __init__(
+        self,
+        expression: str,
+        arg: Any = None,
+        timeout: int = 30000,
+        polling: Union[str, int] = "raf"
+    ):
+        """
+        Args:
+            expression: JS 表达式或函数源码
+            arg: 传给函数的参数
+            timeout: 超时时间（毫秒）
+            polling: "raf"（每帧在页面内判断）或毫秒数
+        """
+        super().__init__(timeout)
+        self.expression = expression
+        self.arg = arg
+        self.polling = polling
+    
+    async def check(self, driver: Any) -> bool:
+        try:
+            return bool(await _page_of(driver).evaluate(self.expression, self.arg))
+        except Exception:
+            return False
+    
+    async def wait(self, driver: Any) -> bool:
+        try:
+            await _page_of(driver).wait_for_function(
+                self.expression,
+                arg=self.arg,
+                timeout=self.timeout,
+                polling=self.polling
+            )
+            return True
+        except Exception as e:
+            logger.warning(f"Wait for function failed: {e}")
+            return False
+
+
+class ResponseCondition(WaitCondition):
+    """等待匹配的网络响应（page.expect_response）"""
+    
+    def __init__(
+        self,
+        url_or_predicate: Union[str, Callable[[Any], bool]],
+        status: Optional[int] = None,
+        timeout: int = 30000
+    ):
+        """
+        Args:
+            url_or_predicate: URL、glob 模式或接收 Response 返回布尔值的函数
+            status: 期望的状态码，为None时不限制
+            timeout: 超时时间（毫秒）
+        """
+        super().__init__(timeout)
+        self.url_or_predicate = url_or_predicate
+        self.status = status
+        self.response: Any = None
+    
+    def _matches(self, response: Any) -> bool:
+        if self.status is not None and response.status != self.status:
+            return False
+        if callable(self.url_or_predicate):
+            return bool(self.url_or_predicate(response))
+        return True
+    
+    async def check(self, driver: Any) -> bool:
+        return self.response is not None
+    
+    async def wait(self, driver: Any) -> bool:
+        page = _page_of(driver)
+        if callable(self.url_or_predicate) or self.status is not None:
+            matcher = self._matches if callable(self.url_or_predicate) else self._url_and_status_matcher()
+        else:
+            matcher = self.url_or_predicate
+        try:
+            async with page.expect_response(matcher, timeout=self.timeout) as response_info:
+                pass
+            self.response = await response_info.value
+            return True
+        except Exception as e:
+            logger.warning(f"Wait for response failed: {e}")
             return False
+    
+    def _url_and_status_matcher(self) -> Callable[[Any], bool]:
+        """URL 模式与状态码同时匹配"""
+        pattern = self.url_or_predicate
+        return lambda response: (
+            response.status == self.status
+            and (response.url == pattern or fnmatch.fnmatch(response.url, pattern))
+        )
 
 
 class NetworkIdleCondition(WaitCondition):
@@ -126,18 +295,160 @@ class NetworkIdleCondition(WaitCondition):
     
     def __init__(self, timeout: int = 30000, poll_interval: int = 100):
         super().__init__(timeout, poll_interval)
-        self._pending_requests = set()
     
     async def check(self, driver: Any) -> bool:
         """检查网络是否空闲"""
-        # Playwright的wait_for_load_state已经支持networkidle
-        # 这里可以检查是否有pending请求
         try:
-            # 使用Playwright的networkidle状态
-            await driver._current_page.wait_for_load_state("networkidle", timeout=100)
+            await _page_of(driver).wait_for_load_state("networkidle", timeout=100)
+            return True
+        except Exception:
+            return False
+    
+    async def wait(self, driver: Any) -> bool:
+        try:
+            await _page_of(driver).wait_for_load_state("networkidle", timeout=self.timeout)
+            return True
+        except Exception as e:
+            logger.warning(f"Wait for network idle failed: {e}")
+            return False
+
+
+class DomCompositeCondition(WaitCondition):
+    """
+    组合条件 - 在页面内用 MutationObserver 判断多个条件
+    
+    每次 DOM 变化（节点、属性、文本）时在页面内重新判断，满足即返回，整个等待只有一次 evaluate；
+    另以低频定时器兜底只改变样式、不产生 DOM 变化的情况。子条件无法在页面内表达时
+    （如 :has-text 等 Playwright 扩展选择器），退化为逐个使用原生等待。
+    """
+    
+    def __init__(
+        self,
+        conditions: List[WaitCondition],
+        mode: str = "all",
+        timeout: int = 30000,
+        fallback_interval: int = 250
+    ):
+        """
+        Args:
+            conditions: 子条件列表
+            mode: "all" 全部满足 / "any" 任一满足
+            timeout: 超时时间（毫秒）
+            fallback_interval: 页面内兜底判断间隔（毫秒）
+        """
+        super().__init__(timeout)
+        if mode not in ("all", "any"):
+            raise ValueError(f"Invalid mode: {mode}")
+        self.conditions = conditions
+        self.mode = mode
+        self.fallback_interval = fallback_interval
+    
+    def js_predicate(self) -> Optional[str]:
+        predicates = [condition.js_predicate() for condition in self.conditions]
+        if not predicates or any(predicate is None for predicate in predicates):
+            return None
+        joiner = " && " if self.mode == "all" else " || "
+        return "() => " + joiner.join(f"({predicate})()" for predicate in predicates)
+    
+    def _script(self, predicate: str) -> str:
+        return f"""
+async ({{ timeout, interval }}) => {{
+{_JS_HELPERS}
+    const satisfied = {predicate};
+    return await new Promise(resolve => {{
+        let done = false, observer = null, fallback = null, timer = null;
+        const finish = result => {{
+            if (done) return;
+            done = true;
+            if (observer) observer.disconnect();
+            clearInterval(fallback);
+            clearTimeout(timer);
+            resolve(result);
+        }};
+        const test = () => {{
+            try {{
+                if (satisfied()) finish({{ ok: true }});
+            }} catch (e) {{
+                finish({{ ok: false, error: String(e) }});
+            }}
+        }};
+        test();
+        if (done) return;
+        observer = new MutationObserver(test);
+        observer.observe(document, {{ subtree: true, childList: true, attributes: true, characterData: true }});
+        fallback = setInterval(test, interval);
+        timer = setTimeout(() => finish({{ ok: false, timeout: true }}), timeout);
+    }});
+}}
+"""
+    
+    async def check(self, driver: Any) -> bool:
+        results = [await condition.check(driver) for condition in self.conditions]
+        return all(results) if self.mode == "all" else any(results)
+    
+    async def wait(self, driver: Any) -> bool:
+        predicate = self.js_predicate()
+        if predicate is None:
+            return await self._wait_natively(driver)
+        
+        script = self._script(predicate)
+        deadline = time.monotonic() + self.timeout / 1000
+        while True:
+            remaining_ms = int((deadline - time.monotonic()) * 1000)
+            if remaining_ms <= 0:
+                return False
+            page = _page_of(driver)
+            try:
+                result = await asyncio.wait_for(
+                    page.evaluate(script, {"timeout": remaining_ms, "interval": self.fallback_interval}),
+                    timeout=remaining_ms / 1000 + 5
+                )
+            except asyncio.TimeoutError:
+                return False
+            except Exception as e:
+                # 导航导致执行上下文销毁时，在新页面上继续等待
+                if "context was destroyed" in str(e) or "navigation" in str(e).lower():
+                    try:
+                        await page.wait_for_load_state(
+                            "domcontentloaded",
+                            timeout=max(int((deadline - time.monotonic()) * 1000), 1)
+                        )
+                    except Exception:
+                        pass
+                    continue
+                logger.warning(f"Composite wait evaluate failed: {e}")
+                return False
+            
+            if result.get("error"):
+                # 页面内无法判断（如选择器语法不被 querySelector 支持），退化为原生等待
+                logger.debug(f"Composite predicate error, falling back: {result['error']}")
+                return await self._wait_natively(driver, deadline)
+            return bool(result.get("ok"))
+    
+    async def _wait_natively(self, driver: Any, deadline: Optional[float] = None) -> bool:
+        """逐个使用子条件自身的等待（all 共享截止时间依次等待，any 并发竞速）"""
+        deadline = deadline or time.monotonic() + self.timeout / 1000
+        
+        def with_remaining(condition: WaitCondition) -> WaitCondition:
+            condition.timeout = max(int((deadline - time.monotonic()) * 1000), 1)
+            return condition
+        
+        if self.mode == "all":
+            for condition in self.conditions:
+                if not await with_remaining(condition).wait(driver):
+                    return False
             return True
-        except:
+        
+        tasks = [asyncio.create_task(with_remaining(condition).wait(driver)) for condition in self.conditions]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                if await next_done:
+                    return True
             return False
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
 
 
 class CustomCondition(WaitCondition):
@@ -228,6 +539,35 @@ def wait_for_network_idle(timeout: int = 30000) -> SmartWait:
     return SmartWait(condition, "Wait for network idle")
 
 
+def wait_for_function(expression: str, arg: Any = None, timeout: int = 30000) -> SmartWait:
+    """等待页面内 JS 表达式返回真值"""
+    condition = FunctionCondition(expression, arg, timeout)
+    return SmartWait(condition, f"Wait for function: {expression[:50]}")
+
+
+def wait_for_response(
+    url_or_predicate: Union[str, Callable[[Any], bool]],
+    status: Optional[int] = None,
+    timeout: int = 30000
+) -> SmartWait:
+    """等待匹配的网络响应"""
+    condition = ResponseCondition(url_or_predicate, status, timeout)
+    description = url_or_predicate if isinstance(url_or_predicate, str) else "predicate"
+    return SmartWait(condition, f"Wait for response: {description}")
+
+
+def wait_for_all(*conditions: WaitCondition, timeout: int = 30000) -> SmartWait:
+    """等待全部条件满足（页面内组合判断）"""
+    condition = DomCompositeCondition(list(conditions), mode="all", timeout=timeout)
+    return SmartWait(condition, f"Wait for all of {len(conditions)} conditions")
+
+
+def wait_for_any(*conditions: WaitCondition, timeout: int = 30000) -> SmartWait:
+    """等待任一条件满足（页面内组合判断）"""
+    condition = DomCompositeCondition(list(conditions), mode="any", timeout=timeout)
+    return SmartWait(condition, f"Wait for any of {len(conditions)} conditions")
+
+
 def wait_for_custom(
     check_func: Callable[[Any], bool],
     description: str,
@@ -7,8 +7,135 @@ import asyncio
 from playwright.async_api import Page, BrowserContext
 
 
+# 页面内批量处理表单字段：一次 evaluate 完成定位、可见性检查、赋值和校验
+# 赋值使用原型上的 value/checked setter（绕过 React 等框架的值追踪），再派发冒泡的 input/change 事件
+_FORM_BATCH_SCRIPT = """
+({ fields, validate }) => {
+    const FILLABLE_INPUTS = new Set([
+        'text', 'email', 'password', 'tel', 'url', 'search', 'number',
+        'date', 'datetime-local', 'month', 'week', 'time', 'color', 'range', ''
+    ]);
+    const describe = el => el.id || el.name || el.className;
+    const isVisible = el => {
+        const style = window.getComputedStyle(el);
+        const rect = el.getBoundingClientRect();
+        return style.visibility !== 'hidden' && style.display !== 'none' && rect.width > 0 && rect.height > 0;
+    };
+    const fire = el => {
+        el.dispatchEvent(new Event('input', { bubbles: true }));
+        el.dispatchEvent(new Event('change', { bubbles: true }));
+    };
+    const setValue = (el, value) => {
+        const proto = Object.getPrototypeOf(el);
+        const setter = Object.getOwnPropertyDescriptor(proto, 'value')?.set;
+        setter ? setter.call(el, value) : (el.value = value);
+        fire(el);
+    };
+
+    const results = {};
+    for (const { selector, value, fill } of fields) {
+        let el = null;
+        try {
+            el = document.querySelector(selector);
+        } catch (e) {
+            results[selector] = { found: false, ok: false, reason: 'invalid_selector' };
+            continue;
+        }
+        if (!el) {
+            results[selector] = { found: false, ok: false, reason: 'not_found' };
+            continue;
+        }
+        const tag = el.tagName.toLowerCase();
+        const type = (el.getAttribute('type') || '').toLowerCase();
+        const info = {
+            found: true, tag, type,
+            visible: isVisible(el),
+            disabled: !!el.disabled,
+            ok: false, reason: null
+        };
+        results[selector] = info;
+        if (!fill) {
+            info.ok = true;
+            info.value = type === 'checkbox' || type === 'radio' ? el.checked : el.value;
+            continue;
+        }
+        if (info.disabled) {
+            info.reason = 'disabled';
+            continue;
+        }
+        // 与 Playwright 的 fill/check 一致：不可见的元素不填充，只读的输入框不改写
+        if (!info.visible) {
+            info.reason = 'not_visible';
+            continue;
+        }
+        if ((tag === 'input' || tag === 'textarea') && el.readOnly && type !== 'checkbox' && type !== 'radio') {
+            info.reason = 'readonly';
+            continue;
+        }
+        if (tag === 'input' && (type === 'checkbox' || type === 'radio')) {
+            const desired = !!value;
+            // radio 只能选中，不能取消
+            if (el.checked !== desired && (type === 'checkbox' || desired)) {
+                el.click();
+            }
+            info.ok = el.checked === desired || (type === 'radio' && !desired);
+            info.reason = info.ok ? null : 'not_toggled';
+        } else if (tag === 'input' && FILLABLE_INPUTS.has(type)) {
+            el.focus();
+            setValue(el, String(value));
+            info.ok = true;
+        } else if (tag === 'textarea') {
+            el.focus();
+            setValue(el, String(value));
+            info.ok = true;
+        } else if (tag === 'select') {
+            // 与 select_option 一致：先按 value 匹配，再按显示文本匹配
+            const wanted = String(value);
+            const option = Array.from(el.options).find(o => o.value === wanted)
+                || Array.from(el.options).find(o => o.label === wanted || o.text.trim() === wanted);
+            if (option) {
+                setValue(el, option.value);
+                info.ok = true;
+            } else {
+                info.reason = 'option_not_found';
+            }
+        } else {
+            // 文件上传、contenteditable 等需要可信事件的元素，交给逐元素处理
+            info.reason = 'needs_trusted';
+        }
+    }
+
+    let validation = null;
+    if (validate) {
+        validation = { valid: true, missing_fields: [], invalid_fields: [] };
+        for (const el of document.querySelectorAll('[required]')) {
+            const type = (el.getAttribute('type') || '').toLowerCase();
+            const missing = el.validity ? el.validity.valueMissing
+                : (type === 'checkbox' || type === 'radio' ? !el.checked : !el.value);
+            if (missing) {
+                validation.missing_fields.push(describe(el));
+                validation.valid = false;
+            }
+        }
+        for (const el of document.querySelectorAll('input, select, textarea')) {
+            if (el.willValidate && !el.validity.valid && !el.validity.valueMissing) {
+                validation.invalid_fields.push({ field: describe(el), message: el.validationMessage });
+                validation.valid = false;
+            }
+        }
+    }
+    return { results, validation };
+}
+"""
+
+
 class FormFiller:
-    """表单自动填充器"""
+    """
+    表单自动填充器
+    
+    默认使用批量模式：所有字段的定位、赋值和校验在一次 page.evaluate 中完成，
+    只有需要可信事件（isTrusted）的字段才逐个通过 Playwright 操作。
+    """
     
     def __init__(self, page: Page):
         """
@@ -22,7 +149,9 @@ class FormFiller:
     async def fill_form(
         self,
         form_data: Dict[str, Any],
-        validate: bool = True
+        validate: bool = True,
+        trusted_selectors: Optional[List[str]] = None,
+        batch: bool = True
     ) -> Dict[str, bool]:
         """
         批量填充表单
@@ -30,75 +159,152 @@ class FormFiller:
         Args:
             form_data: 表单数据字典 {selector: value}
             validate: 是否验证必填字段
+            trusted_selectors: 必须使用可信事件逐个填充的字段（如监听键盘事件的输入框）
+            batch: 是否使用页面内批量赋值，为False时全部逐个填充
             
         Returns:
             填充结果 {selector: success}
         """
+        trusted = set(trusted_selectors or [])
+        if not batch:
+            trusted = set(form_data.keys())
+        batch_fields = [
+            {"selector": selector, "value": value, "fill": True}
+            for selector, value in form_data.items()
+            if selector not in trusted
+        ]
+        
         results = {}
+        validation = None
+        if batch_fields:
+            # 没有逐个填充的字段时，校验在同一次 evaluate 中完成
+            batch_result = await self.page.evaluate(
+                _FORM_BATCH_SCRIPT,
+                {"fields": batch_fields, "validate": validate and not trusted}
+            )
+            validation = batch_result["validation"]
+            for selector, info in batch_result["results"].items():
+                # Playwright 专有选择器（text=、xpath=、>>、:has-text() 等）无法在页面内解析，同样逐个填充
+                if info["reason"] in ("needs_trusted", "invalid_selector"):
+                    trusted.add(selector)
+                    # 页面内的校验早于逐个填充，需要填充完成后重新校验
+                    validation = None
+                else:
+                    results[selector] = info["ok"]
         
         for selector, value in form_data.items():
-            try:
-                element = await self.page.query_selector(selector)
-                if not element:
-                    results[selector] = False
-                    continue
-                
-                # 获取元素类型
-                tag_name = await element.evaluate("el => el.tagName.toLowerCase()")
-                input_type = await element.get_attribute("type")
-                
-                # 根据元素类型填充
-                if tag_name == "input":
-                    if input_type in ["text", "email", "password", "tel", "url"]:
-                        await element.fill(str(value))
-                    elif input_type == "checkbox":
-                        if value:
-                            await element.check()
-                        else:
-                            await element.uncheck()
-                    elif input_type == "radio":
-                        if value:
-                            await element.check()
-                elif tag_name == "select":
-                    await element.select_option(str(value))
-                elif tag_name == "textarea":
-                    await element.fill(str(value))
-                
-                results[selector] = True
-            except Exception as e:
-                results[selector] = False
+            if selector in trusted:
+                results[selector] = await self._fill_element(selector, value)
         
         if validate:
-            validation_results = await self.validate_form()
-            results["validation"] = validation_results
+            results["validation"] = validation if validation is not None else await self.validate_form()
         
         return results
     
-    async def validate_form(self) -> Dict[str, Any]:
+    async def _fill_element(self, selector: str, value: Any) -> bool:
         """
-        验证表单（检查必填字段）
+        通过 Playwright 逐个填充（产生可信的输入事件）
         
+        Args:
+            selector: 选择器
+            value: 值
+            
         Returns:
-            验证结果
+            是否成功
+        """
+        try:
+            element = await self.page.query_selector(selector)
+            if not element:
+                return False
+            
+            # 获取元素类型
+            tag_name = await element.evaluate("el => el.tagName.toLowerCase()")
+            input_type = await element.get_attribute("type")
+            
+            # 根据元素类型填充
+            if tag_name == "input":
+                if input_type == "checkbox":
+                    if value:
+                        await element.check()
+                    else:
+                        await element.uncheck()
+                elif input_type == "radio":
+                    if value:
+                        await element.check()
+                elif input_type == "file":
+                    await element.set_input_files(value)
+                else:
+                    await element.fill(str(value))
+            elif tag_name == "select":
+                await element.select_option(str(value))
+            else:
+                await element.fill(str(value))
+            
+            return True
+        except Exception:
+            return False
+    
+    async def inspect_fields(self, selectors: List[str]) -> Dict[str, Dict[str, Any]]:
         """
-        # 查找所有必填字段
-        required_fields = await self.page.query_selector_all("[required]")
+        一次性查询多个字段的状态（是否存在、可见、禁用及当前值）
         
-        validation = {
-            "valid": True,
-            "missing_fields": []
-        }
+        Args:
+            selectors: 选择器列表
+            
+        Returns:
+            {selector: {found, visible, disabled, tag, type, value}}
+        """
+        fields = [{"selector": selector, "value": None, "fill": False} for selector in selectors]
+        result = await self.page.evaluate(_FORM_BATCH_SCRIPT, {"fields": fields, "validate": False})
+        results = result["results"]
+        for selector, info in results.items():
+            if info["reason"] == "invalid_selector":
+                results[selector] = await self._inspect_element(selector)
+        return results
+    
+    async def _inspect_element(self, selector: str) -> Dict[str, Any]:
+        """
+        通过 Playwright 查询单个字段的状态（用于页面内无法解析的 Playwright 专有选择器）
         
-        for field in required_fields:
-            value = await field.input_value()
-            if not value:
-                selector = await field.evaluate(
-                    "el => el.id || el.name || el.className"
-                )
-                validation["missing_fields"].append(selector)
-                validation["valid"] = False
+        Args:
+            selector: 选择器
+            
+        Returns:
+            {found, visible, disabled, tag, type, value}
+        """
+        try:
+            element = await self.page.query_selector(selector)
+        except Exception:
+            return {"found": False, "ok": False, "reason": "invalid_selector"}
+        if not element:
+            return {"found": False, "ok": False, "reason": "not_found"}
         
-        return validation
+        tag_name = await element.evaluate("el => el.tagName.toLowerCase()")
+        input_type = ((await element.get_attribute("type")) or "").lower()
+        if input_type in ("checkbox", "radio"):
+            value = await element.is_checked()
+        else:
+            value = await element.evaluate("el => el.value")
+        return {
+            "found": True,
+            "tag": tag_name,
+            "type": input_type,
+            "visible": await element.is_visible(),
+            "disabled": await element.is_disabled(),
+            "ok": True,
+            "reason": None,
+            "value": value
+        }
+    
+    async def validate_form(self) -> Dict[str, Any]:
+        """
+        验证表单（检查必填字段和浏览器原生约束校验）
+        
+        Returns:
+            验证结果
+        """
+        result = await self.page.evaluate(_FORM_BATCH_SCRIPT, {"fields": [], "validate": True})
+        return result["validation"]
 
 
 class DynamicContentHandler:
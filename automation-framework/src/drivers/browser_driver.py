@@ -45,6 +45,24 @@ class BrowserDriver(Driver):
         self._context: Optional[BrowserContext] = None
         self._pages: List[Page] = []
         self._current_page: Optional[Page] = None
+        # 为False时驱动附着在外部管理的上下文上（共享浏览器），停止时只关闭自己打开的页面
+        self._owns_context = True
+    
+    async def attach_context(self, context: BrowserContext) -> None:
+        """
+        附着到已有的浏览器上下文（由共享浏览器池创建和回收）
+        
+        Args:
+            context: 浏览器上下文
+        """
+        if self.is_running:
+            return
+        
+        self._owns_context = False
+        self._context = context
+        self._current_page = await context.new_page()
+        self._pages.append(self._current_page)
+        self.is_running = True
     
     async def start(self, **kwargs: Any) -> None:
         """
@@ -125,6 +143,12 @@ class BrowserDriver(Driver):
         self._pages.clear()
         self._current_page = None
         
+        # 附着模式下上下文和浏览器由外部管理
+        if not self._owns_context:
+            self._context = None
+            self.is_running = False
+            return
+        
         # 关闭上下文
         if self._context:
             await self._context.close()
@@ -1,11 +1,14 @@
 """
 智能元素定位策略实现
 """
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from enum import Enum
 import logging
+import re
 from playwright.async_api import Page, Locator, ElementHandle
 
+from ..core.locator_memory import LocatorMemory, locate_with_memory
+
 
 logger = logging.getLogger(__name__)
 
@@ -19,16 +22,23 @@ class LocatorStrategy(str, Enum):
 
 
 class ElementLocator:
-    """智能元素定位器"""
+    """
+    智能元素定位器
+    
+    原始选择器与各降级策略并发竞速，取最先可见的元素；命中的策略按 (站点, 选择器) 记忆，
+    下次优先尝试（见 core.locator_memory）。
+    """
     
-    def __init__(self, page: Page):
+    def __init__(self, page: Page, memory: Optional[LocatorMemory] = None):
         """
         初始化定位器
         
         Args:
             page: Playwright页面对象
+            memory: 定位策略记忆，默认使用全局实例
         """
         self.page = page
+        self.memory = memory
         self.strategy_priority = [
             LocatorStrategy.CSS,
             LocatorStrategy.XPATH,
@@ -47,179 +57,72 @@ class ElementLocator:
         
         Args:
             selector: 选择器字符串
-            timeout: 超时时间（毫秒）
-            auto_fallback: 是否自动降级尝试其他策略
+            timeout: 超时时间（毫秒），原始选择器和所有降级策略共享该时限
+            auto_fallback: 是否同时尝试其他策略
             
         Returns:
             定位到的元素，失败返回None
         """
-        # 首先尝试直接使用选择器
-        try:
-            locator = self.page.locator(selector)
-            await locator.wait_for(timeout=timeout)
+        candidates = [("direct", self.page.locator(selector))]
+        if auto_fallback:
+            for strategy in self.strategy_priority:
+                candidates.extend(self._strategy_candidates(selector, strategy))
+        
+        result = await locate_with_memory(
+            self.page,
+            selector,
+            candidates,
+            timeout,
+            memory=self.memory
+        )
+        if result:
+            strategy, locator = result
+            if strategy != "direct":
+                logger.info(f"Located element using {strategy} strategy")
             return locator
-        except Exception as e:
-            logger.debug(f"Direct selector failed: {selector}, error: {e}")
-        
-        if not auto_fallback:
-            return None
-        
-        # 自动降级：尝试不同的定位策略
-        for strategy in self.strategy_priority:
-            try:
-                locator = await self._locate_with_strategy(
-                    selector,
-                    strategy,
-                    timeout
-                )
-                if locator:
-                    logger.info(f"Located element using {strategy} strategy")
-                    return locator
-            except Exception as e:
-                logger.debug(f"Strategy {strategy} failed: {e}")
-                continue
         
         logger.error(f"Failed to locate element with selector: {selector}")
         return None
     
-    async def _locate_with_strategy(
+    def _strategy_candidates(
         self,
         selector: str,
-        strategy: LocatorStrategy,
-        timeout: int
-    ) -> Optional[Locator]:
+        strategy: LocatorStrategy
+    ) -> List[Tuple[str, Locator]]:
         """
-        使用指定策略定位元素
+        生成指定策略的候选定位器
         
         Args:
             selector: 选择器
             strategy: 定位策略
-            timeout: 超时时间
             
         Returns:
-            定位到的元素
+            (策略名, 定位器) 列表
         """
         if strategy == LocatorStrategy.CSS:
-            return await self._locate_by_css(selector, timeout)
+            return [(strategy.value, self.page.locator(f"css={selector}"))]
         elif strategy == LocatorStrategy.XPATH:
-            return await self._locate_by_xpath(selector, timeout)
+            # 如果不是以//或/开头，尝试添加//
+            xpath = selector if selector.startswith(('/', '//')) else f"//{selector}"
+            return [(strategy.value, self.page.locator(f"xpath={xpath}"))]
         elif strategy == LocatorStrategy.TEXT:
-            return await self._locate_by_text(selector, timeout)
+            # 精确匹配与忽略大小写的包含匹配
+            pattern = re.escape(selector).replace("/", "\\/")
+            return [
+                (strategy.value, self.page.locator(f"text={selector}")),
+                (f"{strategy.value}_regex", self.page.locator(f"text=/{pattern}/i")),
+            ]
         elif strategy == LocatorStrategy.ACCESSIBILITY:
-            return await self._locate_by_accessibility(selector, timeout)
-        return None
-    
-    async def _locate_by_css(
-        self,
-        selector: str,
-        timeout: int
-    ) -> Optional[Locator]:
-        """
-        使用CSS选择器定位
-        
-        Args:
-            selector: CSS选择器
-            timeout: 超时时间
-            
-        Returns:
-            定位到的元素
-        """
-        try:
-            locator = self.page.locator(f"css={selector}")
-            await locator.wait_for(timeout=timeout)
-            return locator
-        except:
-            return None
-    
-    async def _locate_by_xpath(
-        self,
-        selector: str,
-        timeout: int
-    ) -> Optional[Locator]:
-        """
-        使用XPath定位
-        
-        Args:
-            selector: XPath表达式
-            timeout: 超时时间
-            
-        Returns:
-            定位到的元素
-        """
-        try:
-            # 如果不是以//或/开头，尝试添加//
-            if not selector.startswith(('/', '//')):
-                selector = f"//{selector}"
-            
-            locator = self.page.locator(f"xpath={selector}")
-            await locator.wait_for(timeout=timeout)
-            return locator
-        except:
-            return None
-    
-    async def _locate_by_text(
-        self,
-        text: str,
-        timeout: int
-    ) -> Optional[Locator]:
-        """
-        使用文本内容定位
-        
-        Args:
-            text: 文本内容
-            timeout: 超时时间
-            
-        Returns:
-            定位到的元素
-        """
-        try:
-            # 尝试精确匹配
-            locator = self.page.locator(f"text={text}")
-            await locator.wait_for(timeout=timeout)
-            return locator
-        except:
-            pass
-        
-        try:
-            # 尝试包含匹配
-            locator = self.page.locator(f"text=/{text}/i")
-            await locator.wait_for(timeout=timeout)
-            return locator
-        except:
-            return None
-    
-    async def _locate_by_accessibility(
-        self,
-        selector: str,
-        timeout: int
-    ) -> Optional[Locator]:
-        """
-        使用Accessibility属性定位
-        
-        Args:
-            selector: 属性值
-            timeout: 超时时间
-            
-        Returns:
-            定位到的元素
-        """
-        # 尝试常见的accessibility属性
-        attributes = [
-            f"[role='{selector}']",
-            f"[aria-label='{selector}']",
-            f"[aria-labelledby='{selector}']",
-            f"[title='{selector}']",
-        ]
-        
-        for attr in attributes:
-            try:
-                locator = self.page.locator(attr)
-                await locator.wait_for(timeout=timeout)
-                return locator
-            except:
-                continue
-        
-        return None
+            # 常见的accessibility属性合并为一个选择器
+            value = selector.replace("\\", "\\\\").replace("'", "\\'")
+            attributes = ", ".join([
+                f"[role='{value}']",
+                f"[aria-label='{value}']",
+                f"[aria-labelledby='{value}']",
+                f"[title='{value}']",
+            ])
+            return [(strategy.value, self.page.locator(attributes))]
+        return []
     
     async def locate_all(
         self,
@@ -1,165 +1,542 @@
 """
-文件存储管理
+文件存储管理 - 内容寻址存储
+
+文件内容按 SHA256 存放在 objects/<前2位>/<3-4位>/<完整哈希> 下，相同内容只保存一份
+（重复截图自动去重）；文件名、类型、关联对象和过期时间等信息记录在 file_storage 表中，
+查找、列表、统计和过期清理都走索引查询，不再扫描目录。
+旧版按类型分目录（screenshots/、logs/ 等）存放的文件可通过 import_legacy_files 导入。
 """
-import os
+import hashlib
+import logging
+import mimetypes
 import shutil
-from pathlib import Path
-from typing import Optional, List
+import uuid
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-import hashlib
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+
+import aiofiles
+import aiofiles.os
+from sqlalchemy import delete, func, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from ..models.sqlalchemy_models import FileStorage as FileStorageModel
+
+logger = logging.getLogger(__name__)
+
+# 流式读写的分块大小
+CHUNK_SIZE = 1024 * 1024
+
+# 等待内容对象锁的最长时间（秒）
+OBJECT_LOCK_TIMEOUT = 30
+
+# 旧版存储目录与文件类型的对应关系
+LEGACY_DIRS = {
+    "screenshots": "screenshot",
+    "logs": "log",
+    "videos": "video",
+    "exports": "export"
+}
 
 
 class FileStorageManager:
     """文件存储管理器"""
-    
-    def __init__(self, base_path: str = "./storage"):
+
+    def __init__(
+        self,
+        base_path: str = "./storage",
+        default_ttl_days: Optional[Dict[str, int]] = None
+    ):
+        """
+        初始化文件存储管理器
+
+        Args:
+            base_path: 存储根目录
+            default_ttl_days: 各文件类型的默认保留天数（如 {"screenshot": 30}），未配置的类型不过期
+        """
         self.base_path = Path(base_path)
-        self.base_path.mkdir(parents=True, exist_ok=True)
-        
-        # 创建子目录
-        self.screenshots_path = self.base_path / "screenshots"
-        self.logs_path = self.base_path / "logs"
-        self.videos_path = self.base_path / "videos"
-        self.exports_path = self.base_path / "exports"
-        
-        for path in [self.screenshots_path, self.logs_path, self.videos_path, self.exports_path]:
+        self.objects_path = self.base_path / "objects"
+        self.tmp_path = self.base_path / "tmp"
+        self.default_ttl_days = default_ttl_days or {}
+
+        for path in [self.objects_path, self.tmp_path]:
             path.mkdir(parents=True, exist_ok=True)
-    
-    def _get_file_path(self, file_type: str, filename: str) -> Path:
-        """获取文件路径"""
-        type_map = {
-            "screenshot": self.screenshots_path,
-            "log": self.logs_path,
-            "video": self.videos_path,
-            "export": self.exports_path
+
+    @asynccontextmanager
+    async def _session(self, db_session: Optional[AsyncSession]) -> AsyncIterator[AsyncSession]:
+        """使用传入的会话，未传入时创建独立会话"""
+        if db_session is not None:
+            yield db_session
+            return
+        from ..models.database import AsyncSessionLocal
+        async with AsyncSessionLocal() as session:
+            yield session
+
+    @asynccontextmanager
+    async def _object_lock(self, content_hash: str) -> AsyncIterator[AsyncConnection]:
+        """
+        按内容哈希加 MySQL 命名锁
+
+        去重写入（对象已存在则跳过、随后插入记录）和孤儿对象删除（确认无引用后删除对象）都在锁内完成，
+        避免删除方在写入方的记录提交前删掉刚被复用的对象。锁占用独立连接，不影响调用方会话的事务。
+        """
+        from ..models.database import async_engine
+        lock_name = f"file_object:{content_hash[:48]}"
+        async with async_engine.connect() as conn:
+            result = await conn.execute(
+                text("SELECT GET_LOCK(:name, :timeout)"),
+                {"name": lock_name, "timeout": OBJECT_LOCK_TIMEOUT}
+            )
+            if result.scalar() != 1:
+                raise TimeoutError(f"Timed out waiting for file object lock: {content_hash}")
+            # 结束加锁语句所在的事务，锁内的查询读取最新提交的数据
+            await conn.commit()
+            try:
+                yield conn
+            finally:
+                await conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": lock_name})
+                await conn.commit()
+
+    def object_path(self, content_hash: str) -> Path:
+        """根据内容哈希获取对象路径（两级前缀分片）"""
+        return self.objects_path / content_hash[:2] / content_hash[2:4] / content_hash
+
+    def _expires_at(
+        self,
+        file_type: str,
+        ttl_days: Optional[int],
+        created_at: Optional[datetime] = None
+    ) -> Optional[datetime]:
+        days = ttl_days if ttl_days is not None else self.default_ttl_days.get(file_type)
+        return (created_at or datetime.now()) + timedelta(days=days) if days else None
+
+    async def _write_object(self, content_hash: str, file_data: bytes) -> bool:
+        """
+        写入内容对象（已存在则跳过）
+
+        Returns:
+            是否实际写入了新对象
+        """
+        target = self.object_path(content_hash)
+        if await aiofiles.os.path.exists(target):
+            return False
+        await aiofiles.os.makedirs(target.parent, exist_ok=True)
+        tmp = self.tmp_path / uuid.uuid4().hex
+        async with aiofiles.open(tmp, "wb") as f:
+            await f.write(file_data)
+        # 原子替换，并发写入同一内容时不会产生半个文件
+        await aiofiles.os.replace(tmp, target)
+        return True
+
+    @staticmethod
+    async def _hash_path(source: Path) -> Tuple[str, int]:
+        """分块计算本地文件的内容哈希，返回 (哈希, 大小)"""
+        digest = hashlib.sha256()
+        size = 0
+        async with aiofiles.open(source, "rb") as f:
+            while chunk := await f.read(CHUNK_SIZE):
+                digest.update(chunk)
+                size += len(chunk)
+        return digest.hexdigest(), size
+
+    async def _store_path(self, source: Path, content_hash: str, move: bool) -> bool:
+        """
+        将本地文件存为内容对象（已存在则跳过）
+
+        Returns:
+            是否实际写入了新对象
+        """
+        target = self.object_path(content_hash)
+        if await aiofiles.os.path.exists(target):
+            if move:
+                await aiofiles.os.remove(source)
+            return False
+        await aiofiles.os.makedirs(target.parent, exist_ok=True)
+        tmp = self.tmp_path / uuid.uuid4().hex
+        if move:
+            await aiofiles.os.wrap(shutil.move)(str(source), str(tmp))
+        else:
+            await aiofiles.os.wrap(shutil.copyfile)(str(source), str(tmp))
+        await aiofiles.os.replace(tmp, target)
+        return True
+
+    async def _remove_object_if_orphan(self, content_hash: Optional[str]) -> None:
+        """没有记录再引用该内容时删除对象文件（与去重写入互斥）"""
+        if not content_hash:
+            return
+        async with self._object_lock(content_hash) as conn:
+            refs = await conn.execute(
+                select(func.count(FileStorageModel.id)).where(FileStorageModel.content_hash == content_hash)
+            )
+            if refs.scalar():
+                return
+            try:
+                await aiofiles.os.remove(self.object_path(content_hash))
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    async def _remove_legacy_file(file_path: str) -> None:
+        """删除旧版记录（未使用内容寻址）对应的文件"""
+        try:
+            await aiofiles.os.remove(file_path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _to_dict(record: FileStorageModel) -> Dict[str, Any]:
+        return {
+            "id": str(record.id),
+            "filename": record.file_name,
+            "file_type": record.file_type,
+            "path": record.file_path,
+            "size": record.file_size,
+            "hash": record.content_hash,
+            "mime_type": record.mime_type,
+            "related_type": record.related_type,
+            "related_id": record.related_id,
+            "created_at": record.created_at.isoformat() if record.created_at else None,
+            "expires_at": record.expires_at.isoformat() if record.expires_at else None,
+            "metadata": record.extra_metadata or {}
         }
-        base = type_map.get(file_type, self.base_path)
-        return base / filename
-    
+
+    async def _insert_record(
+        self,
+        db: AsyncSession,
+        content_hash: str,
+        size: int,
+        filename: str,
+        file_type: str,
+        metadata: Optional[dict],
+        related_type: Optional[str],
+        related_id: Optional[int],
+        ttl_days: Optional[int],
+        created_at: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        metadata = metadata or {}
+        record = FileStorageModel(
+            file_name=filename,
+            file_path=str(self.object_path(content_hash)),
+            file_type=file_type,
+            file_size=size,
+            content_hash=content_hash,
+            mime_type=metadata.get("content_type") or mimetypes.guess_type(filename)[0],
+            related_type=related_type,
+            related_id=related_id,
+            extra_metadata=metadata,
+            expires_at=self._expires_at(file_type, ttl_days, created_at)
+        )
+        if created_at is not None:
+            record.created_at = created_at
+        db.add(record)
+        await db.commit()
+        await db.refresh(record)
+        return self._to_dict(record)
+
     async def save_file(
         self,
         file_data: bytes,
         filename: str,
         file_type: str = "screenshot",
-        metadata: Optional[dict] = None
+        metadata: Optional[dict] = None,
+        related_type: Optional[str] = None,
+        related_id: Optional[int] = None,
+        ttl_days: Optional[int] = None,
+        db_session: Optional[AsyncSession] = None
     ) -> dict:
-        """保存文件"""
-        file_path = self._get_file_path(file_type, filename)
-        
-        # 保存文件
-        with open(file_path, "wb") as f:
-            f.write(file_data)
-        
-        # 计算文件哈希
-        file_hash = hashlib.sha256(file_data).hexdigest()
-        
-        # 创建文件记录
-        file_record = {
-            "id": file_hash[:16],
-            "filename": filename,
-            "file_type": file_type,
-            "path": str(file_path),
-            "size": len(file_data),
-            "hash": file_hash,
-            "created_at": datetime.now().isoformat(),
-            "metadata": metadata or {}
-        }
-        
-        # TODO: 保存到数据库
-        return file_record
-    
-    async def get_file(self, file_id: str) -> Optional[bytes]:
-        """获取文件"""
-        # TODO: 从数据库查询文件路径
-        # 这里简化实现
-        for path in [self.screenshots_path, self.logs_path, self.videos_path, self.exports_path]:
-            for file_path in path.glob("*"):
-                if file_id in str(file_path):
-                    with open(file_path, "rb") as f:
-                        return f.read()
-        return None
-    
-    async def delete_file(self, file_id: str) -> bool:
-        """删除文件"""
-        # TODO: 从数据库查询并删除
-        for path in [self.screenshots_path, self.logs_path, self.videos_path, self.exports_path]:
-            for file_path in path.glob("*"):
-                if file_id in str(file_path):
-                    file_path.unlink()
-                    return True
-        return False
-    
+        """
+        保存文件
+
+        Args:
+            file_data: 文件内容
+            filename: 原始文件名
+            file_type: 文件类型（screenshot, log, video, export）
+            metadata: 元数据
+            related_type: 关联类型（task, execution, session）
+            related_id: 关联ID
+            ttl_days: 保留天数（为None时使用该类型的默认值）
+            db_session: 数据库会话（可选）
+
+        Returns:
+            文件记录
+        """
+        content_hash = hashlib.sha256(file_data).hexdigest()
+        # 记录在锁内提交，提交之前对象不会被并发的删除或清理当作孤儿删掉
+        async with self._object_lock(content_hash):
+            deduplicated = not await self._write_object(content_hash, file_data)
+            async with self._session(db_session) as db:
+                record = await self._insert_record(
+                    db, content_hash, len(file_data), filename, file_type,
+                    metadata, related_type, related_id, ttl_days
+                )
+        record["deduplicated"] = deduplicated
+        return record
+
+    async def save_file_from_path(
+        self,
+        source_path: Union[str, Path],
+        filename: Optional[str] = None,
+        file_type: str = "video",
+        metadata: Optional[dict] = None,
+        related_type: Optional[str] = None,
+        related_id: Optional[int] = None,
+        ttl_days: Optional[int] = None,
+        move: bool = False,
+        db_session: Optional[AsyncSession] = None
+    ) -> dict:
+        """
+        从本地文件保存（分块计算哈希，适用于录屏等大文件，不整体读入内存）
+
+        Args:
+            source_path: 源文件路径
+            filename: 文件名（默认使用源文件名）
+            file_type: 文件类型
+            metadata: 元数据
+            related_type: 关联类型
+            related_id: 关联ID
+            ttl_days: 保留天数
+            move: 是否移动源文件（否则复制）
+            db_session: 数据库会话（可选）
+
+        Returns:
+            文件记录
+        """
+        source = Path(source_path)
+        content_hash, size = await self._hash_path(source)
+
+        async with self._object_lock(content_hash):
+            deduplicated = not await self._store_path(source, content_hash, move)
+            async with self._session(db_session) as db:
+                record = await self._insert_record(
+                    db, content_hash, size, filename or source.name, file_type,
+                    metadata, related_type, related_id, ttl_days
+                )
+        record["deduplicated"] = deduplicated
+        return record
+
+    async def get_file_info(
+        self,
+        file_id: str,
+        db_session: Optional[AsyncSession] = None
+    ) -> Optional[dict]:
+        """获取文件记录（主键查询）"""
+        try:
+            record_id = int(file_id)
+        except (TypeError, ValueError):
+            return None
+        async with self._session(db_session) as db:
+            record = await db.get(FileStorageModel, record_id)
+            return self._to_dict(record) if record else None
+
+    async def get_file(
+        self,
+        file_id: str,
+        db_session: Optional[AsyncSession] = None
+    ) -> Optional[bytes]:
+        """获取文件内容（小文件；大文件请使用 open_stream）"""
+        info = await self.get_file_info(file_id, db_session)
+        if not info:
+            return None
+        try:
+            async with aiofiles.open(info["path"], "rb") as f:
+                return await f.read()
+        except FileNotFoundError:
+            logger.warning(f"File object missing for record {file_id}: {info['path']}")
+            return None
+
+    async def open_stream(
+        self,
+        file_id: str,
+        chunk_size: int = CHUNK_SIZE,
+        db_session: Optional[AsyncSession] = None
+    ) -> Optional[AsyncIterator[bytes]]:
+        """
+        以分块方式读取文件（用于下载录屏等大文件）
+
+        Returns:
+            异步分块迭代器，文件不存在返回None
+        """
+        info = await self.get_file_info(file_id, db_session)
+        if not info or not await aiofiles.os.path.exists(info["path"]):
+            return None
+
+        async def _iterate() -> AsyncIterator[bytes]:
+            async with aiofiles.open(info["path"], "rb") as f:
+                while chunk := await f.read(chunk_size):
+                    yield chunk
+
+        return _iterate()
+
+    async def delete_file(
+        self,
+        file_id: str,
+        db_session: Optional[AsyncSession] = None
+    ) -> bool:
+        """删除文件记录（内容对象在没有其他引用时一并删除）"""
+        try:
+            record_id = int(file_id)
+        except (TypeError, ValueError):
+            return False
+        async with self._session(db_session) as db:
+            record = await db.get(FileStorageModel, record_id)
+            if not record:
+                return False
+            content_hash, file_path = record.content_hash, record.file_path
+            await db.execute(delete(FileStorageModel).where(FileStorageModel.id == record_id))
+            await db.commit()
+        if content_hash:
+            await self._remove_object_if_orphan(content_hash)
+        else:
+            await self._remove_legacy_file(file_path)
+        return True
+
     async def list_files(
         self,
         file_type: Optional[str] = None,
-        limit: int = 100
+        limit: int = 100,
+        offset: int = 0,
+        related_type: Optional[str] = None,
+        related_id: Optional[int] = None,
+        db_session: Optional[AsyncSession] = None
     ) -> List[dict]:
-        """列出文件"""
-        files = []
-        
+        """列出文件（按创建时间倒序）"""
+        query = select(FileStorageModel)
         if file_type:
-            search_paths = [self._get_file_path(file_type, "").parent]
-        else:
-            search_paths = [self.screenshots_path, self.logs_path, self.videos_path, self.exports_path]
-        
-        for path in search_paths:
-            for file_path in path.glob("*"):
-                if file_path.is_file():
-                    stat = file_path.stat()
-                    files.append({
-                        "filename": file_path.name,
-                        "path": str(file_path),
-                        "size": stat.st_size,
-                        "created_at": datetime.fromtimestamp(stat.st_ctime).isoformat()
-                    })
-        
-        return files[:limit]
-    
-    async def cleanup_old_files(self, days: int = 30):
-        """清理过期文件"""
-        cutoff_date = datetime.now() - timedelta(days=days)
+            query = query.where(FileStorageModel.file_type == file_type)
+        if related_type:
+            query = query.where(FileStorageModel.related_type == related_type)
+        if related_id is not None:
+            query = query.where(FileStorageModel.related_id == related_id)
+        query = query.order_by(FileStorageModel.created_at.desc()).offset(offset).limit(limit)
+
+        async with self._session(db_session) as db:
+            result = await db.execute(query)
+            return [self._to_dict(r) for r in result.scalars().all()]
+
+    async def cleanup_old_files(
+        self,
+        days: Optional[int] = 30,
+        batch_size: int = 500,
+        db_session: Optional[AsyncSession] = None
+    ) -> int:
+        """
+        清理过期文件（按 expires_at / created_at 索引分批查询，不扫描目录）
+
+        Args:
+            days: 删除早于该天数创建的文件（为None时只清理已过期的文件）
+            batch_size: 每批处理的记录数
+            db_session: 数据库会话（可选）
+
+        Returns:
+            删除的记录数
+        """
+        now = datetime.now()
+        condition = FileStorageModel.expires_at <= now
+        if days is not None:
+            condition = or_(condition, FileStorageModel.created_at < now - timedelta(days=days))
+
         deleted_count = 0
-        
-        for path in [self.screenshots_path, self.logs_path, self.videos_path, self.exports_path]:
-            for file_path in path.glob("*"):
-                if file_path.is_file():
-                    stat = file_path.stat()
-                    file_date = datetime.fromtimestamp(stat.st_ctime)
-                    if file_date < cutoff_date:
-                        file_path.unlink()
-                        deleted_count += 1
-        
+        async with self._session(db_session) as db:
+            while True:
+                result = await db.execute(
+                    select(FileStorageModel.id, FileStorageModel.content_hash, FileStorageModel.file_path)
+                    .where(condition)
+                    .limit(batch_size)
+                )
+                rows = result.all()
+                if not rows:
+                    break
+                await db.execute(
+                    delete(FileStorageModel).where(FileStorageModel.id.in_([r[0] for r in rows]))
+                )
+                await db.commit()
+                for content_hash in {r[1] for r in rows if r[1]}:
+                    await self._remove_object_if_orphan(content_hash)
+                for r in rows:
+                    if not r[1]:
+                        await self._remove_legacy_file(r[2])
+                deleted_count += len(rows)
+
         return deleted_count
-    
-    async def get_storage_stats(self) -> dict:
-        """获取存储统计"""
+
+    async def import_legacy_files(self, db_session: Optional[AsyncSession] = None) -> int:
+        """
+        导入旧版按类型分目录存放的文件（screenshots/、logs/、videos/、exports/）
+
+        文件移入对象目录并补写 file_storage 记录（创建时间取文件修改时间），可重复执行；
+        已有记录按原路径引用的文件（content_hash 为空）保持原位，读取和删除仍按记录中的路径进行。
+
+        Args:
+            db_session: 数据库会话（可选）
+
+        Returns:
+            导入的文件数
+        """
+        imported = 0
+        async with self._session(db_session) as db:
+            result = await db.execute(
+                select(FileStorageModel.file_path).where(FileStorageModel.content_hash.is_(None))
+            )
+            referenced = set(result.scalars().all())
+
+            for dir_name, file_type in LEGACY_DIRS.items():
+                legacy_dir = self.base_path / dir_name
+                if not legacy_dir.is_dir():
+                    continue
+                for path in sorted(legacy_dir.iterdir()):
+                    if not path.is_file() or str(path) in referenced:
+                        continue
+                    try:
+                        created_at = datetime.fromtimestamp(path.stat().st_mtime)
+                        content_hash, size = await self._hash_path(path)
+                        async with self._object_lock(content_hash):
+                            await self._store_path(path, content_hash, move=True)
+                            await self._insert_record(
+                                db, content_hash, size, path.name, file_type,
+                                {"legacy_path": str(path)}, None, None, None, created_at
+                            )
+                    except FileNotFoundError:
+                        # 已被并发执行的导入处理
+                        continue
+                    imported += 1
+
+        return imported
+
+    async def get_storage_stats(self, db_session: Optional[AsyncSession] = None) -> dict:
+        """获取存储统计（按类型聚合；disk_size 为去重后的实际占用）"""
         stats = {
             "total_size": 0,
             "file_count": 0,
             "by_type": {}
         }
-        
-        for type_name, path in [
-            ("screenshots", self.screenshots_path),
-            ("logs", self.logs_path),
-            ("videos", self.videos_path),
-            ("exports", self.exports_path)
-        ]:
-            type_size = 0
-            type_count = 0
-            
-            for file_path in path.glob("*"):
-                if file_path.is_file():
-                    type_size += file_path.stat().st_size
-                    type_count += 1
-            
-            stats["by_type"][type_name] = {
-                "size": type_size,
-                "count": type_count
-            }
-            stats["total_size"] += type_size
-            stats["file_count"] += type_count
-        
+
+        async with self._session(db_session) as db:
+            result = await db.execute(
+                select(
+                    FileStorageModel.file_type,
+                    func.count(FileStorageModel.id),
+                    func.coalesce(func.sum(FileStorageModel.file_size), 0)
+                ).group_by(FileStorageModel.file_type)
+            )
+            for file_type, count, size in result.all():
+                stats["by_type"][file_type] = {"size": int(size), "count": int(count)}
+                stats["total_size"] += int(size)
+                stats["file_count"] += int(count)
+
+            unique = (
+                select(FileStorageModel.content_hash, func.max(FileStorageModel.file_size).label("size"))
+                .where(FileStorageModel.content_hash.isnot(None))
+                .group_by(FileStorageModel.content_hash)
+                .subquery()
+            )
+            result = await db.execute(
+                select(func.count(), func.coalesce(func.sum(unique.c.size), 0)).select_from(unique)
+            )
+            object_count, disk_size = result.one()
+
+        stats["object_count"] = int(object_count)
+        stats["disk_size"] = int(disk_size)
         return stats
 
 
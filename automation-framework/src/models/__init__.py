@@ -17,6 +17,8 @@ from .database import (
 from .sqlalchemy_models import (
     Task,
     Schedule,
+    SchedulerLease,
+    ScheduleRun,
     ExecutionRecord,
     Session,
     SessionCheckpoint,
@@ -24,6 +26,7 @@ from .sqlalchemy_models import (
     ModelMetrics,
     SystemLog,
     NotificationConfig,
+    NotificationOutbox,
     FileStorage,
     Plugin,
     PerformanceMetrics,
@@ -43,6 +46,8 @@ __all__ = [
     # 任务
     "Task",
     "Schedule",
+    "SchedulerLease",
+    "ScheduleRun",
     "ExecutionRecord",
     # 会话
     "Session",
@@ -52,6 +57,7 @@ __all__ = [
     "ModelMetrics",
     "SystemLog",
     "NotificationConfig",
+    "NotificationOutbox",
     # 文件
     "FileStorage",
     "Plugin",
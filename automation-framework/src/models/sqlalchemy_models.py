@@ -3,8 +3,8 @@ SQLAlchemy 数据模型 - 统一使用 SQLAlchemy ORM
 """
 from datetime import datetime
 from sqlalchemy import (
-    Column, Integer, String, Text, Boolean, DateTime, 
-    JSON, Float, ForeignKey, Index
+    Column, Integer, BigInteger, String, Text, Boolean, DateTime,
+    JSON, Float, ForeignKey, Index, UniqueConstraint
 )
 from sqlalchemy.orm import relationship
 
@@ -72,6 +72,46 @@ class Schedule(Base):
     task = relationship("Task", back_populates="schedules")
 
 
+class SchedulerLease(Base):
+    """调度器租约模型（多实例部署时的主节点选举）"""
+    
+    __tablename__ = 'scheduler_leases'
+    __table_args__ = (
+        {'comment': '调度器租约表'},
+    )
+    
+    name = Column(String(64), primary_key=True, nullable=False, comment='租约名称')
+    holder = Column(String(128), nullable=False, comment='当前持有者（主机名:进程号:随机串）')
+    fencing_token = Column(BigInteger, nullable=False, default=1, comment='隔离令牌，每次更换持有者时递增')
+    expires_at = Column(DateTime, nullable=False, comment='租约过期时间')
+    updated_at = Column(DateTime, nullable=False, default=datetime.now, onupdate=datetime.now, comment='更新时间')
+
+
+class ScheduleRun(Base):
+    """调度执行队列模型（主节点写入到期的调度，各实例按空闲容量认领执行）"""
+    
+    __tablename__ = 'schedule_runs'
+    __table_args__ = (
+        UniqueConstraint('schedule_id', 'scheduled_time', name='uk_schedule_time'),
+        Index('idx_status_id', 'status', 'id'),
+        Index('idx_task_id', 'task_id'),
+        {'comment': '调度执行队列表'}
+    )
+    
+    id = Column(Integer, primary_key=True, nullable=False, autoincrement=True, comment='队列ID')
+    schedule_id = Column(Integer, ForeignKey('schedules.id', ondelete='CASCADE'), nullable=False, comment='调度ID')
+    task_id = Column(Integer, ForeignKey('tasks.id', ondelete='CASCADE'), nullable=False, comment='任务ID')
+    scheduled_time = Column(DateTime, nullable=False, comment='计划执行时间')
+    fencing_token = Column(BigInteger, nullable=False, comment='写入时主节点的隔离令牌')
+    status = Column(String(50), nullable=False, server_default='pending', comment='状态：pending, running, completed, failed')
+    worker_id = Column(String(128), nullable=True, comment='认领的实例')
+    claimed_at = Column(DateTime, nullable=True, comment='认领时间')
+    lease_expires_at = Column(DateTime, nullable=True, comment='执行租约到期时间（执行期间由认领的实例续期，过期后可被重新认领）')
+    finished_at = Column(DateTime, nullable=True, comment='结束时间')
+    error_message = Column(Text, nullable=True, comment='错误信息')
+    created_at = Column(DateTime, nullable=False, default=datetime.now, comment='创建时间')
+
+
 class ExecutionRecord(Base):
     """执行记录模型"""
     
@@ -80,6 +120,9 @@ class ExecutionRecord(Base):
         Index('idx_task_id', 'task_id'),
         Index('idx_status', 'status'),
         Index('idx_start_time', 'start_time'),
+        # 覆盖索引：历史统计/趋势聚合只需扫描索引
+        Index('idx_task_start_status', 'task_id', 'start_time', 'status', 'duration'),
+        Index('idx_start_status_duration', 'start_time', 'status', 'duration'),
         {'comment': '执行记录表'}
     )
     
@@ -226,6 +269,32 @@ class NotificationConfig(Base):
     updated_at = Column(DateTime, nullable=False, default=datetime.now, onupdate=datetime.now, comment='更新时间')
 
 
+class NotificationOutbox(Base):
+    """通知发件箱（持久化的待发送通知，由后台分发器异步投递）"""
+    
+    __tablename__ = 'notification_outbox'
+    __table_args__ = (
+        Index('idx_status_next_attempt', 'status', 'next_attempt_at'),
+        Index('idx_channel_digest', 'channel', 'digest_key', 'status'),
+        {'comment': '通知发件箱表'}
+    )
+    
+    id = Column(Integer, primary_key=True, nullable=False, autoincrement=True, comment='消息ID')
+    channel = Column(String(255), nullable=False, comment='通知渠道（notification_configs.name）')
+    event_type = Column(String(50), nullable=False, comment='事件类型：task_completed, task_failed, system_alert')
+    message = Column(Text, nullable=False, comment='渲染后的消息内容')
+    payload = Column(JSON, nullable=True, comment='发送参数（标题等）')
+    digest_key = Column(String(255), nullable=True, comment='摘要合并键，同一渠道同一键的突发消息合并发送')
+    status = Column(String(20), nullable=False, server_default='pending', comment='状态：pending, sending, sent, failed')
+    attempts = Column(Integer, nullable=False, default=0, comment='已尝试次数')
+    worker_id = Column(String(128), nullable=True, comment='认领的实例')
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.now, comment='下次可发送时间')
+    claimed_at = Column(DateTime, nullable=True, comment='认领时间')
+    sent_at = Column(DateTime, nullable=True, comment='发送成功时间')
+    last_error = Column(Text, nullable=True, comment='最近一次错误')
+    created_at = Column(DateTime, nullable=False, default=datetime.now, comment='创建时间')
+
+
 class FileStorage(Base):
     """文件存储"""
     
@@ -234,6 +303,8 @@ class FileStorage(Base):
         Index('idx_file_type', 'file_type'),
         Index('idx_related', 'related_type', 'related_id'),
         Index('idx_created_at', 'created_at'),
+        Index('idx_content_hash', 'content_hash'),
+        Index('idx_expires_at', 'expires_at'),
         {'comment': '文件存储表'}
     )
     
@@ -242,12 +313,14 @@ class FileStorage(Base):
     file_path = Column(String(512), nullable=False, comment='文件路径')
     file_type = Column(String(50), nullable=False, comment='文件类型：screenshot, log, video, export')
     file_size = Column(Integer, nullable=False, comment='文件大小（字节）')
+    content_hash = Column(String(64), nullable=True, comment='内容SHA256（内容寻址存储的对象键）')
     mime_type = Column(String(100), nullable=True, comment='MIME类型')
     related_type = Column(String(50), nullable=True, comment='关联类型：task, execution, session')
     related_id = Column(Integer, nullable=True, comment='关联ID')
     # 注意：SQLAlchemy Declarative API 中属性名 `metadata` 是保留的，
     # 这里使用 `extra_metadata` 作为属性名，但数据库列名仍为 `metadata`，兼容现有表结构。
     extra_metadata = Column("metadata", JSON, nullable=True, comment='元数据')
+    expires_at = Column(DateTime, nullable=True, comment='过期时间（为空表示不过期）')
     created_at = Column(DateTime, nullable=False, default=datetime.now, comment='创建时间')
 
 
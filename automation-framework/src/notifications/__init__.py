@@ -3,6 +3,7 @@
 """
 from .base import Notifier, NotificationManager
 from .channels import EmailNotifier, WebhookNotifier, SlackNotifier, DingTalkNotifier, WeChatWorkNotifier
+from .outbox import OutboxDispatcher, outbox_dispatcher
 
 __all__ = [
     "Notifier",
@@ -11,5 +12,7 @@ __all__ = [
     "WebhookNotifier",
     "SlackNotifier",
     "DingTalkNotifier",
-    "WeChatWorkNotifier"
+    "WeChatWorkNotifier",
+    "OutboxDispatcher",
+    "outbox_dispatcher"
 ]
@@ -4,6 +4,9 @@
 from abc import ABC, abstractmethod
 from typing import Dict, List, Optional
 import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class Notifier(ABC):
@@ -21,6 +24,15 @@ class Notifier(ABC):
     def validate_config(self) -> bool:
         """验证配置"""
         pass
+    
+    @property
+    def rate_limit_per_minute(self) -> int:
+        """每分钟最多发送条数（钉钉、企业微信机器人均限制为20条/分钟）"""
+        return int(self.config.get("rate_limit_per_minute", 20))
+    
+    async def close(self):
+        """释放渠道持有的连接等资源（可选的钩子，默认不持有资源，无需释放）"""
+        return None
 
 
 class NotificationManager:
@@ -33,6 +45,12 @@ class NotificationManager:
         """注册通知器"""
         self.notifiers[name] = notifier
     
+    async def unregister_notifier(self, name: str):
+        """注销通知器并释放其连接"""
+        notifier = self.notifiers.pop(name, None)
+        if notifier:
+            await notifier.close()
+    
     async def send_notification(self, channel: str, message: str, **kwargs) -> bool:
         """发送通知"""
         if channel not in self.notifiers:
@@ -42,7 +60,7 @@ class NotificationManager:
         try:
             return await notifier.send(message, **kwargs)
         except Exception as e:
-            print(f"Failed to send notification via {channel}: {e}")
+            logger.error(f"Failed to send notification via {channel}: {e}")
             return False
     
     async def broadcast(self, message: str, channels: Optional[List[str]] = None, **kwargs):
@@ -55,6 +73,11 @@ class NotificationManager:
         ]
         results = await asyncio.gather(*tasks, return_exceptions=True)
         return results
+    
+    async def close(self):
+        """关闭所有通知器"""
+        for name in list(self.notifiers.keys()):
+            await self.unregister_notifier(name)
 
 
 # 全局通知管理器
@@ -1,10 +1,16 @@
 """
 通知渠道实现
+
+HTTP 类渠道在实例内复用同一个 httpx.AsyncClient（连接池、keep-alive），
+由 close() 统一释放；传输异常向上抛出，由发件箱分发器记录错误并重试。
 """
+import logging
 import httpx
 from typing import Optional
 from .base import Notifier
 
+logger = logging.getLogger(__name__)
+
 
 class EmailNotifier(Notifier):
     """邮件通知"""
@@ -16,11 +22,59 @@ class EmailNotifier(Notifier):
     async def send(self, message: str, subject: str = "Notification", **kwargs) -> bool:
         """发送邮件"""
         # TODO: 实现SMTP邮件发送
-        print(f"[EMAIL] To: {self.config.get('to_email')}, Subject: {subject}, Message: {message}")
+        logger.info(f"[EMAIL] To: {self.config.get('to_email')}, Subject: {subject}, Message: {message}")
+        return True
+
+
+class HttpNotifier(Notifier):
+    """基于 HTTP 的通知渠道基类（渠道级共享客户端）"""
+    
+    def __init__(self, config: dict):
+        super().__init__(config)
+        self._client: Optional[httpx.AsyncClient] = None
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """获取共享客户端（首次使用时创建）"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=float(self.config.get("timeout", 10.0)),
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=5)
+            )
+        return self._client
+    
+    async def _post(self, url: str, payload: dict, headers: Optional[dict] = None) -> bool:
+        """
+        POST JSON 并判断是否成功
+        
+        Args:
+            url: 目标地址
+            payload: 请求体
+            headers: 额外请求头
+            
+        Returns:
+            HTTP 状态码为 200 且响应中没有非零 errcode（钉钉、企业微信限流时仍返回 200）
+        """
+        response = await self._get_client().post(url, json=payload, headers=headers)
+        if response.status_code != 200:
+            logger.warning(f"{self.__class__.__name__} got HTTP {response.status_code}: {response.text[:200]}")
+            return False
+        try:
+            body = response.json()
+        except ValueError:
+            return True
+        if isinstance(body, dict) and body.get("errcode", 0) != 0:
+            logger.warning(f"{self.__class__.__name__} rejected: {body}")
+            return False
         return True
+    
+    async def close(self):
+        """关闭共享客户端"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
 
-class WebhookNotifier(Notifier):
+class WebhookNotifier(HttpNotifier):
     """Webhook通知"""
     
     def validate_config(self) -> bool:
@@ -31,21 +85,10 @@ class WebhookNotifier(Notifier):
         url = self.config["url"]
         headers = self.config.get("headers", {})
         
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    url,
-                    json={"message": message, **kwargs},
-                    headers=headers,
-                    timeout=10.0
-                )
-                return response.status_code == 200
-            except Exception as e:
-                print(f"Webhook error: {e}")
-                return False
+        return await self._post(url, {"message": message, **kwargs}, headers=headers)
 
 
-class SlackNotifier(Notifier):
+class SlackNotifier(HttpNotifier):
     """Slack通知"""
     
     def validate_config(self) -> bool:
@@ -68,16 +111,10 @@ class SlackNotifier(Notifier):
             ]
         }
         
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(webhook_url, json=payload, timeout=10.0)
-                return response.status_code == 200
-            except Exception as e:
-                print(f"Slack error: {e}")
-                return False
+        return await self._post(webhook_url, payload)
 
 
-class DingTalkNotifier(Notifier):
+class DingTalkNotifier(HttpNotifier):
     """钉钉通知"""
     
     def validate_config(self) -> bool:
@@ -95,16 +132,10 @@ class DingTalkNotifier(Notifier):
             }
         }
         
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(webhook_url, json=payload, timeout=10.0)
-                return response.status_code == 200
-            except Exception as e:
-                print(f"DingTalk error: {e}")
-                return False
+        return await self._post(webhook_url, payload)
 
 
-class WeChatWorkNotifier(Notifier):
+class WeChatWorkNotifier(HttpNotifier):
     """企业微信通知"""
     
     def validate_config(self) -> bool:
@@ -122,10 +153,4 @@ class WeChatWorkNotifier(Notifier):
             }
         }
         
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(webhook_url, json=payload, timeout=10.0)
-                return response.status_code == 200
-            except Exception as e:
-                print(f"WeChatWork error: {e}")
-                return False
+        return await self._post(webhook_url, payload)
@@ -0,0 +1,497 @@
+"""
+通知发件箱
+
+通知先写入 notification_outbox 表，再由后台分发器异步投递，业务路径上只有一次 INSERT：
+- 分发器按 next_attempt_at 轮询到期消息，以条件 UPDATE（pending -> sending）认领，多实例部署时不会重复发送
+- 每个渠道复用同一个通知器实例（共享 HTTP 客户端），按令牌桶限速；渠道之间并发，渠道内串行
+- 发送失败按指数退避重试，超过最大次数标记为 failed；认领后进程退出的消息超时后重新入队
+- 带 digest_key 的消息（如任务失败告警）在合并窗口内的突发只发送一条摘要
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update, delete, func
+
+from ..models.database import AsyncSessionLocal
+from ..models.sqlalchemy_models import NotificationOutbox, NotificationConfig
+from .base import Notifier, notification_manager
+from .channels import EmailNotifier, WebhookNotifier, SlackNotifier, DingTalkNotifier, WeChatWorkNotifier
+from .templates import template_manager
+
+logger = logging.getLogger(__name__)
+
+
+# notification_configs.notification_type -> 通知器类型
+NOTIFIER_TYPES = {
+    "email": EmailNotifier,
+    "webhook": WebhookNotifier,
+    "slack": SlackNotifier,
+    "dingtalk": DingTalkNotifier,
+    "wechat_work": WeChatWorkNotifier,
+}
+
+
+class TokenBucket:
+    """令牌桶（按分钟速率匀速补充，允许短时突发到桶容量）"""
+
+    def __init__(self, rate_per_minute: int):
+        self.capacity = max(1, rate_per_minute)
+        self.tokens = float(self.capacity)
+        self.refill_per_second = self.capacity / 60.0
+        self.updated_at = time.monotonic()
+
+    def try_acquire(self) -> float:
+        """
+        尝试取一个令牌
+
+        Returns:
+            需要等待的秒数，0 表示已取得令牌
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.refill_per_second
+
+
+class OutboxDispatcher:
+    """通知发件箱分发器"""
+
+    def __init__(
+        self,
+        poll_interval: float = 2.0,
+        batch_size: int = 50,
+        max_attempts: int = 5,
+        base_backoff: float = 10.0,
+        max_backoff: float = 1800.0,
+        digest_window: float = 60.0,
+        digest_max_items: int = 20,
+        claim_timeout: float = 300.0,
+        config_refresh_interval: float = 60.0,
+        retention_days: int = 7
+    ):
+        """
+        初始化分发器
+
+        Args:
+            poll_interval: 空闲时的轮询间隔（秒），本进程入队时会立即唤醒
+            batch_size: 每轮最多认领的消息数
+            max_attempts: 最大发送次数
+            base_backoff: 重试退避基数（秒），第 n 次失败后等待 base_backoff * 2^(n-1)
+            max_backoff: 重试退避上限（秒）
+            digest_window: 摘要合并窗口（秒）
+            digest_max_items: 摘要中最多列出的条数
+            claim_timeout: 认领超时（秒），超时仍为 sending 的消息重新入队
+            config_refresh_interval: 从 notification_configs 刷新渠道的间隔（秒）
+            retention_days: 已发送消息的保留天数
+        """
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.digest_window = digest_window
+        self.digest_max_items = digest_max_items
+        self.claim_timeout = claim_timeout
+        self.config_refresh_interval = config_refresh_interval
+        self.retention_days = retention_days
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._buckets: Dict[str, TokenBucket] = {}
+        # 由本分发器从数据库注册的渠道及其配置更新时间
+        self._config_versions: Dict[str, datetime] = {}
+        self._configs_loaded_at = 0.0
+        self._purged_at = 0.0
+
+    async def start(self):
+        """启动后台分发"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info("Notification outbox dispatcher started")
+
+    async def stop(self):
+        """停止后台分发并关闭各渠道的 HTTP 客户端"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for name in list(self._config_versions.keys()):
+            await notification_manager.unregister_notifier(name)
+        self._config_versions.clear()
+        self._configs_loaded_at = 0.0
+        logger.info("Notification outbox dispatcher stopped")
+
+    async def enqueue(
+        self,
+        event_type: str,
+        message: str,
+        channels: Optional[List[str]] = None,
+        digest_key: Optional[str] = None,
+        **payload
+    ) -> int:
+        """
+        写入发件箱
+
+        Args:
+            event_type: 事件类型
+            message: 渲染后的消息内容
+            channels: 目标渠道，为空时发送到所有已启用渠道
+            digest_key: 摘要合并键，为空时不参与合并
+            **payload: 传给通知器 send() 的参数，需可 JSON 序列化（summary 仅用于摘要列表）
+
+        Returns:
+            写入的消息条数
+        """
+        await self._refresh_channels()
+        target_channels = channels or list(notification_manager.notifiers.keys())
+        if not target_channels:
+            return 0
+
+        now = datetime.now()
+        async with AsyncSessionLocal() as db:
+            for channel in target_channels:
+                next_attempt_at = now
+                if digest_key:
+                    next_attempt_at = await self._digest_due_time(db, channel, digest_key, now)
+                db.add(NotificationOutbox(
+                    channel=channel,
+                    event_type=event_type,
+                    message=message,
+                    payload=payload or None,
+                    digest_key=digest_key,
+                    status="pending",
+                    attempts=0,
+                    next_attempt_at=next_attempt_at,
+                    created_at=now
+                ))
+            await db.commit()
+
+        self._wakeup.set()
+        return len(target_channels)
+
+    async def _digest_due_time(self, db, channel: str, digest_key: str, now: datetime) -> datetime:
+        """
+        计算可合并消息的发送时间
+
+        同键已有待发送消息时加入同一批；窗口内刚发送过时推迟到窗口结束；否则立即发送，
+        因此一次突发中的第一条告警不会被延迟。
+        """
+        result = await db.execute(
+            select(func.min(NotificationOutbox.next_attempt_at)).where(
+                NotificationOutbox.channel == channel,
+                NotificationOutbox.digest_key == digest_key,
+                NotificationOutbox.status == "pending"
+            )
+        )
+        pending_due = result.scalar()
+        if pending_due is not None:
+            return max(pending_due, now)
+
+        sent_at = func.coalesce(NotificationOutbox.sent_at, NotificationOutbox.claimed_at)
+        result = await db.execute(
+            select(func.max(sent_at)).where(
+                NotificationOutbox.channel == channel,
+                NotificationOutbox.digest_key == digest_key,
+                NotificationOutbox.status.in_(["sending", "sent"]),
+                sent_at >= now - timedelta(seconds=self.digest_window)
+            )
+        )
+        last_sent = result.scalar()
+        if last_sent is not None:
+            return max(last_sent + timedelta(seconds=self.digest_window), now)
+        return now
+
+    async def _run(self):
+        """后台分发循环"""
+        while True:
+            processed = 0
+            try:
+                await self._refresh_channels()
+                await self._requeue_stale()
+                await self._purge_sent()
+                processed = await self.dispatch_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Notification outbox dispatch failed: {e}")
+
+            if processed:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def dispatch_once(self) -> int:
+        """
+        认领并发送一批到期消息
+
+        Returns:
+            本轮处理的消息条数
+        """
+        rows = await self._claim_due()
+        if not rows:
+            return 0
+
+        # 按渠道分组；同一渠道同一 digest_key 的消息合并为一个发送单元
+        units_by_channel: Dict[str, List[List[Dict[str, Any]]]] = defaultdict(list)
+        digest_units: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for row in rows:
+            if row["digest_key"]:
+                key = (row["channel"], row["digest_key"])
+                if key not in digest_units:
+                    digest_units[key] = []
+                    units_by_channel[row["channel"]].append(digest_units[key])
+                digest_units[key].append(row)
+            else:
+                units_by_channel[row["channel"]].append([row])
+
+        results = await asyncio.gather(*[
+            self._send_channel(channel, units)
+            for channel, units in units_by_channel.items()
+        ])
+
+        async with AsyncSessionLocal() as db:
+            for outcomes in results:
+                for unit, sent, error, retry_after in outcomes:
+                    await self._apply_outcome(db, unit, sent, error, retry_after)
+            await db.commit()
+        return len(rows)
+
+    async def _claim_due(self) -> List[Dict[str, Any]]:
+        """以条件 UPDATE 认领到期消息，返回本实例认领成功的消息"""
+        now = datetime.now()
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(NotificationOutbox.id)
+                .where(
+                    NotificationOutbox.status == "pending",
+                    NotificationOutbox.next_attempt_at <= now
+                )
+                .order_by(NotificationOutbox.next_attempt_at, NotificationOutbox.id)
+                .limit(self.batch_size)
+            )
+            ids = list(result.scalars().all())
+            if not ids:
+                return []
+
+            await db.execute(
+                update(NotificationOutbox)
+                .where(
+                    NotificationOutbox.id.in_(ids),
+                    NotificationOutbox.status == "pending"
+                )
+                .values(status="sending", worker_id=self.worker_id, claimed_at=now)
+            )
+            await db.commit()
+
+            result = await db.execute(
+                select(NotificationOutbox)
+                .where(
+                    NotificationOutbox.id.in_(ids),
+                    NotificationOutbox.status == "sending",
+                    NotificationOutbox.worker_id == self.worker_id
+                )
+                .order_by(NotificationOutbox.id)
+            )
+            return [
+                {
+                    "id": row.id,
+                    "channel": row.channel,
+                    "event_type": row.event_type,
+                    "message": row.message,
+                    "payload": row.payload or {},
+                    "digest_key": row.digest_key,
+                    "attempts": row.attempts,
+                    "created_at": row.created_at,
+                }
+                for row in result.scalars().all()
+            ]
+
+    async def _send_channel(
+        self,
+        channel: str,
+        units: List[List[Dict[str, Any]]]
+    ) -> List[Tuple[List[Dict[str, Any]], bool, Optional[str], Optional[float]]]:
+        """
+        在一个渠道上依次发送
+
+        Returns:
+            (发送单元, 是否成功, 错误信息, 限速时需等待的秒数) 列表
+        """
+        notifier = notification_manager.notifiers.get(channel)
+        outcomes = []
+        for unit in units:
+            if notifier is None:
+                outcomes.append((unit, False, f"Notifier '{channel}' not registered", None))
+                continue
+
+            retry_after = self._get_bucket(channel, notifier).try_acquire()
+            if retry_after > 0:
+                outcomes.append((unit, False, None, retry_after))
+                continue
+
+            message, kwargs = self._compose(unit)
+            try:
+                sent = await notifier.send(message, **kwargs)
+                outcomes.append((unit, sent, None if sent else "Notifier returned failure", None))
+            except Exception as e:
+                outcomes.append((unit, False, f"{type(e).__name__}: {e}", None))
+        return outcomes
+
+    def _compose(self, unit: List[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+        """生成发送内容：单条消息原样发送，多条合并为摘要"""
+        if len(unit) == 1:
+            kwargs = {k: v for k, v in unit[0]["payload"].items() if k != "summary"}
+            return unit[0]["message"], kwargs
+
+        items = [
+            {"title": row["payload"].get("summary") or row["payload"].get("title") or row["message"].splitlines()[0]}
+            for row in unit[:self.digest_max_items]
+        ]
+        template_name = f"{unit[0]['event_type']}_digest"
+        if template_manager.get_template(template_name) is None:
+            template_name = "task_failed_digest"
+        message = template_manager.render_template(
+            template_name,
+            count=len(unit),
+            items=items,
+            omitted=max(0, len(unit) - self.digest_max_items),
+            first_at=unit[0]["created_at"].isoformat(),
+            last_at=unit[-1]["created_at"].isoformat()
+        )
+        return message, {"title": f"{unit[0]['payload'].get('title', '通知')}等{len(unit)}条"}
+
+    async def _apply_outcome(
+        self,
+        db,
+        unit: List[Dict[str, Any]],
+        sent: bool,
+        error: Optional[str],
+        retry_after: Optional[float]
+    ):
+        """回写发送结果（只更新仍由本实例持有的消息）"""
+        now = datetime.now()
+        claimed = (
+            NotificationOutbox.status == "sending",
+            NotificationOutbox.worker_id == self.worker_id
+        )
+        ids = [row["id"] for row in unit]
+
+        if sent:
+            await db.execute(
+                update(NotificationOutbox)
+                .where(NotificationOutbox.id.in_(ids), *claimed)
+                .values(status="sent", sent_at=now, attempts=NotificationOutbox.attempts + 1, last_error=None)
+            )
+            return
+
+        if retry_after is not None:
+            # 限速：放回队列，不计入重试次数
+            await db.execute(
+                update(NotificationOutbox)
+                .where(NotificationOutbox.id.in_(ids), *claimed)
+                .values(status="pending", worker_id=None, next_attempt_at=now + timedelta(seconds=retry_after))
+            )
+            return
+
+        for row in unit:
+            attempts = row["attempts"] + 1
+            if attempts >= self.max_attempts:
+                values = {"status": "failed"}
+                logger.error(f"Notification {row['id']} via {row['channel']} failed after {attempts} attempts: {error}")
+            else:
+                backoff = min(self.max_backoff, self.base_backoff * (2 ** (attempts - 1)))
+                values = {"status": "pending", "worker_id": None, "next_attempt_at": now + timedelta(seconds=backoff)}
+            await db.execute(
+                update(NotificationOutbox)
+                .where(NotificationOutbox.id == row["id"], *claimed)
+                .values(attempts=attempts, last_error=error, **values)
+            )
+
+    def _get_bucket(self, channel: str, notifier: Notifier) -> TokenBucket:
+        """获取渠道的令牌桶（速率变更时重建）"""
+        bucket = self._buckets.get(channel)
+        if bucket is None or bucket.capacity != max(1, notifier.rate_limit_per_minute):
+            bucket = TokenBucket(notifier.rate_limit_per_minute)
+            self._buckets[channel] = bucket
+        return bucket
+
+    async def _refresh_channels(self):
+        """按间隔从 notification_configs 同步已启用的渠道（手动注册的通知器不受影响）"""
+        if time.monotonic() - self._configs_loaded_at < self.config_refresh_interval:
+            return
+        self._configs_loaded_at = time.monotonic()
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(NotificationConfig).where(NotificationConfig.enabled == True)  # noqa: E712
+            )
+            configs = {config.name: config for config in result.scalars().all()}
+
+        for name in list(self._config_versions.keys()):
+            if name not in configs:
+                await notification_manager.unregister_notifier(name)
+                del self._config_versions[name]
+
+        for name, config in configs.items():
+            if self._config_versions.get(name) == config.updated_at:
+                continue
+            notifier_cls = NOTIFIER_TYPES.get(config.notification_type)
+            if notifier_cls is None:
+                logger.warning(f"Unknown notification type '{config.notification_type}' for channel {name}")
+                continue
+            notifier = notifier_cls(config.config or {})
+            if not notifier.validate_config():
+                logger.warning(f"Invalid notification config for channel {name}")
+                continue
+            await notification_manager.unregister_notifier(name)
+            notification_manager.register_notifier(name, notifier)
+            self._config_versions[name] = config.updated_at
+
+    async def _requeue_stale(self):
+        """认领超时仍未回写结果的消息重新入队（发送中进程退出）"""
+        deadline = datetime.now() - timedelta(seconds=self.claim_timeout)
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(NotificationOutbox)
+                .where(
+                    NotificationOutbox.status == "sending",
+                    NotificationOutbox.claimed_at < deadline
+                )
+                .values(status="pending", worker_id=None)
+            )
+            await db.commit()
+
+    async def _purge_sent(self):
+        """每小时清理一次超过保留期的已发送消息"""
+        if time.monotonic() - self._purged_at < 3600:
+            return
+        self._purged_at = time.monotonic()
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                delete(NotificationOutbox).where(
+                    NotificationOutbox.status == "sent",
+                    NotificationOutbox.sent_at < datetime.now() - timedelta(days=self.retention_days)
+                )
+            )
+            await db.commit()
+
+
+# 全局发件箱分发器
+outbox_dispatcher = OutboxDispatcher()
@@ -69,6 +69,25 @@ class TemplateManager:
             "任务失败通知模板"
         )
         
+        # 任务失败摘要模板（短时间内的多条失败告警合并为一条）
+        self.register_template(
+            "task_failed_digest",
+            """
+❌ **任务失败摘要**
+
+**时间范围**: {{ first_at }} ~ {{ last_at }}
+**失败条数**: {{ count }}
+
+{% for item in items %}
+- {{ item.title }}
+{% endfor %}
+{% if omitted %}
+- ……另有 {{ omitted }} 条未列出
+{% endif %}
+            """.strip(),
+            "任务失败摘要模板"
+        )
+        
         # 系统告警模板
         self.register_template(
             "system_alert",
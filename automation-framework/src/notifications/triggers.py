@@ -1,17 +1,26 @@
 """
 通知触发器
+
+trigger() 只把处理器放到后台任务中执行并立即返回；默认处理器渲染模板后写入通知发件箱，
+实际发送由 OutboxDispatcher 在后台完成，任务执行路径不等待任何网络请求。
 """
-from typing import Callable, Dict, List
+import asyncio
+import logging
+from typing import Callable, Dict, List, Set
 from datetime import datetime
-from .base import notification_manager
+from .outbox import outbox_dispatcher
 from .templates import template_manager
 
+logger = logging.getLogger(__name__)
+
 
 class NotificationTrigger:
     """通知触发器"""
     
     def __init__(self):
         self.handlers: Dict[str, List[Callable]] = {}
+        # 持有后台任务的引用，避免被垃圾回收
+        self._pending: Set[asyncio.Task] = set()
     
     def register_handler(self, event_type: str, handler: Callable):
         """注册事件处理器"""
@@ -20,15 +29,26 @@ class NotificationTrigger:
         self.handlers[event_type].append(handler)
     
     async def trigger(self, event_type: str, **context):
-        """触发事件"""
+        """触发事件（处理器在后台执行，不阻塞调用方）"""
         if event_type not in self.handlers:
             return
         
         for handler in self.handlers[event_type]:
-            try:
-                await handler(**context)
-            except Exception as e:
-                print(f"Handler error for {event_type}: {e}")
+            task = asyncio.create_task(self._run_handler(event_type, handler, context))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+    
+    async def _run_handler(self, event_type: str, handler: Callable, context: dict):
+        """执行单个处理器"""
+        try:
+            await handler(**context)
+        except Exception as e:
+            logger.error(f"Handler error for {event_type}: {e}")
+    
+    async def drain(self):
+        """等待已触发的处理器执行完毕（应用关闭时调用）"""
+        if self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
 
 
 # 全局触发器
@@ -48,8 +68,8 @@ async def on_task_completed(task_id: str, task_name: str, status: str, duration:
         **kwargs
     )
     
-    # 发送通知到所有配置的渠道
-    await notification_manager.broadcast(message)
+    # 写入发件箱，由后台分发器发送到所有配置的渠道
+    await outbox_dispatcher.enqueue("task_completed", message, title=f"任务完成：{task_name}")
 
 
 async def on_task_failed(task_id: str, task_name: str, error_message: str, **kwargs):
@@ -63,8 +83,15 @@ async def on_task_failed(task_id: str, task_name: str, error_message: str, **kwa
         **kwargs
     )
     
-    # 发送通知到所有配置的渠道
-    await notification_manager.broadcast(message)
+    # 同一渠道短时间内的失败告警合并为摘要发送
+    first_line = str(error_message or "").strip().split("\n")[0][:200]
+    await outbox_dispatcher.enqueue(
+        "task_failed",
+        message,
+        digest_key="task_failed",
+        title=f"任务失败：{task_name}",
+        summary=f"{task_name}（{task_id}）：{first_line}"
+    )
 
 
 async def on_system_alert(alert_type: str, severity: str, message: str, **kwargs):
@@ -78,8 +105,8 @@ async def on_system_alert(alert_type: str, severity: str, message: str, **kwargs
         **kwargs
     )
     
-    # 发送通知到所有配置的渠道
-    await notification_manager.broadcast(alert_message)
+    # 写入发件箱，由后台分发器发送到所有配置的渠道
+    await outbox_dispatcher.enqueue("system_alert", alert_message, title=f"系统告警：{alert_type}")
 
 
 # 注册默认处理器
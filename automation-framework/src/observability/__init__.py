@@ -2,7 +2,7 @@
 可观测性系统模块
 """
 from .logging import StructuredLogger, LogQuery
-from .capture import ScreenshotCapture, StateCapture
+from .capture import ScreenshotCapture, StateCapture, CapturePipeline, get_global_capture_pipeline
 from .monitor import PerformanceMonitor, MetricsCollector, StatusCallback
 from .debug import DebugMode, Breakpoint
 
@@ -11,6 +11,8 @@ __all__ = [
     "LogQuery",
     "ScreenshotCapture",
     "StateCapture",
+    "CapturePipeline",
+    "get_global_capture_pipeline",
     "PerformanceMonitor",
     "MetricsCollector",
     "StatusCallback",
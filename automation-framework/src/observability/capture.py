@@ -1,46 +1,341 @@
 """
 截图和状态捕获
+
+捕获时只在事件循环上取得原始数据（截图字节、DOM/UI树），编码、压缩、写盘都交给
+CapturePipeline 在线程池中完成，调用方立即拿到目标路径：
+- 有界队列：队列满时普通捕获被丢弃（记录告警），错误现场捕获等待入队
+- 截图可选缩放并转为 JPEG/WebP，连续相同的截图（感知哈希相同）以硬链接代替重复写入
+- 按任务限制文件数和总大小，超出时删除该任务最早的文件
+- 过期清理使用写入索引，不再每次遍历整个目录
 """
+import asyncio
+import copy
 import gzip
+import hashlib
+import io
 import json
-from typing import Optional, Dict, Any
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Callable, Deque, Tuple
 from pathlib import Path
 from datetime import datetime
 import base64
 
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    Image = None
+    PIL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+def _json_default(obj: Any) -> Any:
+    """序列化 UIElement 等对象"""
+    if hasattr(obj, "to_dict"):
+        return obj.to_dict()
+    if isinstance(obj, bytes):
+        return base64.b64encode(obj).decode("ascii")
+    return str(obj)
+
+
+class ArtifactIndex:
+    """
+    捕获文件索引 - 按写入顺序记录文件，用于按任务配额淘汰和过期清理
+    
+    线程安全：编码任务在线程池中登记文件。
+    """
+    
+    def __init__(self, max_files_per_task: int = 200, max_bytes_per_task: int = 200 * 1024 * 1024):
+        self.max_files_per_task = max_files_per_task
+        self.max_bytes_per_task = max_bytes_per_task
+        self._lock = threading.Lock()
+        # 全局写入顺序 (mtime, path)，用于过期清理
+        self._timeline: Deque[Tuple[float, Path]] = deque()
+        # 每个任务的文件 path -> size（按写入顺序）
+        self._by_task: Dict[str, "OrderedDict[Path, int]"] = {}
+        self._bytes_by_task: Dict[str, int] = {}
+        self._seeded_dirs: set = set()
+    
+    def add(self, task_key: str, path: Path, size: int) -> list:
+        """
+        登记文件并执行任务配额
+        
+        Args:
+            task_key: 任务标识
+            path: 文件路径
+            size: 占用字节数（硬链接的重复截图记为0）
+        
+        Returns:
+            超出配额需要删除的文件列表
+        """
+        with self._lock:
+            self._timeline.append((datetime.now().timestamp(), path))
+            files = self._by_task.setdefault(task_key, OrderedDict())
+            files[path] = size
+            self._bytes_by_task[task_key] = self._bytes_by_task.get(task_key, 0) + size
+            
+            evicted = []
+            while len(files) > 1 and (
+                len(files) > self.max_files_per_task
+                or self._bytes_by_task[task_key] > self.max_bytes_per_task
+            ):
+                old_path, old_size = files.popitem(last=False)
+                self._bytes_by_task[task_key] -= old_size
+                evicted.append(old_path)
+            return evicted
+    
+    def seed(self, directory: Path, patterns: Tuple[str, ...]) -> None:
+        """首次清理时扫描一次目录，把之前运行留下的文件加入索引"""
+        with self._lock:
+            if directory in self._seeded_dirs:
+                return
+            self._seeded_dirs.add(directory)
+            known = {path for _, path in self._timeline}
+        existing = []
+        for pattern in patterns:
+            for file in directory.glob(pattern):
+                if file not in known:
+                    try:
+                        existing.append((file.stat().st_mtime, file))
+                    except OSError:
+                        continue
+        with self._lock:
+            self._timeline = deque(sorted(list(self._timeline) + existing, key=lambda item: item[0]))
+    
+    def expire(self, directory: Path, cutoff: float, suffixes: Tuple[str, ...]) -> list:
+        """
+        取出目录下早于 cutoff 的文件（只检查索引头部）
+        
+        Args:
+            directory: 目录
+            cutoff: 截止时间戳
+            suffixes: 文件名后缀
+            
+        Returns:
+            过期文件列表
+        """
+        expired = []
+        with self._lock:
+            kept = deque()
+            while self._timeline and self._timeline[0][0] < cutoff:
+                item = self._timeline.popleft()
+                if item[1].parent == directory and item[1].name.endswith(suffixes):
+                    expired.append(item[1])
+                else:
+                    kept.append(item)
+            self._timeline.extendleft(reversed(kept))
+            expired_set = set(expired)
+            for task_key, files in self._by_task.items():
+                for path in [p for p in files if p in expired_set]:
+                    self._bytes_by_task[task_key] -= files.pop(path)
+        return expired
+
+
+class CapturePipeline:
+    """
+    捕获处理流水线 - 有界队列 + 线程池编码写盘
+    """
+    
+    def __init__(
+        self,
+        max_queue: int = 32,
+        max_workers: int = 2,
+        index: Optional[ArtifactIndex] = None
+    ):
+        """
+        初始化流水线
+        
+        Args:
+            max_queue: 队列容量
+            max_workers: 编码线程数
+            index: 文件索引（配额与过期清理），默认新建
+        """
+        self.max_queue = max_queue
+        self.max_workers = max_workers
+        self.index = index or ArtifactIndex()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: list = []
+        self._dropped = 0
+    
+    def _ensure_started(self) -> None:
+        """在首次提交时创建队列和消费协程（需要运行中的事件循环）"""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="capture")
+            self._workers = [asyncio.create_task(self._consume()) for _ in range(self.max_workers)]
+    
+    async def submit(self, job: Callable[[], None], critical: bool = False) -> bool:
+        """
+        提交编码写盘任务
+        
+        Args:
+            job: 在线程池中执行的函数
+            critical: 是否为关键捕获（错误现场），关键捕获在队列满时等待而非丢弃
+        
+        Returns:
+            是否已入队
+        """
+        self._ensure_started()
+        if critical:
+            await self._queue.put(job)
+            return True
+        try:
+            self._queue.put_nowait(job)
+            return True
+        except asyncio.QueueFull:
+            self._dropped += 1
+            logger.warning(f"Capture queue full, dropped capture (total dropped: {self._dropped})")
+            return False
+    
+    async def _consume(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            try:
+                await loop.run_in_executor(self._executor, job)
+            except Exception as e:
+                logger.error(f"Capture job failed: {e}")
+            finally:
+                self._queue.task_done()
+    
+    async def flush(self) -> None:
+        """等待队列中的捕获全部写盘"""
+        if self._queue is not None:
+            await self._queue.join()
+    
+    async def close(self) -> None:
+        """写完剩余捕获后停止"""
+        if self._queue is None:
+            return
+        await self.flush()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._executor.shutdown(wait=True)
+        self._queue = None
+        self._executor = None
+        self._workers = []
+    
+    def register(self, task_key: str, path: Path, size: int) -> None:
+        """登记已写入的文件并删除超出任务配额的旧文件（在线程池中调用）"""
+        for old_path in self.index.add(task_key, path, size):
+            try:
+                old_path.unlink()
+            except FileNotFoundError:
+                pass
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取队列统计"""
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "dropped": self._dropped,
+        }
+
+
+_global_capture_pipeline: Optional[CapturePipeline] = None
+
+
+def get_global_capture_pipeline() -> CapturePipeline:
+    """获取全局捕获流水线"""
+    global _global_capture_pipeline
+    if _global_capture_pipeline is None:
+        _global_capture_pipeline = CapturePipeline()
+    return _global_capture_pipeline
+
+
+def _write_json(filepath: Path, data: Any, compress: bool) -> int:
+    """序列化并写入 JSON（在线程池中执行），返回文件大小"""
+    if compress:
+        payload = gzip.compress(json.dumps(data, default=_json_default).encode("utf-8"), compresslevel=6)
+    else:
+        payload = json.dumps(data, indent=2, default=_json_default).encode("utf-8")
+    tmp_path = filepath.with_name(filepath.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, filepath)
+    return len(payload)
+
 
 class ScreenshotCapture:
     """
     截图捕获管理器
     """
     
-    def __init__(self, storage_dir: Path):
+    def __init__(
+        self,
+        storage_dir: Path,
+        image_format: str = "png",
+        quality: int = 80,
+        max_width: Optional[int] = None,
+        dedup: bool = True,
+        dedup_distance: int = 0,
+        pipeline: Optional[CapturePipeline] = None
+    ):
+        """
+        初始化截图捕获
+        
+        Args:
+            storage_dir: 存储目录
+            image_format: 保存格式：png、jpeg、webp（非 png 需要 Pillow）
+            quality: JPEG/WebP 质量
+            max_width: 宽度超过该值时等比缩小，为None时保持原尺寸
+            dedup: 是否对连续相同的截图去重
+            dedup_distance: 感知哈希（dHash）允许的最大汉明距离，0 表示画面完全一致
+            pipeline: 捕获流水线，默认使用全局实例
+        """
         self.storage_dir = Path(storage_dir)
         self.storage_dir.mkdir(parents=True, exist_ok=True)
+        self.image_format = image_format.lower()
+        if self.image_format == "jpg":
+            self.image_format = "jpeg"
+        if self.image_format != "png" and not PIL_AVAILABLE:
+            logger.warning("Pillow not available, screenshots will be saved as PNG")
+            self.image_format = "png"
+        self.quality = quality
+        self.max_width = max_width
+        self.dedup = dedup
+        self.dedup_distance = dedup_distance
+        self.pipeline = pipeline or get_global_capture_pipeline()
+        self._last_frame: Dict[str, Tuple[int, Path]] = {}
+        self._dedup_lock = threading.Lock()
+    
+    @property
+    def _extension(self) -> str:
+        return "jpg" if self.image_format == "jpeg" else self.image_format
     
     async def capture_screenshot(
         self,
         driver: Any,
         name: Optional[str] = None,
         task_id: Optional[str] = None,
-        session_id: Optional[str] = None
+        session_id: Optional[str] = None,
+        critical: bool = False
     ) -> Optional[Path]:
         """
-        捕获截图
+        捕获截图（编码写盘在后台完成，返回的路径稍后可用）
         
         Args:
             driver: 驱动实例
             name: 截图名称
             task_id: 任务ID
             session_id: 会话ID
-            
+            critical: 队列满时是否等待而非丢弃
+        
         Returns:
-            截图文件路径
+            截图文件路径，未捕获或被丢弃时返回None
         """
         try:
             # 生成文件名
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-            filename = f"{name or 'screenshot'}_{timestamp}.png"
+            filename = f"{name or 'screenshot'}_{timestamp}.{self._extension}"
             
             if task_id:
                 filename = f"task_{task_id}_{filename}"
@@ -49,18 +344,81 @@ class ScreenshotCapture:
             
             filepath = self.storage_dir / filename
             
-            # 捕获截图（具体实现取决于驱动类型）
-            if hasattr(driver, "screenshot"):
+            # 浏览器驱动直接取截图字节，其余驱动沿用 screenshot(path) 由驱动自行写盘
+            page = getattr(driver, "_current_page", None)
+            if page is not None:
+                image_bytes = await page.screenshot()
+            elif hasattr(driver, "screenshot"):
                 await driver.screenshot(str(filepath))
+                return filepath
             else:
                 return None
             
-            return filepath
-            
+            task_key = str(task_id or session_id or "default")
+            queued = await self.pipeline.submit(
+                lambda: self._encode_and_store(image_bytes, filepath, task_key),
+                critical=critical
+            )
+            return filepath if queued else None
+        
         except Exception as e:
-            print(f"Failed to capture screenshot: {e}")
+            logger.error(f"Failed to capture screenshot: {e}")
             return None
     
+    def _encode_and_store(self, image_bytes: bytes, filepath: Path, task_key: str) -> None:
+        """缩放、转码、去重并写盘（在线程池中执行）"""
+        image = None
+        if PIL_AVAILABLE:
+            image = Image.open(io.BytesIO(image_bytes))
+            image.load()
+        
+        if self.dedup:
+            frame_hash = self._dhash(image) if image is not None else int(hashlib.sha1(image_bytes).hexdigest()[:16], 16)
+            with self._dedup_lock:
+                previous = self._last_frame.get(task_key)
+            if previous and bin(previous[0] ^ frame_hash).count("1") <= self.dedup_distance and previous[1].exists():
+                # 与上一张相同：硬链接到上一张文件，不占用额外空间
+                try:
+                    os.link(previous[1], filepath)
+                except OSError:
+                    shutil.copyfile(previous[1], filepath)
+                self.pipeline.register(task_key, filepath, 0)
+                return
+        
+        payload = image_bytes
+        if image is not None and (self.image_format != "png" or (self.max_width and image.width > self.max_width)):
+            if self.max_width and image.width > self.max_width:
+                height = max(1, round(image.height * self.max_width / image.width))
+                image = image.resize((self.max_width, height), Image.LANCZOS)
+            buffer = io.BytesIO()
+            if self.image_format == "jpeg":
+                image.convert("RGB").save(buffer, format="JPEG", quality=self.quality, optimize=True)
+            elif self.image_format == "webp":
+                image.save(buffer, format="WEBP", quality=self.quality, method=4)
+            else:
+                image.save(buffer, format="PNG", optimize=False)
+            payload = buffer.getvalue()
+        
+        with open(filepath, "wb") as f:
+            f.write(payload)
+        self.pipeline.register(task_key, filepath, len(payload))
+        if self.dedup:
+            with self._dedup_lock:
+                self._last_frame[task_key] = (frame_hash, filepath)
+    
+    @staticmethod
+    def _dhash(image: Any) -> int:
+        """差值哈希：缩到 9x8 灰度，比较相邻像素得到 64 位指纹"""
+        small = image.convert("L").resize((9, 8), Image.BILINEAR)
+        pixels = list(small.getdata())
+        value = 0
+        for row in range(8):
+            for col in range(8):
+                left = pixels[row * 9 + col]
+                right = pixels[row * 9 + col + 1]
+                value = (value << 1) | (1 if left > right else 0)
+        return value
+    
     async def capture_on_error(
         self,
         driver: Any,
@@ -74,7 +432,7 @@ class ScreenshotCapture:
             driver: 驱动实例
             error: 异常对象
             context: 错误上下文
-            
+        
         Returns:
             截图文件路径
         """
@@ -83,7 +441,8 @@ class ScreenshotCapture:
             driver,
             name=f"error_{error_name}",
             task_id=context.get("task_id"),
-            session_id=context.get("session_id")
+            session_id=context.get("session_id"),
+            critical=True
         )
     
     async def capture_at_step(
@@ -99,7 +458,7 @@ class ScreenshotCapture:
             driver: 驱动实例
             step_name: 步骤名称
             task_id: 任务ID
-            
+        
         Returns:
             截图文件路径
         """
@@ -115,17 +474,21 @@ class ScreenshotCapture:
         
         Args:
             days: 保留天数
-            
+        
         Returns:
             删除的文件数量
         """
-        count = 0
+        index = self.pipeline.index
+        index.seed(self.storage_dir, ("*.png", "*.jpg", "*.webp"))
         cutoff = datetime.now().timestamp() - (days * 86400)
         
-        for file in self.storage_dir.glob("*.png"):
-            if file.stat().st_mtime < cutoff:
+        count = 0
+        for file in index.expire(self.storage_dir, cutoff, (".png", ".jpg", ".webp")):
+            try:
                 file.unlink()
                 count += 1
+            except FileNotFoundError:
+                continue
         
         return count
 
@@ -135,9 +498,33 @@ class StateCapture:
     状态捕获管理器 - 捕获DOM/UI树快照
     """
     
-    def __init__(self, storage_dir: Path):
+    def __init__(self, storage_dir: Path, pipeline: Optional[CapturePipeline] = None):
         self.storage_dir = Path(storage_dir)
         self.storage_dir.mkdir(parents=True, exist_ok=True)
+        self.pipeline = pipeline or get_global_capture_pipeline()
+    
+    async def _store_json(
+        self,
+        data: Any,
+        prefix: str,
+        task_id: Optional[str],
+        compress: bool,
+        critical: bool = False
+    ) -> Optional[Path]:
+        """生成文件名并把序列化、压缩、写盘交给流水线"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        filename = f"{prefix}_{timestamp}"
+        if task_id:
+            filename = f"task_{task_id}_{filename}"
+        filename += ".json.gz" if compress else ".json"
+        filepath = self.storage_dir / filename
+        task_key = str(task_id or "default")
+        
+        def job():
+            self.pipeline.register(task_key, filepath, _write_json(filepath, data, compress))
+        
+        queued = await self.pipeline.submit(job, critical=critical)
+        return filepath if queued else None
     
     async def capture_dom(
         self,
@@ -152,9 +539,9 @@ class StateCapture:
             driver: 浏览器驱动
             task_id: 任务ID
             compress: 是否压缩
-            
+        
         Returns:
-            文件路径
+            文件路径（写盘在后台完成）
         """
         try:
             # 获取DOM树
@@ -162,31 +549,10 @@ class StateCapture:
                 return None
             
             dom_data = await driver.get_dom()
-            
-            # 生成文件名
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-            filename = f"dom_{timestamp}"
-            if task_id:
-                filename = f"task_{task_id}_{filename}"
-            
-            if compress:
-                filename += ".json.gz"
-                filepath = self.storage_dir / filename
-                
-                # 压缩存储
-                with gzip.open(filepath, "wt", encoding="utf-8") as f:
-                    json.dump(dom_data, f)
-            else:
-                filename += ".json"
-                filepath = self.storage_dir / filename
-                
-                with open(filepath, "w", encoding="utf-8") as f:
-                    json.dump(dom_data, f, indent=2)
-            
-            return filepath
-            
+            return await self._store_json(dom_data, "dom", task_id, compress)
+        
         except Exception as e:
-            print(f"Failed to capture DOM: {e}")
+            logger.error(f"Failed to capture DOM: {e}")
             return None
     
     async def capture_ui_tree(
@@ -202,9 +568,9 @@ class StateCapture:
             driver: 桌面驱动
             task_id: 任务ID
             compress: 是否压缩
-            
+        
         Returns:
-            文件路径
+            文件路径（写盘在后台完成）
         """
         try:
             # 获取UI树
@@ -212,31 +578,10 @@ class StateCapture:
                 return None
             
             ui_tree = await driver.get_ui_tree()
-            
-            # 生成文件名
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-            filename = f"ui_tree_{timestamp}"
-            if task_id:
-                filename = f"task_{task_id}_{filename}"
-            
-            if compress:
-                filename += ".json.gz"
-                filepath = self.storage_dir / filename
-                
-                # 压缩存储
-                with gzip.open(filepath, "wt", encoding="utf-8") as f:
-                    json.dump(ui_tree, f)
-            else:
-                filename += ".json"
-                filepath = self.storage_dir / filename
-                
-                with open(filepath, "w", encoding="utf-8") as f:
-                    json.dump(ui_tree, f, indent=2)
-            
-            return filepath
-            
+            return await self._store_json(ui_tree, "ui_tree", task_id, compress)
+        
         except Exception as e:
-            print(f"Failed to capture UI tree: {e}")
+            logger.error(f"Failed to capture UI tree: {e}")
             return None
     
     async def capture_context(
@@ -252,15 +597,16 @@ class StateCapture:
             driver: 驱动实例
             variables: 变量字典
             task_id: 任务ID
-            
+        
         Returns:
-            文件路径
+            文件路径（写盘在后台完成）
         """
         try:
+            # 变量在任务继续执行时可能被修改，先复制一份再交给后台序列化
             context = {
                 "timestamp": datetime.now().isoformat(),
                 "task_id": task_id,
-                "variables": variables,
+                "variables": copy.deepcopy(variables),
             }
             
             # 捕获DOM/UI树
@@ -269,22 +615,10 @@ class StateCapture:
             elif hasattr(driver, "get_ui_tree"):
                 context["ui_tree"] = await driver.get_ui_tree()
             
-            # 生成文件名
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-            filename = f"context_{timestamp}.json.gz"
-            if task_id:
-                filename = f"task_{task_id}_{filename}"
-            
-            filepath = self.storage_dir / filename
-            
-            # 压缩存储
-            with gzip.open(filepath, "wt", encoding="utf-8") as f:
-                json.dump(context, f)
-            
-            return filepath
-            
+            return await self._store_json(context, "context", task_id, compress=True, critical=True)
+        
         except Exception as e:
-            print(f"Failed to capture context: {e}")
+            logger.error(f"Failed to capture context: {e}")
             return None
     
     def cleanup_old_captures(self, days: int = 7) -> int:
@@ -293,17 +627,20 @@ class StateCapture:
         
         Args:
             days: 保留天数
-            
+        
         Returns:
             删除的文件数量
         """
-        count = 0
+        index = self.pipeline.index
+        index.seed(self.storage_dir, ("*.json", "*.json.gz"))
         cutoff = datetime.now().timestamp() - (days * 86400)
         
-        for pattern in ["*.json", "*.json.gz"]:
-            for file in self.storage_dir.glob(pattern):
-                if file.stat().st_mtime < cutoff:
-                    file.unlink()
-                    count += 1
+        count = 0
+        for file in index.expire(self.storage_dir, cutoff, (".json", ".json.gz")):
+            try:
+                file.unlink()
+                count += 1
+            except FileNotFoundError:
+                continue
         
         return count
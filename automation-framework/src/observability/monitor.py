@@ -58,8 +58,8 @@ class MetricsCollector:
         Returns:
             系统指标
         """
-        # CPU使用率
-        cpu_percent = psutil.cpu_percent(interval=0.1)
+        # CPU使用率（interval=None 返回距上次调用的平均值，不阻塞事件循环）
+        cpu_percent = psutil.cpu_percent(interval=None)
         
         # 内存使用
         memory = psutil.virtual_memory()
@@ -1,8 +1,16 @@
 """
 性能监控系统
 """
-from .metrics import PerformanceMetrics
+from .metrics import PerformanceMetrics, performance_metrics
 from .alerts import AlertManager
 from .reports import ReportGenerator
+from .registry import MetricsRegistry, metrics_registry
 
-__all__ = ["PerformanceMetrics", "AlertManager", "ReportGenerator"]
+__all__ = [
+    "PerformanceMetrics",
+    "performance_metrics",
+    "AlertManager",
+    "ReportGenerator",
+    "MetricsRegistry",
+    "metrics_registry",
+]
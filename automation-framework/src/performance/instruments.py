@@ -0,0 +1,145 @@
+"""
+业务指标埋点 - 任务执行、LLM调用和验证码处理
+"""
+from typing import Dict, Optional, Tuple
+
+from .registry import metrics_registry
+
+# ==================== 任务执行 ====================
+
+task_executions_total = metrics_registry.counter(
+    "task_executions_total", "Finished task executions by final status", ["status"]
+)
+task_execution_duration = metrics_registry.histogram(
+    "task_execution_duration_seconds", "Task execution wall time", ["status"]
+)
+task_actions_total = metrics_registry.counter(
+    "task_actions_total", "Executed actions by type and outcome", ["action_type", "status"]
+)
+task_action_duration = metrics_registry.histogram(
+    "task_action_duration_seconds", "Single action execution time", ["action_type"]
+)
+tasks_running = metrics_registry.gauge(
+    "tasks_running", "Task executions currently in progress"
+)
+
+# ==================== LLM调用 ====================
+
+llm_requests_total = metrics_registry.counter(
+    "llm_requests_total", "LLM requests by provider, model and outcome", ["provider", "model", "status"]
+)
+llm_request_duration = metrics_registry.histogram(
+    "llm_request_duration_seconds", "LLM request latency", ["provider", "model"]
+)
+llm_tokens_total = metrics_registry.counter(
+    "llm_tokens_total", "LLM tokens by type (prompt/completion/cached)", ["provider", "model", "type"]
+)
+llm_cost_total = metrics_registry.counter(
+    "llm_cost_usd_total", "Estimated LLM cost in USD", ["provider", "model"]
+)
+
+# ==================== 验证码 ====================
+
+captcha_attempts_total = metrics_registry.counter(
+    "captcha_attempts_total", "Captcha handling attempts by type and outcome", ["captcha_type", "status"]
+)
+captcha_solve_duration = metrics_registry.histogram(
+    "captcha_solve_duration_seconds", "Captcha handling time", ["captcha_type"]
+)
+
+# 模型单价（美元 / 百万Token）：(输入, 输出, 缓存命中的输入)
+# 未登记的模型成本记为0，可通过 register_model_pricing 补充或覆盖
+MODEL_PRICING: Dict[str, Tuple[float, float, float]] = {
+    "gpt-4o": (2.5, 10.0, 1.25),
+    "gpt-4o-mini": (0.15, 0.6, 0.075),
+    "claude-3-5-sonnet-20241022": (3.0, 15.0, 0.3),
+    "claude-3-5-haiku-20241022": (0.8, 4.0, 0.08),
+}
+
+
+def register_model_pricing(
+    model: str,
+    input_per_million: float,
+    output_per_million: float,
+    cached_input_per_million: Optional[float] = None
+) -> None:
+    """
+    登记模型单价（美元 / 百万Token）
+
+    Args:
+        model: 模型名称
+        input_per_million: 输入单价
+        output_per_million: 输出单价
+        cached_input_per_million: 缓存命中的输入单价（默认与输入单价相同）
+    """
+    cached = input_per_million if cached_input_per_million is None else cached_input_per_million
+    MODEL_PRICING[model] = (input_per_million, output_per_million, cached)
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    """估算单次调用成本（美元）"""
+    pricing = MODEL_PRICING.get(model)
+    if not pricing:
+        return 0.0
+    input_price, output_price, cached_price = pricing
+    uncached = max(0, prompt_tokens - cached_tokens)
+    return (uncached * input_price + cached_tokens * cached_price + completion_tokens * output_price) / 1_000_000
+
+
+def record_llm_call(
+    provider: str,
+    model: str,
+    latency: float,
+    success: bool = True,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+    cached_tokens: int = 0
+) -> None:
+    """
+    记录一次LLM调用
+
+    Args:
+        provider: 提供商
+        model: 模型名称
+        latency: 耗时（秒）
+        success: 是否成功
+        prompt_tokens: 输入Token数
+        completion_tokens: 输出Token数
+        cached_tokens: 缓存命中的输入Token数
+    """
+    llm_requests_total.inc(provider=provider, model=model, status="success" if success else "error")
+    llm_request_duration.observe(latency, provider=provider, model=model)
+    if not success:
+        return
+    llm_tokens_total.inc(prompt_tokens, provider=provider, model=model, type="prompt")
+    llm_tokens_total.inc(completion_tokens, provider=provider, model=model, type="completion")
+    llm_tokens_total.inc(cached_tokens, provider=provider, model=model, type="cached")
+    cost = estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens)
+    if cost:
+        llm_cost_total.inc(cost, provider=provider, model=model)
+
+
+def record_task_execution(status: str, duration: Optional[float]) -> None:
+    """
+    记录一次任务执行结束
+
+    Args:
+        status: 最终状态（completed/failed/stopped/timeout）
+        duration: 执行耗时（秒）
+    """
+    task_executions_total.inc(status=status)
+    if duration is not None:
+        task_execution_duration.observe(duration, status=status)
+
+
+def record_action(action_type: str, success: bool, duration: float) -> None:
+    """记录一次操作执行"""
+    task_actions_total.inc(action_type=action_type, status="success" if success else "error")
+    task_action_duration.observe(duration, action_type=action_type)
+
+
+def record_captcha(captcha_type: str, success: bool, duration: Optional[float] = None) -> None:
+    """记录一次验证码处理"""
+    captcha_attempts_total.inc(captcha_type=captcha_type, status="success" if success else "error")
+    if duration is not None:
+        captcha_solve_duration.observe(duration, captcha_type=captcha_type)
@@ -6,6 +6,23 @@ import asyncio
 from typing import Dict, List
 from datetime import datetime
 
+from ..ai.llm_middleware import get_usage_tracker
+from .registry import metrics_registry
+from .instruments import (
+    task_executions_total,
+    task_execution_duration,
+    task_actions_total,
+    tasks_running,
+    llm_requests_total,
+    llm_request_duration,
+    llm_tokens_total,
+    llm_cost_total,
+)
+
+system_cpu_usage = metrics_registry.gauge("system_cpu_usage_percent", "Host CPU usage")
+system_memory_usage = metrics_registry.gauge("system_memory_usage_percent", "Host memory usage")
+system_disk_usage = metrics_registry.gauge("system_disk_usage_percent", "Root filesystem usage")
+
 
 class PerformanceMetrics:
     """性能指标收集器"""
@@ -13,10 +30,13 @@ class PerformanceMetrics:
     def __init__(self):
         self.metrics_history: List[dict] = []
         self.collection_task = None
+        # 预热CPU采样：之后 cpu_percent(interval=None) 返回距上次调用的平均值，不会阻塞
+        psutil.cpu_percent(interval=None)
     
-    async def collect_system_metrics(self) -> dict:
-        """收集系统指标"""
-        cpu_percent = psutil.cpu_percent(interval=1)
+    @staticmethod
+    def _sample_system() -> dict:
+        """采集系统指标（同步，在线程池中执行）"""
+        cpu_percent = psutil.cpu_percent(interval=None)
         memory = psutil.virtual_memory()
         disk = psutil.disk_usage('/')
         
@@ -29,7 +49,7 @@ class PerformanceMetrics:
         except:
             network_stats = {"bytes_sent": 0, "bytes_recv": 0}
         
-        metrics = {
+        return {
             "timestamp": datetime.now().isoformat(),
             "cpu_usage": cpu_percent,
             "memory_usage": memory.percent,
@@ -38,33 +58,88 @@ class PerformanceMetrics:
             "disk_free": disk.free,
             "network": network_stats
         }
+    
+    async def collect_system_metrics(self) -> dict:
+        """收集系统指标（不阻塞事件循环）"""
+        metrics = await asyncio.to_thread(self._sample_system)
+        
+        system_cpu_usage.set(metrics["cpu_usage"])
+        system_memory_usage.set(metrics["memory_usage"])
+        system_disk_usage.set(metrics["disk_usage"])
         
         return metrics
     
     async def collect_task_metrics(self) -> dict:
-        """收集任务指标"""
-        # TODO: 从任务管理器获取实际数据
+        """收集任务指标（来自TaskExecutor的埋点）"""
+        completed = task_executions_total.get(status="completed")
+        total = task_executions_total.total()
+        duration = task_execution_duration.summary()
+        actions_total = task_actions_total.total()
+        action_errors = task_actions_total.total(status="error")
+        
         metrics = {
             "timestamp": datetime.now().isoformat(),
-            "total_tasks": 0,
-            "running_tasks": 0,
-            "completed_tasks": 0,
-            "failed_tasks": 0,
-            "average_execution_time": 0.0,
-            "success_rate": 0.0
+            "total_tasks": int(total),
+            "running_tasks": int(tasks_running.get()),
+            "completed_tasks": int(completed),
+            "failed_tasks": int(task_executions_total.get(status="failed")),
+            "stopped_tasks": int(task_executions_total.get(status="stopped")),
+            "timeout_tasks": int(task_executions_total.get(status="timeout")),
+            "average_execution_time": duration["avg"],
+            "p50_execution_time": duration["p50"],
+            "p95_execution_time": duration["p95"],
+            "p99_execution_time": duration["p99"],
+            "success_rate": round(completed / total, 4) if total else 0.0,
+            "total_actions": int(actions_total),
+            "action_error_rate": round(action_errors / actions_total, 4) if actions_total else 0.0
         }
         
         return metrics
     
     async def collect_model_metrics(self) -> dict:
-        """收集模型指标"""
-        # TODO: 从AI模块获取实际数据
+        """收集模型指标（按提供商和模型统计延迟分位数、Token、成本和错误率）"""
+        usage = get_usage_tracker().get_summary()
+        latency = llm_request_duration.summary()
+        total_calls = llm_requests_total.total()
+        total_errors = llm_requests_total.total(status="error")
+        
+        models = []
+        for labels in llm_request_duration.label_sets():
+            provider, model = labels["provider"], labels["model"]
+            calls = llm_requests_total.total(provider=provider, model=model)
+            errors = llm_requests_total.get(provider=provider, model=model, status="error")
+            model_latency = llm_request_duration.summary(provider=provider, model=model)
+            models.append({
+                "provider": provider,
+                "model": model,
+                "calls": int(calls),
+                "errors": int(errors),
+                "error_rate": round(errors / calls, 4) if calls else 0.0,
+                "average_latency": model_latency["avg"],
+                "p50_latency": model_latency["p50"],
+                "p95_latency": model_latency["p95"],
+                "p99_latency": model_latency["p99"],
+                "prompt_tokens": int(llm_tokens_total.get(provider=provider, model=model, type="prompt")),
+                "completion_tokens": int(llm_tokens_total.get(provider=provider, model=model, type="completion")),
+                "cached_tokens": int(llm_tokens_total.get(provider=provider, model=model, type="cached")),
+                "cost": round(llm_cost_total.get(provider=provider, model=model), 6)
+            })
+        
         metrics = {
             "timestamp": datetime.now().isoformat(),
-            "total_calls": 0,
-            "average_latency": 0.0,
-            "total_cost": 0.0,
-            "total_tokens": 0
+            "total_calls": int(total_calls),
+            "error_rate": round(total_errors / total_calls, 4) if total_calls else 0.0,
+            "average_latency": latency["avg"],
+            "p50_latency": latency["p50"],
+            "p95_latency": latency["p95"],
+            "p99_latency": latency["p99"],
+            "total_cost": round(llm_cost_total.total(), 6),
+            "total_tokens": usage["total_tokens"],
+            "prompt_tokens": usage["prompt_tokens"],
+            "completion_tokens": usage["completion_tokens"],
+            "cached_tokens": usage["cached_tokens"],
+            "cache_hit_ratio": usage["cache_hit_ratio"],
+            "models": models
         }
         
         return metrics
@@ -0,0 +1,242 @@
+"""
+指标注册表 - 计数器、直方图与Prometheus文本格式导出
+
+更新路径上不加锁：所有更新都发生在事件循环线程内，只做整数/浮点累加和
+定长环形缓冲区追加；分位数（p50/p95/p99）在读取时根据最近的样本计算。
+"""
+import bisect
+import math
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# 默认延迟分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.extend(f'{n}="{_escape(v)}"' for n, v in extra.items())
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """单调递增计数器"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names: Tuple[str, ...] = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """增加计数"""
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels: str) -> float:
+        """获取指定标签的值"""
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        return self._values.get(key, 0.0)
+
+    def items(self) -> List[Tuple[Dict[str, str], float]]:
+        """返回所有 (标签, 值)"""
+        return [(dict(zip(self.label_names, k)), v) for k, v in self._values.items()]
+
+    def total(self, **labels: str) -> float:
+        """对匹配部分标签的序列求和"""
+        return sum(
+            v for k, v in self._values.items()
+            if all(dict(zip(self.label_names, k)).get(n) == str(val) for n, val in labels.items())
+        )
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+    def reset(self) -> None:
+        self._values.clear()
+
+
+class Gauge(Counter):
+    """可增可减的瞬时值"""
+
+    type_name = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        """设置当前值"""
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        self._values[key] = float(value)
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        """减少当前值"""
+        self.inc(-amount, **labels)
+
+
+class _HistogramSeries:
+    """单个标签组合的直方图数据"""
+
+    __slots__ = ("bucket_counts", "count", "sum", "samples")
+
+    def __init__(self, bucket_count: int, reservoir_size: int):
+        self.bucket_counts = [0] * bucket_count
+        self.count = 0
+        self.sum = 0.0
+        self.samples: Deque[float] = deque(maxlen=reservoir_size)
+
+
+class Histogram:
+    """
+    直方图 - 累积分桶（用于Prometheus导出）+ 最近样本（用于分位数）
+    """
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+        reservoir_size: int = 2048
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.label_names: Tuple[str, ...] = tuple(labels)
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+        self.reservoir_size = reservoir_size
+        self._series: Dict[LabelValues, _HistogramSeries] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """记录一个观测值"""
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = _HistogramSeries(len(self.buckets), self.reservoir_size)
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series.bucket_counts[index] += 1
+        series.count += 1
+        series.sum += value
+        series.samples.append(value)
+
+    def _matching(self, labels: Dict[str, str]) -> List[_HistogramSeries]:
+        return [
+            s for k, s in self._series.items()
+            if all(dict(zip(self.label_names, k)).get(n) == str(v) for n, v in labels.items())
+        ]
+
+    def summary(self, quantiles: Iterable[float] = (0.5, 0.95, 0.99), **labels: str) -> Dict[str, float]:
+        """
+        计算匹配标签的汇总数据
+
+        Returns:
+            包含 count、sum、avg 以及 p50/p95/p99 等分位数的字典
+        """
+        series = self._matching(labels)
+        count = sum(s.count for s in series)
+        total = sum(s.sum for s in series)
+        samples = sorted(v for s in series for v in s.samples)
+        result = {"count": count, "sum": round(total, 6), "avg": round(total / count, 6) if count else 0.0}
+        for q in quantiles:
+            key = f"p{int(q * 100)}"
+            if samples:
+                idx = min(len(samples) - 1, max(0, math.ceil(q * len(samples)) - 1))
+                result[key] = round(samples[idx], 6)
+            else:
+                result[key] = 0.0
+        return result
+
+    def label_sets(self) -> List[Dict[str, str]]:
+        """返回所有已出现的标签组合"""
+        return [dict(zip(self.label_names, k)) for k in self._series]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+        for key, series in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, series.bucket_counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.label_names, key, {"le": _format_value(bound)})
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key, {"le": "+Inf"})
+            lines.append(f"{self.name}_bucket{labels} {series.count}")
+            plain = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{plain} {_format_value(series.sum)}")
+            lines.append(f"{self.name}_count{plain} {series.count}")
+        return lines
+
+    def reset(self) -> None:
+        self._series.clear()
+
+
+class MetricsRegistry:
+    """
+    指标注册表 - 按名称管理指标并导出为Prometheus文本格式
+    """
+
+    def __init__(self, namespace: str = "automation"):
+        self.namespace = namespace
+        self._metrics: Dict[str, object] = {}
+
+    def _full_name(self, name: str) -> str:
+        return f"{self.namespace}_{name}" if self.namespace else name
+
+    def counter(self, name: str, help_text: str, labels: Iterable[str] = ()) -> Counter:
+        """获取或创建计数器"""
+        full = self._full_name(name)
+        if full not in self._metrics:
+            self._metrics[full] = Counter(full, help_text, labels)
+        return self._metrics[full]
+
+    def gauge(self, name: str, help_text: str, labels: Iterable[str] = ()) -> Gauge:
+        """获取或创建瞬时值指标"""
+        full = self._full_name(name)
+        if full not in self._metrics:
+            self._metrics[full] = Gauge(full, help_text, labels)
+        return self._metrics[full]
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labels: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        """获取或创建直方图"""
+        full = self._full_name(name)
+        if full not in self._metrics:
+            self._metrics[full] = Histogram(full, help_text, labels, buckets)
+        return self._metrics[full]
+
+    def render_prometheus(self) -> str:
+        """导出为Prometheus文本格式（text/plain; version=0.0.4）"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """清空所有指标数据（保留定义）"""
+        for metric in self._metrics.values():
+            metric.reset()
+
+
+# 全局指标注册表
+metrics_registry = MetricsRegistry()
@@ -3,6 +3,7 @@
 """
 import asyncio
 import logging
+import time
 from typing import Dict, Any, Optional, Callable
 from datetime import datetime
 from enum import Enum
@@ -19,6 +20,7 @@ from ..core.retry_strategy import RetryStrategy, ErrorClassifier, execute_with_r
 from ..drivers.browser_driver import BrowserDriver
 from ..drivers.desktop_driver import DesktopDriver
 from .task_manager import TaskManager, get_global_task_manager
+from ..performance.instruments import record_action, record_task_execution, tasks_running
 from ..models.sqlalchemy_models import (
     ExecutionRecord as ExecutionRecordModel,
     SessionCheckpoint as SessionCheckpointModel
@@ -226,15 +228,25 @@ class TaskExecutor:
             db: 数据库会话
             timeout: 超时时间（秒）
         """
+        started_at = time.monotonic()
+        final_status = None
+        tasks_running.inc()
         try:
             await asyncio.wait_for(
                 self._execute_task_async(task_id, task, session, execution_id, db),
                 timeout=timeout
             )
         except asyncio.TimeoutError:
+            final_status = "timeout"
             logger.error(f"Task {task_id} execution timeout after {timeout} seconds")
             await self._handle_timeout(task_id, execution_id, db)
             raise
+        finally:
+            tasks_running.dec()
+            if final_status is None:
+                state = self._execution_states.get(task_id)
+                final_status = state.value if state else ExecutionState.STOPPED.value
+            record_task_execution(final_status, time.monotonic() - started_at)
     
     async def _execute_task_async(
         self,
@@ -402,6 +414,7 @@ class TaskExecutor:
                 action_success = False
                 action_result = None
                 action_error = None
+                action_recorded = False
                 
                 try:
                     # 使用重试策略执行操作
@@ -417,6 +430,8 @@ class TaskExecutor:
                     action_result = result
                     action_error = error
                     execution_time = (datetime.now() - action_start_time).total_seconds()
+                    record_action(action.action_type.value, success, execution_time)
+                    action_recorded = True
                     
                     if success:
                         # 操作成功
@@ -464,6 +479,8 @@ class TaskExecutor:
                 except Exception as e:
                     execution_time = (datetime.now() - action_start_time).total_seconds()
                     logger.error(f"Action {i} failed after retries: {e}")
+                    if not action_recorded:
+                        record_action(action.action_type.value, False, execution_time)
                     
                     results.append({
                         "action_index": i,
@@ -532,6 +549,13 @@ class TaskExecutor:
             )
             
             logger.info(f"Task {task_id} execution completed")
+            await self._notify(
+                "task_completed",
+                task_id=task_id,
+                task_name=getattr(task, "name", task_id),
+                status="completed",
+                duration=round((datetime.now() - session.created_at).total_seconds(), 2)
+            )
             
         except asyncio.CancelledError:
             # 任务被停止
@@ -635,12 +659,32 @@ class TaskExecutor:
                 )
             
             logger.error(f"Task {task_id} execution failed: {e}")
+            await self._notify(
+                "task_failed",
+                task_id=task_id,
+                task_name=getattr(task, "name", task_id),
+                error_message=str(e)
+            )
         finally:
             # 清理内存中的执行状态（确保所有路径都清理）
             if task_id in self._running_executions:
                 del self._running_executions[task_id]
             # 注意：不删除context、progress、session映射，可能用于恢复和查询
     
+    async def _notify(self, event_type: str, **context) -> None:
+        """
+        触发通知事件（处理器在后台写入通知发件箱，不等待发送）
+        
+        Args:
+            event_type: 事件类型
+            **context: 模板上下文
+        """
+        try:
+            from ..notifications.triggers import trigger
+            await trigger.trigger(event_type, **context)
+        except Exception as e:
+            logger.warning(f"Failed to trigger {event_type} notification: {e}")
+    
     async def _handle_timeout(
         self,
         task_id: str,
@@ -1041,6 +1085,21 @@ class TaskExecutor:
         """
         return task_id in self._running_executions
     
+    async def wait_for_execution(self, task_id: str) -> Optional[ExecutionState]:
+        """
+        等待后台执行结束（不取消、不抛出执行中的异常）
+        
+        Args:
+            task_id: 任务ID
+        
+        Returns:
+            结束时的执行状态
+        """
+        execution_task = self._running_executions.get(task_id)
+        if execution_task is not None:
+            await asyncio.wait({execution_task})
+        return self._execution_states.get(task_id)
+    
     def get_execution_state(self, task_id: str) -> Optional[ExecutionState]:
         """
         获取执行状态
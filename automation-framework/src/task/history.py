@@ -1,14 +1,24 @@
 """
-历史任务管理器 - 管理任务执行历史记录
+历史任务管理器 - 管理任务执行历史记录（基于 execution_records 表持久化）
 """
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple, Union
 from datetime import datetime, timedelta
-from enum import Enum
+import logging
+import time
 import uuid
 import json
 from pathlib import Path
 
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, func, case, false
+
 from ..core.types import TaskStatus
+from ..models.sqlalchemy_models import (
+    ExecutionRecord as ExecutionRecordModel,
+    Task as TaskModel
+)
+
+logger = logging.getLogger(__name__)
 
 
 class ExecutionHistory:
@@ -74,21 +84,140 @@ class ExecutionHistory:
             error=data.get("error"),
             metadata=data.get("metadata", {})
         )
+    
+    @classmethod
+    def from_db_model(
+        cls,
+        db_record: ExecutionRecordModel,
+        task_name: Optional[str] = None
+    ) -> "ExecutionHistory":
+        """
+        从数据库模型创建执行记录
+        
+        Args:
+            db_record: 数据库执行记录
+            task_name: 任务名称（来自关联的任务表）
+            
+        Returns:
+            执行记录
+        """
+        logs: List[str] = []
+        if db_record.logs:
+            try:
+                parsed = json.loads(db_record.logs)
+                logs = parsed if isinstance(parsed, list) else [str(parsed)]
+            except (ValueError, TypeError):
+                logs = db_record.logs.splitlines()
+        
+        result = db_record.result or {}
+        try:
+            status = TaskStatus(db_record.status)
+        except ValueError:
+            status = TaskStatus.FAILED
+        
+        return cls(
+            record_id=str(db_record.id),
+            task_id=str(db_record.task_id),
+            task_name=task_name or "",
+            status=status,
+            start_time=db_record.start_time,
+            end_time=db_record.end_time,
+            duration_ms=db_record.duration * 1000 if db_record.duration is not None else None,
+            logs=logs,
+            screenshots=db_record.screenshots or [],
+            error=db_record.error_message,
+            metadata=result.get("metadata", {}) if isinstance(result, dict) else {}
+        )
+
+
+
+
+def _parse_datetime(value: Optional[Union[str, datetime]]) -> Optional[datetime]:
+    """解析日期参数（支持ISO字符串）"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+def _error_type(error: str) -> str:
+    """提取错误类型（冒号前的部分）"""
+    return error.split(":")[0] if ":" in error else error
 
 
 class HistoryManager:
     """
-    历史管理器 - 管理任务执行历史
+    历史管理器 - 管理任务执行历史（数据库持久化版本）
+    
+    统计、趋势和错误分析直接在数据库中聚合（GROUP BY），
+    并按 cache_ttl 缓存结果，仪表盘刷新不会重复扫描历史记录。
     """
     
-    def __init__(self):
-        self._records: Dict[str, ExecutionHistory] = {}
+    def __init__(
+        self,
+        db_session: Optional[AsyncSession] = None,
+        cache_ttl: float = 30.0
+    ):
+        """
+        初始化历史管理器
         
-    def create_record(
+        Args:
+            db_session: 数据库会话（如果为None，需要在每个方法中传入）
+            cache_ttl: 统计结果缓存时间（秒），0表示不缓存
+        """
+        self._db_session = db_session
+        self.cache_ttl = cache_ttl
+        self._cache: Dict[Tuple, Tuple[float, Dict[str, Any]]] = {}
+    
+    def _get_db(self, db_session: Optional[AsyncSession]) -> AsyncSession:
+        db = db_session or self._db_session
+        if not db:
+            raise ValueError("Database session is required")
+        return db
+    
+    def _cache_get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        entry = self._cache.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        self._cache.pop(key, None)
+        return None
+    
+    def _cache_set(self, key: Tuple, value: Dict[str, Any]) -> None:
+        if self.cache_ttl > 0:
+            self._cache[key] = (time.monotonic() + self.cache_ttl, value)
+    
+    def invalidate_cache(self) -> None:
+        """清空统计缓存"""
+        self._cache.clear()
+    
+    @staticmethod
+    def _apply_filters(
+        query,
+        task_id: Optional[str] = None,
+        status: Optional[TaskStatus] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ):
+        """添加过滤条件（与 (task_id, start_time, status) 复合索引的列顺序一致）"""
+        if task_id:
+            try:
+                query = query.where(ExecutionRecordModel.task_id == int(task_id))
+            except (ValueError, TypeError):
+                # 非数字的任务ID不会匹配任何记录
+                query = query.where(false())
+        if start_date:
+            query = query.where(ExecutionRecordModel.start_time >= start_date)
+        if end_date:
+            query = query.where(ExecutionRecordModel.start_time <= end_date)
+        if status:
+            query = query.where(ExecutionRecordModel.status == status.value)
+        return query
+        
+    async def create_record(
         self,
         task_id: str,
         task_name: str,
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        db_session: Optional[AsyncSession] = None
     ) -> ExecutionHistory:
         """
         创建执行记录
@@ -97,20 +226,25 @@ class HistoryManager:
             task_id: 任务ID
             task_name: 任务名称
             metadata: 元数据
+            db_session: 数据库会话（如果为None，使用初始化时的会话）
             
         Returns:
             执行记录
         """
-        record = ExecutionHistory(
-            task_id=task_id,
-            task_name=task_name,
-            status=TaskStatus.RUNNING,
-            metadata=metadata
+        db = self._get_db(db_session)
+        db_record = ExecutionRecordModel(
+            task_id=int(task_id),
+            status=TaskStatus.RUNNING.value,
+            start_time=datetime.now(),
+            result={"metadata": metadata or {}}
         )
-        self._records[record.id] = record
-        return record
+        db.add(db_record)
+        await db.commit()
+        await db.refresh(db_record)
+        self.invalidate_cache()
+        return ExecutionHistory.from_db_model(db_record, task_name)
         
-    def update_record(
+    async def update_record(
         self,
         record_id: str,
         status: Optional[TaskStatus] = None,
@@ -118,7 +252,8 @@ class HistoryManager:
         duration_ms: Optional[float] = None,
         logs: Optional[List[str]] = None,
         screenshots: Optional[List[str]] = None,
-        error: Optional[str] = None
+        error: Optional[str] = None,
+        db_session: Optional[AsyncSession] = None
     ) -> Optional[ExecutionHistory]:
         """
         更新执行记录
@@ -128,55 +263,87 @@ class HistoryManager:
             status: 状态
             end_time: 结束时间
             duration_ms: 执行时长
-            logs: 日志
-            screenshots: 截图
+            logs: 日志（追加）
+            screenshots: 截图（追加）
             error: 错误信息
+            db_session: 数据库会话（如果为None，使用初始化时的会话）
             
         Returns:
             更新后的记录，如果不存在返回None
         """
-        record = self._records.get(record_id)
+        db = self._get_db(db_session)
+        record = await self.get_record(record_id, db_session=db)
         if not record:
             return None
         
+        values: Dict[str, Any] = {}
         if status is not None:
-            record.status = status
+            values["status"] = status.value
         if end_time is not None:
-            record.end_time = end_time
+            values["end_time"] = end_time
         if duration_ms is not None:
-            record.duration_ms = duration_ms
+            values["duration"] = int(duration_ms / 1000)
         if logs is not None:
-            record.logs.extend(logs)
+            values["logs"] = json.dumps(record.logs + logs, ensure_ascii=False)
         if screenshots is not None:
-            record.screenshots.extend(screenshots)
+            values["screenshots"] = record.screenshots + screenshots
         if error is not None:
-            record.error = error
+            values["error_message"] = error
         
-        return record
+        if values:
+            await db.execute(
+                update(ExecutionRecordModel)
+                .where(ExecutionRecordModel.id == int(record_id))
+                .values(**values)
+            )
+            await db.commit()
+            self.invalidate_cache()
         
-    def get_record(self, record_id: str) -> Optional[ExecutionHistory]:
+        return await self.get_record(record_id, db_session=db)
+        
+    async def get_record(
+        self,
+        record_id: str,
+        db_session: Optional[AsyncSession] = None
+    ) -> Optional[ExecutionHistory]:
         """
         获取执行记录
         
         Args:
             record_id: 记录ID
+            db_session: 数据库会话（如果为None，使用初始化时的会话）
             
         Returns:
             执行记录，如果不存在返回None
         """
-        return self._records.get(record_id)
+        db = self._get_db(db_session)
+        try:
+            record_id_int = int(record_id)
+        except (ValueError, TypeError):
+            return None
         
-    def list_records(
+        result = await db.execute(
+            select(ExecutionRecordModel, TaskModel.name)
+            .outerjoin(TaskModel, TaskModel.id == ExecutionRecordModel.task_id)
+            .where(ExecutionRecordModel.id == record_id_int)
+        )
+        row = result.first()
+        if not row:
+            return None
+        return ExecutionHistory.from_db_model(row[0], row[1])
+        
+    async def list_records(
         self,
         task_id: Optional[str] = None,
         status: Optional[TaskStatus] = None,
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None,
         limit: int = 100,
-        offset: int = 0
+        offset: int = 0,
+        db_session: Optional[AsyncSession] = None
     ) -> List[ExecutionHistory]:
         """
-        列出执行记录（支持分页和过滤）
+        列出执行记录（支持分页和过滤，按开始时间倒序）
         
         Args:
             task_id: 任务ID过滤
@@ -185,48 +352,51 @@ class HistoryManager:
             end_date: 结束日期过滤
             limit: 每页数量
             offset: 偏移量
+            db_session: 数据库会话（如果为None，使用初始化时的会话）
             
         Returns:
             执行记录列表
         """
-        records = list(self._records.values())
-        
-        # 过滤
-        if task_id:
-            records = [r for r in records if r.task_id == task_id]
-        if status:
-            records = [r for r in records if r.status == status]
-        if start_date:
-            records = [r for r in records if r.start_time >= start_date]
-        if end_date:
-            records = [r for r in records if r.start_time <= end_date]
-        
-        # 排序（按开始时间倒序）
-        records.sort(key=lambda r: r.start_time, reverse=True)
+        db = self._get_db(db_session)
+        query = select(ExecutionRecordModel, TaskModel.name).outerjoin(
+            TaskModel, TaskModel.id == ExecutionRecordModel.task_id
+        )
+        query = self._apply_filters(query, task_id, status, start_date, end_date)
+        query = query.order_by(ExecutionRecordModel.start_time.desc()).offset(offset).limit(limit)
         
-        # 分页
-        return records[offset:offset + limit]
+        result = await db.execute(query)
+        return [ExecutionHistory.from_db_model(row[0], row[1]) for row in result.all()]
         
-    def filter_by_task(self, task_id: str) -> List[ExecutionHistory]:
+    async def filter_by_task(
+        self,
+        task_id: str,
+        db_session: Optional[AsyncSession] = None
+    ) -> List[ExecutionHistory]:
         """按任务过滤"""
-        return self.list_records(task_id=task_id)
+        return await self.list_records(task_id=task_id, db_session=db_session)
         
-    def filter_by_status(self, status: TaskStatus) -> List[ExecutionHistory]:
+    async def filter_by_status(
+        self,
+        status: TaskStatus,
+        db_session: Optional[AsyncSession] = None
+    ) -> List[ExecutionHistory]:
         """按状态过滤"""
-        return self.list_records(status=status)
+        return await self.list_records(status=status, db_session=db_session)
         
-    def filter_by_date(
+    async def filter_by_date(
         self,
         start_date: datetime,
-        end_date: datetime
+        end_date: datetime,
+        db_session: Optional[AsyncSession] = None
     ) -> List[ExecutionHistory]:
         """按日期范围过滤"""
-        return self.list_records(start_date=start_date, end_date=end_date)
+        return await self.list_records(start_date=start_date, end_date=end_date, db_session=db_session)
         
-    def rerun_task(
+    async def rerun_task(
         self,
         record_id: str,
-        modified_params: Optional[Dict[str, Any]] = None
+        modified_params: Optional[Dict[str, Any]] = None,
+        db_session: Optional[AsyncSession] = None
     ) -> Optional[str]:
         """
         重新执行任务
@@ -234,11 +404,12 @@ class HistoryManager:
         Args:
             record_id: 原记录ID
             modified_params: 修改的参数
+            db_session: 数据库会话（如果为None，使用初始化时的会话）
             
         Returns:
             新记录ID，如果原记录不存在返回None
         """
-        original_record = self._records.get(record_id)
+        original_record = await self.get_record(record_id, db_session=db_session)
         if not original_record:
             return None
         
@@ -248,19 +419,21 @@ class HistoryManager:
             metadata.update(modified_params)
         metadata["rerun_from"] = record_id
         
-        new_record = self.create_record(
+        new_record = await self.create_record(
             task_id=original_record.task_id,
             task_name=original_record.task_name,
-            metadata=metadata
+            metadata=metadata,
+            db_session=db_session
         )
         
         return new_record.id
         
-    def export_records(
+    async def export_records(
         self,
         record_ids: List[str],
         file_path: Path,
-        format: str = "json"
+        format: str = "json",
+        db_session: Optional[AsyncSession] = None
     ) -> None:
         """
         导出执行记录
@@ -269,8 +442,20 @@ class HistoryManager:
             record_ids: 记录ID列表
             file_path: 导出文件路径
             format: 导出格式（json或csv）
+            db_session: 数据库会话（如果为None，使用初始化时的会话）
         """
-        records = [self._records[rid] for rid in record_ids if rid in self._records]
+        if format not in ("json", "csv"):
+            raise ValueError(f"Unsupported format: {format}")
+        
+        db = self._get_db(db_session)
+        ids = [int(rid) for rid in record_ids if str(rid).isdigit()]
+        result = await db.execute(
+            select(ExecutionRecordModel, TaskModel.name)
+            .outerjoin(TaskModel, TaskModel.id == ExecutionRecordModel.task_id)
+            .where(ExecutionRecordModel.id.in_(ids))
+            .order_by(ExecutionRecordModel.start_time.desc())
+        )
+        records = [ExecutionHistory.from_db_model(row[0], row[1]) for row in result.all()]
         
         if format == "json":
             data = {
@@ -281,7 +466,7 @@ class HistoryManager:
             with open(file_path, "w", encoding="utf-8") as f:
                 json.dump(data, f, indent=2, ensure_ascii=False)
                 
-        elif format == "csv":
+        else:
             import csv
             with open(file_path, "w", newline="", encoding="utf-8") as f:
                 writer = csv.writer(f)
@@ -302,148 +487,177 @@ class HistoryManager:
                         record.duration_ms or "",
                         record.error or ""
                     ])
-        else:
-            raise ValueError(f"Unsupported format: {format}")
             
-    def get_statistics(
+    async def get_statistics(
         self,
         task_id: Optional[str] = None,
-        days: int = 30
+        days: int = 30,
+        start_date: Optional[Union[str, datetime]] = None,
+        end_date: Optional[Union[str, datetime]] = None,
+        db_session: Optional[AsyncSession] = None
     ) -> Dict[str, Any]:
         """
-        获取统计信息
+        获取统计信息（单次条件聚合查询）
         
         Args:
             task_id: 任务ID（可选）
-            days: 统计天数
+            days: 统计天数（未指定start_date时生效）
+            start_date: 开始日期（可选）
+            end_date: 结束日期（可选）
+            db_session: 数据库会话（如果为None，使用初始化时的会话）
             
         Returns:
             统计信息
         """
-        # 获取指定时间范围内的记录
-        start_date = datetime.now() - timedelta(days=days)
-        records = self.list_records(
-            task_id=task_id,
-            start_date=start_date,
-            limit=10000
+        start = _parse_datetime(start_date)
+        end = _parse_datetime(end_date)
+        cache_key = ("statistics", task_id, days, start, end)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+        
+        if start is None:
+            start = datetime.now() - timedelta(days=days)
+        
+        db = self._get_db(db_session)
+        query = select(
+            func.count(ExecutionRecordModel.id),
+            func.sum(case((ExecutionRecordModel.status == TaskStatus.COMPLETED.value, 1), else_=0)),
+            func.sum(case((ExecutionRecordModel.status == TaskStatus.FAILED.value, 1), else_=0)),
+            func.avg(ExecutionRecordModel.duration),
         )
+        query = self._apply_filters(query, task_id, None, start, end)
+        total, success, failed, avg_duration = (await db.execute(query)).one()
         
-        if not records:
-            return {
-                "total": 0,
-                "success": 0,
-                "failed": 0,
-                "success_rate": 0.0,
-                "avg_duration_ms": 0.0,
-            }
-        
-        total = len(records)
-        success = len([r for r in records if r.status == TaskStatus.COMPLETED])
-        failed = len([r for r in records if r.status == TaskStatus.FAILED])
-        
-        # 计算平均执行时间
-        durations = [r.duration_ms for r in records if r.duration_ms is not None]
-        avg_duration = sum(durations) / len(durations) if durations else 0.0
-        
-        return {
+        total = int(total or 0)
+        success = int(success or 0)
+        stats = {
             "total": total,
             "success": success,
-            "failed": failed,
+            "failed": int(failed or 0),
             "success_rate": success / total if total > 0 else 0.0,
-            "avg_duration_ms": avg_duration,
+            "avg_duration_ms": float(avg_duration) * 1000 if avg_duration is not None else 0.0,
         }
+        self._cache_set(cache_key, stats)
+        return stats
         
-    def get_trends(
+    async def get_trends(
         self,
         task_id: Optional[str] = None,
-        days: int = 30
+        days: int = 30,
+        db_session: Optional[AsyncSession] = None
     ) -> Dict[str, Any]:
         """
-        获取趋势分析
+        获取趋势分析（按日期 GROUP BY）
         
         Args:
             task_id: 任务ID（可选）
             days: 分析天数
+            db_session: 数据库会话（如果为None，使用初始化时的会话）
             
         Returns:
             趋势数据
         """
-        start_date = datetime.now() - timedelta(days=days)
-        records = self.list_records(
-            task_id=task_id,
-            start_date=start_date,
-            limit=10000
+        cache_key = ("trends", task_id, days)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+        
+        db = self._get_db(db_session)
+        day = func.date(ExecutionRecordModel.start_time)
+        query = select(
+            day,
+            func.count(ExecutionRecordModel.id),
+            func.sum(case((ExecutionRecordModel.status == TaskStatus.COMPLETED.value, 1), else_=0)),
+            func.sum(case((ExecutionRecordModel.status == TaskStatus.FAILED.value, 1), else_=0)),
         )
+        query = self._apply_filters(query, task_id, None, datetime.now() - timedelta(days=days))
+        query = query.group_by(day).order_by(day)
         
-        # 按日期分组统计
         daily_stats = {}
-        for record in records:
-            date_key = record.start_time.date().isoformat()
-            if date_key not in daily_stats:
-                daily_stats[date_key] = {
-                    "total": 0,
-                    "success": 0,
-                    "failed": 0,
-                }
-            
-            daily_stats[date_key]["total"] += 1
-            if record.status == TaskStatus.COMPLETED:
-                daily_stats[date_key]["success"] += 1
-            elif record.status == TaskStatus.FAILED:
-                daily_stats[date_key]["failed"] += 1
+        for date_value, total, success, failed in (await db.execute(query)).all():
+            date_key = date_value.isoformat() if hasattr(date_value, "isoformat") else str(date_value)
+            daily_stats[date_key] = {
+                "total": int(total or 0),
+                "success": int(success or 0),
+                "failed": int(failed or 0),
+            }
         
-        return {
+        trends = {
             "daily_stats": daily_stats,
             "period_days": days,
         }
+        self._cache_set(cache_key, trends)
+        return trends
         
-    def get_error_analysis(
+    async def get_error_analysis(
         self,
         task_id: Optional[str] = None,
-        days: int = 30
+        days: int = 30,
+        db_session: Optional[AsyncSession] = None
     ) -> Dict[str, Any]:
         """
-        获取错误分析
+        获取错误分析（按错误信息 GROUP BY 后归并错误类型）
         
         Args:
             task_id: 任务ID（可选）
             days: 分析天数
+            db_session: 数据库会话（如果为None，使用初始化时的会话）
             
         Returns:
             错误分析数据
         """
+        cache_key = ("errors", task_id, days)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+        
+        db = self._get_db(db_session)
         start_date = datetime.now() - timedelta(days=days)
-        records = self.list_records(
-            task_id=task_id,
-            status=TaskStatus.FAILED,
-            start_date=start_date,
-            limit=10000
+        
+        total_query = self._apply_filters(
+            select(func.count(ExecutionRecordModel.id)), task_id, TaskStatus.FAILED, start_date
         )
+        total_errors = int((await db.execute(total_query)).scalar() or 0)
         
-        # 统计错误类型
-        error_counts = {}
-        for record in records:
-            if record.error:
-                error_type = record.error.split(":")[0] if ":" in record.error else record.error
-                error_counts[error_type] = error_counts.get(error_type, 0) + 1
+        # 同一错误信息只返回一行，Python侧只需归并不同的错误信息
+        count = func.count(ExecutionRecordModel.id)
+        message_query = self._apply_filters(
+            select(ExecutionRecordModel.error_message, count), task_id, TaskStatus.FAILED, start_date
+        )
+        message_query = (
+            message_query
+            .where(ExecutionRecordModel.error_message.isnot(None))
+            .group_by(ExecutionRecordModel.error_message)
+            .order_by(count.desc())
+            .limit(1000)
+        )
+        
+        error_counts: Dict[str, int] = {}
+        for message, message_count in (await db.execute(message_query)).all():
+            if message:
+                error_type = _error_type(message)
+                error_counts[error_type] = error_counts.get(error_type, 0) + int(message_count)
         
         # 排序
         sorted_errors = sorted(error_counts.items(), key=lambda x: x[1], reverse=True)
         
-        return {
-            "total_errors": len(records),
+        analysis = {
+            "total_errors": total_errors,
             "error_types": dict(sorted_errors),
             "top_errors": sorted_errors[:10],
         }
+        self._cache_set(cache_key, analysis)
+        return analysis
 
 
 # 全局历史管理器实例
 _global_history_manager: Optional[HistoryManager] = None
 
 
-def get_global_history_manager() -> HistoryManager:
+def get_global_history_manager(db_session: Optional[AsyncSession] = None) -> HistoryManager:
     """获取全局历史管理器"""
     global _global_history_manager
     if _global_history_manager is None:
-        _global_history_manager = HistoryManager()
+        _global_history_manager = HistoryManager(db_session)
     return _global_history_manager
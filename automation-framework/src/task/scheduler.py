@@ -1,17 +1,33 @@
 """
 任务调度器 - 基于APScheduler实现定时任务调度（数据库持久化版本）
+
+多实例部署时，schedules表作为共享的调度存储：
+- 各实例通过scheduler_leases表竞争租约，只有持有租约的主节点注册触发器，
+  每次获得租约时递增的隔离令牌（fencing token）保证失去租约的旧主节点无法继续写入；
+- 主节点在调度到期时只把执行请求写入schedule_runs队列，(调度ID, 计划时间)唯一，
+  主节点切换时重复触发的同一次执行会被去重；
+- 所有实例按各自的空闲容量从队列认领并执行任务，执行期间定期续期执行租约，
+  实例崩溃后租约过期的执行项会被其他实例重新认领。
 """
-from typing import Dict, Any, List, Optional, Callable
-from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable, Iterable
+from datetime import datetime, timedelta
 from enum import Enum
+import asyncio
+import os
+import socket
+import sys
+import time
 import uuid
 import logging
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete
+from sqlalchemy import select, update, delete, insert, literal, or_, case
+from sqlalchemy.exc import IntegrityError
 
 try:
     from apscheduler.schedulers.asyncio import AsyncIOScheduler
+    from apscheduler.executors.base import BaseExecutor
+    from apscheduler.events import JobExecutionEvent, EVENT_JOB_EXECUTED
     from apscheduler.triggers.cron import CronTrigger
     from apscheduler.triggers.interval import IntervalTrigger
     from apscheduler.triggers.date import DateTrigger
@@ -20,16 +36,73 @@ try:
 except ImportError:
     APSCHEDULER_AVAILABLE = False
     AsyncIOScheduler = None
+    BaseExecutor = object
     CronTrigger = None
     IntervalTrigger = None
     DateTrigger = None
     Job = None
 
-from ..models.sqlalchemy_models import Schedule as ScheduleModel
+from ..models.database import AsyncSessionLocal
+from ..models.sqlalchemy_models import (
+    Schedule as ScheduleModel,
+    SchedulerLease as SchedulerLeaseModel,
+    ScheduleRun as ScheduleRunModel,
+)
 
 logger = logging.getLogger(__name__)
 
 
+def _parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    """解析trigger_config中的ISO时间"""
+    return datetime.fromisoformat(value) if value else None
+
+
+def _to_naive(value: Optional[datetime]) -> Optional[datetime]:
+    """转换为本地时区的naive时间（与数据库中的时间字段一致）"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+
+class RunQueueExecutor(BaseExecutor):
+    """
+    APScheduler执行器：调度到期时不在本进程执行任务，而是调用
+    job.func(*job.args, run_times=run_times) 把本次触发写入执行队列
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._eventloop = None
+        self._pending: set = set()
+
+    def start(self, scheduler, alias):
+        super().start(scheduler, alias)
+        self._eventloop = scheduler._eventloop
+
+    def shutdown(self, wait=True):
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+
+    def _do_submit_job(self, job, run_times):
+        def callback(future):
+            self._pending.discard(future)
+            try:
+                future.result()
+            except BaseException:
+                self._run_job_error(job.id, *sys.exc_info()[1:])
+            else:
+                events = [
+                    JobExecutionEvent(EVENT_JOB_EXECUTED, job.id, job._jobstore_alias, run_time)
+                    for run_time in run_times
+                ]
+                self._run_job_success(job.id, events)
+
+        future = self._eventloop.create_task(job.func(*job.args, run_times=run_times, **job.kwargs))
+        future.add_done_callback(callback)
+        self._pending.add(future)
+
+
 class ScheduleType(Enum):
     """调度类型"""
     ONCE = "once"  # 一次性
@@ -128,50 +201,95 @@ class TaskScheduler:
     任务调度器 - 管理定时任务的调度（数据库持久化版本）
     """
     
-    def __init__(self, db_session: Optional[AsyncSession] = None):
+    LEASE_NAME = "task_scheduler"
+    DISPATCH_EXECUTOR = "run_queue"
+    
+    def __init__(
+        self,
+        db_session: Optional[AsyncSession] = None,
+        worker_capacity: int = 2,
+        lease_seconds: float = 15.0,
+        sync_interval: float = 10.0,
+        poll_interval: float = 2.0,
+        misfire_grace_seconds: int = 300
+    ):
         """
         初始化任务调度器
         
         Args:
             db_session: 数据库会话（如果为None，需要在每个方法中传入）
+            worker_capacity: 本实例同时执行的调度任务数上限
+            lease_seconds: 主节点租约时长（秒），主节点失联后最多经过该时长完成切换
+            sync_interval: 主节点从数据库同步调度变更的间隔（秒）
+            poll_interval: 认领执行队列的轮询间隔（秒）
+            misfire_grace_seconds: 调度错过执行时间后仍然补偿执行的宽限时长（秒）
         """
         if not APSCHEDULER_AVAILABLE:
             raise ImportError("APScheduler is not installed. Please install it with: pip install apscheduler")
         
         self.scheduler = AsyncIOScheduler()
+        self.scheduler.add_executor(RunQueueExecutor(), alias=self.DISPATCH_EXECUTOR)
         self._db_session = db_session
         self._schedules: Dict[str, TaskSchedule] = {}
         self._jobs: Dict[str, Job] = {}
         self._running = False
         
-    async def start_scheduler(self, db_session: Optional[AsyncSession] = None) -> None:
+        self.worker_capacity = worker_capacity
+        self.lease_seconds = lease_seconds
+        self.sync_interval = sync_interval
+        self.poll_interval = poll_interval
+        self.misfire_grace_seconds = misfire_grace_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._is_leader = False
+        self._fencing_token: Optional[int] = None
+        self._lease_deadline = 0.0
+        self._background_tasks: List[asyncio.Task] = []
+        self._active_runs: Dict[int, asyncio.Task] = {}
+    
+    @property
+    def is_leader(self) -> bool:
+        """当前实例是否为调度主节点"""
+        return self._is_leader
+    
+    async def start_scheduler(self) -> None:
         """
-        启动调度器并加载数据库中的调度
+        启动调度器：参与主节点选举，并开始从执行队列认领任务
         
-        Args:
-            db_session: 数据库会话（如果为None，使用初始化时的会话）
+        数据库中的调度只由主节点注册触发器（成为主节点时从数据库重建），
+        其他实例只负责执行。
         """
         if not self._running:
-            db = db_session or self._db_session
-            if db:
-                # 从数据库加载所有启用的调度
-                await self._load_schedules_from_db(db)
-            
             self.scheduler.start()
             self._running = True
-            logger.info("Task scheduler started")
-            
-    def stop_scheduler(self) -> None:
-        """停止调度器"""
-        if self._running:
-            self.scheduler.shutdown()
-            self._running = False
-            
+            self._background_tasks = [
+                asyncio.create_task(self._leader_loop()),
+                asyncio.create_task(self._worker_loop()),
+            ]
+            logger.info(f"Task scheduler started (worker {self.worker_id}, capacity {self.worker_capacity})")
+    
+    async def stop_scheduler(self) -> None:
+        """停止调度器，释放主节点租约"""
+        if not self._running:
+            return
+        self._running = False
+        for task in self._background_tasks + list(self._active_runs.values()):
+            task.cancel()
+        await asyncio.gather(*self._background_tasks, *self._active_runs.values(), return_exceptions=True)
+        self._background_tasks = []
+        if self._is_leader:
+            self._step_down()
+            try:
+                await self._release_lease()
+            except Exception as e:
+                logger.warning(f"Failed to release scheduler lease: {e}")
+        self.scheduler.shutdown(wait=False)
+        logger.info("Task scheduler stopped")
+    
     async def schedule_once(
         self,
         task_id: str,
         run_date: datetime,
-        callback: Callable,
+        callback: Optional[Callable] = None,
         metadata: Optional[Dict[str, Any]] = None,
         db_session: Optional[AsyncSession] = None
     ) -> str:
@@ -181,62 +299,27 @@ class TaskScheduler:
         Args:
             task_id: 任务ID
             run_date: 运行时间
-            callback: 回调函数
+            callback: 回调函数（仅在没有数据库会话时使用，持久化的调度由执行队列执行）
             metadata: 元数据
-            
+        
         Returns:
             调度ID
         """
-        # 创建调度对象
         schedule = TaskSchedule(
             task_id=task_id,
             schedule_type=ScheduleType.ONCE,
             trigger_config={"run_date": run_date.isoformat()},
             metadata=metadata
         )
-        
-        # 保存到数据库
-        db = db_session or self._db_session
-        if db:
-            db_schedule = ScheduleModel(**schedule.to_db_model())
-            db.add(db_schedule)
-            await db.commit()
-            await db.refresh(db_schedule)
-            schedule.id = str(db_schedule.id)
-            schedule.created_at = db_schedule.created_at
-            schedule.updated_at = db_schedule.updated_at
-        
-        # 添加到APScheduler
-        trigger = DateTrigger(run_date=run_date)
-        job = self.scheduler.add_job(
-            callback,
-            trigger=trigger,
-            id=schedule.id,
-            args=[task_id]
-        )
-        
-        schedule.next_run = job.next_run_time
-        
-        # 更新数据库中的next_run_time
-        if db:
-            await db.execute(
-                update(ScheduleModel)
-                .where(ScheduleModel.id == int(schedule.id))
-                .values(next_run_time=schedule.next_run)
-            )
-            await db.commit()
-        
-        self._schedules[schedule.id] = schedule
-        self._jobs[schedule.id] = job
-        
+        await self._add_schedule(schedule, callback, db_session or self._db_session)
         logger.info(f"Created once schedule: {schedule.id} for task {task_id}")
         return schedule.id
-        
+    
     async def schedule_interval(
         self,
         task_id: str,
         interval_seconds: int,
-        callback: Callable,
+        callback: Optional[Callable] = None,
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None,
         metadata: Optional[Dict[str, Any]] = None,
@@ -248,15 +331,14 @@ class TaskScheduler:
         Args:
             task_id: 任务ID
             interval_seconds: 间隔秒数
-            callback: 回调函数
+            callback: 回调函数（仅在没有数据库会话时使用，持久化的调度由执行队列执行）
             start_date: 开始时间
             end_date: 结束时间
             metadata: 元数据
-            
+        
         Returns:
             调度ID
         """
-        # 创建调度对象
         schedule = TaskSchedule(
             task_id=task_id,
             schedule_type=ScheduleType.INTERVAL,
@@ -267,53 +349,15 @@ class TaskScheduler:
             },
             metadata=metadata
         )
-        
-        # 保存到数据库
-        db = db_session or self._db_session
-        if db:
-            db_schedule = ScheduleModel(**schedule.to_db_model())
-            db.add(db_schedule)
-            await db.commit()
-            await db.refresh(db_schedule)
-            schedule.id = str(db_schedule.id)
-            schedule.created_at = db_schedule.created_at
-            schedule.updated_at = db_schedule.updated_at
-        
-        # 添加到APScheduler
-        trigger = IntervalTrigger(
-            seconds=interval_seconds,
-            start_date=start_date,
-            end_date=end_date
-        )
-        job = self.scheduler.add_job(
-            callback,
-            trigger=trigger,
-            id=schedule.id,
-            args=[task_id]
-        )
-        
-        schedule.next_run = job.next_run_time
-        
-        # 更新数据库中的next_run_time
-        if db:
-            await db.execute(
-                update(ScheduleModel)
-                .where(ScheduleModel.id == int(schedule.id))
-                .values(next_run_time=schedule.next_run)
-            )
-            await db.commit()
-        
-        self._schedules[schedule.id] = schedule
-        self._jobs[schedule.id] = job
-        
+        await self._add_schedule(schedule, callback, db_session or self._db_session)
         logger.info(f"Created interval schedule: {schedule.id} for task {task_id}")
         return schedule.id
-        
+    
     async def schedule_cron(
         self,
         task_id: str,
         cron_expression: str,
-        callback: Callable,
+        callback: Optional[Callable] = None,
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None,
         metadata: Optional[Dict[str, Any]] = None,
@@ -325,15 +369,14 @@ class TaskScheduler:
         Args:
             task_id: 任务ID
             cron_expression: Cron表达式（例如：'0 0 * * *'）
-            callback: 回调函数
+            callback: 回调函数（仅在没有数据库会话时使用，持久化的调度由执行队列执行）
             start_date: 开始时间
             end_date: 结束时间
             metadata: 元数据
-            
+        
         Returns:
             调度ID
         """
-        # 创建调度对象
         schedule = TaskSchedule(
             task_id=task_id,
             schedule_type=ScheduleType.CRON,
@@ -344,9 +387,28 @@ class TaskScheduler:
             },
             metadata=metadata
         )
+        await self._add_schedule(schedule, callback, db_session or self._db_session)
+        logger.info(f"Created cron schedule: {schedule.id} for task {task_id}")
+        return schedule.id
+    
+    async def _add_schedule(
+        self,
+        schedule: TaskSchedule,
+        callback: Optional[Callable],
+        db: Optional[AsyncSession]
+    ) -> None:
+        """
+        保存调度并注册触发器
+        
+        Args:
+            schedule: 调度对象
+            callback: 回调函数（无数据库会话时使用）
+            db: 数据库会话
+        """
+        # 先构造触发器，配置错误时不写入数据库
+        trigger = self._build_trigger(schedule)
+        schedule.next_run = self._next_fire_time(trigger)
         
-        # 保存到数据库
-        db = db_session or self._db_session
         if db:
             db_schedule = ScheduleModel(**schedule.to_db_model())
             db.add(db_schedule)
@@ -355,16 +417,51 @@ class TaskScheduler:
             schedule.id = str(db_schedule.id)
             schedule.created_at = db_schedule.created_at
             schedule.updated_at = db_schedule.updated_at
+            # 非主节点只写入共享存储，由主节点在下一次同步时注册
+            if self._is_leader:
+                self._register_job(schedule, trigger)
+        else:
+            if callback is None:
+                raise ValueError("callback is required when no database session is available")
+            self._jobs[schedule.id] = self.scheduler.add_job(
+                callback,
+                trigger=trigger,
+                id=schedule.id,
+                args=[schedule.task_id]
+            )
+        
+        self._schedules[schedule.id] = schedule
+    
+    def _build_trigger(self, schedule: TaskSchedule):
+        """
+        根据调度配置构造APScheduler触发器
+        
+        Args:
+            schedule: 调度对象
+        
+        Returns:
+            触发器
+        """
+        config = schedule.trigger_config
+        if schedule.schedule_type == ScheduleType.ONCE:
+            return DateTrigger(run_date=_parse_datetime(config.get("run_date")))
+        
+        start_date = _parse_datetime(config.get("start_date"))
+        end_date = _parse_datetime(config.get("end_date"))
+        if schedule.schedule_type == ScheduleType.INTERVAL:
+            return IntervalTrigger(
+                seconds=int(config["interval_seconds"]),
+                start_date=start_date,
+                end_date=end_date
+            )
         
         # 解析Cron表达式
-        parts = cron_expression.split()
+        parts = str(config.get("cron_expression", "")).split()
         if len(parts) != 5:
             raise ValueError("Invalid cron expression. Expected format: 'minute hour day month day_of_week'")
         
         minute, hour, day, month, day_of_week = parts
-        
-        # 添加到APScheduler
-        trigger = CronTrigger(
+        return CronTrigger(
             minute=minute,
             hour=hour,
             day=day,
@@ -373,30 +470,53 @@ class TaskScheduler:
             start_date=start_date,
             end_date=end_date
         )
-        job = self.scheduler.add_job(
-            callback,
-            trigger=trigger,
-            id=schedule.id,
-            args=[task_id]
-        )
+    
+    @staticmethod
+    def _next_fire_time(trigger) -> Optional[datetime]:
+        """计算触发器的下一次触发时间"""
+        return _to_naive(trigger.get_next_fire_time(None, datetime.now().astimezone()))
+    
+    def _register_job(self, schedule: TaskSchedule, trigger=None) -> Optional[Job]:
+        """
+        在主节点注册持久化调度的触发器（到期时写入执行队列）
         
-        schedule.next_run = job.next_run_time
+        Args:
+            schedule: 调度对象
+            trigger: 已构造的触发器
         
-        # 更新数据库中的next_run_time
-        if db:
-            await db.execute(
-                update(ScheduleModel)
-                .where(ScheduleModel.id == int(schedule.id))
-                .values(next_run_time=schedule.next_run)
-            )
-            await db.commit()
+        Returns:
+            APScheduler任务，无需注册时返回None
+        """
+        # 一次性调度已经触发过，不再注册
+        if schedule.schedule_type == ScheduleType.ONCE and schedule.last_run:
+            self._unregister_job(schedule.id)
+            return None
         
-        self._schedules[schedule.id] = schedule
+        options: Dict[str, Any] = {}
+        # 沿用共享存储中的下次运行时间，主节点切换期间到期的调度会被补偿执行，周期调度的相位也保持不变
+        if schedule.next_run:
+            options["next_run_time"] = schedule.next_run
+        job = self.scheduler.add_job(
+            self._dispatch_runs,
+            trigger=trigger or self._build_trigger(schedule),
+            id=schedule.id,
+            args=[schedule.id],
+            executor=self.DISPATCH_EXECUTOR,
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1,
+            misfire_grace_time=self.misfire_grace_seconds,
+            **options
+        )
         self._jobs[schedule.id] = job
-        
-        logger.info(f"Created cron schedule: {schedule.id} for task {task_id}")
-        return schedule.id
-        
+        return job
+    
+    def _unregister_job(self, schedule_id: str) -> None:
+        """移除本地注册的触发器"""
+        self._jobs.pop(schedule_id, None)
+        if self.scheduler.get_job(schedule_id):
+            self.scheduler.remove_job(schedule_id)
+    
     async def cancel_schedule(
         self,
         schedule_id: str,
@@ -408,33 +528,31 @@ class TaskScheduler:
         Args:
             schedule_id: 调度ID
             db_session: 数据库会话（如果为None，使用初始化时的会话）
-            
+        
         Returns:
             是否取消成功
         """
-        if schedule_id in self._schedules:
-            # 从APScheduler移除
-            if schedule_id in self._jobs:
-                self.scheduler.remove_job(schedule_id)
-                del self._jobs[schedule_id]
-            
-            # 从数据库删除
-            db = db_session or self._db_session
-            if db:
-                try:
-                    await db.execute(
-                        delete(ScheduleModel).where(ScheduleModel.id == int(schedule_id))
-                    )
-                    await db.commit()
-                except (ValueError, TypeError):
-                    # 如果schedule_id不是数字，尝试通过其他方式查找
-                    pass
-            
-            del self._schedules[schedule_id]
-            logger.info(f"Cancelled schedule: {schedule_id}")
-            return True
-        return False
+        # 从APScheduler移除（其他实例上的主节点会在同步时移除）
+        self._unregister_job(schedule_id)
+        cancelled = self._schedules.pop(schedule_id, None) is not None
         
+        # 从数据库删除
+        db = db_session or self._db_session
+        if db:
+            try:
+                result = await db.execute(
+                    delete(ScheduleModel).where(ScheduleModel.id == int(schedule_id))
+                )
+                await db.commit()
+                cancelled = cancelled or result.rowcount > 0
+            except (ValueError, TypeError):
+                # 如果schedule_id不是数字，尝试通过其他方式查找
+                pass
+        
+        if cancelled:
+            logger.info(f"Cancelled schedule: {schedule_id}")
+        return cancelled
+    
     async def list_schedules(
         self,
         task_id: Optional[str] = None,
@@ -448,7 +566,7 @@ class TaskScheduler:
             task_id: 任务ID过滤
             enabled: 启用状态过滤
             db_session: 数据库会话（如果为None，使用初始化时的会话）
-            
+        
         Returns:
             调度列表
         """
@@ -480,14 +598,8 @@ class TaskScheduler:
         db_schedules = result.scalars().all()
         
         # 转换为TaskSchedule对象
-        schedules = [TaskSchedule.from_db_model(db_schedule) for db_schedule in db_schedules]
-        
-        # 同步到内存（用于快速访问）
-        for schedule in schedules:
-            self._schedules[schedule.id] = schedule
-        
-        return schedules
-        
+        return [TaskSchedule.from_db_model(db_schedule) for db_schedule in db_schedules]
+    
     async def get_schedule(
         self,
         schedule_id: str,
@@ -499,31 +611,24 @@ class TaskScheduler:
         Args:
             schedule_id: 调度ID
             db_session: 数据库会话（如果为None，使用初始化时的会话）
-            
+        
         Returns:
             调度对象，如果不存在返回None
         """
-        # 先检查内存
-        if schedule_id in self._schedules:
-            return self._schedules[schedule_id]
-        
-        # 从数据库查询
+        # 调度可能由其他实例修改，有数据库会话时以数据库为准
         db = db_session or self._db_session
-        if db:
-            try:
-                result = await db.execute(
-                    select(ScheduleModel).where(ScheduleModel.id == int(schedule_id))
-                )
-                db_schedule = result.scalar_one_or_none()
-                if db_schedule:
-                    schedule = TaskSchedule.from_db_model(db_schedule)
-                    self._schedules[schedule.id] = schedule
-                    return schedule
-            except (ValueError, TypeError):
-                pass
-        
-        return None
+        if not db:
+            return self._schedules.get(schedule_id)
         
+        try:
+            result = await db.execute(
+                select(ScheduleModel).where(ScheduleModel.id == int(schedule_id))
+            )
+        except (ValueError, TypeError):
+            return None
+        db_schedule = result.scalar_one_or_none()
+        return TaskSchedule.from_db_model(db_schedule) if db_schedule else None
+    
     async def update_schedule_status(
         self,
         schedule_id: str,
@@ -537,7 +642,7 @@ class TaskScheduler:
             schedule_id: 调度ID
             enabled: 是否启用
             db_session: 数据库会话（如果为None，使用初始化时的会话）
-            
+        
         Returns:
             更新后的调度，如果不存在返回None
         """
@@ -545,24 +650,28 @@ class TaskScheduler:
         if not schedule:
             return None
         
+        now = datetime.now()
         schedule.enabled = enabled
-        schedule.updated_at = datetime.now()
+        schedule.updated_at = now
         
         # 更新数据库
         db = db_session or self._db_session
         if db:
-            try:
-                await db.execute(
-                    update(ScheduleModel)
-                    .where(ScheduleModel.id == int(schedule_id))
-                    .values(enabled=enabled, updated_at=datetime.now())
-                )
-                await db.commit()
-            except (ValueError, TypeError):
-                pass
-        
-        # 暂停或恢复APScheduler中的任务
-        if schedule_id in self._jobs:
+            await db.execute(
+                update(ScheduleModel)
+                .where(ScheduleModel.id == int(schedule_id))
+                .values(enabled=enabled, updated_at=now)
+            )
+            await db.commit()
+            # 主节点立即生效，其他实例由主节点在同步时处理
+            if self._is_leader:
+                if enabled:
+                    self._register_job(schedule)
+                else:
+                    self._unregister_job(schedule_id)
+                self._schedules[schedule_id] = schedule
+        elif schedule_id in self._jobs:
+            # 暂停或恢复APScheduler中的任务
             if enabled:
                 self.scheduler.resume_job(schedule_id)
             else:
@@ -571,45 +680,370 @@ class TaskScheduler:
         logger.info(f"Updated schedule {schedule_id} status to {enabled}")
         return schedule
     
-    async def _load_schedules_from_db(self, db: AsyncSession) -> None:
+    # ==================== 主节点选举 ====================
+    
+    async def _leader_loop(self) -> None:
+        """定期获取或续约主节点租约，主节点同时负责同步调度变更"""
+        next_sync = 0.0
+        while True:
+            try:
+                token = await self._acquire_or_renew_lease()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Scheduler lease renewal failed: {e}")
+                # 无法访问数据库时，本地租约到期前仍保持主节点身份
+                token = self._fencing_token if self._lease_deadline > time.monotonic() else None
+            
+            try:
+                if token is None:
+                    if self._is_leader:
+                        logger.warning(f"Scheduler leadership lost by {self.worker_id}")
+                        self._step_down()
+                elif not self._is_leader or token != self._fencing_token:
+                    await self._become_leader(token)
+                    next_sync = time.monotonic() + self.sync_interval
+                elif time.monotonic() >= next_sync:
+                    await self._load_schedules_from_db()
+                    next_sync = time.monotonic() + self.sync_interval
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Scheduler leader loop error: {e}")
+            
+            await asyncio.sleep(self.lease_seconds / 3)
+    
+    async def _acquire_or_renew_lease(self) -> Optional[int]:
         """
-        从数据库加载所有启用的调度
+        获取或续约主节点租约
+        
+        Returns:
+            持有租约时返回隔离令牌，否则返回None
+        """
+        now = datetime.now()
+        expires_at = now + timedelta(seconds=self.lease_seconds)
+        lease = SchedulerLeaseModel
+        async with AsyncSessionLocal() as db:
+            # 令牌必须在holder之前赋值：MySQL按顺序执行SET，CASE需要看到旧的持有者
+            result = await db.execute(
+                update(lease)
+                .where(
+                    lease.name == self.LEASE_NAME,
+                    or_(lease.holder == self.worker_id, lease.expires_at < now)
+                )
+                .ordered_values(
+                    (lease.fencing_token, case(
+                        (lease.holder == self.worker_id, lease.fencing_token),
+                        else_=lease.fencing_token + 1
+                    )),
+                    (lease.holder, self.worker_id),
+                    (lease.expires_at, expires_at),
+                    (lease.updated_at, now),
+                )
+            )
+            if result.rowcount == 0:
+                # 租约记录不存在时创建；已被其他实例持有时主键冲突
+                db.add(lease(
+                    name=self.LEASE_NAME,
+                    holder=self.worker_id,
+                    fencing_token=1,
+                    expires_at=expires_at,
+                    updated_at=now
+                ))
+            try:
+                await db.commit()
+            except IntegrityError:
+                await db.rollback()
+                return None
+            
+            token = (await db.execute(
+                select(lease.fencing_token).where(
+                    lease.name == self.LEASE_NAME,
+                    lease.holder == self.worker_id
+                )
+            )).scalar_one_or_none()
+        
+        if token is not None:
+            self._lease_deadline = time.monotonic() + self.lease_seconds
+        return token
+    
+    async def _release_lease(self) -> None:
+        """主动释放租约，其他实例无需等待过期即可接管"""
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(SchedulerLeaseModel)
+                .where(
+                    SchedulerLeaseModel.name == self.LEASE_NAME,
+                    SchedulerLeaseModel.holder == self.worker_id
+                )
+                .values(expires_at=datetime.now())
+            )
+            await db.commit()
+    
+    async def _become_leader(self, token: int) -> None:
+        """
+        成为主节点：从共享存储重建全部触发器
         
         Args:
-            db: 数据库会话
+            token: 隔离令牌
         """
-        try:
+        self._step_down()
+        self._is_leader = True
+        self._fencing_token = token
+        logger.info(f"Scheduler leadership acquired by {self.worker_id} (fencing token {token})")
+        await self._load_schedules_from_db()
+    
+    def _step_down(self) -> None:
+        """放弃主节点身份，移除本地注册的持久化调度触发器"""
+        self._is_leader = False
+        self._fencing_token = None
+        for job in self.scheduler.get_jobs():
+            if job.executor == self.DISPATCH_EXECUTOR:
+                self._unregister_job(job.id)
+    
+    async def _load_schedules_from_db(self) -> None:
+        """
+        从数据库加载所有启用的调度并注册触发器（仅主节点）
+        
+        只重新注册新增或修改过（updated_at变化）的调度，并移除已删除或停用的调度。
+        """
+        async with AsyncSessionLocal() as db:
             result = await db.execute(
                 select(ScheduleModel).where(ScheduleModel.enabled == True)
             )
             db_schedules = result.scalars().all()
+        
+        if not self._is_leader:
+            return
+        
+        active_ids = set()
+        for db_schedule in db_schedules:
+            schedule = TaskSchedule.from_db_model(db_schedule)
+            active_ids.add(schedule.id)
+            loaded = self._schedules.get(schedule.id)
+            if schedule.id in self._jobs and loaded and loaded.updated_at == schedule.updated_at:
+                continue
+            self._schedules[schedule.id] = schedule
+            try:
+                if self._register_job(schedule):
+                    logger.info(f"Loaded schedule {schedule.id} from database")
+            except Exception as e:
+                logger.error(f"Failed to register schedule {schedule.id}: {e}")
+        
+        for schedule_id in list(self._jobs):
+            job = self.scheduler.get_job(schedule_id)
+            if schedule_id not in active_ids and (job is None or job.executor == self.DISPATCH_EXECUTOR):
+                self._unregister_job(schedule_id)
+    
+    async def _dispatch_runs(self, schedule_id: str, run_times: Iterable[datetime] = ()) -> None:
+        """
+        把到期的调度写入执行队列（由RunQueueExecutor在主节点调用）
+        
+        写入语句以当前租约为条件，隔离令牌已失效的旧主节点写入0行并立即退位。
+        
+        Args:
+            schedule_id: 调度ID
+            run_times: 本次到期的计划时间
+        """
+        token = self._fencing_token
+        schedule = self._schedules.get(schedule_id)
+        if token is None or schedule is None:
+            return
+        
+        now = datetime.now()
+        lease = SchedulerLeaseModel
+        last_run = None
+        async with AsyncSessionLocal() as db:
+            for run_time in run_times:
+                scheduled_time = _to_naive(run_time)
+                source = select(
+                    literal(int(schedule_id)),
+                    literal(int(schedule.task_id)),
+                    literal(scheduled_time),
+                    literal(token),
+                    literal("pending"),
+                    literal(now),
+                ).where(
+                    lease.name == self.LEASE_NAME,
+                    lease.holder == self.worker_id,
+                    lease.fencing_token == token,
+                    lease.expires_at > now
+                )
+                stmt = insert(ScheduleRunModel).from_select(
+                    ["schedule_id", "task_id", "scheduled_time", "fencing_token", "status", "created_at"],
+                    source
+                )
+                try:
+                    result = await db.execute(stmt)
+                    await db.commit()
+                except IntegrityError:
+                    # 主节点切换时同一次触发已由前任写入
+                    await db.rollback()
+                    logger.info(f"Schedule {schedule_id} run at {scheduled_time} already queued")
+                    continue
+                if result.rowcount == 0:
+                    logger.warning(f"Fencing token {token} rejected, {self.worker_id} stepping down")
+                    self._step_down()
+                    return
+                last_run = scheduled_time
             
-            for db_schedule in db_schedules:
-                schedule = TaskSchedule.from_db_model(db_schedule)
-                self._schedules[schedule.id] = schedule
-                
-                # 重新添加到APScheduler（需要回调函数，这里先跳过，由外部提供）
-                # 注意：实际使用时需要在启动时提供回调函数
-                logger.info(f"Loaded schedule {schedule.id} from database")
+            if last_run is None:
+                return
+            current_job = self.scheduler.get_job(schedule_id)
+            next_run = _to_naive(current_job.next_run_time) if current_job else None
+            if current_job is None:
+                self._jobs.pop(schedule_id, None)
+            # 保持updated_at不变，避免同步时把运行时间的更新当作调度变更
+            await db.execute(
+                update(ScheduleModel)
+                .where(ScheduleModel.id == int(schedule_id))
+                .values(last_run_time=last_run, next_run_time=next_run, updated_at=ScheduleModel.updated_at)
+            )
+            await db.commit()
+        schedule.last_run = last_run
+        schedule.next_run = next_run
+    
+    # ==================== 执行队列 ====================
+    
+    async def _worker_loop(self) -> None:
+        """按空闲容量从执行队列认领任务，并续期执行中任务的租约"""
+        next_renew = 0.0
+        while True:
+            try:
+                if self._active_runs and time.monotonic() >= next_renew:
+                    await self._renew_run_leases()
+                    next_renew = time.monotonic() + self.lease_seconds / 3
+                free = self.worker_capacity - len(self._active_runs)
+                if free > 0:
+                    for run in await self._claim_runs(free):
+                        task = asyncio.create_task(self._execute_run(run))
+                        self._active_runs[run.id] = task
+                        task.add_done_callback(lambda _, run_id=run.id: self._active_runs.pop(run_id, None))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Failed to claim scheduled runs: {e}")
+            await asyncio.sleep(self.poll_interval)
+    
+    def _claimable(self, now: datetime):
+        """可认领的队列项：待执行，或执行中但租约已过期（认领的实例已崩溃或失联）"""
+        return or_(
+            ScheduleRunModel.status == "pending",
+            (ScheduleRunModel.status == "running") & (ScheduleRunModel.lease_expires_at < now)
+        )
+    
+    async def _claim_runs(self, limit: int) -> List[Any]:
+        """
+        认领待执行或租约已过期的队列项（条件更新，同一项只会被一个实例认领）
+        
+        Args:
+            limit: 最多认领数量
+        
+        Returns:
+            认领成功的队列项
+        """
+        claimed = []
+        now = datetime.now()
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(
+                    ScheduleRunModel.id, ScheduleRunModel.schedule_id, ScheduleRunModel.task_id,
+                    ScheduleRunModel.status, ScheduleRunModel.worker_id
+                )
+                .where(self._claimable(now))
+                .order_by(ScheduleRunModel.id)
+                .limit(limit)
+            )
+            for run in result.all():
+                claim = await db.execute(
+                    update(ScheduleRunModel)
+                    .where(ScheduleRunModel.id == run.id, self._claimable(now))
+                    .values(
+                        status="running",
+                        worker_id=self.worker_id,
+                        claimed_at=now,
+                        lease_expires_at=now + timedelta(seconds=self.lease_seconds)
+                    )
+                )
+                if claim.rowcount == 1:
+                    if run.status == "running":
+                        logger.warning(f"Reclaimed scheduled run {run.id} from stale worker {run.worker_id}")
+                    claimed.append(run)
+            await db.commit()
+        return claimed
+    
+    async def _renew_run_leases(self) -> None:
+        """续期本实例执行中队列项的租约"""
+        now = datetime.now()
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(ScheduleRunModel)
+                .where(
+                    ScheduleRunModel.id.in_(list(self._active_runs)),
+                    ScheduleRunModel.worker_id == self.worker_id,
+                    ScheduleRunModel.status == "running"
+                )
+                .values(lease_expires_at=now + timedelta(seconds=self.lease_seconds))
+            )
+            await db.commit()
+    
+    async def _execute_run(self, run: Any) -> None:
+        """
+        执行认领的队列项并记录结果
+        
+        Args:
+            run: 队列项（id, schedule_id, task_id）
+        """
+        from .executor import ExecutionState, get_global_executor
+        
+        task_id = str(run.task_id)
+        status, error = "completed", None
+        try:
+            async with AsyncSessionLocal() as db:
+                executor = get_global_executor(db_session=db)
+                result = await executor.execute_task(task_id, db_session=db)
+                if not result.get("success"):
+                    status, error = "failed", result.get("message")
+                else:
+                    # 等待后台执行结束，执行期间占用本实例的一个容量
+                    state = await executor.wait_for_execution(task_id)
+                    if state != ExecutionState.COMPLETED:
+                        status, error = "failed", f"Execution finished with state: {state.value if state else None}"
+        except asyncio.CancelledError:
+            status, error = "failed", "Worker stopped before the run finished"
         except Exception as e:
-            logger.error(f"Failed to load schedules from database: {e}")
+            status, error = "failed", str(e)
+            logger.error(f"Scheduled run {run.id} of task {task_id} failed: {e}")
+        
+        async with AsyncSessionLocal() as db:
+            # 租约过期后已被其他实例重新认领时不覆盖其结果
+            await db.execute(
+                update(ScheduleRunModel)
+                .where(ScheduleRunModel.id == run.id, ScheduleRunModel.worker_id == self.worker_id)
+                .values(status=status, error_message=error, finished_at=datetime.now())
+            )
+            await db.commit()
 
 
-# 全局调度器实例（注意：需要在使用时传入db_session）
+# 全局调度器实例（各方法使用调用方传入的db_session）
 _global_scheduler: Optional[TaskScheduler] = None
 
 
 def get_global_scheduler(db_session: Optional[AsyncSession] = None) -> TaskScheduler:
     """
-    获取全局调度器
-    
+    获取全局调度器（进程内单例，参与主节点选举和执行队列消费）
+
     Args:
-        db_session: 数据库会话（如果提供，会创建新的调度器实例）
-        
+        db_session: 兼容旧调用保留，请在调用调度方法时传入db_session
+
     Returns:
         调度器实例
     """
     global _global_scheduler
-    if _global_scheduler is None or db_session is not None:
-        _global_scheduler = TaskScheduler(db_session=db_session)
+    if _global_scheduler is None:
+        _global_scheduler = TaskScheduler(
+            worker_capacity=int(os.getenv("SCHEDULER_WORKER_CAPACITY", "2")),
+            lease_seconds=float(os.getenv("SCHEDULER_LEASE_SECONDS", "15")),
+            sync_interval=float(os.getenv("SCHEDULER_SYNC_INTERVAL", "10")),
+        )
     return _global_scheduler